@@ -0,0 +1,114 @@
+"""
+Benchmark comparing the JSON and binary framing modes of the CHAS socket.
+
+We encode a few typical packets with each framing mode,
+and report the number of bytes on the wire as well as the time taken to parse them.
+
+Run from the server directory:
+
+    python -m benchmarks.framing
+"""
+
+import logging
+import time
+import uuid
+
+from chaslib.socket_lib import CHASocket, FRAMING_JSON, FRAMING_BINARY
+
+
+class DummySocket:
+
+    """
+    Dummy socket that accepts the socket options CHASocket sets.
+
+    We never touch the network, as we only want to measure encoding and parsing.
+    """
+
+    def setsockopt(self, *args):
+
+        pass
+
+    def settimeout(self, timeout):
+
+        pass
+
+
+PACKETS = {
+    'ping': {'id': 0, 'uuid': str(uuid.uuid4()), 'content': {'ping': 1.0}},
+    'voice': {'id': 2, 'uuid': str(uuid.uuid4()), 'content': {'voice': 'what time is it', 'talk': False}},
+    'special': {'id': 3, 'uuid': str(uuid.uuid4()), 'content': {'content-uuid': str(uuid.uuid4()),
+                                                                 'content-status': 0,
+                                                                 'content-id': 2,
+                                                                 'content-type': 0,
+                                                                 'content': {'voice': 'hello', 'talk': False}}},
+}
+
+
+def get_socket(framing):
+
+    """
+    Creates a CHAS socket using the given framing mode.
+
+    :param framing: Framing mode to use
+    :type framing: str
+    :return: CHAS socket
+    :rtype: CHASocket
+    """
+
+    sock = CHASocket(None, DummySocket(), ('127.0.0.1', 0), logging.getLogger("BENCH"))
+
+    sock.set_framing(framing)
+
+    return sock
+
+
+def bench(framing, packet, num=20000):
+
+    """
+    Encodes and parses the given packet a number of times.
+
+    :param framing: Framing mode to use
+    :type framing: str
+    :param packet: Packet to encode
+    :type packet: dict
+    :param num: Number of packets to encode and parse
+    :type num: int
+    :return: Size of one packet, encode time per packet and parse time per packet in microseconds
+    :rtype: tuple
+    """
+
+    sock = get_socket(framing)
+
+    start = time.perf_counter()
+
+    wire = b''.join([sock.encode(packet) for _ in range(num)])
+
+    encode = (time.perf_counter() - start) / num * 1000000
+
+    start = time.perf_counter()
+
+    messages = sock.feed(wire)
+
+    parse = (time.perf_counter() - start) / num * 1000000
+
+    assert len(messages) == num, "Lost messages while parsing!"
+
+    return len(wire) // num, encode, parse
+
+
+def main():
+
+    print("{:<10}{:<10}{:>10}{:>14}{:>14}".format('Packet', 'Framing', 'Bytes', 'Encode(us)', 'Parse(us)'))
+
+    for name, packet in PACKETS.items():
+
+        for framing in (FRAMING_JSON, FRAMING_BINARY):
+
+            size, encode, parse = bench(framing, packet)
+
+            print("{:<10}{:<10}{:>10}{:>14.2f}{:>14.2f}".format(name, framing, size, encode, parse))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark of matching commands against the CoreTools intent grammar.
+
+We run a corpus of commands and chatter through three matchers:
+
+    - Chain - The chain of 'keyword_find()' calls CoreTools used before intents
+    - Scan - Every intent tried in order, without the keyword index
+    - Grammar - The IntentGrammar, which searches the keyword index once
+
+To see how latency grows as commands are added,
+we then register extra intents, like extensions would, and run the corpus again.
+The chain can't grow without writing more code, so it's only run once.
+
+We report the mean time to match one input, and check that every matcher agrees on the commands.
+
+Run from the server directory:
+
+    python -m benchmarks.intents
+"""
+
+import time
+
+from chaslib.extension import CoreTools
+from chaslib.intents import Intent, IntentGrammar
+from chaslib.resptools import ParsedUtterance, keyword_find
+
+REPEAT = 200  # Number of times to run the corpus
+EXTRA = (0, 50, 200, 1000)  # Numbers of extra intents to register
+
+CORPUS = (
+    ('extension reload', 'extension_reload'),
+    ('please refresh the plugin list for me', 'extension_reload'),
+    ('extension list', 'extension_list'),
+    ('plugin disable Music Player', 'extension_disable'),
+    ('extension enable Date-Time', 'extension_enable'),
+    ('personality reload', 'personality_reload'),
+    ('personality list', 'personality_list'),
+    ('intelligence select CORE', 'personality_select'),
+    ('net status', 'net_status'),
+    ('audio list', 'audio_list'),
+    ('audio stats', 'audio_stats'),
+    ('audio status reset', 'audio_stats_reset'),
+    ('audio stream enable', 'audio_stream_enable'),
+    ('audio stream disable', 'audio_stream_disable'),
+    ('audio stream', 'audio_stream_status'),
+    ('what time is it', None),
+    ('play Spanish Flea by Herb Albert', None),
+    ('turn the light on', None),
+    ('hello there, how are you doing today?', None),
+    ('could you tell me a story about a dragon and a knight in a faraway land', None),
+)  # Input, and the intent it should match
+
+
+def chain(mesg):
+
+    # The order and keywords CoreTools checked before intents, returns the intent name
+
+    if keyword_find(mesg, ['extension', 'plugin']):
+
+        for keys, name in ((['reload', 'refresh'], 'extension_reload'), (['list', 'show'], 'extension_list'),
+                           ('disable', 'extension_disable'), ('enable', 'extension_enable')):
+
+            if keyword_find(mesg, keys):
+
+                return name
+
+    if keyword_find(mesg, ['personality', 'intelligence']):
+
+        for keys, name in (('reload', 'personality_reload'), ('list', 'personality_list'),
+                           ('select', 'personality_select')):
+
+            if keyword_find(mesg, keys):
+
+                return name
+
+    if keyword_find(mesg, ['net']) and keyword_find(mesg, 'status'):
+
+        return 'net_status'
+
+    if keyword_find(mesg, ['audio']):
+
+        if keyword_find(mesg, ['list']):
+
+            return 'audio_list'
+
+        if keyword_find(mesg, ['stats', 'status']) and not keyword_find(mesg, ['stream']):
+
+            return 'audio_stats_reset' if keyword_find(mesg, ['reset']) else 'audio_stats'
+
+        if keyword_find(mesg, ['stream']):
+
+            if keyword_find(mesg, ['enable']):
+
+                return 'audio_stream_enable'
+
+            if keyword_find(mesg, ['disable']):
+
+                return 'audio_stream_disable'
+
+            return 'audio_stream_status'
+
+    return None
+
+
+def scan(intents, mesg):
+
+    # Tries every intent in order, returns the intent name
+
+    for intent in intents:
+
+        if intent.match(mesg) is not None:
+
+            return intent.name
+
+    return None
+
+
+def grammar_match(grammar, mesg):
+
+    # Matches with the keyword index, returns the intent name
+
+    intent, _ = grammar.match(ParsedUtterance(mesg))
+
+    return intent.name if intent else None
+
+
+def bench(func):
+
+    # Runs the corpus through the matcher, and returns the mean time per input and the names matched
+
+    names = [func(mesg) for mesg, _ in CORPUS]
+
+    start = time.perf_counter()
+
+    for _ in range(REPEAT):
+
+        for mesg, _ in CORPUS:
+
+            func(mesg)
+
+    return (time.perf_counter() - start) / (REPEAT * len(CORPUS)), names
+
+
+def main():
+
+    core = CoreTools()
+    expected = [name for _, name in CORPUS]
+
+    print("{} inputs, {} runs".format(len(CORPUS), REPEAT))
+    print("{:<10}{:>10}{:>14}{:>10}".format('Matcher', 'Intents', 'Mean(us)', 'Correct'))
+
+    mean, names = bench(chain)
+
+    print("{:<10}{:>10}{:>14.2f}{:>10}".format('Chain', len(core.intents), mean * 1e6,
+                                              sum(a == b for a, b in zip(names, expected))))
+
+    for extra in EXTRA:
+
+        intents = list(core.intents)
+
+        for num in range(extra):
+
+            # Commands an extension could register:
+
+            intents.append(Intent('extra{}'.format(num), ['gadget{} (start|stop) {{what}}'.format(num),
+                                                          'set gadget{} to {{value}}'.format(num)]))
+
+        grammar = IntentGrammar()
+
+        for intent in intents:
+
+            grammar.add(intent)
+
+        for name, func in (('Scan', lambda mesg: scan(intents, mesg)),
+                           ('Grammar', lambda mesg: grammar_match(grammar, mesg))):
+
+            mean, names = bench(func)
+
+            print("{:<10}{:>10}{:>14.2f}{:>10}".format(name, len(intents), mean * 1e6,
+                                                      sum(a == b for a, b in zip(names, expected))))
+
+
+if __name__ == '__main__':
+
+    main()
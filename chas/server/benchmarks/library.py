@@ -0,0 +1,171 @@
+"""
+Benchmark of finding songs in a large media library.
+
+We create a song directory with thousands of empty song files, spread over many folders,
+and find songs the way MusicPlayer used to, by walking the directory,
+and with the MediaLibrary index.
+
+We report the time to build the index, to refresh it when nothing changed,
+and to refresh it after adding a song,
+along with the time each kind of lookup takes.
+
+Run from the server directory:
+
+    python -m benchmarks.library
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from chaslib.sound.library import MediaLibrary
+
+FOLDERS = 200  # Number of folders, like artists
+ALBUMS = 5  # Number of albums in each folder
+SONGS = 20  # Number of songs in each album
+LOOKUPS = 50  # Number of lookups to time
+WORDS = ('spanish', 'flea', 'blue', 'moon', 'night', 'train', 'river', 'song', 'dance', 'little', 'love', 'rain')
+
+
+def make_library(root):
+
+    # Creates the song directory, and returns the folder and title of every song
+
+    songs = []
+
+    for folder in range(FOLDERS):
+
+        for album in range(ALBUMS):
+
+            path = os.path.join(root, 'artist_{}'.format(folder), 'album_{}'.format(album))
+
+            os.makedirs(path)
+
+            for num in range(SONGS):
+
+                title = '_'.join(random.sample(WORDS, 3)) + '_{}'.format(num * ALBUMS + album)
+
+                open(os.path.join(path, title + '.wav'), 'w').close()
+
+                songs.append(('artist {}'.format(folder), title.replace('_', ' ')))
+
+    os.makedirs(os.path.join(root, 'playlists'))
+
+    open(os.path.join(root, 'playlists', 'jams.txt'), 'w').close()
+
+    return songs
+
+
+def walk(root, title, folder):
+
+    # Finds a song like MusicPlayer used to
+
+    temp_title = title.lower().replace(' ', '_')
+    media_dir = os.path.join(root, folder.lower().replace(' ', '_'))
+
+    for dirpath, dirs, files in os.walk(media_dir):
+
+        if temp_title + '.wav' in files:
+
+            return os.path.join(dirpath, temp_title + '.wav')
+
+    return None
+
+
+def timed(func, *args):
+
+    # Runs the function, and returns the time it took and it's result
+
+    start = time.perf_counter()
+
+    val = func(*args)
+
+    return time.perf_counter() - start, val
+
+
+def mean_time(func, lookups):
+
+    # Returns the mean time of the given lookups, and the number found
+
+    found = 0
+    start = time.perf_counter()
+
+    for args in lookups:
+
+        if func(*args) is not None:
+
+            found += 1
+
+    return (time.perf_counter() - start) / len(lookups), found
+
+
+def main():
+
+    root = tempfile.mkdtemp()
+
+    try:
+
+        songs = make_library(root)
+        picks = random.sample(songs, LOOKUPS)
+
+        print("{} songs in {} folders".format(len(songs), FOLDERS * (ALBUMS + 1)))
+
+        library = MediaLibrary(root)
+
+        secs, changed = timed(library.refresh)
+
+        print("{:<32}{:>12.2f} ms, {} directories listed".format('Build index', secs * 1000, changed))
+
+        secs, changed = timed(library.refresh)
+
+        print("{:<32}{:>12.2f} ms, {} directories listed".format('Refresh, nothing changed', secs * 1000, changed))
+
+        open(os.path.join(root, 'artist_0', 'album_0', 'brand_new_song.wav'), 'w').close()
+
+        secs, changed = timed(library.refresh)
+
+        print("{:<32}{:>12.2f} ms, {} directories listed".format('Refresh, one song added', secs * 1000, changed))
+
+        # Walk the whole library, like a search without a folder:
+
+        secs, found = mean_time(lambda title, folder: walk(root, title, ''), [(title, folder) for folder, title in picks])
+
+        print("{:<32}{:>12.3f} ms, {}/{} found".format('Walk, title', secs * 1000, found, LOOKUPS))
+
+        secs, found = mean_time(lambda title, folder: walk(root, title, folder), [(title, folder) for folder, title in picks])
+
+        print("{:<32}{:>12.3f} ms, {}/{} found".format('Walk, title by folder', secs * 1000, found, LOOKUPS))
+
+        secs, found = mean_time(library.find_song, [(title,) for folder, title in picks])
+
+        print("{:<32}{:>12.3f} ms, {}/{} found".format('Index, title', secs * 1000, found, LOOKUPS))
+
+        secs, found = mean_time(library.find_song, [(title, folder) for folder, title in picks])
+
+        print("{:<32}{:>12.3f} ms, {}/{} found".format('Index, title by folder', secs * 1000, found, LOOKUPS))
+
+        # Misheard titles, with one word changed a little:
+
+        misheard = [(title.replace('flea', 'flee').replace('night', 'knight').replace('rain', 'rein'),)
+                    for folder, title in picks]
+
+        secs, found = mean_time(library.find_song, misheard)
+
+        print("{:<32}{:>12.3f} ms, {}/{} found".format('Index, misheard title', secs * 1000, found, LOOKUPS))
+
+        secs, found = mean_time(library.find_playlist, [('Jams',)] * LOOKUPS)
+
+        print("{:<32}{:>12.3f} ms, {}/{} found".format('Index, playlist', secs * 1000, found, LOOKUPS))
+
+        library.close()
+
+    finally:
+
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,197 @@
+"""
+Loopback test of network audio streaming under loss and delay.
+
+We stream a sine wave from a sender thread to a NetReader over a loopback socket,
+the same way NetModule and IDHandler4 do it.
+The sender encodes a block on the real time cadence,
+drops some blocks, and delays the rest by a random amount, so they can arrive out of order.
+A player thread pulls blocks from the NetReader on the real time cadence, like the mixer does.
+
+For each codec and network condition we report the size of each block,
+the bitrate of the stream, and the counters of the jitter buffer.
+
+Run from the server directory:
+
+    python -m benchmarks.netjitter
+"""
+
+import heapq
+import math
+import random
+import socket
+import threading
+import time
+
+from benchmarks.framing import get_socket
+from chaslib.socket_lib import FRAMING_BINARY
+from chaslib.sound.input import NetReader
+from chaslib.sound.netcodec import available_codecs, encode_block, make_codec
+from chaslib.sound.utils import make_block
+
+RATE = 48000  # Sample rate, Opus supports this one
+FRAMES = 960  # Number of frames in each block, 20 milliseconds
+SECONDS = 3  # Seconds of audio to stream for each run
+
+CONDITIONS = (
+    ('clean', 0.0, 0.0),
+    ('5% loss, 20ms', 0.05, 0.02),
+    ('10% loss, 60ms', 0.10, 0.06),
+)  # Name, fraction of blocks lost, and largest random delay in seconds
+
+
+def gen_blocks(num):
+
+    """
+    Generates interleaved stereo blocks of a sine wave.
+
+    :param num: Number of blocks to generate
+    :type num: int
+    :return: List of blocks
+    :rtype: list
+    """
+
+    return [make_block([0.5 * math.sin(2 * math.pi * 440 * (i // 2 + n * FRAMES) / RATE) for i in range(FRAMES * 2)])
+            for n in range(num)]
+
+
+def sender(conn, codec, blocks, loss, delay):
+
+    # Encodes blocks on the real time cadence, and sends them after a random delay
+
+    sock = get_socket(FRAMING_BINARY)
+    codec = make_codec(codec, rate=RATE, channels=2, frames=FRAMES)
+
+    pending = []  # Heap of messages waiting to be sent, keyed by send time
+    period = FRAMES / RATE
+    start = time.perf_counter()
+
+    for num, block in enumerate(blocks):
+
+        data = encode_block(block, codec, channels=2, seq=num, position=num * FRAMES)
+
+        if random.random() >= loss:
+
+            message = sock.encode({'id': 4, 'uuid': None, 'content': data})
+
+            heapq.heappush(pending, (start + num * period + random.uniform(0, delay), num, message))
+
+        # Send everything that is due until the next block:
+
+        deadline = start + (num + 1) * period
+
+        while True:
+
+            now = time.perf_counter()
+
+            while pending and pending[0][0] <= now:
+
+                conn.sendall(heapq.heappop(pending)[2])
+
+            if now >= deadline:
+
+                break
+
+            time.sleep(min(deadline, pending[0][0] if pending else deadline) - now)
+
+    for _, _, message in sorted(pending):
+
+        conn.sendall(message)
+
+    conn.close()
+
+
+def receiver(conn, reader):
+
+    # Reads messages from the socket, and hands the blocks to the NetReader
+
+    sock = get_socket(FRAMING_BINARY)
+
+    while True:
+
+        data = conn.recv(65536)
+
+        if not data:
+
+            break
+
+        for mesg in sock.feed(data):
+
+            reader.put_block(mesg['content'])
+
+
+def player(reader, num):
+
+    # Pulls blocks on the real time cadence, like the mixer
+
+    period = FRAMES / RATE
+    start = time.perf_counter()
+
+    for block in range(num):
+
+        reader.get_block(FRAMES)
+
+        time.sleep(max(0.0, start + (block + 1) * period - time.perf_counter()))
+
+
+def run(codec, loss, delay):
+
+    """
+    Streams a few seconds of audio over loopback.
+
+    :param codec: Name of the codec to use
+    :type codec: str
+    :param loss: Fraction of blocks to drop
+    :type loss: float
+    :param delay: Largest random delay of each block in seconds
+    :type delay: float
+    :return: Size of one block, and the stats of the NetReader
+    :rtype: tuple
+    """
+
+    num = int(RATE * SECONDS / FRAMES)
+    blocks = gen_blocks(num)
+
+    reader = NetReader(rate=RATE)
+
+    send, recv = socket.socketpair()
+
+    threads = [threading.Thread(target=sender, args=(send, codec, blocks, loss, delay)),
+               threading.Thread(target=receiver, args=(recv, reader)),
+               threading.Thread(target=player, args=(reader, num))]
+
+    for thread in threads:
+
+        thread.start()
+
+    for thread in threads:
+
+        thread.join()
+
+    recv.close()
+
+    size = len(encode_block(blocks[0], make_codec(codec, rate=RATE, channels=2, frames=FRAMES), channels=2, seq=0))
+
+    return size, reader.stats()
+
+
+def main():
+
+    print("{} Hz, {} frames per block, {} seconds per run".format(RATE, FRAMES, SECONDS))
+
+    print("{:<8}{:<18}{:>8}{:>10}{:>6}{:>6}{:>8}{:>12}{:>11}".format('Codec', 'Network', 'Bytes', 'kbit/s', 'Lost',
+                                                                   'Late', 'Under', 'Jitter(ms)', 'Delay(ms)'))
+
+    for codec in available_codecs(['pcm16', 'adpcm', 'opus']):
+
+        for name, loss, delay in CONDITIONS:
+
+            size, stats = run(codec, loss, delay)
+
+            print("{:<8}{:<18}{:>8}{:>10.0f}{:>6}{:>6}{:>8}{:>12.1f}{:>11.1f}".format(
+                codec, name, size, size * 8 * RATE / FRAMES / 1000, stats['lost'], stats['late'],
+                stats['underruns'], stats['jitter'] * 1000, stats['delay'] * 1000))
+
+
+if __name__ == '__main__':
+
+    main()
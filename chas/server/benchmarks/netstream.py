@@ -0,0 +1,139 @@
+"""
+Benchmark comparing the ways NetModule can stream audio.
+
+We encode blocks of stereo frames the way NetModule sends them,
+and decode them the way NetReader receives them.
+We report the size of each block on the wire,
+as well as the throughput in frames per second and bytes per second.
+
+Run from the server directory:
+
+    python -m benchmarks.netstream
+"""
+
+import math
+import time
+
+from base64 import b64encode, b64decode
+
+from benchmarks.framing import get_socket
+from chaslib.socket_lib import FRAMING_JSON, FRAMING_BINARY
+from chaslib.sound import netcodec
+from chaslib.sound.netcodec import CODEC_PCM16, CODEC_F32, encode_block, decode_block
+
+FRAMES = 1024  # Number of frames in each block
+RATE = 44100  # Sample rate, used for generating the frames
+
+
+def gen_frames(num):
+
+    """
+    Generates a number of stereo frames of a sine wave.
+
+    :param num: Number of frames to generate
+    :type num: int
+    :return: Tuple of frames
+    :rtype: tuple
+    """
+
+    return tuple((math.sin(2 * math.pi * 440 * i / RATE), math.sin(2 * math.pi * 220 * i / RATE)) for i in range(num))
+
+
+def legacy(sock, frames):
+
+    # Frames as JSON lists of floats
+
+    message = sock.encode({'id': 4, 'uuid': None, 'content': {'id': 1, 'data': frames}})
+
+    return message, lambda mesg: [val for frame in mesg['content']['data'] for val in frame]
+
+
+def block(codec, base64):
+
+    # Frames packed into a block, optionally base64 encoded for JSON framing
+
+    def encode(sock, frames):
+
+        data = encode_block(frames, codec)
+
+        if base64:
+
+            content = {'id': 3, 'data': b64encode(data).decode('utf-8')}
+
+            return sock.encode({'id': 4, 'uuid': None, 'content': content}), \
+                lambda mesg: decode_block(b64decode(mesg['content']['data']))[1]
+
+        return sock.encode({'id': 4, 'uuid': None, 'content': data}), lambda mesg: decode_block(mesg['content'])[1]
+
+    return encode
+
+
+MODES = (
+    ('legacy', FRAMING_JSON, legacy),
+    ('pcm16', FRAMING_JSON, block(CODEC_PCM16, True)),
+    ('pcm16', FRAMING_BINARY, block(CODEC_PCM16, False)),
+    ('f32', FRAMING_BINARY, block(CODEC_F32, False)),
+)
+
+
+def bench(framing, encoder, frames, num=200):
+
+    """
+    Encodes and decodes the given frames a number of times.
+
+    :param framing: Framing mode to use
+    :type framing: str
+    :param encoder: Function that encodes the frames, and returns the message and a decoder
+    :type encoder: callable
+    :param frames: Frames to encode
+    :type frames: tuple
+    :param num: Number of blocks to encode and decode
+    :type num: int
+    :return: Size of one block, encode frames/sec, encode bytes/sec and decode frames/sec
+    :rtype: tuple
+    """
+
+    sock = get_socket(framing)
+
+    start = time.perf_counter()
+
+    encoded = [encoder(sock, frames) for _ in range(num)]
+
+    encode = time.perf_counter() - start
+
+    wire = b''.join(message for message, _ in encoded)
+
+    decoder = encoded[0][1]
+
+    start = time.perf_counter()
+
+    for mesg in sock.feed(wire):
+
+        decoder(mesg)
+
+    decode = time.perf_counter() - start
+
+    return len(wire) // num, num * len(frames) / encode, len(wire) / encode, num * len(frames) / decode
+
+
+def main():
+
+    frames = gen_frames(FRAMES)
+
+    print("NumPy: {}, {} frames per block, real time is {} frames/sec".format(
+        'yes' if netcodec.numpy is not None else 'no', FRAMES, RATE))
+
+    print("{:<8}{:<8}{:>10}{:>16}{:>16}{:>16}".format('Codec', 'Framing', 'Bytes', 'Enc(frames/s)',
+                                                    'Enc(bytes/s)', 'Dec(frames/s)'))
+
+    for name, framing, encoder in MODES:
+
+        size, enc_frames, enc_bytes, dec_frames = bench(framing, encoder, frames)
+
+        print("{:<8}{:<8}{:>10}{:>16.0f}{:>16.0f}{:>16.0f}".format(name, framing, size, enc_frames,
+                                                                 enc_bytes, dec_frames))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,170 @@
+"""
+Test of synchronized playback across several clients with skewed clocks.
+
+We stream timed blocks to a few NetReaders, each playing in a different 'room'.
+Every client has a clock with it's own offset and drift against the server clock,
+and it's output pulls blocks on that clock, like a sound card with it's own crystal.
+Clients sync their clocks with pings, like the maintenance handler does,
+with a few milliseconds of random network delay in each direction.
+
+The audio is a ramp that encodes the position of each frame,
+so we can tell which frame each client plays at any moment.
+We compare the time that frame should be heard with the true time it was played,
+and report how far each client is off once it has settled, and how far apart the rooms are.
+
+Run from the server directory:
+
+    python -m benchmarks.netsync
+"""
+
+import random
+import threading
+import time
+
+from chaslib.sound.clock import ClockSync
+from chaslib.sound.input import NetReader
+from chaslib.sound.netcodec import CODEC_F32, encode_block
+from chaslib.sound.utils import make_block
+
+RATE = 48000  # Sample rate
+FRAMES = 960  # Number of frames in each block
+LEAD = 0.2  # Seconds ahead blocks are scheduled to be heard
+SECONDS = 20  # Seconds of audio to stream
+SETTLE = 4  # Seconds we give clients to settle before measuring
+WRAP = 100000  # Frames the ramp takes to wrap around
+
+CLIENTS = (
+    ('in sync', 0.0, 0.0),
+    ('+100 ppm', 17.25, 0.0001),
+    ('-200 ppm', -3.5, -0.0002),
+    ('+400 ppm', 1234.5, 0.0004),
+)  # Name, clock offset in seconds and clock drift of each client
+
+
+def ramp(start):
+
+    # Creates a stereo block of the ramp, starting at the given frame
+
+    return make_block([(start + i // 2) % WRAP / WRAP for i in range(FRAMES * 2)])
+
+
+def sender(readers, start, num):
+
+    # Sends timed blocks to every reader on the real time cadence
+
+    period = FRAMES / RATE
+
+    for block in range(num):
+
+        position = block * FRAMES
+
+        data = encode_block(ramp(position), CODEC_F32, channels=2, seq=block, position=position,
+                            pts=start + LEAD + position / RATE)
+
+        for reader in readers:
+
+            reader.put_block(data)
+
+        time.sleep(max(0.0, start + (block + 1) * period - time.perf_counter()))
+
+
+def client(reader, clock, drift, start, num, errors):
+
+    # Pulls blocks on our own clock, syncing it every so often, and records how far off we are
+
+    local = clock.clock
+    period = FRAMES / RATE
+    begin = local()
+    next_ping = begin
+
+    for block in range(num):
+
+        if local() >= next_ping:
+
+            # Ping the server, with a random delay each way:
+
+            there = random.uniform(0.001, 0.005)
+            back = random.uniform(0.001, 0.005)
+            sent = local()
+            now = time.perf_counter()
+
+            clock.add_sample(sent, now + there, now + there, sent + (there + back) * (1 + drift))
+
+            next_ping += 0.1 if not clock.synced() else 1.0
+
+        now = time.perf_counter()
+
+        frame = reader.get_block(FRAMES)[0]
+
+        if now - start > SETTLE and 0.01 < frame < 0.99:
+
+            # Find the position of the frame we played, and when it should have been heard:
+
+            position = frame * WRAP
+            laps = round(((now - start - LEAD) * RATE - position) / WRAP)
+
+            errors.append(start + LEAD + (laps * WRAP + position) / RATE - now)
+
+        # Sleep until our clock says the next block is due:
+
+        time.sleep(max(0.0, (begin + (block + 1) * period - local()) / (1 + drift)))
+
+
+def main():
+
+    print("{} clients, {} Hz, {} frames per block, {} seconds".format(len(CLIENTS), RATE, FRAMES, SECONDS))
+
+    start = time.perf_counter()
+    num = int(SECONDS * RATE / FRAMES)
+
+    readers = []
+    clocks = []
+    errors = []
+    threads = []
+
+    for name, offset, drift in CLIENTS:
+
+        clock = ClockSync(clock=lambda offset=offset, drift=drift: offset + (time.perf_counter() - start) * (1 + drift))
+
+        reader = NetReader(rate=RATE, clock=clock)
+
+        readers.append(reader)
+        clocks.append(clock)
+        errors.append([])
+
+        threads.append(threading.Thread(target=client, args=(reader, clock, drift, start, num, errors[-1])))
+
+    threads.append(threading.Thread(target=sender, args=(readers, start, num)))
+
+    for thread in threads:
+
+        thread.start()
+
+    for thread in threads:
+
+        thread.join()
+
+    print("{:<12}{:>12}{:>12}{:>14}{:>10}{:>10}".format('Client', 'Mean(ms)', 'Max(ms)', 'Drift(ppm)',
+                                                      'Waited', 'Skipped'))
+
+    means = []
+
+    for (name, offset, drift), reader, clock, errs in zip(CLIENTS, readers, clocks, errors):
+
+        mean = sum(errs) / len(errs) if errs else 0.0
+        worst = max(abs(err) for err in errs) if errs else 0.0
+
+        means.append(mean)
+
+        stats = reader.stats()
+
+        print("{:<12}{:>12.3f}{:>12.3f}{:>14.1f}{:>10}{:>10}".format(name, mean * 1000, worst * 1000,
+                                                                   clock.skew * 1e6, stats['waited'],
+                                                                   stats['skipped']))
+
+    print("Rooms are {:.3f} ms apart".format((max(means) - min(means)) * 1000))
+
+
+if __name__ == '__main__':
+
+    main()
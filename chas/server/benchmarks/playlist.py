@@ -0,0 +1,199 @@
+"""
+Benchmark of the transitions between songs in a playlist.
+
+We create a playlist of short songs, with a mix of rates and channels,
+and play it two ways, pulling blocks faster than real time:
+
+    - Bind - Each song is opened when the last one ends, like MusicPlayer used to
+    - Engine - The PlaylistReader, which opens and buffers the next song while the current one plays
+
+For binding, the transition latency is the time from the end of one song,
+to the first block of the next one.
+Nothing can play during this time, so it is a gap in the audio.
+
+For the engine, we report the number of gapless transitions,
+the frames of silence played waiting for songs,
+and the time 'get_block()' takes on blocks holding a transition, compared to other blocks.
+
+Run from the server directory:
+
+    python -m benchmarks.playlist
+"""
+
+import math
+import os
+import shutil
+import struct
+import tempfile
+import time
+import wave
+
+from chaslib.sound.cache import open_sound
+from chaslib.sound.playlist import PlaylistReader
+from chaslib.sound.resample import convert_chain
+
+RATE = 44100  # Rate of the output
+FRAMES = 1024  # Frames in each block
+SONGS = 12  # Number of songs in the playlist
+SECONDS = 1.0  # Length of each song
+SPEED = 4  # How many times faster than real time we pull blocks
+FORMATS = ((44100, 2), (22050, 1), (48000, 2), (44100, 1))  # Rates and channels of the songs
+
+
+def make_songs(root):
+
+    # Creates the songs, and returns their paths
+
+    paths = []
+
+    for num in range(SONGS):
+
+        rate, channels = FORMATS[num % len(FORMATS)]
+        path = os.path.join(root, 'song_{}.wav'.format(num))
+        frames = int(rate * SECONDS)
+
+        with wave.open(path, 'wb') as file:
+
+            file.setnchannels(channels)
+            file.setsampwidth(2)
+            file.setframerate(rate)
+
+            tone = struct.pack('<{}h'.format(frames), *(int(8000 * math.sin(index * 0.05)) for index in range(frames)))
+
+            file.writeframes(tone if channels == 1 else b''.join(tone[i:i + 2] * 2 for i in range(0, len(tone), 2)))
+
+        paths.append(path)
+
+    return paths
+
+
+def pace(start, blocks):
+
+    # Sleeps until the given number of blocks should have been pulled
+
+    wait = start + blocks * FRAMES / RATE / SPEED - time.perf_counter()
+
+    if wait > 0:
+
+        time.sleep(wait)
+
+
+def bind(paths):
+
+    # Opens each song when the last one ends, returns the transition latencies
+
+    latencies = []
+
+    for path in paths:
+
+        start = time.perf_counter()
+
+        synth = open_sound(path)
+        synth._info.rate = RATE
+
+        iter(synth)
+
+        chain = convert_chain(synth, RATE, stereo=True)
+        block = chain.get_block(FRAMES)
+
+        latencies.append(time.perf_counter() - start)
+
+        begin = time.perf_counter()
+        pulled = 0
+
+        while block is not None:
+
+            pulled += 1
+
+            pace(begin, pulled)
+
+            block = chain.get_block(FRAMES)
+
+        chain.stop_module()
+
+    # The first song is not a transition:
+
+    return latencies[1:]
+
+
+def engine(paths, fade=0.0):
+
+    # Plays the songs through the PlaylistReader, returns the block times, split by transitions
+
+    queue = list(enumerate(paths))
+    changes = []
+
+    reader = PlaylistReader(lambda: queue.pop(0) if queue else None, changes.append,
+                            prefetch=0.5, fade=fade)
+    reader._info.rate = RATE
+
+    iter(reader)
+
+    normal = []
+    transition = []
+    begin = time.perf_counter()
+    pulled = 0
+
+    while True:
+
+        seen = len(changes)
+        start = time.perf_counter()
+
+        block = reader.get_block(FRAMES)
+
+        took = time.perf_counter() - start
+
+        if block is None:
+
+            break
+
+        (transition if len(changes) != seen else normal).append(took)
+
+        pulled += 1
+
+        pace(begin, pulled)
+
+    reader.stop_module()
+
+    return normal, transition, reader.stats()
+
+
+def main():
+
+    root = tempfile.mkdtemp()
+
+    try:
+
+        paths = make_songs(root)
+
+        print("{} songs of {:.1f} seconds, pulled at {}x real time".format(SONGS, SECONDS, SPEED))
+
+        latencies = bind(paths)
+
+        print("{:<36}{:>10.3f} ms mean, {:.3f} ms max, {} frames of silence".format(
+            'Bind, transition', sum(latencies) / len(latencies) * 1000, max(latencies) * 1000,
+            int(sum(latencies) * RATE)))
+
+        for fade in (0.0, 0.1):
+
+            normal, transition, stats = engine(paths, fade=fade)
+            name = 'Engine' if not fade else 'Engine, {:.1f}s crossfade'.format(fade)
+
+            print("{:<36}{:>10.3f} ms mean, {:.3f} ms max, {}/{} gapless, {} frames of silence".format(
+                name + ', transition', sum(transition) / len(transition) * 1000, max(transition) * 1000,
+                stats['gapless'], stats['transitions'], stats['gap_frames']))
+
+            print("{:<36}{:>10.3f} ms mean, {:.3f} ms max".format(
+                name + ', other blocks', sum(normal) / len(normal) * 1000, max(normal) * 1000))
+
+            print("{:<36}{:>10.3f} ms mean, {:.3f} ms max, ready {:.1f} ms ahead at worst".format(
+                name + ', open', stats['open_mean'] * 1000, stats['open_max'] * 1000, stats['ahead_min'] * 1000))
+
+    finally:
+
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+
+    main()
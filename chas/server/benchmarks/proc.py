@@ -0,0 +1,101 @@
+"""
+Benchmark comparing synth chains rendered in the mixer with chains rendered in worker processes.
+
+We bind a few per-sample sine wave chains to an OutputHandler,
+and generate audio through the handler like a special output module would.
+Process chains are read with a long timeout, so we measure how fast the workers render,
+and not how often they are late.
+
+We report the real time factor of each setup, like 'synth.py',
+as well as the CPU time the mixer thread spends on each block.
+The mixer time is what the rest of CHAS competes with,
+so process chains should keep it low no matter how heavy the chains are.
+
+Run from the server directory:
+
+    python -m benchmarks.proc
+"""
+
+import time
+
+from benchmarks.synth import RATE, FRAMES, Sine
+from chaslib.sound.base import OutputHandler
+
+CHAINS = 4  # Number of chains to bind
+SECONDS = 5  # Seconds of audio to generate
+
+
+def bench(num, seconds, process):
+
+    """
+    Generates audio from a number of chains.
+
+    :param num: Number of chains to bind
+    :type num: int
+    :param seconds: Seconds of audio to generate
+    :type seconds: float
+    :param process: Value determining if the chains are rendered in worker processes
+    :type process: bool
+    :return: Real time factor, and mixer CPU time per block in milliseconds
+    :rtype: tuple
+    """
+
+    handler = OutputHandler(rate=RATE)
+
+    controls = []
+
+    for _ in range(num):
+
+        if process:
+
+            control = handler.bind_synth(Sine(), process=True, frames=FRAMES, timeout=10)
+
+        else:
+
+            control = handler.bind_synth(Sine())
+
+        # OutputControl references the first handler ever bound, point it at ours:
+
+        control.OUT[0] = handler
+
+        control.start()
+
+        controls.append(control)
+
+    handler.run = True
+
+    blocks = int(RATE * seconds / FRAMES)
+
+    start = time.perf_counter()
+    cpu = time.thread_time()
+
+    for _ in range(blocks):
+
+        handler.gen_block(FRAMES)
+
+    cpu = time.thread_time() - cpu
+    wall = time.perf_counter() - start
+
+    for control in controls:
+
+        control.stop()
+
+    return blocks * FRAMES / RATE / wall, cpu / blocks * 1000
+
+
+def main():
+
+    print("{} chains, {} Hz, {} frames per block".format(CHAINS, RATE, FRAMES))
+
+    print("{:<24}{:>12}{:>20}".format('Rendered in', 'Real time', 'Mixer ms/block'))
+
+    for name, process in (('Mixer', False), ('Worker processes', True)):
+
+        factor, cpu = bench(CHAINS, SECONDS, process)
+
+        print("{:<24}{:>11.2f}x{:>20.3f}".format(name, factor, cpu))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of the resampler used to play files recorded at other rates.
+
+We convert a few seconds of stereo audio between common rate pairs a block at a time,
+like the ResampleModule does while a file plays.
+We report the real time factor of each pair,
+which is the number of seconds of audio converted per second of wall time.
+
+Run from the server directory:
+
+    python -m benchmarks.resample
+"""
+
+import math
+import time
+
+from chaslib.sound.resample import Resampler
+from chaslib.sound.utils import make_block, numpy
+
+FRAMES = 1024  # Number of frames in each block
+SECONDS = 5  # Seconds of audio to convert
+PAIRS = ((22050, 44100), (48000, 44100), (44100, 48000), (96000, 44100))  # Rate pairs to convert
+
+
+def bench(src, dst, seconds):
+
+    # Convert stereo blocks of a sine wave
+
+    block = make_block([math.sin(2 * math.pi * 440 * (i // 2) / src) for i in range(FRAMES * 2)])
+
+    resampler = Resampler(src, dst, channels=2)
+
+    blocks = int(src * seconds / FRAMES)
+
+    start = time.perf_counter()
+
+    for _ in range(blocks):
+
+        resampler.process(block)
+
+    return blocks * FRAMES / src / (time.perf_counter() - start)
+
+
+def main():
+
+    print("NumPy: {}, {} frames per block".format('yes' if numpy is not None else 'no', FRAMES))
+
+    print("{:<24}{:>12}".format('Rates', 'Real time'))
+
+    for src, dst in PAIRS:
+
+        print("{:<24}{:>11.2f}x".format('{} -> {}'.format(src, dst), bench(src, dst, SECONDS)))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark finding how many synth chains the audio scheduler can keep up with.
+
+We bind more and more sine wave chains to an OutputHandler rendered by an AudioScheduler,
+and let it run in real time for a few seconds with each number of chains.
+A NullModule reads the audio, like a speaker would.
+
+We report the load, which is the mean time spent rendering a block over the block period,
+the slowest block, and the number of underruns and lost blocks.
+Once underruns show up, the machine can't handle that many chains.
+
+Run from the server directory:
+
+    python -m benchmarks.sched [per-sample]
+
+By default the chains compute whole blocks,
+pass 'per-sample' to use chains that are sampled one value at a time.
+"""
+
+import sys
+import time
+
+from benchmarks.synth import RATE, FRAMES, Sine, BlockSine
+from chaslib.sound.base import OutputHandler
+from chaslib.sound.out import NullModule
+
+SECONDS = 2  # Seconds to run each number of chains for
+CHAINS = (1, 2, 4, 8, 16, 32, 64)  # Numbers of chains to try
+
+
+def bench_chains(synth, num, seconds):
+
+    """
+    Runs the scheduler in real time with a number of chains bound.
+
+    :param synth: Synth class to bind
+    :type synth: type
+    :param num: Number of chains to bind
+    :type num: int
+    :param seconds: Seconds to run for
+    :type seconds: float
+    :return: Scheduler stats
+    :rtype: dict
+    """
+
+    handler = OutputHandler(rate=RATE)
+
+    handler.add_output(NullModule())
+
+    sched = handler.schedule(frames=FRAMES)
+
+    for _ in range(num):
+
+        control = handler.bind_synth(synth())
+
+        # OutputControl references the first handler ever bound, point it at ours:
+
+        control.OUT[0] = handler
+
+        control.start()
+
+    handler.start()
+
+    time.sleep(seconds)
+
+    handler.stop()
+
+    return sched.stats()
+
+
+def main():
+
+    synth = Sine if 'per-sample' in sys.argv[1:] else BlockSine
+
+    print("{}, {} Hz, {} frames per block, {:.2f} ms per block".format(
+        synth.__name__, RATE, FRAMES, FRAMES / RATE * 1000))
+
+    print("{:>8}{:>10}{:>12}{:>12}{:>8}".format('Chains', 'Load', 'Max(ms)', 'Underruns', 'Lost'))
+
+    for num in CHAINS:
+
+        stats = bench_chains(synth, num, SECONDS)
+
+        print("{:>8}{:>9.1f}%{:>12.3f}{:>12}{:>8}".format(
+            num, stats['load'] * 100, stats['max'] * 1000, stats['underruns'], stats['lost']))
+
+        if stats['load'] > 1:
+
+            # No point in going any further:
+
+            break
+
+
+if __name__ == '__main__':
+
+    main()
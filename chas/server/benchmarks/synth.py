@@ -0,0 +1,160 @@
+"""
+Benchmark comparing the per-sample and block paths of the audio engine.
+
+We bind a sine wave synth to an OutputHandler with a few output modules,
+and generate audio through the handler like a special output module would.
+Each output module then reads the audio back after each block.
+
+We report the real time factor of each path,
+which is the number of seconds of audio generated per second of wall time.
+Anything below 1 can't keep up with playback.
+
+We run the block path twice, once with a per-sample module,
+which is wrapped automatically, and once with a module that computes whole blocks.
+
+Run from the server directory:
+
+    python -m benchmarks.synth
+"""
+
+import math
+import time
+
+from chaslib.sound.base import OutputHandler
+from chaslib.sound.out import NullModule
+from chaslib.sound.utils import BaseModule, make_block, numpy
+
+RATE = 44100  # Sample rate to generate audio at
+FRAMES = 1024  # Number of frames in each block
+OUTPUTS = 3  # Number of output modules to feed
+
+
+class Sine(BaseModule):
+
+    """
+    Sine wave that is computed one sample at a time.
+    """
+
+    def __init__(self, freq=440.0):
+
+        super().__init__()
+
+        self.freq = freq
+
+    def get_next(self):
+
+        return math.sin(2 * math.pi * self.freq * self.index / RATE)
+
+
+class BlockSine(Sine):
+
+    """
+    Sine wave that is computed a whole block at a time.
+    """
+
+    def get_block(self, frames):
+
+        if numpy is not None:
+
+            block = numpy.sin(2 * math.pi * self.freq * numpy.arange(self.index, self.index + frames) / RATE)
+
+        else:
+
+            block = [math.sin(2 * math.pi * self.freq * i / RATE) for i in range(self.index, self.index + frames)]
+
+        self.index += frames
+
+        return make_block(block)
+
+
+def get_handler(synth):
+
+    """
+    Creates an OutputHandler with the given synth bound and started.
+
+    :param synth: Synth to bind
+    :type synth: BaseModule
+    :return: OutputHandler and it's output modules
+    :rtype: tuple
+    """
+
+    handler = OutputHandler(rate=RATE)
+
+    outputs = [NullModule() for _ in range(OUTPUTS)]
+
+    for out in outputs:
+
+        handler.add_output(out)
+
+    control = handler.bind_synth(synth)
+
+    # OutputControl references the first handler ever bound, point it at ours:
+
+    control.OUT[0] = handler
+
+    handler.run = True
+
+    control.start()
+
+    return handler, outputs
+
+
+def bench_samples(seconds):
+
+    # Generate and read back one sample at a time
+
+    handler, outputs = get_handler(Sine())
+
+    blocks = int(RATE * seconds / FRAMES)
+
+    start = time.perf_counter()
+
+    for _ in range(blocks):
+
+        for _ in range(FRAMES):
+
+            handler.gen_value()
+
+        for out in outputs:
+
+            out.get_samples(FRAMES, raw=True)
+
+    return blocks * FRAMES / RATE / (time.perf_counter() - start)
+
+
+def bench_blocks(synth, seconds):
+
+    # Generate and read back one block at a time
+
+    handler, outputs = get_handler(synth)
+
+    blocks = int(RATE * seconds / FRAMES)
+
+    start = time.perf_counter()
+
+    for _ in range(blocks):
+
+        handler.gen_block(FRAMES)
+
+        for out in outputs:
+
+            out.get_block(FRAMES, raw=True)
+
+    return blocks * FRAMES / RATE / (time.perf_counter() - start)
+
+
+def main():
+
+    print("NumPy: {}, {} Hz, {} frames per block, {} outputs".format(
+        'yes' if numpy is not None else 'no', RATE, FRAMES, OUTPUTS))
+
+    print("{:<32}{:>12}".format('Path', 'Real time'))
+
+    print("{:<32}{:>11.2f}x".format('Per-sample', bench_samples(1)))
+    print("{:<32}{:>11.2f}x".format('Block(wrapped module)', bench_blocks(Sine(), 2)))
+    print("{:<32}{:>11.2f}x".format('Block(block module)', bench_blocks(BlockSine(), 10)))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -1,11 +1,173 @@
 # A class for handling devices
 
 import uuid
-import queue
+import asyncio
+import threading
+
+from concurrent.futures import Future, TimeoutError
 
 # TODO: Add ping, test for socketserver discrepancies, ...
 
 
+class PendingRequests:
+
+    """
+    Table of requests that are waiting for a response.
+
+    Each request is identified by it's content UUID,
+    and is represented by a future that is resolved when the response arrives.
+    Any number of requests can be in flight at once.
+
+    Cancelled or timed out requests are removed from the table,
+    and responses to them are ignored.
+    """
+
+    def __init__(self):
+
+        self._pending = {}  # Futures keyed by content UUID
+        self._lock = threading.Lock()  # Lock protecting the table
+
+    def create(self):
+
+        """
+        Creates a new pending request.
+
+        :return: Content UUID and future of the request
+        :rtype: tuple
+        """
+
+        content_uuid = str(uuid.uuid4())
+
+        future = Future()
+
+        with self._lock:
+
+            self._pending[content_uuid] = future
+
+        # Remove the request from the table once it is done, for whatever reason:
+
+        future.add_done_callback(lambda fut: self._discard(content_uuid))
+
+        return content_uuid, future
+
+    def _discard(self, content_uuid):
+
+        """
+        Removes a request from the table.
+
+        :param content_uuid: Content UUID of the request
+        :type content_uuid: str
+        """
+
+        with self._lock:
+
+            self._pending.pop(content_uuid, None)
+
+    def resolve(self, data):
+
+        """
+        Resolves the request the given response belongs to.
+
+        :param data: Special request response, must contain 'content-uuid' and 'content'
+        :type data: dict
+        :return: True if a request was resolved, False if nobody was waiting for this response
+        :rtype: bool
+        """
+
+        with self._lock:
+
+            future = self._pending.pop(data['content-uuid'], None)
+
+        if future is None or not future.set_running_or_notify_cancel():
+
+            # Unknown, timed out or cancelled request:
+
+            return False
+
+        future.set_result(data['content'])
+
+        return True
+
+    def cancel(self, content_uuid):
+
+        """
+        Cancels a pending request.
+
+        :param content_uuid: Content UUID of the request
+        :type content_uuid: str
+        :return: True if the request was cancelled
+        :rtype: bool
+        """
+
+        with self._lock:
+
+            future = self._pending.get(content_uuid)
+
+        return future is not None and future.cancel()
+
+    def cancel_all(self):
+
+        """
+        Cancels all pending requests.
+        """
+
+        with self._lock:
+
+            futures = list(self._pending.values())
+
+        for future in futures:
+
+            future.cancel()
+
+    def __len__(self):
+
+        return len(self._pending)
+
+
+def _wait(future, timeout):
+
+    """
+    Waits for a pending request to be resolved.
+
+    The request is cancelled if we time out.
+
+    :param future: Future of the request
+    :type future: concurrent.futures.Future
+    :param timeout: Time in seconds to wait, None waits forever
+    :type timeout: float
+    :return: Content of the response
+    :raises concurrent.futures.TimeoutError: If no response arrived in time
+    :raises concurrent.futures.CancelledError: If the request was cancelled
+    """
+
+    try:
+
+        return future.result(timeout=timeout)
+
+    except TimeoutError:
+
+        future.cancel()
+
+        raise
+
+
+async def _wait_async(future, timeout):
+
+    """
+    Awaits a pending request.
+
+    Cancelling the awaiting task, or timing out, also cancels the request.
+
+    :param future: Future of the request
+    :type future: concurrent.futures.Future
+    :param timeout: Time in seconds to wait, None waits forever
+    :type timeout: float
+    :return: Content of the response
+    """
+
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+
 class Device:
 
     def __init__(self, chas, name, ip, port, sck):
@@ -17,7 +179,8 @@ class Device:
         self.uuid = None  # Unique device ID
         self.sock = sck  # CHAS Socket
         self.auth = False  # Value determining if this device is authenticated
-        self.queue = []  # Queue for special handling
+        self.pending = PendingRequests()  # Special requests waiting for a response
+        self.audio_codec = None  # Audio codec agreed on, None if the device did not offer any
 
     def send(self, content, id_num, encoding='utf-8'):
 
@@ -31,11 +194,23 @@ class Device:
 
         #self.sock.write(data)
 
-    def get(self, content, id_num, encoding='utf-8'):
+    def request(self, content, id_num):
 
-        # Function for getting raw data from CHAS server, bypassing server-side handlers
+        """
+        Sends a special request to the remote device, bypassing server-side handlers.
 
-        content_uuid = str(uuid.uuid4())
+        We don't wait for the response,
+        instead we return a future that is resolved once the response arrives.
+        The request can be cancelled by cancelling the future.
+
+        :param content: Content to send
+        :param id_num: ID of the handler to send the content to
+        :type id_num: int
+        :return: Future of the request
+        :rtype: concurrent.futures.Future
+        """
+
+        content_uuid, future = self.pending.create()
 
         inner_data = {'content-uuid': content_uuid,
                       'content-status': 0,
@@ -43,29 +218,28 @@ class Device:
                       'content-type': 0,
                       'content': content}
 
-        data = {'id': 3,
-                'uuid': self.uuid,
-                'content': inner_data}
-
-        self.chas.net.write(data)
+        self.send(inner_data, 3)
 
-        while True:
+        return future
 
-            for i in self.queue:
+    def get(self, content, id_num, encoding='utf-8', timeout=None):
 
-                if i['content-uuid'] == content_uuid:
+        # Function for getting raw data from CHAS server, bypassing server-side handlers
+        # Raises TimeoutError if no response arrives within 'timeout' seconds
 
-                    # Found our request:
+        return _wait(self.request(content, id_num), timeout)
 
-                    message = i['content']
+    async def get_async(self, content, id_num, timeout=None):
 
-                    self.queue.remove(i)
+        # Awaitable version of 'get()', for use in coroutines
 
-                    return message
+        return await _wait_async(self.request(content, id_num), timeout)
 
     def add_queue(self, data):
 
-        self.queue.append(data)
+        # Resolves the pending request this response belongs to
+
+        self.pending.resolve(data)
 
 
 class Server:
@@ -78,7 +252,7 @@ class Server:
         self.sock = sck  # Websocket
         self.uuid = uu_id  # UUID of this node
         self.auth = False  # Value determine if we are authenticated
-        self.queue = []  # Message queue
+        self.pending = PendingRequests()  # Special requests waiting for a response
 
     def send(self, content, id_num, encoding='utf-8'):
 
@@ -92,15 +266,28 @@ class Server:
 
     def add_queue(self, data):
 
-        self.queue.append(data)
+        # Resolves the pending request this response belongs to
+
+        self.pending.resolve(data)
 
         return
 
-    def get(self, content, id_num, encoding='utf-8'):
+    def request(self, content, id_num):
 
-        # Function for getting data from CHAS server
+        """
+        Sends a special request to the CHAS server.
 
-        content_uuid = str(uuid.uuid4())
+        We return a future that is resolved with the response content,
+        which is a list of everything the handler sent back.
+
+        :param content: Content to send
+        :param id_num: ID of the handler to send the content to
+        :type id_num: int
+        :return: Future of the request
+        :rtype: concurrent.futures.Future
+        """
+
+        content_uuid, future = self.pending.create()
 
         inner_data = {'content-uuid': content_uuid,
                       'content-id': id_num,
@@ -108,25 +295,22 @@ class Server:
                       'content-type': 0,
                       'content': content}
 
-        data = {'id': 3,
-                'uuid': self.uuid,
-                'content': inner_data}
-
-        self.sock.write(data)
+        self.send(inner_data, 3)
 
-        while True:
+        return future
 
-            for i in self.queue:
+    def get(self, content, id_num, encoding='utf-8', timeout=None):
 
-                if i['content-uuid'] == content_uuid:
+        # Function for getting data from CHAS server
+        # Raises TimeoutError if no response arrives within 'timeout' seconds
 
-                    # Found our request:
+        return _wait(self.request(content, id_num), timeout)[0]
 
-                    message = i['content']
+    async def get_async(self, content, id_num, timeout=None):
 
-                    self.queue.remove(i)
+        # Awaitable version of 'get()', for use in coroutines
 
-                    return message[0]
+        return (await _wait_async(self.request(content, id_num), timeout))[0]
 
 
 class Devices:
@@ -134,22 +318,41 @@ class Devices:
     """
     Class that maintains a list of devices connected to the server
     Allows for many CHAS operations on said devices
+
+    Devices are indexed by UUID, name and socket file descriptor,
+    so lookups are constant time no matter how many devices are connected.
+    All changes are done under a lock, so registration and unregistration are atomic.
+
+    Iterating over us iterates over a snapshot of the devices,
+    so devices can connect and disconnect while someone is iterating.
     """
 
     def __init__(self, chas):
 
         self.chas = chas  # CHAS Mastercalss instance
-        self.__devs = []  # List of all device objects, None will always be the first value
+        self.__devs = {}  # All device objects, in order of registration. Used as an ordered set
+        self.__by_uuid = {}  # Devices keyed by UUID
+        self.__by_name = {}  # Devices keyed by name, each name maps to an ordered set of devices
+        self.__by_fd = {}  # Devices keyed by socket file descriptor
+        self.__snapshot = ()  # Tuple of all devices, rebuilt on each change
+        self.__lock = threading.RLock()  # Lock protecting the indexes
 
     def register(self, dev, auth=True):
 
         # Register a device object with the list
         # 'Auth' specifies if we want to authenticate the device
-        if auth:
 
-            self.__authenticate(dev)
+        with self.__lock:
 
-        self.__devs.append(dev)
+            if auth:
+
+                self.__authenticate(dev)
+
+            self.__devs[dev] = None
+
+            self.__index(dev)
+
+            self.__snapshot = tuple(self.__devs)
 
     def create(self, name, ip, port, sock):
 
@@ -157,12 +360,64 @@ class Devices:
 
         dev = Device(self.chas, name, ip, port, sock)
 
-        self.__authenticate(dev)
-
-        self.__devs.append(dev)
+        self.register(dev)
 
         return
 
+    def __index(self, dev):
+
+        # Add a device to the UUID, name and file descriptor indexes
+
+        if dev.uuid is not None:
+
+            self.__by_uuid[dev.uuid] = dev
+
+        self.__by_name.setdefault(dev.name, {})[dev] = None
+
+        fd = self.__get_fd(dev)
+
+        if fd >= 0:
+
+            self.__by_fd[fd] = dev
+
+        dev._fd = fd
+
+    def __unindex(self, dev):
+
+        # Remove a device from the UUID, name and file descriptor indexes
+
+        if dev.uuid is not None and self.__by_uuid.get(dev.uuid) is dev:
+
+            del self.__by_uuid[dev.uuid]
+
+        named = self.__by_name.get(dev.name)
+
+        if named is not None:
+
+            named.pop(dev, None)
+
+            if not named:
+
+                del self.__by_name[dev.name]
+
+        fd = getattr(dev, '_fd', -1)
+
+        if fd >= 0 and self.__by_fd.get(fd) is dev:
+
+            del self.__by_fd[fd]
+
+    def __get_fd(self, dev):
+
+        # Get the file descriptor of the device socket, -1 if it has none
+
+        try:
+
+            return dev.sock.fileno()
+
+        except Exception:
+
+            return -1
+
     def __authenticate(self, dev):
 
         # Authenticate a given device
@@ -192,49 +447,100 @@ class Devices:
 
         # Get device instance by UUID
 
-        dev_ind = next((dev for dev, dev in enumerate(self.__devs) if dev.uuid == uid), None)
+        return self.__by_uuid.get(uid)
+
+    def get_by_name(self, name):
+
+        # Get device instance by name, UUID method is preferred.
+        # Names are not unique, so we return the first device registered with this name.
+
+        named = self.__by_name.get(name)
 
-        if dev_ind is None:
+        if not named:
 
             return None
 
-        return dev_ind
+        try:
 
-    def get_by_name(self, name):
+            return next(iter(named))
 
-        # Get device instance by name, UUID method is preferred.
+        except (StopIteration, RuntimeError):
 
-        dev_ind = next((dev for dev, dev in enumerate(self.__devs) if dev.name == name), None)
+            # Changed while we were looking, lets look again under the lock:
 
-        if dev_ind is None:
+            with self.__lock:
 
-            return None
+                named = self.__by_name.get(name)
+
+                return next(iter(named)) if named else None
+
+    def get_by_fd(self, fd):
+
+        # Get device instance by the file descriptor of it's socket
+
+        return self.__by_fd.get(fd)
+
+    def rename(self, dev, name):
+
+        # Change the name of a device, keeping the name index up to date
+
+        with self.__lock:
 
-        return self.__devs[dev_ind]
+            if dev in self.__devs:
+
+                self.__unindex(dev)
+
+                dev.name = name
+
+                self.__index(dev)
+
+                return
+
+            dev.name = name
 
     def unregister_by_uuid(self, uid):
 
         # Unregister device by UUID
 
-        dev = self.get_by_uuid(uid)
+        with self.__lock:
+
+            dev = self.get_by_uuid(uid)
 
-        self.__unregister(dev)
+            return self.__unregister(dev)
 
     def unregister_by_name(self, name):
 
         # Unregister device by name
 
-        dev = self.get_by_name(name)
+        with self.__lock:
 
-        self.__unregister(dev)
+            dev = self.get_by_name(name)
+
+            return self.__unregister(dev)
 
     def __unregister(self, dev):
 
         # Unregister device by device instance, backend for unregistering devices
 
+        if dev is None or dev not in self.__devs:
+
+            # Not registered, nothing to do:
+
+            return False
+
+        self.__unindex(dev)
+
+        del self.__devs[dev]
+
+        self.__snapshot = tuple(self.__devs)
+
         self.__deauthenticate(dev)
 
-        self.__devs.remove(dev)
+        # Nobody is going to answer requests to this device anymore:
+
+        dev.pending.cancel_all()
+
+        return True
 
     def get_device_info(self):
 
@@ -242,7 +548,7 @@ class Devices:
 
         info = []
 
-        for dev in self.__devs:
+        for dev in self:
 
             # Getting device info here:
 
@@ -259,7 +565,18 @@ class Devices:
         :return:
         """
 
-        return len(self.__devs)
+        return len(self.__snapshot)
+
+    def __iter__(self):
+
+        """
+        Iterates over a snapshot of the registered devices.
+
+        Devices registered or unregistered while iterating will not affect the iteration.
+        :return: Iterator over the devices
+        """
+
+        return iter(self.__snapshot)
 
     def __getitem__(self, position):
 
@@ -269,4 +586,4 @@ class Devices:
         :return: Device instance
         """
 
-        return self.__devs[position]
\ No newline at end of file
+        return self.__snapshot[position]
@@ -3,8 +3,14 @@
 from chaslib.device import Devices
 from chaslib.sound.base import OutputHandler
 from chaslib.sound.out import NetModule
-from chaslib.resptools import keyword_find, key_sta_find, string_clean
-from chaslib.misctools import get_logger
+from chaslib.resptools import string_clean, ParsedUtterance
+from chaslib.keyindex import KeywordIndex
+from chaslib.intents import Intent, IntentGrammar
+from chaslib.sound.sched import Histogram
+from chaslib.sound.utils import get_time
+from chaslib.misctools import CHASThreadPoolExecutor, get_logger
+
+from concurrent.futures import TimeoutError
 
 import os
 import pkgutil
@@ -26,6 +32,9 @@ class BaseExtension(object):
         self.enabled = False  # Value determining if extension is enabled
         self.uuid = ''  # UUID of the extension
         self.help = []  # Dictionary storing help information
+        self.keywords = []  # Keywords and phrases we respond to, empty means we see every input
+        self.intents = []  # Intents we handle, tried before 'match()'
+        self.budget = None  # Seconds we have to check input, None uses the default in the settings
 
     def _bind_chas(self, chas):
 
@@ -51,6 +60,27 @@ class BaseExtension(object):
 
         return False
 
+    def check(self, mesg, talk):
+
+        """
+        Determines if 'match()' would handle the given input, without handling it.
+
+        Extensions can override this to have their checks run concurrently with other extensions.
+        It MUST NOT have side effects, like playing audio or running commands,
+        as it may be called for input we end up not handling,
+        and may still be running when the next input arrives.
+        If we return True, and we are the highest priority extension to do so, then 'match()' is called.
+        If we return False, or take longer than our budget, then 'match()' is skipped.
+
+        By default we return None, which means we can't tell without calling 'match()'.
+
+        :param mesg: Message to be checked
+        :param talk: Boolean determining if we are talking
+        :return: True if we would handle the input, False if not, None if unknown
+        """
+
+        return None
+
     def enable(self):
 
         """
@@ -104,6 +134,151 @@ class BaseExtension(object):
 
         pass
 
+    def add_keywords(self, *phrases):
+
+        """
+        Declares keywords and phrases this extension responds to.
+
+        Once an extension declares any keywords,
+        'match()' is only called for input that contains at least one of them as whole words.
+        Extensions that declare nothing have 'match()' called for every input.
+
+        Keywords should be declared in '__init__()' or 'load()',
+        as the dispatch index is built when extensions are parsed.
+
+        :param phrases: Keywords or phrases to declare, like 'play' or 'next song'
+        :type phrases: str
+        """
+
+        for phrase in phrases:
+
+            if phrase not in self.keywords:
+
+                self.keywords.append(phrase)
+
+    def add_intent(self, name, patterns, handler):
+
+        """
+        Registers an intent this extension handles.
+
+        Patterns are described in 'chaslib/intents.py',
+        for example '(extension|plugin) disable {name}'.
+        When one of the patterns matches the input, the handler is called like so:
+
+            handler(mesg, talk, win, **slots)
+
+        Where 'slots' are the text captured by the pattern.
+        The handler should return True if it handled the input.
+        If no intent handles the input, then 'match()' is called as usual.
+
+        The first word of each pattern is also declared as a keyword,
+        see 'add_keywords()'.
+
+        :param name: Name of the intent
+        :type name: str
+        :param patterns: Pattern or list of patterns that match the intent
+        :type patterns: str, list
+        :param handler: Function to call when the intent is matched
+        :type handler: callable
+        :return: Intent that was registered
+        :rtype: Intent
+        """
+
+        intent = Intent(name, patterns, handler=handler, owner=self)
+
+        self.intents.append(intent)
+
+        self.add_keywords(*intent.anchors)
+
+        return intent
+
+
+class ExtensionStats:
+
+    """
+    Counters for a single extension.
+
+    We keep histograms of the time the extension takes to check and handle input,
+    with buckets that are fractions of it's budget.
+    A check that takes longer than the budget counts an overrun,
+    and an extension that overruns too many times in a row is demoted.
+    Handling input does the work the user asked for, which can take as long as it needs,
+    so those times are only recorded.
+
+    :param name: Name of the extension
+    :type name: str
+    :param budget: Seconds the extension has to check input
+    :type budget: float
+    """
+
+    def __init__(self, name, budget):
+
+        self.name = name  # Name of the extension
+        self.budget = budget  # Seconds the extension has to check input
+        self.checks = Histogram(budget)  # Times taken by 'check()'
+        self.matches = Histogram(budget)  # Times taken by intents and 'match()'
+        self.overruns = 0  # Number of times the extension went over budget
+        self.strikes = 0  # Number of overruns in a row
+        self.demoted = False  # Value determining if the extension is tried after all others
+
+    def add_check(self, secs):
+
+        """
+        Records the time it took to check input.
+
+        :param secs: Time in seconds
+        :type secs: float
+        :return: True if we were within budget, False if not
+        :rtype: bool
+        """
+
+        self.checks.add(secs)
+
+        if secs > self.budget:
+
+            self.overrun()
+
+            return False
+
+        self.strikes = 0
+
+        return True
+
+    def add_match(self, secs):
+
+        """
+        Records the time it took to handle input.
+
+        :param secs: Time in seconds
+        :type secs: float
+        """
+
+        self.matches.add(secs)
+
+    def overrun(self):
+
+        """
+        Records an overrun.
+        """
+
+        self.overruns += 1
+        self.strikes += 1
+
+    def stats(self):
+
+        """
+        Returns the counters of this extension.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {'budget': self.budget,
+                'check': self.checks.stats(),
+                'match': self.matches.stats(),
+                'overruns': self.overruns,
+                'demoted': self.demoted}
+
 
 class Extensions:
 
@@ -120,6 +295,11 @@ class Extensions:
         self._disabled_extensions = []  # List of disabled extensions
         self._core = CoreTools()  # Builtin CHAS functions
         self._name = 'BaseExtension'  # Name of extension parent class
+        self._index = KeywordIndex()  # Index of extension keywords
+        self._intents = IntentGrammar()  # Grammar of extension intents
+        self._stats = {}  # Counters of each extension
+        self._checks = {}  # Latest check of each extension, run concurrently
+        self._pool = None  # Thread pool running extension checks
         self.log = get_logger("CHAS:EXTEN")
 
         self._core.chas = self.chas  # Binding the CHAS masterclass to the Core Tools extension
@@ -273,6 +453,8 @@ class Extensions:
 
         self._enabled_extensions.clear()
         self._disabled_extensions.clear()
+        self._stats.clear()
+        self._checks.clear()
 
         # Loading enabled extensions
 
@@ -309,8 +491,95 @@ class Extensions:
         self._enabled_extensions.sort(key=self._get_priority)
         self._disabled_extensions.sort(key=self._get_priority)
 
+        # Building the keyword index:
+
+        self.build_index()
+
         return True
 
+    def build_index(self):
+
+        """
+        Builds the keyword index of every loaded extension.
+
+        We index disabled extensions as well,
+        so extensions can be enabled and disabled without rebuilding.
+        This should be called again if an extension changes it's keywords.
+        """
+
+        self._index.clear()
+        self._intents.clear()
+
+        for ext in self._enabled_extensions + self._disabled_extensions:
+
+            for phrase in ext.keywords:
+
+                self._index.add(phrase, ext)
+
+            for intent in ext.intents:
+
+                self._intents.add(intent)
+
+        self._index.build()
+
+        self.log.debug("Indexed [{}] keywords and [{}] intents".format(self._index.phrases, len(self._intents)))
+
+    def candidates(self, sent):
+
+        """
+        Gets the enabled extensions that could handle the given sentence.
+
+        These are the extensions with a keyword in the sentence,
+        and every extension that declares no keywords.
+        They are returned in priority order, with demoted extensions last.
+
+        :param sent: Sentence typed/spoken by user
+        :type sent: str
+        :return: List of extensions
+        :rtype: list
+        """
+
+        found = self._index.search(ParsedUtterance(sent).tokens)
+
+        return sorted((ext for ext in self._enabled_extensions if not ext.keywords or ext in found),
+                      key=lambda ext: self.get_stats(ext).demoted)
+
+    def get_stats(self, ext):
+
+        """
+        Gets the counters of the given extension.
+
+        :param ext: Extension to get counters for
+        :type ext: BaseExtension
+        :return: Counters of the extension
+        :rtype: ExtensionStats
+        """
+
+        if ext not in self._stats:
+
+            self._stats[ext] = ExtensionStats(ext.name, ext.budget or self.chas.settings.extension_budget)
+
+        return self._stats[ext]
+
+    def stats(self):
+
+        """
+        Returns the counters of every extension that has seen input.
+
+        :return: Dictionary of counters, keyed by extension name
+        :rtype: dict
+        """
+
+        return {ext.name: stats.stats() for ext, stats in self._stats.items()}
+
+    def reset_stats(self):
+
+        """
+        Resets the counters of every extension, and promotes demoted extensions.
+        """
+
+        self._stats.clear()
+
     def handel(self, sent, talk, win):
 
         """
@@ -321,6 +590,10 @@ class Extensions:
         :param talk: Boolean determining if user is talking
         """
 
+        # Parsing the sentence once, for every extension to share
+
+        sent = ParsedUtterance(sent)
+
         # Checking CORE features first
 
         val = self._core.handel(sent, talk, win)
@@ -331,13 +604,59 @@ class Extensions:
 
             return True
 
-        # Checking other extensions
+        # Matching extension intents
 
-        for ext in self._enabled_extensions:
+        matched = {}
+
+        for intent, slots in self._intents.matches(sent):
+
+            matched.setdefault(intent.owner, []).append((intent, slots))
+
+        # Checking extensions that could handle the sentence
+
+        candidates = self.candidates(sent)
+        start = get_time()
+
+        if self.chas.settings.extension_parallel:
+
+            # Start checking the extensions that can, while we go through them in order:
+
+            self._start_checks(candidates, sent, talk)
+
+        for ext in candidates:
+
+            stats = self.get_stats(ext)
 
             try:
 
-                val = ext.match(sent, talk, win)
+                wants = self._get_check(ext, stats, start) if self.chas.settings.extension_parallel else None
+
+                if wants is False and ext not in matched:
+
+                    # Extension can't handle this, or took too long to tell us:
+
+                    continue
+
+                val = False
+                begin = get_time()
+
+                for intent, slots in matched.get(ext, ()):
+
+                    # Try the intents of the extension first:
+
+                    val = intent.handler(sent, talk, win, **slots)
+
+                    if val:
+
+                        break
+
+                if not val and wants is not False:
+
+                    # Fall back to the match method:
+
+                    val = ext.match(sent, talk, win)
+
+                stats.add_match(get_time() - begin)
 
             except Exception as e:
 
@@ -354,6 +673,149 @@ class Extensions:
 
         return False
 
+    def _start_checks(self, candidates, sent, talk):
+
+        """
+        Starts the checks of the given extensions in our thread pool.
+
+        Only extensions that override 'check()' are checked.
+        If the last check of an extension is still running, then we don't start another one.
+
+        :param candidates: Extensions to check
+        :type candidates: list
+        :param sent: Sentence typed/spoken by user
+        :type sent: ParsedUtterance
+        :param talk: Boolean determining if user is talking
+        :type talk: bool
+        """
+
+        if self._pool is None:
+
+            self._pool = CHASThreadPoolExecutor(max_workers=self.chas.settings.extension_workers,
+                                                thread_name_prefix='CHAS:EXTEN')
+
+        for ext in candidates:
+
+            if type(ext).check is BaseExtension.check:
+
+                # Extension can't be checked:
+
+                self._checks.pop(ext, None)
+
+                continue
+
+            last = self._checks.get(ext)
+
+            if last is not None and not last[0].done():
+
+                # Still running from an earlier input, mark it as stuck:
+
+                self._checks[ext] = (last[0], None)
+
+                continue
+
+            self._checks[ext] = (self._pool.submit(self._run_check, ext, sent, talk), sent)
+
+    def _run_check(self, ext, sent, talk):
+
+        """
+        Runs the check of an extension, and returns the time it took.
+
+        This runs in our thread pool, so we leave recording the time to the caller.
+
+        :param ext: Extension to check
+        :type ext: BaseExtension
+        :param sent: Sentence typed/spoken by user
+        :type sent: ParsedUtterance
+        :param talk: Boolean determining if user is talking
+        :type talk: bool
+        :return: Result of the check, and the time it took
+        :rtype: tuple
+        """
+
+        begin = get_time()
+
+        val = ext.check(sent, talk)
+
+        return val, get_time() - begin
+
+    def _get_check(self, ext, stats, start):
+
+        """
+        Waits for the check of an extension, until the end of it's budget.
+
+        :param ext: Extension to get the check of
+        :type ext: BaseExtension
+        :param stats: Counters of the extension
+        :type stats: ExtensionStats
+        :param start: Time the checks were started
+        :type start: float
+        :return: Result of the check, False if it took too long, None if the extension can't be checked
+        """
+
+        if ext not in self._checks:
+
+            # Extension can't be checked:
+
+            return None
+
+        future, sent = self._checks[ext]
+
+        if sent is None:
+
+            # Check from an earlier input is still running:
+
+            stats.overrun()
+
+            self._demote(ext, stats)
+
+            return False
+
+        try:
+
+            val, secs = future.result(timeout=max(0.0, start + stats.budget - get_time()))
+
+        except TimeoutError:
+
+            # Took too long, we move on without it:
+
+            self.log.debug("Extension [{}] took too long to check input".format(ext.name))
+
+            stats.overrun()
+
+            self._demote(ext, stats)
+
+            return False
+
+        if not stats.add_check(secs):
+
+            self._demote(ext, stats)
+
+        return None if val is None else bool(val)
+
+    def _demote(self, ext, stats):
+
+        """
+        Demotes an extension if it has gone over budget too many times in a row.
+
+        Demoted extensions are tried after every other extension,
+        until the extensions are reloaded or the stats are reset.
+
+        :param ext: Extension to demote
+        :type ext: BaseExtension
+        :param stats: Counters of the extension
+        :type stats: ExtensionStats
+        """
+
+        if stats.demoted or stats.strikes < self.chas.settings.extension_strikes:
+
+            return
+
+        stats.demoted = True
+
+        self.log.warning("Extension [{}] went over it's budget of {} seconds {} times in a row, "
+                         "it will now be tried last".format(ext.name, stats.budget, stats.strikes))
+
     def stop(self):
 
         """
@@ -362,12 +824,34 @@ class Extensions:
         and the unloads them.
         """
 
-        for ext in self._enabled_extensions:
+        if self._pool is not None:
+
+            # Stop running checks:
+
+            self._pool.shutdown(wait=False)
+
+            self._pool = None
+
+        for ext in list(self._enabled_extensions):
 
             # Disabling extension
 
             self.disable_extension(ext.name)
 
+        for ext in self._enabled_extensions + self._disabled_extensions:
+
+            # Unloading extension, so it can let go of threads and files:
+
+            try:
+
+                ext.unload()
+
+            except Exception as e:
+
+                # Lets log and continue:
+
+                self.log.warning("Exception occurred when unloading extension: [{}]!".format(ext.name), exc_info=e)
+
     def find(self, name, disabled=False):
 
         """
@@ -494,6 +978,10 @@ class CoreTools(BaseExtension):
     CHAS builtins
     Handles events such as changing extensions, personalities, ect.
     These are builtin commands that can't be removed, as they are necessary for CHAS to function.
+
+    Each command is registered as an intent, see 'chaslib/intents.py'.
+    Intents are matched in the order they are added here,
+    so more specific commands must be added before the ones they overlap with.
     """
 
     def __init__(self):
@@ -501,442 +989,632 @@ class CoreTools(BaseExtension):
         super(CoreTools, self).__init__('CoreTools', 'CHAS Core Tools', priority=-1)
         self.out = 'CORE:TOOLS'
         self.sep = "+==================================================+"  # Seperator for text
+        self.grammar = IntentGrammar()  # Grammar of our commands
+
+        ext = '(extension|extensions|plugin|plugins)'
+        per = '(personality|personalities|intelligence)'
+
+        # Extension commands:
+
+        self.add_intent('extension_reload', [ext + ' (reload|refresh)', '(reload|refresh) ' + ext],
+                        self._extension_reload)
+        self.add_intent('extension_list', [ext + ' (list|show)', '(list|show) ' + ext], self._extension_list)
+        self.add_intent('extension_stats_reset', [ext + ' (stats|status) reset', 'reset ' + ext + ' (stats|status)'],
+                        self._extension_stats_reset)
+        self.add_intent('extension_stats', [ext + ' (stats|status)'], self._extension_stats)
+        self.add_intent('extension_disable', [ext + ' disable {name}', 'disable ' + ext + ' {name}'],
+                        self._extension_disable)
+        self.add_intent('extension_enable', [ext + ' enable {name}', 'enable ' + ext + ' {name}'],
+                        self._extension_enable)
+
+        # Personality commands:
+
+        self.add_intent('personality_reload', [per + ' reload', 'reload ' + per], self._personality_reload)
+        self.add_intent('personality_list', [per + ' list', 'list ' + per], self._personality_list)
+        self.add_intent('personality_select', [per + ' select {name}', 'select ' + per + ' {name}'],
+                        self._personality_select)
+
+        # Networking commands:
+
+        self.add_intent('net_status', ['(net|network) status', 'status (net|network)'], self._net_status)
+
+        # Audio commands, stream commands must come before the stats:
+
+        self.add_intent('audio_list', ['audio list', 'list audio'], self._audio_list)
+        self.add_intent('audio_stream_enable', ['audio stream enable', 'enable audio stream'],
+                        self._audio_stream_enable)
+        self.add_intent('audio_stream_disable', ['audio stream disable', 'disable audio stream'],
+                        self._audio_stream_disable)
+        self.add_intent('audio_stream_status', ['audio stream', 'stream audio'], self._audio_stream_status)
+        self.add_intent('audio_stats_reset', ['audio (stats|status) reset', 'reset audio (stats|status)'],
+                        self._audio_stats_reset)
+        self.add_intent('audio_stats', 'audio (stats|status)', self._audio_stats)
+
+        for intent in self.intents:
+
+            self.grammar.add(intent)
 
     def handel(self, mesg, talk, win):
 
         """
         Handels input from user.
 
+        We match the input against our grammar,
+        and call the handler of the first command that handles it.
+
         :param mesg: Input from us er
         :param talk: Boolean determining if we are talking
         :param win: Output object
-        :return:
+        :return: True if we handled the input, False if not
+        :rtype: bool
         """
 
-        if keyword_find(mesg, ['extension', 'plugin']):
+        for intent, slots in self.grammar.matches(mesg):
 
-            # Dealing with plugins here:
+            if intent.handler(mesg, talk, win, **slots):
 
-            if keyword_find(mesg, ['reload', 'refresh']):
+                return True
 
-                # Reload the extensions reconfigure them
+        if 'help ' == string_clean(mesg):
 
-                win.add("[Reloading and reconfiguring extensions]", prefix=self.out)
-                win.add("[Please wait...]", prefix=self.out)
+            # User wants help
 
-                val = self.chas.extensions.parse_extensions()
+            pass
 
-                if val:
+        return False
 
-                    # Procedure was a success
+    def _extension_reload(self, mesg, talk, win):
 
-                    win.add("[Task Completed Successfully]", prefix=self.out)
+        """
+        Reloads the extensions and reconfigures them.
+        """
 
-                    return True
+        win.add("[Reloading and reconfiguring extensions]", prefix=self.out)
+        win.add("[Please wait...]", prefix=self.out)
 
-                win.add("[Task Failed]", prefix=self.out)
-                win.add("[Check usage logs for more information]", prefix=self.out)
+        val = self.chas.extensions.parse_extensions()
 
-                return True
+        if val:
 
-            if keyword_find(mesg, ['list', 'show']):
+            # Procedure was a success
 
-                # User wants to see all extensions
+            win.add("[Task Completed Successfully]", prefix=self.out)
 
-                # Getting dictionary from extension manager
+            return True
 
-                dic = self.chas.extensions.get_extensions()
+        win.add("[Task Failed]", prefix=self.out)
+        win.add("[Check usage logs for more information]", prefix=self.out)
 
-                if talk:
+        return True
 
-                    # User is expecting audio output:
+    def _extension_list(self, mesg, talk, win):
 
-                    win.add("Listing Enabled Extensions:")
+        """
+        Lists all extensions.
+        """
 
-                    for ext in dic['enabled']:
+        # Getting dictionary from extension manager
 
-                        # Separating info for pausing
+        dic = self.chas.extensions.get_extensions()
 
-                        win.add(ext.name)
-                        win.add(ext.description)
+        if talk:
 
-                    win.add("Listing Disabled Extensions:")
+            # User is expecting audio output:
 
-                    for ext in dic['disabled']:
+            win.add("Listing Enabled Extensions:")
 
-                        # Separating info for for pausing
+            for ext in dic['enabled']:
 
-                        win.add(ext.name)
-                        win.add(ext.description)
+                # Separating info for pausing
 
-                    win.add("End listing extensions.")
+                win.add(ext.name)
+                win.add(ext.description)
 
-                    return True
+            win.add("Listing Disabled Extensions:")
 
-                else:
+            for ext in dic['disabled']:
 
-                    # User wants text-based output
+                # Separating info for for pausing
 
-                    win.add("+==================================================+", prefix=self.out)
+                win.add(ext.name)
+                win.add(ext.description)
 
-                    win.add("[Enabled Extensions:]", prefix=self.out)
+            win.add("End listing extensions.")
 
-                    for ext in dic['enabled']:
+            return True
 
-                        win.add(" - {}: {}".format(ext.name, ext.description), prefix=self.out)
+        # User wants text-based output
 
-                    win.add("[Disabled Extensions:]", prefix=self.out)
+        win.add("+==================================================+", prefix=self.out)
 
-                    for ext in dic['disabled']:
+        win.add("[Enabled Extensions:]", prefix=self.out)
 
-                        win.add(" - {}: {}".format(ext.name, ext.description))
+        for ext in dic['enabled']:
 
-                    win.add("+==================================================+", prefix=self.out)
+            win.add(" - {}: {}".format(ext.name, ext.description), prefix=self.out)
 
-                    return True
+        win.add("[Disabled Extensions:]", prefix=self.out)
 
-            if keyword_find(mesg, 'disable'):
+        for ext in dic['disabled']:
 
-                # User wants to disable an extension
+            win.add(" - {}: {}".format(ext.name, ext.description))
 
-                # Getting name from string
+        win.add("+==================================================+", prefix=self.out)
 
-                index = mesg.index(" disable ") + 9
+        return True
 
-                val = mesg[index:]
+    def _extension_stats_reset(self, mesg, talk, win):
 
-                win.add("[Disabling Extension: {}]".format(val), prefix=self.out)
+        """
+        Resets the extension stats, and promotes demoted extensions.
+        """
 
-                # Disabling name
+        self.chas.extensions.reset_stats()
 
-                ret = self.chas.extensions.disable_extension(val)
+        win.add("Reset extension stats!")
 
-                if ret:
+        return True
 
-                    win.add("[Successfully Disabled Extension: {}]".format(val), prefix=self.out)
+    def _extension_stats(self, mesg, talk, win):
 
-                    return True
+        """
+        Shows how long each extension takes to check and handle input.
+        """
 
-                win.add("[Failed to disable extension: {}]".format(val), prefix=self.out)
-                win.add("[Check usage logs more more details]", prefix=self.out)
-                win.add("[The extension was unloaded, and will not be used again for the remainder of this runtime]")
+        stats = self.chas.extensions.stats()
 
-                return True
+        if talk:
 
-            if keyword_find(mesg, 'enable'):
+            # Lets say out loud
 
-                # User wants to enable an extension
+            win.add("Stats for {} extensions".format(len(stats)))
 
-                # Getting name from string
+            for name, ext_stats in stats.items():
 
-                index = mesg.index(" enable ") + 8
+                win.add("{} takes {} milliseconds on average, with {} overruns".format(
+                    name, round(ext_stats['match']['mean'] * 1000), ext_stats['overruns']))
 
-                val = mesg[index:]
+            return True
 
-                win.add("[Enabling Extension: {}]".format(val), prefix=self.out)
+        # Lets print to the terminal:
 
-                # Enabling name
+        win.add(self.sep, prefix=self.out)
+        win.add("[Extension Stats:]", prefix=self.out)
+        win.add(" - Parallel Checks: {}".format(self.chas.settings.extension_parallel), prefix=self.out)
 
-                ret = self.chas.extensions.enable_extension(val)
+        if not stats:
 
-                if ret:
+            win.add("No extensions have seen input!", prefix=self.out)
 
-                    win.add("[Successfully Enabled Extension: {}]".format(val), prefix=self.out)
+        for name, ext_stats in stats.items():
 
-                    return True
+            win.add(" - [{}]: Budget: {} ms, Overruns: {}{}".format(
+                name, round(ext_stats['budget'] * 1000, 1), ext_stats['overruns'],
+                ", Demoted" if ext_stats['demoted'] else ''), prefix=self.out)
 
-                win.add("[Failed to enable extension: {}]".format(val), prefix=self.out)
-                win.add("[Check usage logs more more details]", prefix=self.out)
+            for key in ('check', 'match'):
 
-                return True
+                win.add("   {}: Count: {}, Mean: {} ms, Max: {} ms, Histogram: {}".format(
+                    key.capitalize(), ext_stats[key]['count'], round(ext_stats[key]['mean'] * 1000, 3),
+                    round(ext_stats[key]['max'] * 1000, 3), ", ".join(
+                        "{}: {}".format(bucket, val) for bucket, val in ext_stats[key]['histogram'].items())),
+                    prefix=self.out)
 
-        if keyword_find(mesg, ['personality', 'intelligence']):
+        win.add(self.sep, prefix=self.out)
 
-            # Dealing with personalities
+        return True
 
-            if keyword_find(mesg, 'reload'):
+    def _extension_disable(self, mesg, talk, win, name):
 
-                # User wants to reload personalities
+        """
+        Disables the extension with the given name.
+        """
 
-                win.add("[Reloading and reconfiguring personalities]", prefix=self.out)
-                win.add("[Please wait...]", prefix=self.out)
+        win.add("[Disabling Extension: {}]".format(name), prefix=self.out)
 
-                val = self.chas.person.parse_personalities()
+        # Disabling name
 
-                if val:
+        ret = self.chas.extensions.disable_extension(name)
 
-                    # Successfully parsed personalities
+        if ret:
 
-                    win.add("[Task Completed Successfully]", prefix=self.out)
+            win.add("[Successfully Disabled Extension: {}]".format(name), prefix=self.out)
 
-                    return True
+            return True
 
-                # Did not complete task
+        win.add("[Failed to disable extension: {}]".format(name), prefix=self.out)
+        win.add("[Check usage logs more more details]", prefix=self.out)
+        win.add("[The extension was unloaded, and will not be used again for the remainder of this runtime]")
 
-                win.add("[Task Failed]", prefix=self.out)
-                win.add("[Check usage logs for more information]", prefix=self.out)
+        return True
 
-                return True
+    def _extension_enable(self, mesg, talk, win, name):
 
-            if keyword_find(mesg, 'list'):
+        """
+        Enables the extension with the given name.
+        """
 
-                # User wants to see all personalities
+        win.add("[Enabling Extension: {}]".format(name), prefix=self.out)
 
-                # Getting personalities from personality manager
+        # Enabling name
 
-                dic = self.chas.person.get_personalities()
+        ret = self.chas.extensions.enable_extension(name)
 
-                if talk:
+        if ret:
 
-                    # User is expecting audio output:
+            win.add("[Successfully Enabled Extension: {}]".format(name), prefix=self.out)
 
-                    win.add("Listing Available Personalities:")
+            return True
 
-                    for per in dic:
+        win.add("[Failed to enable extension: {}]".format(name), prefix=self.out)
+        win.add("[Check usage logs more more details]", prefix=self.out)
 
-                        # Separating info for pausing
+        return True
 
-                        win.add(per.name)
-                        win.add(per.description)
+    def _personality_reload(self, mesg, talk, win):
 
-                    win.add("End listing personalities.")
+        """
+        Reloads the personalities.
+        """
 
-                    return True
+        win.add("[Reloading and reconfiguring personalities]", prefix=self.out)
+        win.add("[Please wait...]", prefix=self.out)
 
-                else:
+        val = self.chas.person.parse_personalities()
 
-                    # User wants text-based output
+        if val:
 
-                    win.add("+==================================================+", prefix=self.out)
+            # Successfully parsed personalities
 
-                    win.add("[Available Personalities:]", prefix=self.out)
+            win.add("[Task Completed Successfully]", prefix=self.out)
 
-                    for per in dic:
+            return True
+
+        # Did not complete task
+
+        win.add("[Task Failed]", prefix=self.out)
+        win.add("[Check usage logs for more information]", prefix=self.out)
+
+        return True
+
+    def _personality_list(self, mesg, talk, win):
+
+        """
+        Lists all personalities.
+        """
+
+        # Getting personalities from personality manager
+
+        dic = self.chas.person.get_personalities()
+
+        if talk:
+
+            # User is expecting audio output:
+
+            win.add("Listing Available Personalities:")
+
+            for per in dic:
+
+                # Separating info for pausing
+
+                win.add(per.name)
+                win.add(per.description)
+
+            win.add("End listing personalities.")
+
+            return True
+
+        # User wants text-based output
+
+        win.add("+==================================================+", prefix=self.out)
+
+        win.add("[Available Personalities:]", prefix=self.out)
 
-                        win.add(" - {}: {} {}".format(per.name, per.description,
-                                                      ("< Selected" if per.selected else '')), prefix=self.out)
+        for per in dic:
 
-                    win.add("+==================================================+", prefix=self.out)
+            win.add(" - {}: {} {}".format(per.name, per.description,
+                                          ("< Selected" if per.selected else '')), prefix=self.out)
 
-                    return True
+        win.add("+==================================================+", prefix=self.out)
 
-            if keyword_find(mesg, 'select'):
+        return True
+
+    def _personality_select(self, mesg, talk, win, name):
+
+        """
+        Selects the personality with the given name.
+        """
+
+        win.add("[Selecting personality: {}]".format(name), prefix=self.out)
+        win.add("[Please wait, this could take some time depending on the personality...]", prefix=self.out)
 
-                # User wants to select a personality
+        ret = self.chas.person.select(name)
 
-                # Getting index
+        if ret:
 
-                index = mesg.index(' select ') + 8
+            win.add("[Successfully selected personality: {}]".format(name), prefix=self.out)
 
-                val = mesg[index:]
+            return True
+
+        win.add("[Failed to select personality: {}]".format(name), prefix=self.out)
+        win.add("[See usage logs for more details]", prefix=self.out)
+
+        return True
 
-                win.add("[Selecting personality: {}]".format(val), prefix=self.out)
-                win.add("[Please wait, this could take some time depending on the personality...]", prefix=self.out)
+    def _net_status(self, mesg, talk, win):
 
-                ret = self.chas.person.select(val)
+        """
+        Shows the stats of the networking component.
+        """
 
-                if ret:
+        host = self.chas.net.host
+        port = self.chas.net.port
 
-                    win.add("[Successfully selected personality: {}]".format(val), prefix=self.out)
+        if not self.chas.client:
 
-                    return True
+            if talk:
 
-                win.add("[Failed to select personality: {}]".format(val), prefix=self.out)
-                win.add("[See usage logs for more details]", prefix=self.out)
+                # Lets say out loud
+
+                win.add("Stats for socket server")
+                win.add("Listening on host {} on port {}".format(host, port))
+                win.add("{} clients connected".format(len(self.chas.devices)))
 
                 return True
 
-        if keyword_find(mesg, ['net']):
+            # Lets print to the terminal:
 
-            # Dealing with networking
+            win.add(self.sep, prefix=self.out)
+            win.add("[Socket Server Stats:]", prefix=self.out)
+            win.add(" - Hostname: {}".format(host), prefix=self.out)
+            win.add(" - Port: {}".format(port), prefix=self.out)
+            win.add(" - Clients Connected: {}".format(len(self.chas.devices)), prefix=self.out)
 
-            if keyword_find(mesg, 'status'):
+            for dev in self.chas.devices:
 
-                # Get stats from networking component:
+                # Show the write counters of each device:
 
-                host = self.chas.net.host
-                port = self.chas.net.port
+                stats = dev.sock.stats()
 
-                if not self.chas.client:
+                win.add(" - [{}:{}]: {}".format(dev.ip, dev.port, ", ".join(
+                    "{}: {}".format(key, round(val, 4) if isinstance(val, float) else val)
+                    for key, val in stats.items())), prefix=self.out)
 
-                    if talk:
+            win.add(self.sep, prefix=self.out)
 
-                        # Lets say out loud
+            return True
 
-                        win.add("Stats for socket server")
-                        win.add("Listening on host {} on port {}".format(host, port))
-                        win.add("{} clients connected".format(len(self.chas.devices)))
+        # Working with a client:
 
-                        return True
+        if talk:
 
-                    # Lets print to the terminal:
+            # Lets say out loud
 
-                    win.add(self.sep, prefix=self.out)
-                    win.add("[Socket Server Stats:]", prefix=self.out)
-                    win.add(" - Hostname: {}".format(host), prefix=self.out)
-                    win.add(" - Port: {}".format(port), prefix=self.out)
-                    win.add(" - Clients Connected: {}".format(len(self.chas.devices)), prefix=self.out)
-                    win.add(self.sep, prefix=self.out)
+            win.add("Stats for socket client")
 
-                    return True
+            if self.chas.server is None:
 
-                # Working with a client:
+                # We are not connected:
 
-                if talk:
+                win.add("Socket client is not connected")
 
-                    # Lets say out loud
+            else:
 
-                    win.add("Stats for socket client")
-                    
-                    if self.chas.server is None:
+                win.add("Socket client is connected")
 
-                        # We are not connected:
+            win.add("Server address is {}".format(self.chas.net.hostname))
+            win.add("Server port is {}".format(self.chas.net.port))
 
-                        win.add("Socket client is not connected")
+            return True
 
-                    else:
+        # Lets print out to terminal:
 
-                        win.add("Socket client is connected")
-                    
-                    win.add("Server address is {}".format(self.chas.net.hostname))
-                    win.add("Server port is {}".format(self.chas.net.port))
+        win.add(self.sep, prefix=self.out)
+        win.add("[Socket Client Stats:]", prefix=self.out)
+        win.add("[Connected: {}]".format(self.chas.server is not None), prefix=self.out)
+        win.add(" - Address: {}".format(host), prefix=self.out)
+        win.add(" - Port: {}".format(port), prefix=self.out)
+        win.add(self.sep, prefix=self.out)
 
-                    return True
+        return True
 
-                # Lets print out to terminal:
+    def _audio_list(self, mesg, talk, win):
 
-                win.add(self.sep, prefix=self.out)
-                win.add("[Socket Client Stats:]", prefix=self.out)
-                win.add("[Connected: {}]".format(self.chas.server is not None), prefix=self.out)
-                win.add(" - Address: {}".format(host), prefix=self.out)
-                win.add(" - Port: {}".format(port), prefix=self.out)
-                win.add(self.sep, prefix=self.out)
+        """
+        Lists all audio nodes.
+        """
 
-                return True
+        nodes = self.chas.sound._input._objs
+
+        if talk:
+
+            # We are talking, lets give a concice list:
+
+            win.add("Connected audio nodes")
+
+            for node in nodes:
 
-        if keyword_find(mesg, ['audio']):
+                win.add("{} with name {}".format(type(node), node.info.name))
 
-            # Dealing with audio commands
+            return True
 
-            if keyword_find(mesg, ['list']):
+        # Lets provide a textual representation of the audio:
 
-                # User wants a list of all audio nodes:
+        win.add(self.sep, prefix=self.out)
+        win.add("[Connected audio nodes:]", prefix=self.out)
 
-                nodes = self.chas.sound._input._objs
+        if not nodes:
 
-                if talk:
+            # No nodes loaded! Lets print that
 
-                    # We are talking, lets give a concice list:
+            win.add("No audio nodes loaded!", prefix=self.out)
 
-                    win.add("Connected audio nodes")
+        for node in nodes:
 
-                    for node in nodes:
+            win.add(" - [{}]: {}".format(type(node), node.info.name), prefix=self.out)
 
-                        win.add("{} with name {}".format(type(node), node.info.name))
+        win.add(self.sep, prefix=self.out)
 
-                    return True
+        return True
 
-                # Lets provide a textual representation of the audio:
+    def _audio_stats_reset(self, mesg, talk, win):
 
-                win.add(self.sep, prefix=self.out)
-                win.add("[Connected audio nodes:]", prefix=self.out)
-                
-                if not nodes:
+        """
+        Resets the stats of the audio scheduler.
+        """
 
-                    # No nodes loaded! Lets print that
+        if self.chas.sound.sched_stats() is None:
 
-                    win.add("No audio nodes loaded!", prefix=self.out)
+            win.add("Audio scheduler is not enabled!")
 
-                for node in nodes:
+            return True
 
-                    win.add(" - [{}]: {}".format(type(node), node.info.name), prefix=self.out)
+        self.chas.sound.scheduler.reset()
 
-                win.add(self.sep, prefix=self.out)
+        win.add("Reset audio scheduler stats!")
 
-                return True
+        return True
 
-            if keyword_find(mesg, ['stream']):
+    def _audio_stats(self, mesg, talk, win):
 
-                # We are dealing with stream, lets figure out if we need to enable or disable.
+        """
+        Shows if the audio engine is keeping up.
+        """
 
-                if self.chas.client:
+        stats = self.chas.sound.sched_stats()
 
-                    # We are working with a client, lets figure out what the user wants:
+        if stats is None:
 
-                    if keyword_find(mesg, ['enable']):
+            win.add("Audio scheduler is not enabled!")
 
-                        win.add("Enabling streaming!")
+            return True
 
-                        self.chas.net.handlers[4].start()
+        if talk:
 
-                        return True
+            # Lets say out loud
 
-                    if keyword_find(mesg, ['disable']):
+            win.add("Audio scheduler has rendered {} blocks".format(stats['blocks']))
+            win.add("{} underruns and {} lost blocks".format(stats['underruns'], stats['lost']))
+            win.add("Average load is {} percent".format(round(stats['load'] * 100)))
 
-                        win.add("Disabling streaming!")
+            return True
 
-                        self.chas.net.handlers[4].stop()
+        # Lets print to the terminal:
 
-                        return True
+        win.add(self.sep, prefix=self.out)
+        win.add("[Audio Scheduler Stats:]", prefix=self.out)
+        win.add(" - Running: {}".format(self.chas.sound.scheduled()), prefix=self.out)
+        win.add(" - Block: {} frames at {} Hz, {} ms".format(
+            stats['frames'], stats['rate'], round(stats['period'] * 1000, 2)), prefix=self.out)
+        win.add(" - Blocks: {}".format(stats['blocks']), prefix=self.out)
+        win.add(" - Underruns: {}, Lost Blocks: {}, Latest: {} ms".format(
+            stats['underruns'], stats['lost'], round(stats['late'] * 1000, 2)), prefix=self.out)
+        win.add(" - Load: {}%, Mean: {} ms, Max: {} ms".format(
+            round(stats['load'] * 100, 1), round(stats['mean'] * 1000, 3), round(stats['max'] * 1000, 3)),
+            prefix=self.out)
+        win.add(" - Histogram(block periods): {}".format(", ".join(
+            "{}: {}".format(key, val) for key, val in stats['histogram'].items())), prefix=self.out)
 
-                    # Just report the status
+        win.add("[Synth Chains:]", prefix=self.out)
 
-                    win.add("Streaming is: {}!".format("Enabled" if self.chas.net.handlers[4].allow_stream else "Disabled"))
+        if not stats['chains']:
 
-                    return True
+            win.add("No synth chains rendered!", prefix=self.out)
 
-                # We are working with a server:
+        for chain, chain_stats in stats['chains'].items():
 
-                enabled = self.chas.sound.search_type(NetModule)
+            win.add(" - [{}]: Load: {}%, Mean: {} ms, Max: {} ms, Overruns: {}".format(
+                chain, round(chain_stats['load'] * 100, 1), round(chain_stats['mean'] * 1000, 3),
+                round(chain_stats['max'] * 1000, 3), chain_stats['overruns']), prefix=self.out)
+            win.add("   Histogram: {}".format(", ".join(
+                "{}: {}".format(key, val) for key, val in chain_stats['histogram'].items())),
+                prefix=self.out)
 
-                if keyword_find(mesg, ['enable']):
+        win.add(self.sep, prefix=self.out)
 
-                    # Check to make sure we are already enabled:
+        return True
 
-                    if enabled:
+    def _audio_stream_enable(self, mesg, talk, win):
 
-                        # Present, lets return
+        """
+        Enables audio streaming.
+        """
 
-                        win.add("Streaming is already enabled!")
+        if self.chas.client:
 
-                        return True
+            # We are working with a client:
 
-                    # Otherwise, lets enable it:
+            win.add("Enabling streaming!")
 
-                    win.add("Enabled streaming!")
+            self.chas.net.handlers[4].start()
 
-                    self.chas.sound.add_output(NetModule())
+            return True
 
-                    return True
+        # We are working with a server, check to make sure we are not already enabled:
 
-                if keyword_find(mesg, ['disable']):
+        if self.chas.sound.search_type(NetModule):
 
-                    # Check to make sure we are already enabled:
+            # Present, lets return
 
-                    if enabled:
+            win.add("Streaming is already enabled!")
 
-                        # Disable the module:
+            return True
 
-                        self.chas.sound.remove_type(NetModule)
+        # Otherwise, lets enable it:
 
-                        win.add("Disabled streaming!")
+        win.add("Enabled streaming!")
 
-                        return True
+        self.chas.sound.add_output(NetModule(frames_per_buffer=self.chas.settings.net_audio_frames,
+                                             lead=self.chas.settings.net_audio_lead))
 
-                    win.add("Streaming is already enabled!")
+        return True
 
-                    return True
+    def _audio_stream_disable(self, mesg, talk, win):
 
-                # Otherwise, report the status:
+        """
+        Disables audio streaming.
+        """
 
-                win.add("Streaming is: {}!".format("Enabled" if enabled else "Disabled"))
+        if self.chas.client:
 
-                return True
+            # We are working with a client:
 
-        if 'help ' == string_clean(mesg):
+            win.add("Disabling streaming!")
 
-            # User wants help
+            self.chas.net.handlers[4].stop()
 
-            pass
+            return True
 
-        return False
+        # We are working with a server, check to make sure we are enabled:
+
+        if self.chas.sound.search_type(NetModule):
+
+            # Disable the module:
+
+            self.chas.sound.remove_type(NetModule)
+
+            win.add("Disabled streaming!")
+
+            return True
+
+        win.add("Streaming is already disabled!")
+
+        return True
+
+    def _audio_stream_status(self, mesg, talk, win):
+
+        """
+        Reports if audio streaming is enabled.
+        """
+
+        if self.chas.client:
+
+            enabled = self.chas.net.handlers[4].allow_stream
+
+        else:
+
+            enabled = self.chas.sound.search_type(NetModule)
+
+        win.add("Streaming is: {}!".format("Enabled" if enabled else "Disabled"))
+
+        return True
@@ -0,0 +1,248 @@
+"""
+Intent grammars, used to match commands and pull arguments out of them.
+
+An intent is something the user wants done, like disabling an extension.
+Each intent has one or more patterns, and a handler that is called when one of them matches.
+Patterns are written as words, with a few extras:
+
+    - (a|b|c) - Any one of the given alternatives, which can be phrases like (next song|skip)
+    - {name} - A slot, which captures the text at that point and passes it to the handler as 'name'
+
+So the pattern '(extension|plugin) disable {name}' matches 'disable' after 'extension' or 'plugin',
+and captures everything after 'disable' as 'name'.
+Words are matched in order, but other words can come between them,
+so 'please show me the extension list' still matches '(extension|extensions) list'.
+Slots are captured from the raw input, so they keep their case and punctuation.
+
+Each pattern is compiled into a regular expression,
+and the words that must start each pattern are added to a KeywordIndex.
+Matching an input searches the index once, and only tries the patterns that could match,
+in the order the intents were added.
+"""
+
+import re
+
+from chaslib.keyindex import KeywordIndex
+from chaslib.resptools import ParsedUtterance
+
+ELEMENT = re.compile(r'\(([^)]*)\)|\{(\w+)\}|([^\s(){}]+)')  # Regex splitting a pattern into elements
+FILLER = r'\W+(?:\w+\W+)*?'  # Regex allowing other words between two words
+GAP = r'\W+'  # Regex separating a word and a slot
+
+
+def compile_pattern(pattern):
+
+    """
+    Compiles a pattern into a regular expression.
+
+    We also return the alternatives of the first word in the pattern,
+    which every input matching the pattern must contain.
+
+    :param pattern: Pattern to compile
+    :type pattern: str
+    :return: Compiled regular expression, and list of starting words
+    :rtype: tuple
+    :raises ValueError: If the pattern has no words, or two slots next to each other
+    """
+
+    elements = []
+
+    for alts, slot, word in ELEMENT.findall(pattern):
+
+        if slot:
+
+            elements.append((None, slot))
+
+            continue
+
+        # Split the alternatives and clean them like the input:
+
+        alts = [' '.join(ParsedUtterance(alt).tokens) for alt in (alts.split('|') if alts else [word])]
+
+        elements.append(([alt for alt in alts if alt], None))
+
+    anchors = [alts for alts, _ in elements if alts]
+
+    if not anchors:
+
+        raise ValueError("Pattern [{}] has no words to match!".format(pattern))
+
+    parts = []
+    last = None
+
+    for num, (alts, slot) in enumerate(elements):
+
+        if slot is not None:
+
+            if last is not None and last[1] is not None:
+
+                raise ValueError("Pattern [{}] has two slots next to each other!".format(pattern))
+
+            # Slots at the end take the rest of the input, others take as little as they can:
+
+            regex = '(?P<{}>.+)'.format(slot) if num == len(elements) - 1 else '(?P<{}>.+?)'.format(slot)
+
+        else:
+
+            regex = r'\b(?:{})\b'.format('|'.join(r'\W+'.join(re.escape(word) for word in alt.split())
+                                                 for alt in alts))
+
+        if last is None:
+
+            # Slots at the start take everything before the next word:
+
+            parts.append(r'^\W*' if slot is not None else '')
+
+        else:
+
+            parts.append(FILLER if last[1] is None and slot is None else GAP)
+
+        parts.append(regex)
+
+        last = (alts, slot)
+
+    return re.compile(''.join(parts), re.IGNORECASE), anchors[0]
+
+
+class Intent:
+
+    """
+    Something the user wants done, and the patterns that ask for it.
+
+    The handler is called with the input, the talk value and output object,
+    and each captured slot as a keyword argument.
+    It should return True if it handled the input, like 'BaseExtension.match()'.
+
+    :param name: Name of the intent
+    :type name: str
+    :param patterns: Pattern or list of patterns that match the intent
+    :type patterns: str, list
+    :param handler: Function called when the intent is matched
+    :type handler: callable
+    :param owner: Object that added the intent, usually an extension
+    """
+
+    def __init__(self, name, patterns, handler=None, owner=None):
+
+        if isinstance(patterns, str):
+
+            patterns = [patterns]
+
+        self.name = name  # Name of the intent
+        self.handler = handler  # Function called when we are matched
+        self.owner = owner  # Object that added us
+        self.patterns = [compile_pattern(pattern) for pattern in patterns]  # Compiled regex and starting words
+        self.anchors = []  # Words that can start any of our patterns
+
+        for _, alts in self.patterns:
+
+            for alt in alts:
+
+                if alt not in self.anchors:
+
+                    self.anchors.append(alt)
+
+    def match(self, sent):
+
+        """
+        Matches the input against our patterns.
+
+        :param sent: Input from the user
+        :type sent: str
+        :return: Dictionary of captured slots, or None if no pattern matched
+        :rtype: dict
+        """
+
+        for regex, _ in self.patterns:
+
+            found = regex.search(sent)
+
+            if found:
+
+                return {key: val.strip() for key, val in found.groupdict().items()}
+
+        return None
+
+
+class IntentGrammar:
+
+    """
+    Collection of intents, matched against input with one search of a keyword index.
+
+    Intents are added with 'add()', and matched in the order they were added.
+    """
+
+    def __init__(self):
+
+        self._intents = []  # List of intents, in the order they were added
+        self._order = {}  # Position of each intent
+        self._index = KeywordIndex()  # Index of the starting words of each intent
+
+    def add(self, intent):
+
+        """
+        Adds an intent to the grammar.
+
+        :param intent: Intent to add
+        :type intent: Intent
+        """
+
+        self._order[intent] = len(self._intents)
+
+        self._intents.append(intent)
+
+        for anchor in intent.anchors:
+
+            self._index.add(anchor, intent)
+
+    def matches(self, sent):
+
+        """
+        Generates every intent that matches the input, in the order they were added.
+
+        :param sent: Input from the user
+        :type sent: str
+        :return: Generator of intents and their captured slots
+        :rtype: tuple
+        """
+
+        sent = ParsedUtterance(sent)
+
+        for intent in sorted(self._index.search(sent.tokens), key=self._order.get):
+
+            slots = intent.match(sent)
+
+            if slots is not None:
+
+                yield intent, slots
+
+    def match(self, sent):
+
+        """
+        Gets the first intent that matches the input.
+
+        :param sent: Input from the user
+        :type sent: str
+        :return: Intent and it's captured slots, or (None, None) if nothing matched
+        :rtype: tuple
+        """
+
+        for intent, slots in self.matches(sent):
+
+            return intent, slots
+
+        return None, None
+
+    def clear(self):
+
+        """
+        Removes every intent from the grammar.
+        """
+
+        self._intents.clear()
+        self._order.clear()
+        self._index.clear()
+
+    def __len__(self):
+
+        return len(self._intents)
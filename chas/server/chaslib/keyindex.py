@@ -0,0 +1,180 @@
+"""
+Keyword index used to pick which extensions should see some input.
+
+Extensions can declare the keywords and phrases they respond to.
+Instead of asking every extension to scan the input for it's keywords,
+we compile every declared phrase into one automaton when extensions are parsed.
+Each input is then cleaned and split into words once,
+and a single pass over those words finds every phrase present,
+and so every extension that could handle the input.
+
+The automaton is an Aho-Corasick automaton over words instead of characters.
+Phrases are stored in a trie, keyed by word,
+and each node has a failure link to the longest phrase suffix that is also in the trie.
+This lets us find overlapping phrases, like 'song' and 'next song',
+without ever going backwards in the input.
+"""
+
+from collections import deque
+
+from chaslib.resptools import ParsedUtterance
+
+
+def tokenize(sent):
+
+    """
+    Cleans a sentence and splits it into words.
+
+    We split the sentence the same way 'ParsedUtterance' does,
+    so phrases are indexed with the same words the input is searched with.
+
+    :param sent: Sentence to split
+    :type sent: str
+    :return: List of words
+    :rtype: list
+    """
+
+    return ParsedUtterance(sent).tokens
+
+
+class KeywordIndex:
+
+    """
+    Aho-Corasick automaton mapping phrases to the objects that declared them.
+
+    Phrases are added with 'add()', and the automaton is compiled with 'build()'.
+    Afterwards, 'search()' returns every object with a phrase present in the given words.
+    Adding phrases after we are built will rebuild us on the next search.
+    """
+
+    def __init__(self):
+
+        self._goto = [{}]  # Transitions of each node, keyed by word
+        self._fail = [0]  # Failure link of each node
+        self._out = [set()]  # Objects with a phrase ending at each node
+        self._built = True  # Value determining if our failure links are up to date
+        self.phrases = 0  # Number of phrases added
+
+    def add(self, phrase, value):
+
+        """
+        Adds a phrase to the index.
+
+        :param phrase: Phrase to add, cleaned like the input will be
+        :type phrase: str
+        :param value: Object returned when the phrase is found
+        """
+
+        words = tokenize(phrase)
+
+        if not words:
+
+            # Nothing to match:
+
+            return
+
+        node = 0
+
+        for word in words:
+
+            nxt = self._goto[node].get(word)
+
+            if nxt is None:
+
+                # Create a new node:
+
+                nxt = len(self._goto)
+
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+
+                self._goto[node][word] = nxt
+
+            node = nxt
+
+        self._out[node].add(value)
+
+        self.phrases += 1
+        self._built = False
+
+    def build(self):
+
+        """
+        Computes the failure links of the automaton.
+
+        We walk the trie breadth first, so the failure link of each parent is known before it's children.
+        Each node also inherits the objects of it's failure link,
+        so a search never has to follow the links to collect them.
+        """
+
+        queue = deque()
+
+        for nxt in self._goto[0].values():
+
+            self._fail[nxt] = 0
+
+            queue.append(nxt)
+
+        while queue:
+
+            node = queue.popleft()
+
+            for word, nxt in self._goto[node].items():
+
+                # Find the longest suffix that can be followed by this word:
+
+                fail = self._fail[node]
+
+                while fail and word not in self._goto[fail]:
+
+                    fail = self._fail[fail]
+
+                fail = self._goto[fail].get(word, 0)
+
+                self._fail[nxt] = fail
+                self._out[nxt] |= self._out[fail]
+
+                queue.append(nxt)
+
+        self._built = True
+
+    def search(self, words):
+
+        """
+        Finds every object with a phrase in the given words.
+
+        :param words: Words of the input, like the tokens of a ParsedUtterance
+        :type words: list
+        :return: Set of objects found
+        :rtype: set
+        """
+
+        if not self._built:
+
+            self.build()
+
+        found = set()
+        node = 0
+
+        for word in words:
+
+            while node and word not in self._goto[node]:
+
+                node = self._fail[node]
+
+            node = self._goto[node].get(word, 0)
+
+            if self._out[node]:
+
+                found |= self._out[node]
+
+        return found
+
+    def clear(self):
+
+        """
+        Removes every phrase from the index.
+        """
+
+        self.__init__()
@@ -63,6 +63,12 @@ def get_logger(name):
 
     log.setLevel(logging.DEBUG)
 
+    if get_chas() is None:
+
+        # We are running outside of CHAS(Benchmarks, scripts), we have no handlers to configure:
+
+        return log
+
     # Create file handler:
 
     file_hand = logging.FileHandler(get_chas().settings.log_file)
@@ -24,30 +24,27 @@ def keyword_find(sent, word, start=0):
     # And returns True if present, false if not.
     # Can be passed single string for single response,
     # Or a list for multiple!
+    # If given a ParsedUtterance, we use it's token set instead of cleaning the string again.
 
-    sent = string_clean(sent)
+    if isinstance(sent, ParsedUtterance) and not start:
 
-    words = get_words(sent, start)
+        # Words are already split, check the token set:
 
-    # If word var is string:
-
-    if isinstance(word, (str,)):
-
-        word = word.lower()
+        words = sent.token_set
 
-        # Checking if keyword is present:
+    else:
 
-        if word in words:
+        sent = sent.text if isinstance(sent, ParsedUtterance) else string_clean(sent)
 
-            # Found our lucky keyword!
+        words = get_words(sent, start)
 
-            return True
+    # If word var is string:
 
-        else:
+    if isinstance(word, (str,)):
 
-            # Did not find keyword. Better luck next time!
+        # Checking if keyword is present:
 
-            return False
+        return word.lower() in words
 
     # If word var is list:
 
@@ -55,9 +52,9 @@ def keyword_find(sent, word, start=0):
 
         # Formatting keywords and checking if they are present:
 
-        for i in range(len(word)):
+        for key in word:
 
-            if word[i].lower() in words:
+            if key.lower() in words:
 
                 # Found one of our lucky keywords!
 
@@ -74,126 +71,160 @@ def key_sta_find(sent, state, start=0):
     # See 'keyword_find' for argument details,
     # As these are the same.
 
-    sent = string_clean(sent)
+    parsed = isinstance(sent, ParsedUtterance) and not start
+
+    text = sent.text if isinstance(sent, ParsedUtterance) else string_clean(sent)
 
     # Statement is string
 
     if isinstance(state, (str,)):
 
-        state = state.lower()
+        state = [state]
 
-        first_char = state[0:1]
-        len_state = len(state)
+    # Statement is list:
 
-        # Checking every char to see if their is a match:
+    if isinstance(state, (list,)):
 
-        for i in range(start, len(sent)):
+        for key in state:
 
-            if sent[i:i+1] == first_char:
+            key = key.lower()
 
-                # If first chars match
+            if parsed and sent.has_phrase(key):
 
-                if sent[i:len_state+i] == state:
+                # Statement is made of whole words in the utterance!
 
-                    # Found key statement!
+                return True
 
-                    return True
+            # Statements can be part of a word, so search the whole string:
 
-                else:
+            if key and text.find(key, start) != -1:
 
-                    # Rest don't match, DARN!
+                # Found key statement!
 
-                    continue
+                return True
 
-        # Did not find key statement!
+        # Didn't find key statement! DARN!
 
         return False
 
-    # Statement is list:
 
-    if isinstance(state, (list,)):
+def get_words(sent, start):
 
-        for j in range(len(state)):
+    # Function for generating list of words from string
+    # Words are the text between two spaces,
+    # so the last word is only found if the string ends with a space, like 'string_clean()' ensures.
 
-            state_temp = state[j].lower()
-            len_state_temp = len(state_temp)
-            first_char = state_temp[0:1]
+    words = []
 
-            # Checking every char to see if their is a match:
+    # Finding the first space after our starting point:
 
-            for i in range(start, len(sent)):
+    i = sent.find(' ', start)
 
-                if sent[i:i + 1] == first_char:
+    while i != -1:
 
-                    # If first chars match
+        # Finding the end of the word:
 
-                    if sent[i:len_state_temp + i] == state_temp:
+        j = sent.find(' ', i + 1)
 
-                        # Found key statement!
+        if j == -1:
 
-                        return True
+            # No space after the word, we are done
 
-                    else:
+            break
 
-                        # Rest don't match, DARN!
+        # Found a word! Appending to word list!
 
-                        continue
+        words.append(sent[i+1:j])
 
-        # Didn't find key statement! DARN!
+        i = j
 
-        return False
+    return words
 
 
-def get_words(sent, start):
+def string_clean(temp):
 
-    # Function for generating list of words from string
+    # Function for cleaning and preparing string for parsing
 
-    words = []
+    # Making lowercase and removing pesky newline chars
+
+    new_str = temp.lower().lstrip()
 
-    # Looping through list until we hit a whitespace:
+    # Removing punctuation
 
-    for i in range(start, len(sent)):
+    new_str = re.sub("[{}]".format("".join(string.punctuation)), "", new_str)
 
-        # Getting current value:
+    # Adding space in front and behind string
 
-        curr_val = sent[i]
+    new_str = ' ' + new_str + ' '
 
-        if curr_val == ' ':
+    return new_str
 
-            # If whitespace, find end of word!
 
-            for j in range(i+1, len(sent)):
+class ParsedUtterance(str):
 
-                curr_val_two = sent[j]
+    """
+    Input from the user, cleaned and split into words once.
 
-                if curr_val_two == ' ':
+    We are a string, so we can be used anywhere the raw input is expected,
+    like slicing out the arguments of a command.
+    On top of that, we keep the cleaned text, a list and set of it's words,
+    and sets of the phrases made of neighbouring words.
+    'keyword_find()' and 'key_sta_find()' use these instead of cleaning the input every time they are called.
 
-                    # Found a word! Appending to word list!
+    Creating a ParsedUtterance from a ParsedUtterance returns the same instance,
+    so it is safe to wrap input that might already be parsed.
 
-                    words.append(sent[i+1:j])
+    :param sent: Input from the user
+    :type sent: str
+    """
 
-                    break
+    MAX_GRAM = 4  # Longest phrase, in words, we keep a set of
 
-    return words
+    def __new__(cls, sent):
 
+        if isinstance(sent, ParsedUtterance):
 
-def string_clean(temp):
+            # Already parsed:
 
-    # Function for cleaning and preparing string for parsing
+            return sent
 
-    # Making lowercase and removing pesky newline chars
+        self = super().__new__(cls, sent)
 
-    new_str = temp.lower().lstrip()
+        self.text = string_clean(sent)  # Cleaned text, padded with spaces
+        self.tokens = self.text.split()  # List of words
+        self.token_set = frozenset(self.tokens)  # Set of words
+        self.ngrams = {}  # Sets of phrases, keyed by the number of words in them
 
-    # Removing punctuation
+        for num in range(2, cls.MAX_GRAM + 1):
 
-    new_str = re.sub("[{}]".format("".join(string.punctuation)), "", new_str)
+            self.ngrams[num] = frozenset(' '.join(self.tokens[i:i + num]) for i in range(len(self.tokens) - num + 1))
 
-    # Adding space in front and behind string
+        return self
 
-    new_str = ' ' + new_str + ' '
+    def has_phrase(self, phrase):
 
-    return new_str
+        """
+        Determines if the given phrase is made of whole words in the utterance.
+
+        :param phrase: Lowercase phrase to search for, words separated by a single space
+        :type phrase: str
+        :return: True if present, False if not
+        :rtype: bool
+        """
+
+        num = phrase.count(' ') + 1
+
+        if num == 1:
+
+            return phrase in self.token_set
+
+        if num in self.ngrams:
+
+            return phrase in self.ngrams[num]
+
+        # Phrase is longer than our sets:
+
+        return (' ' + phrase + ' ') in self.text
 
 
 def key_search(sent, talk=False):
@@ -806,6 +837,12 @@ class Personalities:
         :param win: Output object, varies based on talk
         """
 
+        if isinstance(mesg, str):
+
+            # Parse the input, unless someone already did:
+
+            mesg = ParsedUtterance(mesg)
+
         self.log.debug("Sending text [{}] to personality [{}]".format(mesg, self.selected.name))
 
         self.selected.handel(mesg, talk, win)
@@ -0,0 +1,492 @@
+"""
+asyncio engine for the CHAS socket server.
+
+Instead of a selector thread, a write thread and a global write queue,
+we run a single asyncio event loop in a background thread.
+Each connection gets a reader task and a writer task,
+and each device has it's own bounded outbound queue, shared with the selector engine.
+
+Handlers can be coroutines, in which case they are awaited on the event loop.
+Regular handlers are offloaded to the thread pool executor,
+just like the selector engine does.
+
+The engine can be selected by setting 'net_engine' to 'asyncio' in the settings.
+"""
+
+import asyncio
+import inspect
+import threading
+import traceback
+
+from chaslib.socket_lib import BaseCHASocket, OutboundQueue
+from chaslib.socket_server import SocketServer
+
+
+class AsyncCHASocket(BaseCHASocket):
+
+    """
+    AsyncCHASocket - CHAS socket that is driven by asyncio streams.
+
+    Reading is done by the connection's reader task, which feeds us the bytes.
+    Writing puts the encoded message into our outbound queue,
+    which is drained by the connection's writer task.
+
+    We can be written to from any thread, and writing never blocks.
+    We use the same OutboundQueue as the selector engine,
+    so when a client falls behind the write policy of each message ID
+    determines what is dropped or coalesced.
+    After queueing a message, we wake up the writer task on the event loop.
+
+    :param loop: Event loop we are running on
+    :type loop: asyncio.AbstractEventLoop
+    :param writer: Stream writer of the connection
+    :type writer: asyncio.StreamWriter
+    :param addr: Address of the client
+    :type addr: tuple
+    :param log: Logger to use
+    :type log: logging.Logger
+    :param outbound: Queue of messages waiting to be written
+    :type outbound: OutboundQueue
+    """
+
+    def __init__(self, loop, writer, addr, log, outbound=None):
+
+        super().__init__(addr, log)
+
+        self.loop = loop  # Event loop we are running on
+        self.writer = writer  # Stream writer of the connection
+        self.outbound = outbound or OutboundQueue()  # Queue of messages waiting to be written
+        self.wakeup = asyncio.Event()  # Event set when there are messages to write
+        self.closed = False  # Value determining if we are closed
+
+    def _in_loop(self):
+
+        """
+        Determines if we are being called from our event loop.
+
+        :return: True if we are on the event loop thread
+        :rtype: bool
+        """
+
+        try:
+
+            return asyncio.get_running_loop() is self.loop
+
+        except RuntimeError:
+
+            # No loop running in this thread:
+
+            return False
+
+    def write(self, content, encoding='utf-8'):
+
+        """
+        Encodes the given content and adds it to our outbound queue.
+
+        :param content: Content to write, should contain 'id', 'uuid' and 'content'
+        :type content: dict
+        :param encoding: Encoding to use for JSON framing
+        :type encoding: str
+        """
+
+        self.queue_message(content['id'], self.encode(content, encoding=encoding))
+
+    def queue_message(self, id_num, message):
+
+        """
+        Adds an already encoded message to our outbound queue.
+
+        The write policy of the ID determines what happens if the queue is full.
+        We never block, no matter what thread we are called from.
+
+        :param id_num: ID of the message
+        :type id_num: int
+        :param message: Encoded message, created by 'encode()'
+        :type message: bytes
+        :return: True if the message was queued, False if it was dropped
+        :rtype: bool
+        """
+
+        if self.closed:
+
+            # We are closed, nothing to do:
+
+            return False
+
+        if not self.outbound.put(id_num, message):
+
+            self.log.debug("Outbound queue for [{}] is full! Dropping message...".format(self.addr))
+
+            return False
+
+        # Wake up the writer task:
+
+        if self._in_loop():
+
+            self.wakeup.set()
+
+            return True
+
+        try:
+
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+        except RuntimeError:
+
+            # Event loop is closed, message will never be written:
+
+            return False
+
+        return True
+
+    def stats(self):
+
+        """
+        Returns the write counters of this socket.
+
+        See 'OutboundQueue.stats()' for the counters.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return self.outbound.stats()
+
+    def fileno(self):
+
+        """
+        Returns the file descriptor of the connection.
+
+        :return: File descriptor, -1 if we have none
+        :rtype: int
+        """
+
+        sock = self.writer.get_extra_info('socket')
+
+        return -1 if sock is None else sock.fileno()
+
+    def close(self):
+
+        """
+        Closes the connection.
+
+        Can be called from any thread.
+        """
+
+        if self.closed:
+
+            return
+
+        self.closed = True
+
+        self.log.debug(f"Closing connection to: {self.addr}")
+
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+
+class AsyncSocketServer(SocketServer):
+
+    """
+    AsyncSocketServer - asyncio engine for the CHAS socket server.
+
+    We offer the same interface as SocketServer,
+    so the rest of CHAS does not care which engine is in use.
+
+    All networking is done on one event loop, running in our listen thread.
+    Each connection gets a reader task, that parses messages and dispatches them,
+    and a writer task, that drains the outbound queue of the connection.
+    Writers wait for the transport to drain before continuing,
+    so slow clients only slow down their own queue.
+    """
+
+    def __init__(self, chas, host, port):
+
+        super().__init__(chas, host, port)
+
+        self.loop = None  # Event loop we are running on
+        self.server = None  # asyncio server instance
+        self.connections = set()  # Sockets of all open connections
+
+        self._started = threading.Event()  # Event set once we are listening
+
+    def start(self):
+
+        # Function for starting the event loop thread
+
+        self.running = True
+
+        self.log.debug("Parsing and loading handlers...")
+
+        self.parse_handlers()
+
+        self.log.debug("Starting event loop thread...")
+
+        self.loop = asyncio.new_event_loop()
+
+        self.listen_thread = threading.Thread(target=self._run_loop)
+        self.listen_thread.daemon = True
+        self.listen_thread.start()
+
+        # Wait until we are listening, or the loop has failed:
+
+        self._started.wait()
+
+        return
+
+    def stop(self):
+
+        # Function for gracefully stopping the event loop thread
+
+        self.running = False
+
+        self.log.debug("Stopping event loop thread...")
+
+        if self.loop.is_running():
+
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+
+        self.listen_thread.join()
+
+        # Shutting down handel thread
+
+        self.log.debug("Stopping handler threads...")
+
+        for hand in self.handlers:
+
+            hand.stop()
+
+        self.pool.shutdown()
+
+    def write(self, data, uuid):
+
+        """
+        Adds data to the outbound queue of a device.
+
+        We never block, see 'AsyncCHASocket.queue_message()'.
+
+        :param data: Data to be sent
+        :param uuid: UUID of device to send data to
+        :return:
+        """
+
+        dev = self.devices.get_by_uuid(uuid)
+
+        if dev is None:
+
+            self.log.warning("Device [{}] not found! Dropping message...".format(uuid))
+
+            return
+
+        dev.sock.write(data)
+
+    def broadcast(self, data, devices=None):
+
+        """
+        Sends the given data to many devices, encoding it once per framing mode.
+
+        Like 'write()', we never block, so a stalled device does not hold up the others.
+
+        :param data: Data to be sent, the UUID is ignored by clients
+        :type data: dict
+        :param devices: Devices to send the data to, defaults to all devices
+        :type devices: iterable
+        """
+
+        encoded = {}  # Encoded messages keyed by framing mode
+
+        for dev in (self.devices if devices is None else devices):
+
+            message = encoded.get(dev.sock.framing)
+
+            if message is None:
+
+                message = encoded[dev.sock.framing] = dev.sock.encode(data)
+
+            dev.sock.queue_message(data['id'], message)
+
+    def _run_loop(self):
+
+        """
+        Runs the event loop, until we are stopped.
+        """
+
+        asyncio.set_event_loop(self.loop)
+
+        try:
+
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, self.host, self.port,
+                                     reuse_address=True, backlog=self.chas.settings.net_backlog)
+            )
+
+            self.log.debug(f"Listening on: {self.host}:{self.port}")
+
+        except Exception as e:
+
+            self.log.error("Unable to start listening: {}".format(e))
+
+            self._started.set()
+
+            return
+
+        self._started.set()
+
+        try:
+
+            self.loop.run_forever()
+
+        finally:
+
+            self.loop.close()
+
+    async def _shutdown(self):
+
+        """
+        Closes all connections and stops the event loop.
+        """
+
+        self.server.close()
+
+        for sock in list(self.connections):
+
+            sock.close()
+
+        await self.server.wait_closed()
+
+        self.loop.stop()
+
+    async def _handle_connection(self, reader, writer):
+
+        """
+        Reader task for a connection.
+
+        We read whatever is available, parse the messages,
+        and create a task for each message so slow handlers don't hold up reading.
+
+        :param reader: Stream reader of the connection
+        :type reader: asyncio.StreamReader
+        :param writer: Stream writer of the connection
+        :type writer: asyncio.StreamWriter
+        """
+
+        addr = writer.get_extra_info('peername')
+
+        self.log.debug(f"Accepted connection from: {addr}")
+
+        outbound = OutboundQueue(self.chas.settings.net_out_buffer, self.chas.settings.net_write_policy)
+        sock = AsyncCHASocket(self.loop, writer, addr, self.log, outbound=outbound)
+
+        self.connections.add(sock)
+
+        write_task = self.loop.create_task(self._writer(sock))
+
+        try:
+
+            while self.running:
+
+                data = await reader.read(sock.RECV_SIZE)
+
+                if not data:
+
+                    # Remote end closed the connection:
+
+                    break
+
+                for mesg in sock.feed(data):
+
+                    self.loop.create_task(self._dispatch(sock, mesg))
+
+        except Exception as e:
+
+            self.log.error("Error during connection event loop: {}".format(e))
+
+            self.log.debug("Traceback: \n{}".format(traceback.format_exc()))
+
+        finally:
+
+            write_task.cancel()
+
+            sock.close()
+
+            self.connections.discard(sock)
+
+            self._unregister(sock)
+
+    async def _writer(self, sock):
+
+        """
+        Writer task for a connection.
+
+        We wait until we are woken up, write everything in the outbound queue,
+        and then wait for the transport to drain.
+        Messages queued while we are draining are subject to the write policy.
+
+        :param sock: Socket to write for
+        :type sock: AsyncCHASocket
+        """
+
+        try:
+
+            while True:
+
+                await sock.wakeup.wait()
+
+                sock.wakeup.clear()
+
+                # Write everything that is waiting before draining:
+
+                entries = sock.outbound.take()
+
+                if not entries:
+
+                    continue
+
+                sock.writer.writelines([entry[1] for entry in entries])
+
+                await sock.writer.drain()
+
+                sock.outbound.done(entries)
+
+        except Exception as e:
+
+            self.log.error("Error while writing to [{}]: {}".format(sock.addr, e))
+
+            sock.close()
+
+    async def _dispatch(self, sock, data):
+
+        """
+        Finds a suitable handler for the given message and runs it.
+
+        Coroutine handlers are awaited on the event loop,
+        regular handlers are offloaded to the thread pool executor.
+
+        :param sock: Socket the message was received on
+        :type sock: AsyncCHASocket
+        :param data: Decoded message
+        :type data: dict
+        """
+
+        try:
+
+            resolved = self._resolve_handler(sock, data)
+
+            if resolved is None:
+
+                # Packet was dropped:
+
+                return
+
+            hand, target, content = resolved
+
+            if inspect.iscoroutinefunction(hand.handel_server):
+
+                await hand.handel_server(target, content)
+
+                return
+
+            await asyncio.wrap_future(self.pool.submit(hand.handel_server, target, content))
+
+        except Exception as e:
+
+            self.log.warning("Error occurred during handler: {}".format(e))
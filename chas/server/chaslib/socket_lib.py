@@ -1,106 +1,534 @@
-import io
 import json
 import struct
 import sys
 import socket
+import threading
+import time
+
+from collections import deque
 
 """
 A CHAS implementation of the Python Socket.
 The CHAS socket handles all low-level read/write operations,
 And includes support for CHAS device objects.
+
+We support two framing modes:
+
+    - JSON - Proto-header, JSON header, JSON content. Always understood, used as the fallback
+    - Binary - Fixed struct header (marker, length, id, flags, codec), then the content
+
+Binary frames start with a marker that can never be a valid JSON proto-header,
+so we can always tell the two apart when reading.
+The framing mode only determines what we WRITE,
+and it is agreed upon during the authentication exchange(id 1).
 """
 
+FRAMING_JSON = 'json'  # JSON framing, always supported
+FRAMING_BINARY = 'binary'  # Compact binary framing
 
-class CHASocket:
+BINARY_MARKER = 0xFFFF  # Proto-header value that marks a binary frame
+BINARY_HEADER = struct.Struct('>HIBBB')  # Marker, content length, id, flags, codec
+BINARY_BODY_HEADER = struct.Struct('>IBBB')  # Binary header without the marker
 
-    def __init__(self, selector, sock, addr, log):
+CODEC_JSON = 0  # Content is JSON encoded
+CODEC_RAW = 1  # Content is raw bytes
+
+POLICY_KEEP = 'keep'  # Never drop messages with this ID
+POLICY_DROP = 'drop'  # Drop the oldest queued messages with this ID when the buffer is full
+POLICY_COALESCE = 'coalesce'  # Only keep the newest queued message with this ID
+
+
+def negotiate_framing(offered, supported):
+
+    """
+    Determines the framing mode to use, given the modes offered by the remote end.
+
+    We pick the first offered mode that we support.
+    If nothing matches, or nothing was offered, then we fall back to JSON framing.
+
+    :param offered: Framing modes offered by the remote end, in order of preference
+    :type offered: list
+    :param supported: Framing modes we support
+    :type supported: list
+    :return: Framing mode to use
+    :rtype: str
+    """
+
+    for mode in (offered or ()):
+
+        if mode in supported:
+
+            # Found a mode we both understand:
+
+            return mode
+
+    return FRAMING_JSON
+
+
+class OutboundQueue:
+
+    """
+    OutboundQueue - Bounded buffer of encoded messages waiting to be written to a socket.
+
+    Messages are added from any thread without blocking, and written out by the selector thread
+    when the socket is writable, or by the writer task of the asyncio engine,
+    so a slow client never holds up anyone else.
+
+    Each message ID can have a policy that determines what happens when the buffer is full:
+
+        - keep - Message is always queued, even if we go over the limit
+        - drop - Oldest queued messages with the same ID are dropped to make room,
+          if that is not enough then the new message is dropped
+        - coalesce - Queued messages with the same ID are replaced by the new message
+
+    IDs without a policy use 'keep'.
+
+    We also keep some counters, such as the number of queued bytes,
+    the number of dropped messages, and the time it takes for messages to be written.
+
+    :param max_bytes: Maximum number of bytes to queue
+    :type max_bytes: int
+    :param policies: Dictionary mapping message IDs to policies
+    :type policies: dict
+    """
+
+    def __init__(self, max_bytes=256000, policies=None):
+
+        self.max_bytes = max_bytes  # Maximum number of bytes to queue
+        self.policies = policies or {}  # Policies for each message ID
+
+        self._queue = deque()  # Queued messages, [id, message, time queued]
+        self._offset = 0  # Number of bytes of the first message that have already been written
+        self._lock = threading.Lock()  # Lock protecting the queue
+
+        self.queued_bytes = 0  # Number of bytes currently queued
+        self.dropped = 0  # Number of messages dropped
+        self.sent = 0  # Number of messages written
+        self.sent_bytes = 0  # Number of bytes written
+        self.latency = 0.0  # Time it took to write the last message
+        self.max_latency = 0.0  # Longest time it took to write a message
+        self._total_latency = 0.0  # Total time spent writing messages, used for the average
+
+    def put(self, id_num, message):
+
+        """
+        Adds the given message to the queue, applying the policy of it's ID.
+
+        :param id_num: ID of the message
+        :type id_num: int
+        :param message: Encoded message
+        :type message: bytes
+        :return: True if the message was queued, False if it was dropped
+        :rtype: bool
+        """
+
+        policy = self.policies.get(id_num, POLICY_KEEP)
+
+        with self._lock:
+
+            if policy == POLICY_COALESCE:
+
+                # Remove all queued messages with this ID:
+
+                self._remove(id_num, len(self._queue))
+
+            elif policy == POLICY_DROP and self.queued_bytes + len(message) > self.max_bytes:
+
+                # Drop stale messages with this ID until we have room:
+
+                self._remove(id_num, len(self._queue), needed=len(message))
+
+                if self.queued_bytes + len(message) > self.max_bytes:
+
+                    # Still no room, drop this message:
+
+                    self.dropped += 1
+
+                    return False
+
+            self._queue.append([id_num, message, time.perf_counter()])
+
+            self.queued_bytes += len(message)
+
+        return True
+
+    def _remove(self, id_num, num, needed=None):
+
+        """
+        Removes queued messages with the given ID, oldest first.
+
+        The first message is never removed if it has been partially written.
+        We assume the lock is held!
+
+        :param id_num: ID of the messages to remove
+        :type id_num: int
+        :param num: Maximum number of messages to look at
+        :type num: int
+        :param needed: If given, stop once there is room for this many bytes
+        :type needed: int
+        """
+
+        keep = deque()
+
+        for index in range(num):
+
+            entry = self._queue[index]
+
+            if entry[0] == id_num and not (index == 0 and self._offset) and \
+                    (needed is None or self.queued_bytes + needed > self.max_bytes):
+
+                # Remove this message:
+
+                self.queued_bytes -= len(entry[1])
+                self.dropped += 1
+
+                continue
+
+            keep.append(entry)
+
+        self._queue = keep
+
+    def send(self, sock):
+
+        """
+        Writes as much of the queue as the socket will take without blocking.
+
+        This should only be called by the thread that owns the socket,
+        usually when the selector reports that the socket is writable.
+
+        :param sock: Non-blocking socket to write to
+        :type sock: socket.socket
+        :return: True if the queue is now empty
+        :rtype: bool
+        """
+
+        with self._lock:
+
+            while self._queue:
+
+                entry = self._queue[0]
+
+                try:
+
+                    num = sock.send(memoryview(entry[1])[self._offset:])
+
+                except (BlockingIOError, InterruptedError):
+
+                    # Socket buffer is full, continue when we are writable again:
+
+                    return False
+
+                self._offset += num
+                self.queued_bytes -= num
+                self.sent_bytes += num
+
+                if self._offset < len(entry[1]):
+
+                    # Partial write, socket buffer is full:
+
+                    return False
+
+                # Message has been fully written:
+
+                self._queue.popleft()
+
+                self._offset = 0
+                self.sent += 1
+
+                self.latency = time.perf_counter() - entry[2]
+                self.max_latency = max(self.max_latency, self.latency)
+                self._total_latency += self.latency
+
+            return True
+
+    def take(self):
+
+        """
+        Removes and returns all queued messages.
+
+        This is used by writers that hand whole messages to a transport,
+        such as the asyncio engine, instead of writing to a socket with 'send()'.
+        Once the messages have been written, they should be passed to 'done()'
+        so our counters are updated.
+
+        :return: Queued messages, [id, message, time queued]
+        :rtype: collections.deque
+        """
+
+        with self._lock:
+
+            entries = self._queue
+
+            self._queue = deque()
+            self._offset = 0
+            self.queued_bytes = 0
+
+        return entries
+
+    def done(self, entries):
+
+        """
+        Updates our counters with messages that have been written.
+
+        :param entries: Messages returned by 'take()'
+        :type entries: collections.deque
+        """
+
+        now = time.perf_counter()
+
+        with self._lock:
+
+            for entry in entries:
+
+                self.sent += 1
+                self.sent_bytes += len(entry[1])
+
+                self.latency = now - entry[2]
+                self.max_latency = max(self.max_latency, self.latency)
+                self._total_latency += self.latency
+
+    def empty(self):
+
+        """
+        Determines if the queue is empty.
+
+        :return: True if there is nothing to write
+        :rtype: bool
+        """
+
+        return not self._queue
+
+    def stats(self):
+
+        """
+        Returns the counters of this queue.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {'queued-messages': len(self._queue),
+                'queued-bytes': self.queued_bytes,
+                'dropped': self.dropped,
+                'sent': self.sent,
+                'sent-bytes': self.sent_bytes,
+                'latency': self.latency,
+                'max-latency': self.max_latency,
+                'avg-latency': self._total_latency / self.sent if self.sent else 0.0}
+
+
+class BaseCHASocket:
+
+    """
+    BaseCHASocket - Framing and device binding shared by all CHAS sockets.
+
+    We handle encoding messages, and parsing messages out of our receive buffer,
+    for both the JSON and binary framing modes.
+    We don't care how the bytes are read or written,
+    that is up to the child class.
+    """
+
+    RECV_SIZE = 65536  # Maximum number of bytes to receive per read
+
+    def __init__(self, addr, log):
 
-        self.sel = selector  # Selector object
-        self.sock = sock  # Socket object
         self.addr = addr  # Address of client
         self._jsonheader_len = None  # Length of JSON header
         self._jsonheader = None  # Decoded JSON header
+        self._binheader = None  # Decoded binary header
+        self.framing = FRAMING_JSON  # Framing mode to use when writing
         self.content = None  # Decoded content of the response
         self.__dev = None  # UUID of device socket is binded to, allows for high level CHAS socket management
 
+        self._recv_buffer = bytearray()  # Buffer of received bytes that have not been parsed
+        self._recv_pos = 0  # Position of the first unparsed byte in the receive buffer
+
         self.log = log
 
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 32000)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 32000)
-        self.sock.settimeout(5)
+    def _available(self):
+
+        """
+        Returns the number of unparsed bytes in the receive buffer.
+
+        :return: Number of bytes available
+        :rtype: int
+        """
+
+        return len(self._recv_buffer) - self._recv_pos
+
+    def _consume(self, byts):
+
+        """
+        Consumes the given number of bytes from the receive buffer.
+
+        We slice through a memoryview, so the data is only copied once.
+        The caller MUST ensure that this many bytes are available!
+
+        :param byts: Number of bytes to consume
+        :type byts: int
+        :return: Consumed bytes
+        :rtype: bytes
+        """
+
+        start = self._recv_pos
+
+        self._recv_pos = start + byts
+
+        with memoryview(self._recv_buffer) as view:
+
+            return bytes(view[start:self._recv_pos])
+
+    def _compact(self):
+
+        """
+        Removes parsed bytes from the front of the receive buffer.
+
+        We only do this once per read,
+        so the cost of shifting the buffer is amortized over all messages parsed.
+        """
+
+        if self._recv_pos:
+
+            del self._recv_buffer[:self._recv_pos]
+
+            self._recv_pos = 0
 
-    def _read(self, byts):
+    def _parse_messages(self):
 
-        # Read a specified amount of bytes
+        """
+        Parses as many complete messages as possible from the receive buffer.
 
-        data = b''
-        orig = int(byts)
+        We keep track of our progress through the proto-header, JSON header and body,
+        so a message that arrives in pieces is picked up where we left off.
+
+        :return: List of decoded messages, may be empty
+        :rtype: list
+        """
+
+        messages = []
 
         while True:
 
-            try:
+            if self._jsonheader_len is None and not self._process_proto_header():
 
-                data = data + self.sock.recv(byts)
+                # Not enough data for the proto-header:
 
-            except BlockingIOError:
+                break
 
-                # Resource temporarily unavailable!
+            if self._jsonheader_len == BINARY_MARKER:
 
-                self.log.info("Socket temporarily unavailable!")
+                # Working with a binary frame:
 
-            finally:
+                if self._binheader is None and not self._process_binheader():
 
-                # Check how many bytes we have read - Prevents Socket Drift:
+                    # Not enough data for the binary header:
 
-                byts = orig - len(data)
+                    break
 
-                if len(data) == orig:
+                if not self._process_binary():
 
-                    # We are done lets break:
+                    # Not enough data for the body:
 
                     break
 
-        return data
+            else:
 
-    def read(self):
+                if self._jsonheader is None and not self._process_jsonheader():
 
-        if self._jsonheader_len is None:
+                    # Not enough data for the JSON header:
 
-            self._process_proto_header()
+                    break
 
-        if self._jsonheader_len is not None:
+                if not self._process_request():
 
-            if self._jsonheader is None:
+                    # Not enough data for the body:
 
-                self._process_jsonheader()
+                    break
 
-        if self._jsonheader:
+            if self.content is not None:
 
-            if self.content is None:
+                # Only keep content that decoded correctly:
 
-                return self._process_request()
+                messages.append(self.content)
 
-        self._read(50)
+            self.content = None
 
-        return None
+        # Remove the parsed data from the buffer:
 
-    def _write(self, content_bytes):
+        self._compact()
 
-        # Write data to the stream
+        return messages
 
-        self.sock.sendall(content_bytes)
+    def encode(self, content, encoding='utf-8'):
 
-        return
+        """
+        Encodes the given content into a message, using our framing mode.
 
-    def write(self, content, encoding='utf-8'):
+        We only use binary framing if the ID fits into the binary header,
+        otherwise we fall back to JSON framing.
+        If the inner content is bytes, then it is sent as is without any JSON encoding.
 
-        # Encoding data and sending data
+        :param content: Content to encode, should contain 'id', 'uuid' and 'content'
+        :type content: dict
+        :param encoding: Encoding to use for JSON framing
+        :type encoding: str
+        :return: Encoded message, ready to be written
+        :rtype: bytes
+        """
+
+        if self.framing == FRAMING_BINARY and 0 <= content['id'] <= 255:
+
+            # Create a binary frame:
+
+            inner = content['content']
+
+            if isinstance(inner, (bytes, bytearray, memoryview)):
+
+                # Send the bytes as is:
+
+                return self._create_binary_message(inner, content['id'], CODEC_RAW)
 
-        encoded = self._json_encode(content)
+            return self._create_binary_message(self._json_encode(inner), content['id'], CODEC_JSON)
 
-        message = self._create_message(encoded, 'text', encoding)
+        encoded = self._json_encode(content, encoding=encoding)
 
-        self._write(message)
+        return self._create_message(encoded, 'text', encoding)
+
+    def set_framing(self, framing):
+
+        """
+        Sets the framing mode to use when writing.
+
+        We can always read both framing modes,
+        so this can be changed at any time without confusing the remote end,
+        as long as the remote end understands the framing mode.
+
+        :param framing: Framing mode to use
+        :type framing: str
+        """
+
+        if framing not in (FRAMING_JSON, FRAMING_BINARY):
+
+            raise ValueError("Invalid framing mode: {}".format(framing))
+
+        self.framing = framing
+
+    def feed(self, data):
+
+        """
+        Adds the given bytes to the receive buffer, and returns all complete messages.
+
+        Useful if something else is doing the reading for us.
+
+        :param data: Bytes to add
+        :type data: bytes
+        :return: List of decoded messages, may be empty
+        :rtype: list
+        """
+
+        self._recv_buffer += data
+
+        return self._parse_messages()
 
     def _json_encode(self, mesg, encoding="utf-8"):
 
@@ -114,14 +542,7 @@ class CHASocket:
 
         try:
 
-            tiow = io.TextIOWrapper(
-                io.BytesIO(json_bytes), encoding=encoding, newline=""
-            )
-
-            obj = json.load(tiow)
-            tiow.close()
-
-            return obj
+            return json.loads(json_bytes.decode(encoding))
 
         except Exception as e:
 
@@ -129,61 +550,157 @@ class CHASocket:
 
     def _process_proto_header(self):
 
-        # Method for processing proto header
+        """
+        Processes the proto-header, which contains the length of the JSON header.
+
+        :return: True if the proto-header was processed, False if we need more data
+        :rtype: bool
+        """
 
         hdrlen = 2
 
-        content = self._read(2)
+        if self._available() < hdrlen:
 
-        if len(content) == hdrlen:
+            return False
 
-            self._jsonheader_len = struct.unpack(
-                ">H", content
-            )[0]
+        self._jsonheader_len = struct.unpack(
+            ">H", self._consume(hdrlen)
+        )[0]
 
-            return
+        return True
 
     def _process_jsonheader(self):
 
+        """
+        Processes the JSON header, which describes the content.
+
+        :return: True if the JSON header was processed, False if we need more data
+        :rtype: bool
+        """
+
         hdrlen = self._jsonheader_len
 
-        content = self._read(hdrlen)
+        if self._available() < hdrlen:
 
-        if len(content) == hdrlen:
+            return False
 
-            self._jsonheader = self._json_decode(
-                content, encoding="utf-8"
-            )
+        self._jsonheader = self._json_decode(
+            self._consume(hdrlen), encoding="utf-8"
+        )
 
-            for reqhd in (
-                "byteorder",
-                "content-length",
-                "content-type",
-                "content-encoding",
-            ):
+        for reqhd in (
+            "byteorder",
+            "content-length",
+            "content-type",
+            "content-encoding",
+        ):
 
-                if reqhd not in self._jsonheader:
+            if reqhd not in self._jsonheader:
 
-                    raise Exception("Malformed JSON Header!")
+                raise Exception("Malformed JSON Header!")
 
-        return
+        return True
 
     def _process_request(self):
 
-        # Method for processing the request
+        """
+        Processes the content of the message.
+
+        The decoded content is stored under 'content'.
+
+        :return: True if the content was processed, False if we need more data
+        :rtype: bool
+        """
 
         content_len = self._jsonheader["content-length"]
 
-        contents = self._read(content_len)
+        if self._available() < content_len:
+
+            return False
 
         encoding = self._jsonheader["content-encoding"]
 
-        content = self._json_decode(contents, encoding=encoding)
+        self.content = self._json_decode(self._consume(content_len), encoding=encoding)
 
         self._jsonheader = None
         self._jsonheader_len = None
 
-        return content
+        return True
+
+    def _process_binheader(self):
+
+        """
+        Processes the rest of a binary header.
+
+        The marker has already been consumed as the proto-header.
+
+        :return: True if the binary header was processed, False if we need more data
+        :rtype: bool
+        """
+
+        hdrlen = BINARY_BODY_HEADER.size
+
+        if self._available() < hdrlen:
+
+            return False
+
+        self._binheader = BINARY_BODY_HEADER.unpack(self._consume(hdrlen))
+
+        return True
+
+    def _process_binary(self):
+
+        """
+        Processes the content of a binary frame.
+
+        Binary frames do not carry a UUID, as the socket is already bound to a device.
+        We add our bound UUID to the content, so handlers can treat it like any other message.
+
+        :return: True if the content was processed, False if we need more data
+        :rtype: bool
+        """
+
+        content_len, id_num, flags, codec = self._binheader
+
+        if self._available() < content_len:
+
+            return False
+
+        body = self._consume(content_len)
+
+        if codec == CODEC_JSON:
+
+            body = self._json_decode(body)
+
+        elif codec != CODEC_RAW:
+
+            raise Exception("Unknown binary codec: {}".format(codec))
+
+        self.content = {'id': id_num, 'uuid': self.__dev, 'content': body}
+
+        self._binheader = None
+        self._jsonheader_len = None
+
+        return True
+
+    def _create_binary_message(self, content_bytes, id_num, codec, flags=0):
+
+        """
+        Creates a binary frame with the given content.
+
+        :param content_bytes: Encoded content
+        :type content_bytes: bytes
+        :param id_num: ID of the message
+        :type id_num: int
+        :param codec: Codec of the content
+        :type codec: int
+        :param flags: Flags for this frame, reserved for future use
+        :type flags: int
+        :return: Binary frame
+        :rtype: bytes
+        """
+
+        return BINARY_HEADER.pack(BINARY_MARKER, len(content_bytes), id_num, flags, codec) + content_bytes
 
     def _create_message(self, content_bytes, content_type, content_encoding):
 
@@ -223,6 +740,241 @@ class CHASocket:
         
         return
 
+    def write(self, content, encoding='utf-8'):
+
+        """
+        Encodes and writes the given content to the remote end.
+
+        :param content: Content to write, should contain 'id', 'uuid' and 'content'
+        :type content: dict
+        :param encoding: Encoding to use for JSON framing
+        :type encoding: str
+        """
+
+        raise NotImplementedError("Should be implemented in child class!")
+
+    def queue_message(self, id_num, message):
+
+        """
+        Adds an already encoded message to our outbound queue.
+
+        This allows one encoded message to be shared between many sockets,
+        as long as they use the same framing mode.
+
+        :param id_num: ID of the message
+        :type id_num: int
+        :param message: Encoded message, created by 'encode()'
+        :type message: bytes
+        :return: True if the message was queued, False if it was dropped
+        :rtype: bool
+        """
+
+        raise NotImplementedError("Should be implemented in child class!")
+
+    def close(self):
+
+        """
+        Closes the connection to the remote end.
+        """
+
+        raise NotImplementedError("Should be implemented in child class!")
+
+    def stats(self):
+
+        """
+        Returns the write counters of this socket.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {}
+
+    def fileno(self):
+
+        """
+        Returns the file descriptor of the underlying socket.
+
+        :return: File descriptor, -1 if we have none
+        :rtype: int
+        """
+
+        return -1
+
+
+class CHASocket(BaseCHASocket):
+
+    """
+    CHASocket - CHAS socket that reads and writes to a python socket.
+
+    Reads are driven by a selector, so we only read what is available.
+
+    Writes can either be sent right away with 'write()',
+    or queued with 'queue_write()' and sent by the selector thread with 'flush()'
+    when the socket is writable.
+    The socket server uses the latter, so a slow client never blocks anyone else.
+
+    :param selector: Selector the socket is registered with
+    :type selector: selectors.BaseSelector
+    :param sock: Socket to read and write to
+    :type sock: socket.socket
+    :param addr: Address of the remote end
+    :type addr: tuple
+    :param log: Logger to use
+    :type log: logging.Logger
+    :param outbound: Outbound queue to use for queued writes
+    :type outbound: OutboundQueue
+    """
+
+    def __init__(self, selector, sock, addr, log, outbound=None):
+
+        super().__init__(addr, log)
+
+        self.sel = selector  # Selector object
+        self.sock = sock  # Socket object
+        self.outbound = outbound or OutboundQueue()  # Queue of messages waiting to be written
+
+        self._recv_view = memoryview(bytearray(self.RECV_SIZE))  # Scratch buffer to receive data into
+
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 32000)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 32000)
+        self.sock.settimeout(5)
+
+    def _fill_buffer(self):
+
+        """
+        Reads whatever is currently available on the socket into our receive buffer.
+
+        We only call 'recv_into()' once, as we are invoked when the selector reports
+        that the socket is readable, so this call will never block the event loop.
+        If more data is waiting, then the selector will simply report us again.
+
+        :raise: ConnectionResetError: If the remote end closed the connection
+        """
+
+        try:
+
+            # Read into our scratch buffer:
+
+            num = self.sock.recv_into(self._recv_view)
+
+        except (BlockingIOError, InterruptedError):
+
+            # Resource temporarily unavailable, try again on the next event:
+
+            return
+
+        if num == 0:
+
+            # Remote end closed the connection:
+
+            raise ConnectionResetError("Connection closed by remote host!")
+
+        # Append the data to our receive buffer:
+
+        self._recv_buffer += self._recv_view[:num]
+
+    def read(self):
+
+        """
+        Reads available data from the socket and returns all complete messages.
+
+        This should be called when the selector reports that the socket is readable.
+        We never block waiting for a full message,
+        partial messages are kept in our receive buffer until the rest arrives.
+
+        :return: List of decoded messages, may be empty
+        :rtype: list
+        """
+
+        self._fill_buffer()
+
+        return self._parse_messages()
+
+    def _write(self, content_bytes):
+
+        # Write data to the stream
+
+        self.sock.sendall(content_bytes)
+
+        return
+
+    def write(self, content, encoding='utf-8'):
+
+        # Encoding data and sending data
+
+        self._write(self.encode(content, encoding=encoding))
+
+    def queue_write(self, content, encoding='utf-8'):
+
+        """
+        Encodes the given content and adds it to our outbound queue.
+
+        The message will be written when 'flush()' is called.
+        This can be called from any thread.
+
+        :param content: Content to write, should contain 'id', 'uuid' and 'content'
+        :type content: dict
+        :param encoding: Encoding to use for JSON framing
+        :type encoding: str
+        :return: True if the message was queued, False if it was dropped
+        :rtype: bool
+        """
+
+        return self.queue_message(content['id'], self.encode(content, encoding=encoding))
+
+    def queue_message(self, id_num, message):
+
+        """
+        Adds an already encoded message to our outbound queue.
+
+        The message will be written when 'flush()' is called.
+
+        :param id_num: ID of the message
+        :type id_num: int
+        :param message: Encoded message, created by 'encode()'
+        :type message: bytes
+        :return: True if the message was queued, False if it was dropped
+        :rtype: bool
+        """
+
+        return self.outbound.put(id_num, message)
+
+    def flush(self):
+
+        """
+        Writes as much of our outbound queue as possible without blocking.
+
+        The socket MUST be non-blocking!
+
+        :return: True if everything has been written
+        :rtype: bool
+        """
+
+        return self.outbound.send(self.sock)
+
+    def stats(self):
+
+        """
+        Returns the write counters of this socket.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return self.outbound.stats()
+
+    def fileno(self):
+
+        """
+        Returns the file descriptor of our socket.
+
+        :return: File descriptor, -1 if we are closed
+        :rtype: int
+        """
+
+        return -1 if self.sock is None else self.sock.fileno()
+
     def close(self):
 
         # Method for closing the websocket
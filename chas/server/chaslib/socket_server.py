@@ -1,12 +1,13 @@
+import asyncio
 import selectors
 import socket
 import threading
 import pkgutil
 import inspect
-import queue
 import traceback
 
-from chaslib.socket_lib import CHASocket
+from chaslib.socket_lib import CHASocket, OutboundQueue
+from chaslib.sound.netcodec import available_codecs
 from chaslib.misctools import CHASThreadPoolExecutor, get_logger
 
 # Packet is as follows:
@@ -26,24 +27,30 @@ class SocketServer:
     def __init__(self, chas, host, port):
 
         self.chas = chas  # Instance of the CHAS masterclass
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # Listening socket
+        self.sock = None  # Listening socket, created when we start
         self.sel = selectors.DefaultSelector()  # Selector object
         self.host = host  # Hostname of our SS
         self.port = port  # Port of our SS
         self.listen_thread = None  # Reference to the SS listener thread
-        self.write_thread = None  # Reference to the SS writer thread
         self.devices = self.chas.devices  # CHAS Device instance
         self.running = False  # Value determining if the ss is running
         self.handlers = []  # List containing handler info
-        self.write_queue = queue.Queue()  # Write Queue object
         self.pool = CHASThreadPoolExecutor()  # Thread pool executor instance - For running handler code
 
+        self._wake_read = None  # Socket the listener thread is woken up on
+        self._wake_write = None  # Socket used to wake up the listener thread
+        self._pending = set()  # Sockets with newly queued writes
+        self._pending_lock = threading.Lock()  # Lock protecting pending sockets
+        self._woken = False  # Value determining if a wake up is already on it's way
+
         self.log = get_logger("CORE:NET")
 
     def _start_socket(self):
 
         # Starting a listening socket for accepting new connections
 
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64000)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64000)
@@ -56,6 +63,15 @@ class SocketServer:
         self.sock.setblocking(False)
         self.sel.register(self.sock, selectors.EVENT_READ, data=None)
 
+        # Socket pair for waking up the listener when writes are queued:
+
+        self._wake_read, self._wake_write = socket.socketpair()
+
+        self._wake_read.setblocking(False)
+        self._wake_write.setblocking(False)
+
+        self.sel.register(self._wake_read, selectors.EVENT_READ, data=self._wake_read)
+
     def _accept_connection(self, sock):
 
         # Creating socket and registering it with the selector:
@@ -64,8 +80,12 @@ class SocketServer:
 
         self.log.debug(f"Accepted connection from: {addr}")
 
+        outbound = OutboundQueue(self.chas.settings.net_out_buffer, self.chas.settings.net_write_policy)
+        message = CHASocket(self.sel, conn, addr, self.log, outbound=outbound)
+
+        # Writes are driven by the selector, so the socket must never block:
+
         conn.setblocking(False)
-        message = CHASocket(self.sel, conn, addr, self.log)
         self.sel.register(conn, selectors.EVENT_READ, data=message)
 
     def _ss_listener(self):
@@ -84,6 +104,12 @@ class SocketServer:
 
                     self._accept_connection(key.fileobj)
 
+                elif key.data is self._wake_read:
+
+                    # Writes have been queued, lets watch the sockets for writability:
+
+                    self._process_wake()
+
                 else:
 
                     message = key.data
@@ -92,73 +118,199 @@ class SocketServer:
 
                         if mask & selectors.EVENT_READ:
 
-                            # Reading data from socket...
+                            # Reading all complete messages from socket...
 
-                            data = message.read()
+                            for data in message.read():
 
-                            # Starting task in ThreadPoolExecutor to handel request...
+                                # Starting task in ThreadPoolExecutor to handel request...
 
-                            payload = {'sock': message, 'data': data}
+                                payload = {'sock': message, 'data': data}
 
-                            self.pool.submit(self.handler, payload)
+                                self.pool.submit(self.handler, payload)
 
-                            continue
+                        if mask & selectors.EVENT_WRITE and message.sock is not None and message.flush():
+
+                            # Everything has been written, stop watching for writability:
+
+                            self.sel.modify(message.sock, selectors.EVENT_READ, data=message)
 
                     except Exception as e:
 
                         self.log.error("Error during socket event loop: {}".format(e))
 
                         self.log.debug("Traceback: \n{}".format(traceback.format_exc()))
-                        message.close()
 
-    def _ss_write(self):
+                        self._close(message)
+
+        # Closing the wake up sockets:
+
+        self._wake_read.close()
+        self._wake_write.close()
+
+    def _process_wake(self):
 
         """
-        Socket Server writing thread
+        Handles a wake up of the listener thread.
+
+        We watch every socket with newly queued writes for writability,
+        so the writes happen as soon as the socket can take them.
         """
 
-        while self.running:
+        # Drain the wake up socket:
+
+        try:
+
+            while self._wake_read.recv(4096):
+
+                pass
+
+        except (BlockingIOError, InterruptedError):
+
+            pass
+
+        with self._pending_lock:
+
+            pending = self._pending
+            self._pending = set()
+            self._woken = False
+
+        for message in pending:
 
-            # Pull a request from the queue:
+            if message.sock is None:
 
-            data = self.write_queue.get()
+                # Socket has been closed in the meantime:
 
-            # Checking if data is "None"
+                continue
 
-            if data is None:
+            self.sel.modify(message.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, data=message)
 
-                # Socket server is done writing
+    def _wake(self, message=None):
+
+        """
+        Wakes up the listener thread.
+
+        If a socket is given, then the listener will start watching it for writability.
+        This can be called from any thread.
+
+        :param message: Socket with newly queued writes
+        :type message: CHASocket
+        """
+
+        with self._pending_lock:
+
+            if message is not None:
+
+                self._pending.add(message)
+
+            if self._woken or self._wake_write is None:
+
+                # Wake up already on it's way, or we are not started:
 
                 return
 
-            # Get necessary data:
+            self._woken = True
+
+        try:
 
-            uuid = data['uuid']
-            data = data['data']
+            self._wake_write.send(b'\0')
 
-            # Getting device from Devices
+        except OSError:
 
-            dev = self.chas.devices.get_by_uuid(uuid)
+            # Wake up socket is full or closed, the listener will wake up anyway
 
-            # Writing data to device
+            pass
 
-            dev.sock.write(data)
+    def _close(self, message):
+
+        """
+        Closes the given socket, and unregisters the device bound to it.
+
+        :param message: Socket to close
+        :type message: BaseCHASocket
+        """
+
+        message.close()
+
+        self._unregister(message)
+
+    def _unregister(self, sock):
+
+        """
+        Unregisters the device bound to the given socket, if any.
+
+        :param sock: Socket that has been closed
+        :type sock: BaseCHASocket
+        """
+
+        if sock.device_uuid is not None:
+
+            self.devices.unregister_by_uuid(sock.device_uuid)
 
     def write(self, data, uuid):
 
         """
-        Add data to the write queue to be written
+        Adds data to the outbound queue of a device.
+
+        The data is written by the listener thread once the socket is writable,
+        so we never block, even if the device is slow.
+        Depending on the write policy of the message ID,
+        the message or older messages could be dropped if the device is falling behind.
+
         :param data: Data to be sent
         :param uuid: UUID of device to send data to
         :return:
         """
 
-        self.write_queue.put({"uuid": uuid,
-                              "data": data})
+        dev = self.devices.get_by_uuid(uuid)
+
+        if dev is None or dev.sock.sock is None:
+
+            self.log.warning("Device [{}] not found! Dropping message...".format(uuid))
+
+            return
+
+        dev.sock.queue_write(data)
+
+        self._wake(dev.sock)
+
+    def broadcast(self, data, devices=None):
+
+        """
+        Sends the given data to many devices.
+
+        The data is encoded once per framing mode,
+        and the encoded message is shared between the outbound queues of the devices.
+        This is much cheaper than calling 'write()' for each device.
+
+        :param data: Data to be sent, the UUID is ignored by clients
+        :type data: dict
+        :param devices: Devices to send the data to, defaults to all devices
+        :type devices: iterable
+        """
+
+        encoded = {}  # Encoded messages keyed by framing mode
+
+        for dev in (self.devices if devices is None else devices):
+
+            if dev.sock.sock is None:
+
+                # Device is closed, skip it:
+
+                continue
+
+            message = encoded.get(dev.sock.framing)
+
+            if message is None:
+
+                message = encoded[dev.sock.framing] = dev.sock.encode(data)
+
+            dev.sock.queue_message(data['id'], message)
+
+            self._wake(dev.sock)
 
     def start(self):
 
-        # Function for starting the ss listener thread and ss write thread.
+        # Function for starting the ss listener thread
 
         self.running = True
 
@@ -174,14 +326,6 @@ class SocketServer:
         self.listen_thread.daemon = True
         self.listen_thread.start()
 
-        # Defining write thread:
-
-        self.log.debug("Starting write thread...")
-
-        self.write_thread = threading.Thread(target=self._ss_write)
-        self.write_thread.daemon = True
-        self.write_thread.start()
-
         return
 
     def stop(self):
@@ -194,17 +338,9 @@ class SocketServer:
 
         self.log.debug("Stopping listening thread...")
 
-        self.listen_thread.join()
-
-        # Adding 'None' to write queue to kill write thread
-
-        self.write_queue.put(None)
+        self._wake()
 
-        # Joining write thread
-
-        self.log.debug("Stopping write thread...")
-
-        self.write_thread.join()
+        self.listen_thread.join()
 
         # Shutting down handel thread
 
@@ -269,52 +405,81 @@ class SocketServer:
 
         return
 
-    def handler(self, payload):
+    def _resolve_handler(self, sock, data):
 
-        # SS handel method, find suitable handler and run it
-        # Ran inside of a ThreadPoolExecutor
+        """
+        Finds the handler and target for the given message.
 
-        try:
+        We also ensure that the sender is authenticated,
+        unless the message is an authentication request.
 
-            sock = payload['sock']
-            data = payload['data']
+        :param sock: CHAS socket the message was received on
+        :type sock: BaseCHASocket
+        :param data: Decoded message
+        :type data: dict
+        :return: Handler, target to pass to the handler and content, or None if the packet should be dropped
+        :rtype: tuple
+        """
 
-            if data['id'] > len(self.handlers) or data['id'] < 0:
+        if data['id'] >= len(self.handlers) or data['id'] < 0:
 
-                # No handler found, lets exit:
+            # No handler found, lets exit:
 
-                self.log.warning("No handler found for ID [{}]! Dropping packet...".format(data['id']))
+            self.log.warning("No handler found for ID [{}]! Dropping packet...".format(data['id']))
 
-                return
+            return None
 
-            hand = self.handlers[data['id']]
-            uuid = data['uuid']
-            req_id = data['id']
-            content = data['content']
+        hand = self.handlers[data['id']]
+        uuid = data['uuid']
+        req_id = data['id']
+        content = data['content']
 
-            if uuid is None and sock.device_uuid is None and req_id == 1:
+        if uuid is None and sock.device_uuid is None and req_id == 1:
 
-                # Device is attempting to authenticate
+            # Device is attempting to authenticate
 
-                hand.handel_server(sock, content)
+            return hand, sock, content
 
-                return
+        # Getting device here:
+
+        device = self.devices.get_by_uuid(uuid)
+
+        if device is None or sock.device_uuid != device.uuid:
+
+            # Device is not authenticated,
+            # OR an authentication error has occurred.
+            # Ignoring packet.
+
+            self.log.warning("Device not authenticated! Dropping packet...")
 
-            # Getting device here:
+            return None
 
-            device = self.devices.get_by_uuid(uuid)
+        return hand, device, content
 
-            if device is None or sock.device_uuid != device.uuid:
+    def handler(self, payload):
+
+        # SS handel method, find suitable handler and run it
+        # Ran inside of a ThreadPoolExecutor
+
+        try:
+
+            resolved = self._resolve_handler(payload['sock'], payload['data'])
 
-                # Device is not authenticated,
-                # OR an authentication error has occurred.
-                # Ignoring packet.
+            if resolved is None:
 
-                self.log.warning("Device not authenticated! Dropping packet...")
+                # Packet was dropped:
 
                 return
 
-            hand.handel_server(device, content)
+            hand, target, content = resolved
+
+            val = hand.handel_server(target, content)
+
+            if inspect.iscoroutine(val):
+
+                # Coroutine handler, lets run it to completion in this thread:
+
+                asyncio.run(val)
 
         except Exception as e:
 
@@ -388,7 +553,11 @@ class SocketClient:
         message = CHASocket(self.sel, self.sock, addr, self.log)
         self.sel.register(self.sock, events, data=message)
 
-        message.write({'id': 1, 'uuid': None, 'content': None})
+        # Authenticating, and offering the framing modes and audio codecs we support:
+
+        message.write({'id': 1, 'uuid': None,
+                       'content': {'framing': self.chas.settings.net_framing,
+                                   'audio_codecs': available_codecs(self.chas.settings.net_audio_codecs)}})
 
     def _get_id(self, hand):
 
@@ -450,13 +619,9 @@ class SocketClient:
 
                     if mask & selectors.EVENT_READ:
 
-                        data = message.read()
-
-                        if data is None:
-
-                            continue
+                        for data in message.read():
 
-                        self.handler(data, message)
+                            self.handler(data, message)
 
                 except Exception as e:
 
@@ -17,11 +17,17 @@ but you could script synth output using certain features located in OutputContro
 """
 
 from chaslib.misctools import get_logger
+import itertools
+import multiprocessing
 import threading
 from concurrent.futures import ThreadPoolExecutor
 import traceback
 
-from chaslib.sound.utils import BaseModule, AudioMixer, get_time
+from chaslib.sound.proc import SharedBlocks, render_worker
+from chaslib.sound.resample import ResampleModule, convert_chain
+from chaslib.sound.ring import RingBuffer
+from chaslib.sound.sched import AudioScheduler
+from chaslib.sound.utils import BaseModule, AudioMixer, ModuleInfo, get_time, concat_blocks, zero_block
 from chaslib.sound.out import BaseOutput
 
 
@@ -55,11 +61,13 @@ class OutputControl(BaseModule):
     """
 
     OUT = []  # Reference to OutputHandler
+    SERIAL = itertools.count(1)  # Numbers given to each OutputControl
 
     def __init__(self):
 
         super(OutputControl, self).__init__()
 
+        self.serial = next(self.SERIAL)  # Number of this control, never reused, keys our scheduler stats
         self.time_remove = 0  # Time to remove ourselves. If 0, then we don't keep track
         self.item_written = 0  # Number of items to write. If 0, then we don't keep track
 
@@ -113,14 +121,16 @@ class OutputControl(BaseModule):
 
         self.wait.wait()
 
-    def get_next(self):
+    def _check_stop(self):
 
         """
-        We simply return values from the synth chain attached to us.
+        Checks if we should stop.
 
-        We also do some checks to determine if we should stop.
         If we do stop, we will call our 'stop()' method,
         which will remove us from the OutputHandler.
+
+        :return: True if we have stopped
+        :rtype: bool
         """
 
         if not self.info.running:
@@ -129,7 +139,7 @@ class OutputControl(BaseModule):
 
             self.stop()
 
-            return 0
+            return True
 
         if self.time_remove != 0 and self.time_remove > get_time():
 
@@ -137,7 +147,7 @@ class OutputControl(BaseModule):
 
             self.stop()
 
-            return 0
+            return True
 
         if self.item_written != 0 and self.item_written > self.index:
 
@@ -145,12 +155,50 @@ class OutputControl(BaseModule):
 
             self.stop()
 
+            return True
+
+        return False
+
+    def get_next(self):
+
+        """
+        We simply return values from the synth chain attached to us.
+
+        We also do some checks to determine if we should stop.
+        """
+
+        if self._check_stop():
+
             return 0
 
         # Otherwise, lets just return!
 
         return self.get_input()
 
+    def get_block(self, frames):
+
+        """
+        We simply return blocks from the synth chain attached to us.
+
+        We do the same checks as 'get_next()' before each block.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Block of samples
+        """
+
+        if self._check_stop():
+
+            return None
+
+        block = self.get_input_block(frames)
+
+        if block is not None:
+
+            self.index += len(block)
+
+        return block
+
     def write_time(self, time):
 
         """
@@ -185,6 +233,57 @@ class OutputControl(BaseModule):
 
         self.start()
 
+    def _convert(self):
+
+        """
+        Puts a ResampleModule in front of our started chain, if it needs one.
+
+        This happens when the chain reports a native rate that differs from the OutputHandler,
+        or has more than two channels.
+        We then take the info of the converter, as that is the audio we hand to the mixer.
+        """
+
+        if not self.input._objs:
+
+            return
+
+        synth = self.input._objs[0]
+
+        stage = convert_chain(synth, self.OUT[0].rate)
+
+        if stage is synth:
+
+            # Nothing to convert:
+
+            return
+
+        self.input.remove_module(synth)
+        self.input.add_module(stage)
+
+        stage.output = self
+
+        self._info = stage.info
+
+    def _unconvert(self):
+
+        """
+        Removes the ResampleModule in front of our chain, if there is one.
+        """
+
+        if not self.input._objs or not isinstance(self.input._objs[0], ResampleModule):
+
+            return
+
+        stage = self.input._objs[0]
+        synth = stage.input._objs[0]
+
+        self.input.remove_module(stage)
+        self.input.add_module(synth)
+
+        synth.output = self
+
+        self._info = synth.info
+
     def __iter__(self):
 
         """
@@ -197,10 +296,18 @@ class OutputControl(BaseModule):
 
         self.index = 0
 
+        # Remove the converter from the last time we were started, the chain could have changed:
+
+        self._unconvert()
+
         # Prepare the sub-modules:
 
         self.input.start_modules()
 
+        # Convert the chain if it's rate or channels don't match the OutputHandler:
+
+        self._convert()
+
         # Set our started value:
 
         self.started = True
@@ -214,6 +321,312 @@ class OutputControl(BaseModule):
         return self
 
 
+class ProcessControl(OutputControl):
+
+    """
+    ProcessControl - Controls a synth chain that is rendered in a worker process.
+
+    We work just like OutputControl,
+    except that the synth chain bound to us is rendered in a process of it's own,
+    so heavy chains don't compete with the rest of CHAS for the interpreter.
+    The worker renders blocks into shared memory(see 'proc.py'),
+    and we hand them to the mixer when it asks for them.
+
+    When we are started, a new worker is created, and we wait for it to render it's first block.
+    When we are stopped, the worker is stopped, and killed if it does not exit in time.
+    If the worker has not rendered a block when the mixer needs one,
+    then the mixer gets silence and we count an underrun.
+    If the worker crashes, then we log the traceback and stop ourselves,
+    the rest of the audio keeps playing.
+
+    The worker converts the chain to stereo at the rate of the OutputHandler,
+    so we always hand stereo blocks to the mixer.
+
+    Workers are created using the given multiprocessing start method.
+    With 'fork', the worker gets a copy of the chain as it is.
+    Other start methods pickle the chain, so everything in it must be picklable.
+
+    You shouldn't create this module directly.
+    Instead, pass 'process=True' when you bind a synth to the OutputHandler.
+
+    :param frames: Number of frames the worker renders at a time
+    :type frames: int
+    :param slots: Number of blocks the worker can render ahead
+    :type slots: int
+    :param timeout: Time in seconds to wait for a block from the worker, 0 does not wait
+    :type timeout: float
+    :param method: Multiprocessing start method to use, None for the default
+    :type method: str
+    """
+
+    def __init__(self, frames=1024, slots=4, timeout=0, method=None):
+
+        super(ProcessControl, self).__init__()
+
+        self.frames = frames  # Number of frames the worker renders at a time
+        self.slots = slots  # Number of blocks the worker can render ahead
+        self.timeout = timeout  # Time to wait for a block from the worker
+        self.ctx = multiprocessing.get_context(method)  # Multiprocessing context to create workers with
+
+        self.process = None  # Worker process
+        self.blocks = None  # Shared blocks the worker renders into
+        self.conn = None  # Connection the worker sends tracebacks through
+
+        self.underruns = 0  # Number of times the worker was not ready
+        self.error = None  # Traceback of the last crash, None if we have not crashed
+
+        self._block = None  # Block we are reading from
+        self._pos = 0  # Position of the next sample in the block
+
+        self.log = get_logger("AUDIO_PROC")
+
+    def stop(self):
+
+        """
+        Removes ourselves from the OutputHandler, and stops the worker.
+        """
+
+        # Remove ourselves from the OutputHandler:
+
+        if self in self.OUT[0]._input._objs:
+
+            self.OUT[0]._remove_synth(self)
+
+        self.time_remove = 0
+        self.item_written = 0
+
+        self.started = False
+
+        if self.process is not None:
+
+            # Stop the worker:
+
+            self.blocks.stop()
+
+            self.process.join(timeout=1)
+
+            if self.process.is_alive():
+
+                # Worker is stuck, kill it:
+
+                self.log.warning("Worker {} did not stop, killing it".format(self.process.pid))
+
+                self.process.terminate()
+                self.process.join()
+
+            self.blocks.close()
+            self.conn.close()
+
+            self.process = None
+
+        # Setting our event:
+
+        self.wait.set()
+
+    def get_next(self):
+
+        """
+        We return values from the worker one at a time.
+
+        :return: Next value, 0 if the worker is not ready
+        :rtype: float
+        """
+
+        if self._check_stop():
+
+            return 0
+
+        parts, num = self._pull(1)
+
+        if num:
+
+            return float(parts[0][0])
+
+        if self.blocks.done:
+
+            # The chain is done:
+
+            self.stop()
+
+            return None
+
+        self._check_worker()
+
+        return 0.0
+
+    def get_block(self, frames):
+
+        """
+        We return blocks rendered by the worker.
+
+        If the worker is behind, the rest of the block is silence.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Block of samples
+        """
+
+        if self._check_stop():
+
+            return None
+
+        size = frames * self.info.channels
+
+        parts, num = self._pull(size)
+
+        if num < size:
+
+            if self.blocks.done:
+
+                # The chain is done, return what we have:
+
+                if not parts:
+
+                    self.stop()
+
+                    return None
+
+            else:
+
+                # The worker did not keep up:
+
+                self._check_worker()
+
+                parts.append(zero_block(size - num))
+
+        block = concat_blocks(parts)
+
+        self.index += len(block)
+
+        return block
+
+    def stats(self):
+
+        """
+        Returns the counters of this chain.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {'pid': self.process.pid if self.process is not None else None,
+                'alive': self.process is not None and self.process.is_alive(),
+                'underruns': self.underruns,
+                'crashed': self.error is not None}
+
+    def _pull(self, num):
+
+        """
+        Gets up to the given number of samples from the worker.
+
+        :param num: Number of samples to get
+        :type num: int
+        :return: List of blocks, and the number of samples in them
+        :rtype: tuple
+        """
+
+        parts = []
+        have = 0
+
+        while have < num:
+
+            if self._block is None or self._pos >= len(self._block):
+
+                # Get the next block from the worker:
+
+                self._block = self.blocks.read(timeout=self.timeout)
+                self._pos = 0
+
+                if self._block is None:
+
+                    break
+
+            take = min(num - have, len(self._block) - self._pos)
+
+            parts.append(self._block[self._pos:self._pos + take])
+
+            self._pos += take
+            have += take
+
+        return parts, have
+
+    def _check_worker(self):
+
+        """
+        Called when the worker is not ready.
+
+        We count an underrun, and stop ourselves if the worker has crashed.
+        """
+
+        self.underruns += 1
+
+        if self.process is None or self.process.is_alive():
+
+            # Still rendering, it's just slow:
+
+            return
+
+        self.error = self.conn.recv() if self.conn.poll() else "Exit code {}".format(self.process.exitcode)
+
+        self.log.error("Worker {} crashed, stopping synth chain".format(self.process.pid))
+        self.log.debug("Traceback: \n{}".format(self.error))
+
+        self.stop()
+
+    def __iter__(self):
+
+        """
+        We start a worker to render the synth chain,
+        and add ourselves to the OutputHandler.
+        """
+
+        if self.process is not None:
+
+            # Stop the old worker:
+
+            self.stop()
+
+        self.index = 0
+        self.underruns = 0
+        self.error = None
+        self._block = None
+
+        # Create the worker:
+
+        # The worker converts the chain to stereo at our rate, as we only know it's format once it is started:
+
+        synth = self.input._objs[0]
+
+        self._info = ModuleInfo(samp=self.OUT[0].rate)
+
+        self._info.channels = 2
+        self._info.name = synth.info.name
+
+        self.blocks = SharedBlocks(frames=self.frames, channels=2, slots=self.slots, ctx=self.ctx)
+        self.conn, send = self.ctx.Pipe(duplex=False)
+
+        self.process = self.ctx.Process(target=render_worker, args=(synth, self.OUT[0].rate, self.blocks, send),
+                                        name='AudioWorker', daemon=True)
+        self.process.start()
+
+        # We only need the receiving end:
+
+        send.close()
+
+        # Wait for the first block, so we don't start with silence:
+
+        self._block = self.blocks.read(timeout=1)
+        self._pos = 0
+
+        self.started = True
+
+        # Add ourselves to the OutputHandler:
+
+        self.OUT[0]._add_synth(self)
+
+        return self
+
+
 class OutputHandler:
 
     """
@@ -239,6 +652,10 @@ class OutputHandler:
     This also means that we will only sample as quickly as our slowest module.
     Most of the time this is ideal,
     but if not then you should take care to only load modules you need!
+
+    We can also be made to render audio on a fixed cadence by calling 'schedule()'.
+    In this case an AudioScheduler renders a block every block period,
+    and keeps track of deadlines, underruns and the processing time of each synth chain.
     """
 
     def __init__(self, rate=44100):
@@ -246,10 +663,12 @@ class OutputHandler:
         self._output = []  # Output modules to send information
         self._work = ThreadPoolExecutor()  # Thread pool executor to put our output modules in
         self._input = AudioMixer()  # Audio Collection to mix sound
+        self.ring = RingBuffer()  # Ring buffer output modules read from
         self.rate = rate  # Rate to output audio
         self.futures = []
         self.thread = []
         self.producer_process = None  # Producer thread
+        self.scheduler = None  # AudioScheduler rendering on a fixed cadence, if any
 
         self.run = False  # Value determining if we are running
         self._pause = threading.Event()  # Event object determining if we are paused
@@ -282,6 +701,10 @@ class OutputHandler:
 
         out.out = self
 
+        # Have the module read from our ring:
+
+        out.bind_ring(self.ring)
+
         # Check if we are running:
 
         if self.run:
@@ -294,7 +717,7 @@ class OutputHandler:
 
         self._output.append(out)
 
-    def bind_synth(self, synth):
+    def bind_synth(self, synth, process=False, **kwargs):
 
         """
         Binds a synth chain to the Output class.
@@ -309,29 +732,69 @@ class OutputHandler:
         We also set the sampling rate of the synth chain to our own,
         so all synths can maintain a similar sampling rate.
 
+        Heavy synth chains can be rendered in a worker process,
+        in which case a ProcessControl is returned.
+        Any extra keyword arguments are passed along to it.
+
         :param synth: Synth chain to add to output
         :type synth: BaseModule
+        :param process: Value determining if the chain should be rendered in a worker process
+        :type process: bool
         :return: OutputControl with the synth chain bound to it
         :rtype: OutputControl
         """
 
         # Create an output control:
 
-        out = OutputControl()
+        out = ProcessControl(**kwargs) if process else OutputControl()
         out.OUT.append(self)
 
         # Bind the synth to the output control:
 
         out.bind(synth)
 
-        # Bind our sampling rate to the synth chain:
+        # Bind our sampling rate to the synth chain,
+        # chains that report a different native rate are resampled when started:
 
-        synth._info.samp = self.rate
+        synth._info.rate = self.rate
 
         # Return the output control:
 
         return out
 
+    def schedule(self, frames=1024, max_late=4):
+
+        """
+        Renders audio on a fixed cadence instead of when modules request it.
+
+        We create an AudioScheduler, which renders a block of 'frames' frames
+        every 'frames / rate' seconds while we are running.
+        Special output modules will then read from the ring like everyone else.
+
+        If we are already running, then the scheduler is started right away.
+
+        :param frames: Number of frames in each block
+        :type frames: int
+        :param max_late: Number of blocks the scheduler can fall behind before it skips ahead
+        :type max_late: int
+        :return: The AudioScheduler
+        :rtype: AudioScheduler
+        """
+
+        if self.scheduler is not None:
+
+            # Stop the old scheduler:
+
+            self.scheduler.stop()
+
+        self.scheduler = AudioScheduler(self, frames=frames, max_late=max_late)
+
+        if self.run:
+
+            self.scheduler.start()
+
+        return self.scheduler
+
     def start(self):
 
         """
@@ -355,6 +818,12 @@ class OutputHandler:
 
             self._submit_module(mod)
 
+        if self.scheduler is not None:
+
+            # Start rendering:
+
+            self.scheduler.start()
+
     def stop(self):
 
         """
@@ -372,6 +841,12 @@ class OutputHandler:
 
         self.run = False
 
+        if self.scheduler is not None:
+
+            # Stop rendering:
+
+            self.scheduler.stop()
+
         # Stop all output modules:
 
         for mod in self._output:
@@ -456,21 +931,96 @@ class OutputHandler:
 
                 continue
 
-            # Iterate over our modules:
+            # Write the input to the ring, for all modules to read:
 
-            for mod in self._output:
+            self.ring.write_frame(inp)
 
-                # Add the input to the module:
+            return inp
 
-                if mod.special:
+    def gen_block(self, frames):
 
-                    # Ignore and continue:
+        """
+        Gets and writes a block of input from the synths to the ring buffer.
 
-                    continue
+        Works just like 'gen_value()',
+        except we sample the synths a whole block at a time,
+        which is much faster than sampling them one value at a time.
 
-                mod.add_input(inp)
+        :param frames: Number of frames to generate
+        :type frames: int
+        :return: Interleaved stereo block
+        """
 
-            return inp
+        while self.run:
+
+            # Pause if necessary:
+
+            self._pause.wait()
+
+            # Get a block of audio information:
+
+            try:
+
+                block = self._input.get_block(frames)
+
+            except Exception as e:
+
+                self.log.warning("Getting next block failed: {}".format(e))
+                self.log.debug("Traceback: \n{}".format(traceback.format_exc()))
+
+                block = None
+
+            if block is None:
+
+                continue
+
+            # Write the block to the ring, for all modules to read:
+
+            self.ring.write(block)
+
+            return block
+
+    def output_stats(self):
+
+        """
+        Returns the ring buffer counters of each output module.
+
+        Output modules that are too slow to keep up will show a high lag,
+        and will have overruns if they have lost audio.
+
+        :return: Dictionary of counters, keyed by module name
+        :rtype: dict
+        """
+
+        return self.ring.stats()
+
+    def scheduled(self):
+
+        """
+        Determines if a scheduler is rendering our audio.
+
+        :return: True if a scheduler is running
+        :rtype: bool
+        """
+
+        return self.scheduler is not None and self.scheduler.running
+
+    def sched_stats(self):
+
+        """
+        Returns the counters of our scheduler, and of each synth chain it has rendered.
+
+        See 'AudioScheduler.stats()' for the counters.
+
+        :return: Dictionary of counters, None if we have no scheduler
+        :rtype: dict
+        """
+
+        if self.scheduler is None:
+
+            return None
+
+        return self.scheduler.stats()
 
     def remove_type(self, out_type):
 
@@ -496,6 +1046,8 @@ class OutputHandler:
 
                 self._output.remove(mod)
 
+                self.ring.remove_reader(mod.reader)
+
     def search_type(self, out_type):
         """
         Searches the output modules for a given type.
@@ -554,6 +1106,12 @@ class OutputHandler:
 
         self._input.remove_module(synth)
 
+        if self.scheduler is not None:
+
+            # Drop the stats of the synth, it will not be rendered again:
+
+            self.scheduler.retire(synth)
+
     def _submit_module(self, mod):
 
         """
@@ -572,6 +1130,10 @@ class OutputHandler:
 
         mod.running = True
 
+        # Start reading from the current position in the ring:
+
+        mod.reader.reset()
+
         # Start the module:
 
         mod.start()
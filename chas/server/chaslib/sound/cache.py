@@ -0,0 +1,526 @@
+"""
+Cache of decoded sounds.
+
+Short sounds, like the notification played when the wake word is heard,
+are played over and over again.
+Reading and decoding them from disk each time adds latency to every interaction.
+
+Instead, we decode each sound once into a float32 block, and keep it in a process-wide cache.
+Sounds are keyed by path, modification time, size, sample rate and format,
+so changing a file on disk or asking for a different rate decodes it again.
+The cache has a byte budget, once it is exceeded the least recently used sounds are evicted.
+Sounds larger than a fraction of the budget are never kept,
+so one long file can't push out all the short sounds that are played all the time.
+
+Cached blocks are read only, and are shared by everyone playing them.
+The CachedReader input module serves slices of the cached block to the OutputHandler,
+which are views of the cache if NumPy is installed, so playback copies nothing.
+Evicting a sound that is playing is fine, the reader keeps it alive until it is done.
+
+Long files should not be decoded into memory.
+Use 'open_sound()' to get a CachedReader for sounds that fit in the cache,
+a memory mapped reader for larger wave files,
+and a streaming decoder for compressed files.
+"""
+
+import pathlib
+import threading
+
+from collections import OrderedDict
+
+from chaslib.sound.input import BaseInput, MappedWave, MmapWaveReader, StreamReader, PCM_TYPES, STREAM_TYPES, decode_pcm
+from chaslib.sound.convert import NullConvert
+from chaslib.sound.resample import resample_block
+from chaslib.sound.utils import numpy, zero_block
+from chaslib.misctools import get_logger
+
+FORMAT = 'f32'  # Format sounds are decoded into
+SAMPLE_WIDTH = 4  # Size of each decoded sample in bytes
+
+
+class DecodedSound:
+
+    """
+    A sound decoded into an interleaved float32 block.
+
+    :param key: Key of this sound in the cache
+    :type key: tuple
+    :param block: Interleaved block of samples
+    :param channels: Number of channels
+    :type channels: int
+    :param rate: Sample rate
+    :type rate: int
+    """
+
+    def __init__(self, key, block, channels, rate):
+
+        self.key = key  # Key of this sound in the cache
+        self.block = block  # Interleaved block of samples
+        self.channels = channels  # Number of channels
+        self.rate = rate  # Sample rate
+        self.frames = len(block) // channels if channels else 0  # Number of frames
+        self.size = len(block) * SAMPLE_WIDTH  # Size of the block in bytes
+
+        if numpy is not None:
+
+            # Everyone shares this block, nobody may change it:
+
+            self.block.flags.writeable = False
+
+
+class SoundCache:
+
+    """
+    Process-wide LRU cache of decoded sounds.
+
+    You should get the cache with 'get_cache()', instead of creating one.
+
+    :param budget: Maximum number of bytes of decoded audio to keep
+    :type budget: int
+    :param item_fraction: Largest fraction of the budget a single sound can take
+    :type item_fraction: float
+    """
+
+    def __init__(self, budget=32 * 1024 * 1024, item_fraction=0.25):
+
+        self.budget = budget  # Maximum number of bytes to keep
+        self.item_fraction = item_fraction  # Largest fraction of the budget a single sound can take
+        self.size = 0  # Number of bytes kept
+
+        self.hits = 0  # Number of sounds found in the cache
+        self.misses = 0  # Number of sounds we had to decode
+        self.evictions = 0  # Number of sounds evicted
+
+        self._sounds = OrderedDict()  # Decoded sounds, least recently used first
+        self._lock = threading.Lock()  # Lock protecting the cache
+
+        self.log = get_logger("AUDIO_CACHE")
+
+    @staticmethod
+    def make_key(path, rate=None):
+
+        """
+        Creates the cache key of the given file.
+
+        :param path: Path to the wave file
+        :type path: str
+        :param rate: Sample rate to decode to, None keeps the rate of the file
+        :type rate: int
+        :return: Cache key
+        :rtype: tuple
+        """
+
+        path = pathlib.Path(path).resolve()
+
+        stat = path.stat()
+
+        return str(path), stat.st_mtime_ns, stat.st_size, rate, FORMAT
+
+    def fits(self, path, rate=None):
+
+        """
+        Determines if the given file would fit in the cache once decoded.
+
+        We only read the header of the file to figure this out.
+
+        :param path: Path to the wave file
+        :type path: str
+        :param rate: Sample rate to decode to, None keeps the rate of the file
+        :type rate: int
+        :return: True if the decoded sound would be kept
+        :rtype: bool
+        """
+
+        mapped = MappedWave.acquire(path)
+
+        try:
+
+            frames = mapped.frames if rate is None else int(mapped.frames * rate / mapped.rate)
+
+            return frames * mapped.channels * SAMPLE_WIDTH <= self.item_limit()
+
+        finally:
+
+            mapped.release()
+
+    def get(self, path, rate=None):
+
+        """
+        Gets the decoded sound of the given file, decoding it if necessary.
+
+        Sounds larger than our item limit are decoded, but not kept.
+
+        :param path: Path to the wave file
+        :type path: str
+        :param rate: Sample rate to decode to, None keeps the rate of the file
+        :type rate: int
+        :return: Decoded sound
+        :rtype: DecodedSound
+        """
+
+        key = self.make_key(path, rate)
+
+        with self._lock:
+
+            sound = self._sounds.get(key)
+
+            if sound is not None:
+
+                # Mark the sound as recently used:
+
+                self._sounds.move_to_end(key)
+
+                self.hits += 1
+
+                return sound
+
+            self.misses += 1
+
+        # Decode outside of the lock, so other sounds can be played meanwhile:
+
+        sound = self._decode(key)
+
+        self._add(sound)
+
+        return sound
+
+    def item_limit(self):
+
+        """
+        Returns the size of the largest sound we keep.
+
+        :return: Size in bytes
+        :rtype: int
+        """
+
+        return int(self.budget * self.item_fraction)
+
+    def remove(self, path):
+
+        """
+        Removes every cached version of the given file.
+
+        :param path: Path to the wave file
+        :type path: str
+        """
+
+        path = str(pathlib.Path(path).resolve())
+
+        with self._lock:
+
+            for key in [key for key in self._sounds if key[0] == path]:
+
+                self._drop(key)
+
+    def clear(self):
+
+        """
+        Removes every sound from the cache.
+        """
+
+        with self._lock:
+
+            self._sounds.clear()
+
+            self.size = 0
+
+    def stats(self):
+
+        """
+        Returns the counters of the cache.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {'sounds': len(self._sounds),
+                'size': self.size,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+    def _decode(self, key):
+
+        """
+        Decodes the file of the given key.
+
+        :param key: Cache key of the file
+        :type key: tuple
+        :return: Decoded sound
+        :rtype: DecodedSound
+        """
+
+        path, _, _, rate, _ = key
+
+        mapped = MappedWave.acquire(path)
+
+        try:
+
+            if mapped.width not in PCM_TYPES:
+
+                raise ValueError("Unsupported sample width: {}".format(mapped.width))
+
+            block = zero_block(mapped.frames * mapped.channels)
+
+            decode_pcm(mapped.frames_view(0, mapped.frames), mapped.width, block)
+
+            channels = mapped.channels
+            file_rate = mapped.rate
+
+        finally:
+
+            mapped.release()
+
+        if rate is not None and rate != file_rate:
+
+            block = resample_block(block, channels, file_rate, rate)
+
+        return DecodedSound(key, block, channels, rate or file_rate)
+
+    def _add(self, sound):
+
+        """
+        Adds the given sound, evicting the least recently used sounds to make room.
+
+        :param sound: Sound to add
+        :type sound: DecodedSound
+        """
+
+        if sound.size > self.item_limit():
+
+            # Too big, don't keep it:
+
+            self.log.debug("Not caching {}, it is too large".format(sound.key[0]))
+
+            return
+
+        with self._lock:
+
+            if sound.key in self._sounds:
+
+                # Someone else decoded it first:
+
+                return
+
+            # Older versions of this file are stale:
+
+            for key in [key for key in self._sounds if key[0] == sound.key[0] and key[1:3] != sound.key[1:3]]:
+
+                self._drop(key)
+
+            while self._sounds and self.size + sound.size > self.budget:
+
+                # Evict the least recently used sound:
+
+                self._drop(next(iter(self._sounds)))
+
+                self.evictions += 1
+
+            self._sounds[sound.key] = sound
+            self.size += sound.size
+
+    def _drop(self, key):
+
+        """
+        Removes the given key, the lock must be held.
+
+        :param key: Key to remove
+        :type key: tuple
+        """
+
+        self.size -= self._sounds.pop(key).size
+
+
+_CACHE = SoundCache()  # Process-wide sound cache
+
+
+def get_cache():
+
+    """
+    Returns the process-wide sound cache.
+
+    :return: Sound cache
+    :rtype: SoundCache
+    """
+
+    return _CACHE
+
+
+class CachedReader(BaseInput):
+
+    """
+    Plays a sound from the sound cache.
+
+    The sound is fetched from the cache when we are started,
+    and decoded if it is not there yet.
+    Blocks are slices of the cached sound,
+    so with NumPy installed nothing is copied.
+
+    :param path: Path to the wave file
+    :type path: str
+    :param rate: Sample rate to play the sound at, None keeps the rate of the file
+    :type rate: int
+    :param cache: Sound cache to use, None uses the process-wide cache
+    :type cache: SoundCache
+    """
+
+    def __init__(self, path, rate=None, cache=None) -> None:
+
+        super().__init__()
+
+        self.path = pathlib.Path(path).resolve()  # Path to the wave file
+        self.rate = rate  # Sample rate to play the sound at
+        self.cache = cache or get_cache()  # Sound cache to use
+        self.sound = None  # Decoded sound
+
+        self._pos = 0  # Position of the next sample
+
+        self.bind_converter(NullConvert())
+
+    def start(self):
+
+        """
+        Starts this module,
+        we get the decoded sound from the cache.
+        """
+
+        self.sound = self.cache.get(self.path, rate=self.rate)
+
+        # Set the name of this chain to the name of the file:
+
+        self.info.name = self.path.name
+
+        # Set the number of channels:
+
+        self.info.channels = self.sound.channels
+
+        # Set the rate of the sound, so it can be resampled if it does not match:
+
+        self.info.native_rate = self.sound.rate
+
+        # Set the length of the sound:
+
+        self.nframes(self.sound.frames)
+
+        self._pos = 0
+
+    def stop(self):
+
+        """
+        Stops this module,
+        we let go of the decoded sound.
+        """
+
+        self.sound = None
+
+    def repeat(self):
+
+        """
+        Moves back to the start of the sound.
+        """
+
+        self._pos = 0
+
+    def _check_end(self):
+
+        """
+        Checks if we have reached the end, repeating if we are allowed to.
+
+        :return: True if we are done
+        :rtype: bool
+        """
+
+        if self._pos < len(self.sound.block):
+
+            return False
+
+        if self.allow_repeat and self.loop:
+
+            self.repeat()
+            self.index = 0
+
+            return False
+
+        self.info.running = False
+
+        return True
+
+    def __next__(self):
+
+        """
+        Gets the next sample of the sound.
+
+        :return: Next sample, None if we are done
+        :rtype: float
+        """
+
+        if self.sound is None or self._check_end():
+
+            return None
+
+        val = self.sound.block[self._pos]
+
+        self._pos += 1
+        self.index = self._pos // self.sound.channels
+
+        return float(val)
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of frames from the sound.
+
+        The block is a read only view of the cached sound if NumPy is installed.
+        It is shorter if we reach the end of the sound part way through.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block of samples, None if we are done
+        """
+
+        if self.sound is None or self._check_end():
+
+            return None
+
+        end = min(self._pos + frames * self.sound.channels, len(self.sound.block))
+
+        block = self.sound.block[self._pos:end]
+
+        self._pos = end
+        self.index = self._pos // self.sound.channels
+
+        return block
+
+
+def open_sound(path, rate=None, cache=None):
+
+    """
+    Creates an input module to play the given sound file.
+
+    Compressed files, like FLAC and Ogg, are decoded as they play by a StreamReader.
+    Wave files that fit in the cache are played through a CachedReader,
+    so they are only decoded once.
+    Anything larger is memory mapped instead.
+
+    :param path: Path to the sound file
+    :type path: str
+    :param rate: Sample rate to play cached sounds at, None keeps the rate of the file
+    :type rate: int
+    :param cache: Sound cache to use, None uses the process-wide cache
+    :type cache: SoundCache
+    :return: Input module playing the file
+    :rtype: BaseInput
+    """
+
+    if pathlib.Path(path).suffix.lower() in STREAM_TYPES:
+
+        return StreamReader(path)
+
+    cache = cache or get_cache()
+
+    if cache.fits(path, rate=rate):
+
+        return CachedReader(path, rate=rate, cache=cache)
+
+    return MmapWaveReader(path)
@@ -0,0 +1,530 @@
+"""
+Clock alignment for synchronized playback.
+
+When the server streams audio to clients in different rooms,
+each client would normally play blocks as soon as it's jitter buffer allows,
+so the rooms drift audibly apart.
+
+Instead, the server stamps each block with a presentation time(see 'netcodec.py'),
+which is the time on the server clock the block should be heard.
+Each client estimates how it's own clock relates to the server clock,
+by exchanging pings over the connection maintenance channel(id 0), much like NTP:
+
+    - Client sends it's time t0
+    - Server notes the time it got the ping t1, and the time it replies t2
+    - Client notes the time it got the reply t3
+
+The round trip is (t3 - t0) - (t2 - t1), and the offset of the server clock is ((t1 - t0) + (t2 - t3)) / 2.
+Pings that waited in a queue are skewed, so we only trust the ones with the shortest round trips.
+Clocks also run at slightly different rates,
+so we fit a line through the offsets to find the drift as well.
+
+The SyncBuffer then plays each block at it's presentation time, converted to our clock.
+Large errors are fixed right away, by waiting or skipping ahead.
+Small errors, and drift, are fixed by playing slightly faster or slower,
+resampling by a fraction of a percent, which can't be heard.
+"""
+
+import threading
+
+from collections import deque
+
+from chaslib.sound.netcodec import JitterBuffer, SEQ_MOD
+from chaslib.sound.utils import concat_blocks, get_time, numpy, zero_block
+
+
+class ClockSync:
+
+    """
+    Estimates the offset and drift of the server clock against ours.
+
+    :param clock: Function returning our time in seconds
+    :type clock: callable
+    :param window: Number of ping samples to keep
+    :type window: int
+    """
+
+    MIN_SAMPLES = 3  # Number of samples we need before we trust our estimate
+    KEEP = 0.5  # Fraction of samples with the shortest round trips we use
+    MIN_SPAN = 8.0  # Seconds the samples must span before we estimate drift
+    MAX_SKEW = 0.0005  # Largest drift we believe, 500 parts per million
+
+    def __init__(self, clock=get_time, window=32):
+
+        self.clock = clock  # Function returning our time
+        self.samples = deque(maxlen=window)  # Local time, offset and round trip of each ping
+
+        self.offset = 0.0  # Server time minus our time, at our reference time
+        self.skew = 0.0  # Rate the offset changes at, in seconds per second
+        self.ref = 0.0  # Our time the offset is measured at
+        self.rtt = None  # Shortest round trip we trust
+        self.count = 0  # Number of samples added
+
+        self._lock = threading.Lock()  # Lock protecting our estimate
+
+    def now(self):
+
+        """
+        Returns our time.
+
+        :return: Time in seconds
+        :rtype: float
+        """
+
+        return self.clock()
+
+    def make_ping(self):
+
+        """
+        Creates the content of a ping.
+
+        :return: Ping content
+        :rtype: dict
+        """
+
+        return {'ping': self.clock()}
+
+    def add_sample(self, sent, received, replied, arrived=None):
+
+        """
+        Adds a ping sample, and updates our estimate.
+
+        :param sent: Our time the ping was sent
+        :type sent: float
+        :param received: Server time the ping was received
+        :type received: float
+        :param replied: Server time the reply was sent
+        :type replied: float
+        :param arrived: Our time the reply arrived, None for now
+        :type arrived: float
+        """
+
+        arrived = self.clock() if arrived is None else arrived
+
+        rtt = (arrived - sent) - (replied - received)
+        offset = ((received - sent) + (replied - arrived)) / 2
+
+        with self._lock:
+
+            self.samples.append(((sent + arrived) / 2, offset, rtt))
+            self.count += 1
+
+            self._estimate()
+
+    def synced(self):
+
+        """
+        Determines if we have enough samples to trust our estimate.
+
+        :return: True if we are synced
+        :rtype: bool
+        """
+
+        return self.count >= self.MIN_SAMPLES
+
+    def to_server(self, local):
+
+        """
+        Converts our time to server time.
+
+        :param local: Our time in seconds
+        :type local: float
+        :return: Server time in seconds
+        :rtype: float
+        """
+
+        return local + self.offset + self.skew * (local - self.ref)
+
+    def to_local(self, server):
+
+        """
+        Converts server time to our time.
+
+        :param server: Server time in seconds
+        :type server: float
+        :return: Our time in seconds
+        :rtype: float
+        """
+
+        return (server - self.offset + self.skew * self.ref) / (1 + self.skew)
+
+    def server_now(self):
+
+        """
+        Returns the current server time.
+
+        :return: Server time in seconds
+        :rtype: float
+        """
+
+        return self.to_server(self.clock())
+
+    def stats(self):
+
+        """
+        Returns our estimate.
+
+        :return: Dictionary of values
+        :rtype: dict
+        """
+
+        return {'samples': self.count,
+                'offset': self.offset,
+                'skew': self.skew,
+                'rtt': self.rtt}
+
+    def _estimate(self):
+
+        """
+        Fits our estimate to the samples with the shortest round trips, the lock must be held.
+        """
+
+        best = sorted(self.samples, key=lambda sample: sample[2])[:max(1, int(len(self.samples) * self.KEEP))]
+
+        self.rtt = best[0][2]
+
+        times = [sample[0] for sample in best]
+        offsets = [sample[1] for sample in best]
+
+        ref = sum(times) / len(times)
+        mean = sum(offsets) / len(offsets)
+
+        skew = 0.0
+
+        if len(best) >= self.MIN_SAMPLES and max(times) - min(times) >= self.MIN_SPAN:
+
+            # Least squares fit of the offset over time:
+
+            var = sum((val - ref) ** 2 for val in times)
+
+            skew = sum((val - ref) * (off - mean) for val, off in zip(times, offsets)) / var
+
+        self.ref = ref
+        self.offset = mean
+        self.skew = min(self.MAX_SKEW, max(-self.MAX_SKEW, skew))
+
+
+class SyncBuffer(JitterBuffer):
+
+    """
+    Jitter buffer that plays blocks at their presentation time.
+
+    Until our clock is synced, or if blocks are not timed,
+    we behave like a regular jitter buffer.
+
+    Once synced, we compare the time of the next frame we would play with the time it will be heard.
+    When we start, or if we are off by more than HARD_SYNC, we play silence until it's time, or skip ahead.
+    Otherwise, we play slightly faster or slower to close the gap,
+    and to follow the drift of the server clock.
+
+    :param clock: Estimate of the server clock
+    :type clock: ClockSync
+    :param rate: Sample rate of the stream
+    :type rate: int
+    :param channels: Number of channels
+    :type channels: int
+    :param min_delay: Smallest playout delay in seconds, used until we are synced
+    :type min_delay: float
+    :param max_delay: Largest amount of audio to buffer in seconds
+    :type max_delay: float
+    :param latency: Seconds between us handing audio over and it being heard
+    :type latency: float
+    """
+
+    HARD_SYNC = 0.02  # Errors larger than this are fixed right away, in seconds
+    GAIN = 0.5  # Change of playback rate for each second of error
+    MAX_CORRECTION = 0.002  # Largest change of playback rate, 0.2 percent
+
+    def __init__(self, clock, rate=44100, channels=2, min_delay=0.02, max_delay=0.5, latency=0.0):
+
+        super().__init__(rate, channels, min_delay, max_delay)
+
+        self.clock = clock  # Estimate of the server clock
+        self.latency = latency  # Seconds between us handing audio over and it being heard
+
+        self.error = 0.0  # Time of the next frame minus the time it will be heard, positive if we are early
+        self.ratio = 1.0  # Number of frames we play for each frame we output
+        self.waited = 0  # Number of times we waited for a block
+        self.skipped = 0  # Number of times we skipped ahead
+
+        self._times = {}  # Presentation times of blocks waiting to be played, keyed by sequence number
+        self._current_time = None  # Presentation time of the block we are playing
+        self._carry = zero_block(0)  # Frames read, but not played yet
+        self._frac = 0.0  # Position between the first two frames we carry
+        self._aligned = False  # Value determining if we are lined up with the presentation time
+
+    def put(self, samples, seq=None, position=None, now=None, pts=None):
+
+        """
+        Adds a received block.
+
+        :param samples: Interleaved samples of the block
+        :param seq: Sequence number of the block, None if not sequenced
+        :type seq: int
+        :param position: Position of the first frame in the stream, None if not known
+        :type position: int
+        :param now: Time the block arrived, None for now
+        :type now: float
+        :param pts: Time on the server clock the block should be heard, None if not timed
+        :type pts: float
+        """
+
+        if pts is None or seq is None:
+
+            super().put(samples, seq, position, now)
+
+            return
+
+        with self._lock:
+
+            self._times[seq] = pts
+
+        super().put(samples, seq, position, now)
+
+        with self._lock:
+
+            if seq not in self._blocks:
+
+                # Block was thrown away, or already played:
+
+                self._times.pop(seq, None)
+
+    def get(self, frames):
+
+        """
+        Gets a block of frames to play.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block of samples
+        """
+
+        with self._lock:
+
+            playhead = self._playhead() if self.clock.synced() else None
+
+        if playhead is None:
+
+            # Not synced, or nothing timed to play:
+
+            return super().get(frames)
+
+        final = zero_block(frames * self.channels)
+
+        with self._lock:
+
+            playhead = self._playhead()
+
+            if playhead is None:
+
+                return final
+
+            self.error = error = playhead - self.clock.to_server(self.clock.now() + self.latency)
+
+            start = 0
+
+            # When we start, or after running dry, we line up exactly:
+
+            limit = self.HARD_SYNC if self._aligned else 0.5 / self.rate
+
+            if error > limit:
+
+                # Too early, play silence until it's time:
+
+                start = min(frames, int(error * self.rate))
+                error = 0.0
+
+                self.waited += 1
+
+                if start == frames:
+
+                    return final
+
+            elif error < -limit:
+
+                # Too late, skip ahead:
+
+                self._skip(int(-error * self.rate))
+                error = 0.0
+
+                self.skipped += 1
+
+            self.ratio = 1 + self.clock.skew + min(self.MAX_CORRECTION, max(-self.MAX_CORRECTION, -error * self.GAIN))
+
+            self._playing = self._aligned = True
+
+            if self._resample(final, start * self.channels) < len(final):
+
+                # We ran dry:
+
+                self.underruns += 1
+                self._playing = self._aligned = False
+
+        return final
+
+    def stats(self):
+
+        """
+        Returns the counters of this buffer, and our sync state.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return dict(super().stats(), error=self.error, ratio=self.ratio, waited=self.waited, skipped=self.skipped)
+
+    def _playhead(self):
+
+        """
+        Returns the presentation time of the next frame we would play, the lock must be held.
+
+        :return: Server time in seconds, None if we don't know
+        :rtype: float
+        """
+
+        if self._current is not None and self._current_time is not None:
+
+            # Where we are in the current block:
+
+            time = self._current_time + self._pos // self.channels / self.rate
+
+        elif self._blocks and self._next in self._times:
+
+            # Start of the next block:
+
+            time = self._times[self._next]
+
+        else:
+
+            return None
+
+        # Frames we carry come before that:
+
+        return time - (len(self._carry) // self.channels - self._frac) / self.rate
+
+    def _skip(self, frames):
+
+        """
+        Throws away the given number of frames, the lock must be held.
+
+        :param frames: Number of frames to skip
+        :type frames: int
+        """
+
+        carried = len(self._carry) // self.channels
+
+        if frames < carried:
+
+            self._carry = self._carry[frames * self.channels:]
+
+            return
+
+        self._read(zero_block((frames - carried) * self.channels))
+
+        self._carry = zero_block(0)
+        self._frac = 0.0
+
+    def _resample(self, final, start):
+
+        """
+        Plays frames into the given block at our playback rate, the lock must be held.
+
+        We interpolate between frames, and carry the fraction over to the next block.
+
+        :param final: Block to play into
+        :param start: Index of the first sample to play into
+        :type start: int
+        :return: Number of samples in the block, less than it's length if we ran dry
+        :rtype: int
+        """
+
+        chans = self.channels
+        frames = (len(final) - start) // chans
+
+        # Frames we need, including the one after the last for interpolation:
+
+        need = int(self._frac + frames * self.ratio) + 2
+        have = len(self._carry) // chans
+
+        src = self._carry
+
+        if need > have:
+
+            more = zero_block((need - have) * chans)
+
+            src = concat_blocks([self._carry, more[:self._read(more)]])
+
+        avail = len(src) // chans
+
+        if avail < need:
+
+            # Ran dry, play what we have:
+
+            frames = max(0, min(frames, int((avail - 1 - self._frac) / self.ratio) + 1)) if avail > 1 else 0
+
+        if numpy is not None:
+
+            pos = self._frac + numpy.arange(frames) * self.ratio
+            idx = pos.astype(int)
+            weight = (pos - idx).astype(numpy.float32)[:, None]
+            grid = src.reshape(-1, chans)
+
+            final[start:start + frames * chans] = (grid[idx] * (1 - weight) + grid[idx + 1] * weight).ravel()
+
+        else:
+
+            for num in range(frames):
+
+                pos = self._frac + num * self.ratio
+                idx = int(pos)
+                weight = pos - idx
+
+                for chan in range(chans):
+
+                    final[start + num * chans + chan] = src[idx * chans + chan] * (1 - weight) + \
+                        src[(idx + 1) * chans + chan] * weight
+
+        consumed = self._frac + frames * self.ratio
+        used = min(int(consumed), avail)
+
+        self._frac = consumed - used
+        self._carry = src[used * chans:]
+
+        return start + frames * chans
+
+    def _advance(self):
+
+        """
+        Moves on to the next block, keeping track of it's presentation time, the lock must be held.
+
+        :return: True if there is a block to play
+        :rtype: bool
+        """
+
+        end = None
+
+        if self._current is not None and self._current_time is not None:
+
+            end = self._current_time + len(self._current) // self.channels / self.rate
+
+        if not super()._advance():
+
+            return False
+
+        # Lost blocks have no time, they come right after the last one:
+
+        pts = self._times.pop((self._next - 1) % SEQ_MOD, None)
+
+        self._current_time = pts if pts is not None else end
+
+        return True
+
+    def _drop(self):
+
+        """
+        Drops the oldest block, the lock must be held.
+        """
+
+        self._times.pop(self._next, None)
+
+        super()._drop()
@@ -7,9 +7,29 @@ and output.
 
 We may have to do some crazy stuff for audio format normalization,
 as in an ideal world we will be working with floats.
+
+Converters can also work on whole blocks of samples(see 'utils.py'),
+using 'convert_block()' and 'revert_block()'.
+This is much faster than converting one value at a time.
+If NumPy is installed, then we use it, otherwise we fall back to the 'array' module.
 """
 
 import struct
+import sys
+
+from array import array
+
+try:
+
+    import numpy
+
+except ImportError:
+
+    # NumPy is not available, we will use the array module:
+
+    numpy = None
+
+from chaslib.sound.utils import make_block
 
 
 class BaseConvert(object):
@@ -29,6 +49,7 @@ class BaseConvert(object):
         self.struct = None  # struct instance to use for conversion
         self.byte_order = '<'  # Specifies the byte order, defaults to little-endian
         self.width = 0  # Width of the converter - size of the bytes returned
+        self.scale = None  # Value floats are scaled by, None if we don't work with integers
 
     def big_endian(self):
         """
@@ -88,6 +109,140 @@ class BaseConvert(object):
 
         raise NotImplementedError("Should be implemented in child class!")
 
+    def _swap(self):
+
+        """
+        Determines if the 'array' module needs to swap bytes to match our byte order.
+
+        :return: True if bytes must be swapped
+        :rtype: bool
+        """
+
+        return self.width > 1 and (self.byte_order == '<') != (sys.byteorder == 'little')
+
+    def convert_block(self, block, out=None):
+
+        """
+        Converts a whole block of floats into bytes.
+
+        Floats are clipped to -1 and 1 before being converted to integers.
+        The block should be interleaved,
+        but a 2D NumPy array of frames and channels is interleaved for us.
+
+        If a buffer is given, then we write into it instead of allocating new bytes.
+
+        :param block: Block of floats to convert
+        :param out: Writable buffer to write the bytes into, must be large enough
+        :type out: bytearray
+        :return: Converted bytes, or the number of bytes written if a buffer was given
+        """
+
+        size = len(block) if numpy is None else numpy.size(block)
+        nbytes = size * self.width
+
+        if numpy is not None:
+
+            samples = numpy.asarray(block, dtype=numpy.float64).ravel()
+
+            if self.scale is not None:
+
+                samples = numpy.clip(samples, -1.0, 1.0) * self.scale
+
+            dtype = self.byte_order + self.char
+
+            if out is None:
+
+                return samples.astype(dtype).tobytes()
+
+            # Convert straight into the buffer:
+
+            numpy.frombuffer(out, dtype=dtype, count=size)[:] = samples
+
+            return nbytes
+
+        # No NumPy, use the array module:
+
+        if self.scale is not None:
+
+            samples = array(self.char, [int(min(max(val, -1.0), 1.0) * self.scale) for val in block])
+
+        else:
+
+            samples = array(self.char, block)
+
+        if self._swap():
+
+            samples.byteswap()
+
+        if out is None:
+
+            return samples.tobytes()
+
+        memoryview(out)[:nbytes] = memoryview(samples).cast('B')
+
+        return nbytes
+
+    def revert_block(self, data, out=None):
+
+        """
+        Reverts a whole block of bytes into floats.
+
+        If a block is given, then we write into it instead of allocating a new block.
+
+        :param data: Bytes to revert
+        :type data: bytes
+        :param out: Block to write the floats into, must be large enough
+        :return: Interleaved block of floats, or the number of floats written if a block was given
+        """
+
+        if numpy is not None:
+
+            samples = numpy.frombuffer(data, dtype=self.byte_order + self.char)
+
+            if out is None:
+
+                # Allocate a new block:
+
+                out = dest = numpy.empty(len(samples), dtype=numpy.float32)
+
+            else:
+
+                dest = out[:len(samples)]
+
+            if self.scale is not None:
+
+                numpy.divide(samples, self.scale, out=dest, dtype=numpy.float32)
+
+            else:
+
+                dest[:] = samples
+
+            return out if dest is out else len(samples)
+
+        samples = array(self.char)
+
+        samples.frombytes(data)
+
+        if self._swap():
+
+            samples.byteswap()
+
+        if self.scale is not None:
+
+            samples = make_block([val / self.scale for val in samples])
+
+        else:
+
+            samples = make_block(samples)
+
+        if out is None:
+
+            return samples
+
+        out[:len(samples)] = samples
+
+        return len(samples)
+
 
 class NullConvert(BaseConvert):
 
@@ -128,6 +283,26 @@ class NullConvert(BaseConvert):
 
         return inp
 
+    def convert_block(self, block, out=None):
+
+        """
+        Return exactly what we were given
+
+        :return: Block input
+        """
+
+        return block
+
+    def revert_block(self, data, out=None):
+
+        """
+        Return exactly what we were given
+
+        :return: Block input
+        """
+
+        return data
+
 
 class Float32(BaseConvert):
 
@@ -187,6 +362,7 @@ class Int8(BaseConvert):
         self.gen_struct('b')
 
         self.width = 1  # Set our width
+        self.scale = 127  # Value floats are scaled by
 
     def convert(self, inp):
         
@@ -230,6 +406,7 @@ class Int16(BaseConvert):
         self.gen_struct('h')
 
         self.width = 2  # Set our width
+        self.scale = 32767  # Value floats are scaled by
 
     def convert(self, inp):
 
@@ -277,6 +454,7 @@ class Int32(BaseConvert):
         self.gen_struct("i")
 
         self.width = 4  # Configure our width
+        self.scale = 2147483647  # Value floats are scaled by
 
     def convert(self, inp):
 
@@ -11,20 +11,89 @@ so that they can effect each other.
 We primarily provide support for reading musical files,
 and getting information from a network stream,
 as this is the most relevant operation at this time.
+
+Wave files are read directly, compressed files(FLAC, Ogg) need the 'soundfile' library.
 """
 
 from os import sep
+import mmap
 import pathlib
+import struct
+import sys
+import threading
 import wave
 import queue
 
+from array import array
+
 from base64 import b64decode
 
 from chaslib.sound.convert import Int8, Int16, Int32, Float32, NullConvert, BaseConvert
-from chaslib.sound.utils import BaseModule
+from chaslib.sound.netcodec import JitterBuffer, StreamCounter, make_codec, parse_block
+from chaslib.sound.clock import SyncBuffer
+from chaslib.sound.utils import BaseModule, numpy, zero_block
 from chaslib.misctools import get_logger
 
 
+WAVE_FORMAT_PCM = 0x0001  # Format tag of PCM wave files
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE  # Format tag of extensible wave files
+
+REPEAT = object()  # Marker a StreamReader decoder puts in it's queue when it repeats
+
+PCM_TYPES = {1: ('B', 'u1', 128, 127),
+             2: ('h', '<i2', 0, 32767),
+             4: ('i', '<i4', 0, 2147483647)}  # Sample width mapped to array type, NumPy type, offset and scale
+
+
+def decode_pcm(data, width, out):
+
+    """
+    Decodes little-endian PCM bytes into floats, in one go.
+
+    8 bit audio is unsigned, everything else is signed.
+    The floats are written into the given block, which must be large enough.
+
+    :param data: PCM bytes to decode
+    :type data: bytes
+    :param width: Width of each sample in bytes
+    :type width: int
+    :param out: Block to write the floats into
+    :return: Number of samples decoded
+    :rtype: int
+    """
+
+    code, dtype, offset, scale = PCM_TYPES[width]
+
+    if numpy is not None:
+
+        ints = numpy.frombuffer(data, dtype=dtype)
+
+        dest = out[:len(ints)]
+
+        if offset:
+
+            numpy.subtract(ints, offset, out=dest, dtype=numpy.float32)
+            numpy.divide(dest, scale, out=dest)
+
+        else:
+
+            numpy.divide(ints, scale, out=dest, dtype=numpy.float32)
+
+        return len(ints)
+
+    ints = array(code)
+
+    ints.frombytes(data)
+
+    if sys.byteorder != 'little':
+
+        ints.byteswap()
+
+    out[:len(ints)] = array('f', [(val - offset) / scale for val in ints])
+
+    return len(ints)
+
+
 class BaseInput(BaseModule):
 
     """
@@ -237,22 +306,35 @@ class WaveReader(BaseInput):
     """
     Reads audio information from a wave file.
 
-    We automatically add the correct converter based upon the sample width,
-    and figure out how many channels we have.
+    We figure out the sample width and how many channels we have,
+    and decode the audio accordingly.
+
+    Instead of reading the file one frame at a time,
+    we read large chunks and decode each chunk in one go into a preallocated buffer.
+    Samples and blocks are then served from this buffer,
+    which is refilled in place once it runs out.
 
     We only support stereo and mono files.
     Anything more we will not play!
 
     :param path: Path to the wave file
     :type path: str
+    :param chunk: Number of frames to read and decode at once
+    :type chunk: int
     """
 
-    def __init__(self, path) -> None:
+    def __init__(self, path, chunk=4096) -> None:
 
         super().__init__()
 
         self.path = self.path = pathlib.Path(path).resolve()
         self.wave = None  # Wave file instance
+        self.chunk = chunk  # Number of frames to read at once
+        self.width = 0  # Sample width of the wave file
+
+        self._buffer = None  # Preallocated buffer of decoded samples
+        self._pos = 0  # Position of the next sample in the buffer
+        self._end = 0  # Number of valid samples in the buffer
 
     def start(self):
 
@@ -273,13 +355,29 @@ class WaveReader(BaseInput):
 
         self.info.channels = self.wave.getnchannels()
 
+        # Set the rate the file was recorded at, so it can be resampled:
+
+        self.info.native_rate = self.wave.getframerate()
+
         # Set the length of the wave file:
 
         self.nframes(self.wave.getnframes())
 
-        # Configure the converter:
+        # Configure the converter and the decoder:
+
+        self.width = self.wave.getsampwidth()
+
+        self.format_from_width(self.width)
 
-        self.format_from_width(self.wave.getsampwidth())
+        if self.width not in PCM_TYPES:
+
+            raise ValueError("Unsupported sample width: {}".format(self.width))
+
+        # Allocate our buffer:
+
+        self._buffer = zero_block(self.chunk * self.info.channels)
+        self._pos = 0
+        self._end = 0
 
     def stop(self):
 
@@ -298,87 +396,1062 @@ class WaveReader(BaseInput):
 
         self.wave.rewind()
 
-    def get_next(self):
+    def _read(self):
 
         """
-        Gets the next frame in the wave file and returns it.
+        Reads the next chunk from the wave file.
+
+        We never read past the length of the audio.
+
+        :return: Bytes of the chunk, empty if we are at the end
+        :rtype: bytes
         """
 
-        # Get and return:
+        frames = self.chunk
 
-        return self.wave.readframes(1)
+        if self.length is not None:
 
+            frames = min(frames, self.length - self.index)
 
-class NetReader(BaseInput):
+        if frames <= 0:
+
+            return b''
+
+        return self.wave.readframes(frames)
+
+    def _fill(self):
+
+        """
+        Reads and decodes the next chunk into our buffer.
+
+        If we reach the end of the audio,
+        then we repeat if we are allowed to, and stop otherwise.
+
+        :return: True if the buffer has new samples, False if we are done
+        :rtype: bool
+        """
+
+        data = self._read()
+
+        if not data and self.allow_repeat and self.loop:
+
+            # Repeat this audio instance:
+
+            self.repeat()
+            self.index = 0
+
+            data = self._read()
+
+        if not data:
+
+            # Otherwise, lets exit:
+
+            self.info.running = False
+
+            return False
+
+        self._end = decode_pcm(data, self.width, self._buffer)
+        self._pos = 0
+
+        # Increment our index:
+
+        self.index += self._end // self.info.channels
+
+        return True
+
+    def __next__(self):
+
+        """
+        Gets the next sample from our buffer.
+
+        :return: Next sample, None if we are done
+        :rtype: float
+        """
+
+        if self._pos >= self._end and not self._fill():
+
+            # We are done:
+
+            return None
+
+        val = self._buffer[self._pos]
+
+        self._pos += 1
+
+        return float(val)
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of frames from our buffer.
+
+        The block is shorter if we reach the end of the audio part way through.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block of samples, None if we are done
+        """
+
+        final = zero_block(frames * self.info.channels)
+        done = 0
+
+        while done < len(final):
+
+            if self._pos >= self._end and not self._fill():
+
+                # We are done, return what we have:
+
+                break
+
+            take = min(len(final) - done, self._end - self._pos)
+
+            # Copy the samples out, as our buffer will be reused:
+
+            final[done:done + take] = self._buffer[self._pos:self._pos + take]
+
+            self._pos += take
+            done += take
+
+        if done == 0:
+
+            return None
+
+        if done < len(final):
+
+            return final[:done]
+
+        return final
+
+
+class MappedWave:
 
     """
-    NetReader - Reads audio frames given to us by the CHAS server.
+    A wave file that is memory mapped.
 
-    Because we receive information in float format,
-    we can simply pass the content along without any extra conversion!
+    We parse the RIFF header once, and map the whole file into memory.
+    The operating system pages in the audio as it is read,
+    so opening even very long files is instant, and uses almost no memory.
 
-    IDHandler4 handles the process of creating us, and adding audio information to our queue.
-    We really don't do much, we just react to IDHandler4 and pass information along.
+    Mapped files are shared through a cache,
+    so several readers playing the same file use the same mapping.
+    Use 'acquire()' to get a mapped file, and 'release()' when you are done with it.
+    The file is unmapped once the last reader releases it.
+
+    :param path: Path to the wave file
+    :type path: pathlib.Path
     """
 
-    def __init__(self) -> None:
+    _cache = {}  # Mapped files keyed by path, modification time and size
+    _lock = threading.Lock()  # Lock protecting the cache
 
-        super().__init__()
+    def __init__(self, path):
 
-        self.queue = queue.Queue()  # Queue instance audio information is stored in
-        self.allow_repeat = False  # Disable repetition
-        self.info.name = "Network Audio Stream"
-        self.info.channels = 2
+        self.path = path  # Path to the wave file
+        self.key = None  # Key of this mapping in the cache
+        self.users = 0  # Number of readers using this mapping
 
-        self.frames = None  # Tuple of frames to return
-        self.index_val = 0  # Index of the frame data we are on
+        self.channels = 0  # Number of channels
+        self.rate = 0  # Sample rate
+        self.width = 0  # Width of each sample in bytes
+        self.frame_width = 0  # Width of each frame in bytes
+        self.offset = 0  # Offset of the audio data in the file
+        self.frames = 0  # Number of frames in the file
 
-        self.log = get_logger("NetReader")
+        with open(path, 'rb') as file:
 
-        self.bind_converter(NullConvert())
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)  # Mapping of the file
 
-    def put(self, data):
+        try:
+
+            self._parse()
+
+        except Exception:
+
+            self.map.close()
+
+            raise
+
+        self.view = memoryview(self.map)  # View of the whole file
+
+    @classmethod
+    def acquire(cls, path):
 
         """
-        Adds the given input to the audio queue.
+        Gets a mapped wave file from the cache, mapping it if necessary.
 
-        This should primarily be used by the IDHandler4,
-        as that component handles getting and routing audio information.
+        :param path: Path to the wave file
+        :type path: str
+        :return: Mapped wave file
+        :rtype: MappedWave
+        """
+
+        path = pathlib.Path(path).resolve()
+
+        stat = path.stat()
+
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+
+        with cls._lock:
+
+            mapped = cls._cache.get(key)
+
+            if mapped is None:
+
+                mapped = cls._cache[key] = cls(path)
+
+                mapped.key = key
 
-        The given data should be exactly ONE frame of audio information. 
+            mapped.users += 1
+
+        return mapped
+
+    def release(self):
+
+        """
+        Releases this mapped file.
+
+        Once nobody is using us, we are removed from the cache and unmapped.
         """
 
-        # Put the data into the queue
+        with self._lock:
+
+            self.users -= 1
+
+            if self.users > 0:
+
+                return
+
+            del self._cache[self.key]
+
+        try:
+
+            self.view.release()
 
-        self.queue.put(data)
+            self.map.close()
 
-    def get_next(self):
+        except BufferError:
+
+            # Someone still holds a view, the mapping is closed once they let go:
+
+            pass
+
+    def _parse(self):
 
         """
-        Gets the next value from our queue, decodes it, and sends it along.
+        Parses the RIFF header, and finds the format and data chunks.
 
-        :return: Byte representation of the frame
-        :rtype: bytes
+        :raises ValueError: If this is not a PCM wave file
         """
 
-        # CHeck if our index is valid:
+        if self.map[0:4] != b'RIFF' or self.map[8:12] != b'WAVE':
 
-        if self.frames is None or self.index_val == len(self.frames):
+            raise ValueError("Not a wave file: {}".format(self.path))
 
-            # Clear our frame info:
+        pos = 12
+        fmt = None
 
-            self.frames = self.queue.get()
+        while pos + 8 <= len(self.map):
 
-            self.index_val = 0
+            chunk_id = self.map[pos:pos + 4]
+            size = struct.unpack_from('<I', self.map, pos + 4)[0]
 
-        # Get the frame:
+            if chunk_id == b'fmt ':
 
-        frame = self.frames[self.index_val]
+                fmt = struct.unpack_from('<HHIIHH', self.map, pos + 8)
 
-        # Increment our index:
+            elif chunk_id == b'data':
 
-        self.index_val += 1
+                if fmt is None:
+
+                    raise ValueError("Data chunk before format chunk: {}".format(self.path))
+
+                tag, self.channels, self.rate, _, self.frame_width, bits = fmt
+
+                if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+
+                    raise ValueError("Unsupported wave format {}: {}".format(tag, self.path))
+
+                self.width = bits // 8
+                self.offset = pos + 8
+
+                # Truncated files report more data than they have:
+
+                self.frames = min(size, len(self.map) - self.offset) // self.frame_width
+
+                return
+
+            # Chunks are padded to an even size:
+
+            pos += 8 + size + (size & 1)
+
+        raise ValueError("No data chunk found: {}".format(self.path))
+
+    def frames_view(self, start, num):
+
+        """
+        Returns a zero-copy view of the bytes of the given frames.
+
+        :param start: First frame to view
+        :type start: int
+        :param num: Number of frames to view
+        :type num: int
+        :return: View of the frame bytes
+        :rtype: memoryview
+        """
+
+        start = max(0, min(start, self.frames))
+        num = max(0, min(num, self.frames - start))
+
+        begin = self.offset + start * self.frame_width
+
+        return self.view[begin:begin + num * self.frame_width]
+
+    def frames_array(self, start, num):
+
+        """
+        Returns a zero-copy NumPy view of the given frames.
+
+        The view has one row per frame and one column per channel,
+        and contains the raw integer samples.
+
+        :param start: First frame to view
+        :type start: int
+        :param num: Number of frames to view
+        :type num: int
+        :return: Array of the frames
+        :rtype: numpy.ndarray
+        :raises ModuleNotFoundError: If NumPy is not installed
+        """
+
+        if numpy is None:
+
+            raise ModuleNotFoundError("We require NumPy to be installed!")
+
+        data = self.frames_view(start, num)
+
+        return numpy.frombuffer(data, dtype=PCM_TYPES[self.width][1]).reshape(-1, self.channels)
+
+
+class MmapWaveReader(WaveReader):
+
+    """
+    Reads audio information from a memory mapped wave file.
+
+    We work just like WaveReader, except the file is memory mapped(see MappedWave).
+    Chunks are decoded straight out of the mapping, without reading them into memory first.
+    Starting is instant no matter how long the file is,
+    and many readers can play the same file at once without duplicating it.
+
+    We also support seeking to any frame.
+
+    :param path: Path to the wave file
+    :type path: str
+    :param chunk: Number of frames to decode at once
+    :type chunk: int
+    """
+
+    def __init__(self, path, chunk=4096) -> None:
+
+        super().__init__(path, chunk=chunk)
+
+        self.mapped = None  # Mapped wave file
+
+    def start(self):
+
+        """
+        Starts this module,
+        we map the wave file, and get relevant information from it.
+        """
+
+        self.mapped = MappedWave.acquire(self.path)
+
+        # Set the name of this chin to the name of the file:
+
+        self.info.name = self.path.name
+
+        # Set the number of channels:
+
+        self.info.channels = self.mapped.channels
+
+        # Set the rate the file was recorded at, so it can be resampled:
+
+        self.info.native_rate = self.mapped.rate
+
+        # Set the length of the wave file:
+
+        self.nframes(self.mapped.frames)
+
+        self.width = self.mapped.width
+
+        if self.width not in PCM_TYPES:
+
+            raise ValueError("Unsupported sample width: {}".format(self.width))
+
+        # Allocate our buffer:
+
+        self._buffer = zero_block(self.chunk * self.info.channels)
+        self._pos = 0
+        self._end = 0
+
+    def stop(self):
+
+        """
+        Stops this module,
+        we release the mapped file.
+        """
+
+        if self.mapped is not None:
+
+            self.mapped.release()
+
+            self.mapped = None
+
+    def repeat(self):
+
+        """
+        Nothing to do, our index is reset to zero, which is all we need.
+        """
+
+        pass
+
+    def seek(self, frame):
+
+        """
+        Moves to the given frame.
+
+        :param frame: Frame to move to
+        :type frame: int
+        """
+
+        self.index = max(0, min(frame, self.length))
+
+        # Throw away what we have buffered:
+
+        self._pos = 0
+        self._end = 0
+
+    def _read(self):
+
+        """
+        Gets a view of the next chunk in the mapped file.
+
+        :return: View of the chunk, empty if we are at the end
+        :rtype: memoryview
+        """
+
+        return self.mapped.frames_view(self.index, min(self.chunk, self.length - self.index))
+
+
+class StreamReader(BaseInput):
+
+    """
+    Reads audio information from a compressed file, like FLAC or Ogg.
+
+    We use the 'soundfile' library(libsndfile), which can decode FLAC, Ogg Vorbis and Opus.
+    The file is decoded a chunk at a time by a background thread,
+    which keeps a bounded queue of decoded blocks topped up.
+    This way only a few chunks are ever in memory,
+    and the mixer never waits on the decoder unless it falls behind.
+    If the decoder has nothing ready in time, then we return silence and count an underrun.
+
+    We also support seeking to any frame.
+
+    On the creation of this module,
+    we attempt to import the soundfile library.
+    If this import fails, then we will raise an exception,
+    and will refuse to instantiate.
+
+    :param path: Path to the audio file
+    :type path: str
+    :param chunk: Number of frames to decode at once
+    :type chunk: int
+    :param buffers: Number of decoded chunks to keep ready
+    :type buffers: int
+    :param timeout: Time in seconds to wait for the decoder
+    :type timeout: float
+    """
+
+    def __init__(self, path, chunk=4096, buffers=8, timeout=0.1) -> None:
+
+        super().__init__()
+
+        # Attempt to load soundfile:
+
+        try:
 
-        # Return:
+            import soundfile
+
+        except:
+
+            # Could not import soundfile! Raise an exception of our own
+
+            raise ModuleNotFoundError("We require soundfile to be installed!")
+
+        self.soundfile = soundfile
+        self.path = pathlib.Path(path).resolve()  # Path to the audio file
+        self.chunk = chunk  # Number of frames to decode at once
+        self.timeout = timeout  # Time to wait for the decoder
+        self.file = None  # Instance of the audio file
+        self.thread = None  # Decoder thread
+        self.underruns = 0  # Number of times the decoder was not ready
+
+        self.queue = queue.Queue(maxsize=buffers)  # Decoded blocks, tagged with their seek generation
+        self.running = False  # Value determining if the decoder is running
+
+        self._gen = 0  # Seek generation, blocks from older generations are thrown away
+        self._seek_to = None  # Frame the decoder should seek to
+        self._lock = threading.Lock()  # Lock protecting seek requests
+        self._wake = threading.Event()  # Event waking up the decoder once it is done
+        self._done = False  # Value determining if we have read everything
+
+        self._block = None  # Block we are reading from
+        self._pos = 0  # Position of the next sample in the block
+
+    def start(self):
+
+        """
+        Starts this module,
+        we open the file and start the decoder.
+        """
+
+        self.file = self.soundfile.SoundFile(str(self.path))
+
+        # Set the name of this chain to the name of the file:
+
+        self.info.name = self.path.name
+
+        # Set the number of channels:
+
+        self.info.channels = self.file.channels
+
+        # Set the rate the file was recorded at, so it can be resampled:
+
+        self.info.native_rate = self.file.samplerate
+
+        # Set the length of the file, if it is known:
+
+        if self.file.frames > 0:
+
+            self.nframes(self.file.frames)
+
+        self._block = None
+        self._pos = 0
+        self._seek_to = None
+        self._done = False
+        self.underruns = 0
+
+        # Start the decoder:
+
+        self.running = True
+
+        self.thread = threading.Thread(target=self._decode, name='StreamReader', daemon=True)
+        self.thread.start()
+
+        # Wait for the first chunk, so we don't start with silence:
+
+        block = self._next_block(timeout=1)
+
+        if block is None:
+
+            self._done = True
+
+        elif block is not False:
+
+            self._block = block
+
+    def stop(self):
+
+        """
+        Stops this module,
+        we stop the decoder and close the file.
+        """
+
+        self.running = False
+
+        self._wake.set()
+
+        if self.thread is not None:
+
+            # Make room so the decoder is not stuck waiting:
+
+            self._drain()
+
+            self.thread.join()
+
+            self.thread = None
+
+        if self.file is not None:
+
+            self.file.close()
+
+            self.file = None
+
+    def seek(self, frame):
+
+        """
+        Moves to the given frame.
+
+        Blocks decoded before the seek are thrown away.
+
+        :param frame: Frame to move to
+        :type frame: int
+        """
+
+        if self.length is not None:
+
+            frame = min(frame, self.length)
+
+        with self._lock:
+
+            self._gen += 1
+            self._seek_to = max(0, frame)
+
+        self.index = max(0, frame)
+
+        # Throw away what we have:
+
+        self._block = None
+        self._pos = 0
+        self._done = False
+
+        self._drain()
+
+        self._wake.set()
+
+    def _drain(self):
+
+        """
+        Empties the queue of decoded blocks.
+        """
+
+        try:
+
+            while True:
+
+                self.queue.get_nowait()
+
+        except queue.Empty:
+
+            pass
+
+    def _put(self, item):
+
+        """
+        Puts an item in the queue, waiting for room while we are running.
+
+        :param item: Item to put
+        :type item: tuple
+        """
+
+        while self.running:
+
+            try:
+
+                self.queue.put(item, timeout=0.1)
+
+                return
+
+            except queue.Full:
+
+                continue
+
+    def _decode(self):
+
+        """
+        Decoder thread, decodes chunks until we are stopped.
+
+        At the end of the file, we rewind if we are looping,
+        and put None in the queue otherwise.
+        """
+
+        done = False
+
+        while self.running:
+
+            with self._lock:
+
+                gen = self._gen
+                seek = self._seek_to
+
+                self._seek_to = None
+
+            if seek is not None:
+
+                self.file.seek(seek)
+
+                done = False
+
+            if done:
+
+                # Wait for a seek or for us to be stopped:
+
+                self._wake.wait(0.1)
+                self._wake.clear()
+
+                continue
+
+            block = self.file.read(self.chunk, dtype='float32')
+
+            if len(block) == 0:
+
+                if self.allow_repeat and self.loop:
+
+                    # Repeat this audio instance:
+
+                    self.file.seek(0)
+
+                    self._put((gen, REPEAT))
+
+                    continue
+
+                done = True
+
+                self._put((gen, None))
+
+                continue
+
+            self._put((gen, block.ravel()))
+
+    def _next_block(self, timeout=None):
+
+        """
+        Gets the next decoded block from the queue.
+
+        :param timeout: Time in seconds to wait, None uses our timeout
+        :type timeout: float
+        :return: Block, None if we are done, or False if the decoder is not ready
+        """
+
+        while True:
+
+            try:
+
+                gen, block = self.queue.get(timeout=self.timeout if timeout is None else timeout)
+
+            except queue.Empty:
+
+                return False
+
+            if gen != self._gen:
+
+                # Decoded before a seek:
+
+                continue
+
+            if block is REPEAT:
+
+                # We repeated:
+
+                self.index = 0
+
+                continue
+
+            return block
+
+    def _fill(self):
+
+        """
+        Makes sure we have samples to read.
+
+        :return: True if we have samples, None if we are done, False if the decoder is not ready
+        """
+
+        if self._block is not None and self._pos < len(self._block):
+
+            return True
+
+        if self._done:
+
+            return None
+
+        block = self._next_block()
+
+        if block is None:
+
+            self._done = True
+            self.info.running = False
+
+            return None
+
+        if block is False:
+
+            self.underruns += 1
+
+            return False
+
+        self._block = block
+        self._pos = 0
+
+        return True
+
+    def __next__(self):
+
+        """
+        Gets the next sample.
+
+        :return: Next sample, 0 if the decoder is not ready, None if we are done
+        :rtype: float
+        """
+
+        ready = self._fill()
+
+        if ready is None:
+
+            return None
+
+        if not ready:
+
+            return 0.0
+
+        val = self._block[self._pos]
+
+        self._pos += 1
+
+        if self._pos % self.info.channels == 0:
+
+            self.index += 1
+
+        return float(val)
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of decoded frames.
+
+        If the decoder is not ready, the rest of the block is silence.
+        The block is shorter if we reach the end of the file part way through.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block of samples, None if we are done
+        """
+
+        final = zero_block(frames * self.info.channels)
+        done = 0
+
+        while done < len(final):
+
+            ready = self._fill()
+
+            if ready is None:
+
+                # We are done, return what we have:
+
+                if done == 0:
+
+                    return None
+
+                final = final[:done]
+
+                break
+
+            if not ready:
+
+                # Decoder is behind, the rest is silence:
+
+                break
+
+            take = min(len(final) - done, len(self._block) - self._pos)
+
+            final[done:done + take] = self._block[self._pos:self._pos + take]
+
+            self._pos += take
+            done += take
+
+        self.index += done // self.info.channels
+
+        return final
+
+
+STREAM_TYPES = ('.flac', '.ogg', '.oga', '.opus')  # Extensions played with a StreamReader
+SONG_TYPES = ('.wav',) + STREAM_TYPES  # Extensions of every file type we can play
+
+
+class NetReader(BaseInput):
+
+    """
+    NetReader - Reads audio frames given to us by the CHAS server.
+
+    The server sends us blocks of audio(see 'netcodec.py'),
+    which we decode into floats as a whole when they arrive.
+    We also accept the legacy format, where frames are lists of floats.
+
+    Decoded blocks go into a jitter buffer, which puts them back in order,
+    fills in lost blocks with silence, and plays them out after a delay that adapts to the network.
+    If we are given an estimate of the server clock,
+    then timed blocks are played at their presentation time instead(see 'clock.py'),
+    so every room hears the same thing at the same moment.
+    We never wait on the network, if nothing has arrived then we return silence.
+
+    IDHandler4 handles the process of creating us, and adding audio information to our queue.
+    We really don't do much, we just react to IDHandler4 and pass information along.
+
+    :param rate: Sample rate of the stream, None if it matches the OutputHandler
+    :type rate: int
+    :param min_delay: Smallest playout delay in seconds
+    :type min_delay: float
+    :param max_delay: Largest playout delay in seconds
+    :type max_delay: float
+    :param clock: Estimate of the server clock, None plays blocks as they arrive
+    :type clock: ClockSync
+    :param latency: Seconds between audio leaving the mixer and being heard, used with a clock
+    :type latency: float
+    """
+
+    CHUNK = 256  # Number of frames we get from the jitter buffer when sampled one by one
+
+    def __init__(self, rate=None, min_delay=0.02, max_delay=0.5, clock=None, latency=0.0) -> None:
+
+        super().__init__()
+
+        self.rate = rate  # Sample rate of the stream
+        self.allow_repeat = False  # Disable repetition
+        self.info.name = "Network Audio Stream"
+        self.info.channels = 2
+        self.info.native_rate = rate
+
+        self.clock = clock  # Estimate of the server clock
+
+        if clock is None:
+
+            self.buffer = JitterBuffer(rate or 44100, 2, min_delay, max_delay)  # Jitter buffer of received blocks
+
+        else:
+
+            self.buffer = SyncBuffer(clock, rate or 44100, 2, min_delay, max_delay, latency)
+        self.codecs = {}  # Codec objects keyed by codec ID, some codecs keep state
+
+        self.samples = ()  # Interleaved samples of the current block
+        self.index_val = 0  # Index of the sample we are on
+
+        self.counter = StreamCounter()  # Throughput counter of this stream
+
+        self.log = get_logger("NetReader")
+
+        self.bind_converter(NullConvert())
+
+    def start(self):
+
+        """
+        Starts this module,
+        if we don't know the rate of the stream then it's the rate of the OutputHandler.
+        """
+
+        if self.rate is None and self.info.rate:
+
+            self.buffer.rate = self.info.rate
+
+    def put(self, data):
+
+        """
+        Adds the given frames to the audio queue.
+
+        This should primarily be used by the IDHandler4,
+        as that component handles getting and routing audio information.
+
+        The given data should be a list of frames in the legacy format,
+        where each frame is a list of floats.
+        """
+
+        # Flatten the frames and put them into the buffer
+
+        self.buffer.put([val for frame in data for val in frame])
+
+        self.counter.add(len(data), 0)
+
+    def put_block(self, block):
+
+        """
+        Decodes the given block and adds it to the audio queue.
+
+        :param block: Encoded block
+        :type block: bytes
+        """
+
+        codec_id, channels, frames, seq, position, pts, payload = parse_block(block)
+
+        codec = self.codecs.get(codec_id)
+
+        if codec is None:
+
+            codec = self.codecs[codec_id] = make_codec(codec_id, rate=self.buffer.rate, channels=channels)
+
+        samples = codec.decode(payload, channels, frames)
+
+        if len(samples) != channels * frames:
+
+            raise ValueError("Block is truncated! Expected {} samples, got {}".format(channels * frames, len(samples)))
+
+        if self.clock is None:
+
+            self.buffer.put(samples, seq, position)
+
+        else:
+
+            self.buffer.put(samples, seq, position, pts=pts)
+
+        self.counter.add(frames, len(block))
+
+    def stats(self):
+
+        """
+        Returns the throughput of this stream, and the counters of our jitter buffer.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return dict(self.counter.stats(), **self.buffer.stats())
+
+    def __next__(self):
+
+        """
+        Gets the next sample, getting the next chunk from the jitter buffer if we have run out.
+
+        :return: Next sample
+        :rtype: float
+        """
+
+        if self.index_val >= len(self.samples):
+
+            # Get the next chunk:
+
+            self.samples = self.buffer.get(self.CHUNK)
+
+            self.index_val = 0
+
+        # Get the sample:
+
+        val = self.samples[self.index_val]
+
+        # Increment our index:
+
+        self.index_val += 1
+
+        return float(val)
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of frames from the jitter buffer.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block of samples
+        """
+
+        if self.index_val < len(self.samples):
+
+            # Use up what is left of the last chunk first:
+
+            final = zero_block(frames * self.info.channels)
+            left = self.samples[self.index_val:self.index_val + len(final)]
+
+            final[:len(left)] = left
+            final[len(left):] = self.buffer.get((len(final) - len(left)) // self.info.channels)
+
+            self.index_val += len(left)
+
+            return final
 
-        return frame
+        return self.buffer.get(frames)
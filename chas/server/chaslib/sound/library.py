@@ -0,0 +1,503 @@
+"""
+Index of the songs and playlists in the media directory.
+
+Finding a song used to walk the whole song directory on every request,
+which takes seconds once the library holds tens of thousands of files.
+Instead, we keep an index of every song and playlist in a SQLite database,
+so finding one is a single lookup.
+
+The index is kept on disk, and is brought up to date by comparing modification times.
+A directory's modification time changes when files are added to or removed from it,
+so a refresh only has to stat each known directory,
+and only lists the directories that have changed.
+The MediaLibrary can refresh itself on a background thread,
+and also refreshes when a lookup comes up empty, so new files are found right away.
+
+Titles, folders and playlist names are normalized before they are stored and looked up,
+so 'play spanish flea' finds 'Spanish_Flea.wav'.
+If there is no exact match, then we fall back to fuzzy matching,
+which forgives the small mistakes speech recognition makes.
+
+Songs are laid out like so:
+
+    songs/<folder>/.../<title>.<ext>
+    songs/playlists/<name>.txt
+
+Where the folder is usually the artist, and can hold songs at any depth.
+"""
+
+import difflib
+import os
+import re
+import sqlite3
+import threading
+
+from chaslib.sound.input import SONG_TYPES
+from chaslib.misctools import get_logger
+
+PLAYLIST_TYPE = '.txt'  # Extension of playlist files
+PLAYLIST_DIR = 'playlists'  # Directory holding playlists, in the song directory
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime REAL);
+CREATE TABLE IF NOT EXISTS songs (path TEXT PRIMARY KEY, dir TEXT, title TEXT, folder TEXT, name TEXT);
+CREATE TABLE IF NOT EXISTS playlists (path TEXT PRIMARY KEY, dir TEXT, title TEXT, name TEXT);
+CREATE INDEX IF NOT EXISTS songs_title ON songs (title, folder);
+CREATE INDEX IF NOT EXISTS songs_dir ON songs (dir);
+CREATE INDEX IF NOT EXISTS playlists_title ON playlists (title);
+CREATE INDEX IF NOT EXISTS playlists_dir ON playlists (dir);
+"""
+
+
+def normalize(name):
+
+    """
+    Normalizes a title, folder or playlist name for lookup.
+
+    We lowercase the name, treat underscores as spaces, remove punctuation,
+    and collapse whitespace.
+
+    :param name: Name to normalize
+    :type name: str
+    :return: Normalized name
+    :rtype: str
+    """
+
+    name = re.sub(r'[^\w\s]', '', name.lower().replace('_', ' '))
+
+    return ' '.join(name.split())
+
+
+class MediaLibrary:
+
+    """
+    Index of the songs and playlists in a song directory.
+
+    Call 'refresh()' to bring the index up to date,
+    or 'start()' to refresh it every so often on a background thread.
+    Songs and playlists are found with 'find_song()' and 'find_playlist()'.
+
+    :param songs: Path to the song directory
+    :type songs: str
+    :param path: Path to the index database, ':memory:' keeps the index in memory
+    :type path: str
+    :param cutoff: Smallest similarity, from 0 to 1, a fuzzy match must have
+    :type cutoff: float
+    """
+
+    def __init__(self, songs, path=':memory:', cutoff=0.75):
+
+        self.songs = os.path.abspath(songs)  # Path to the song directory
+        self.playlists = os.path.join(self.songs, PLAYLIST_DIR)  # Path to the playlist directory
+        self.path = path  # Path to the index database
+        self.cutoff = cutoff  # Smallest similarity of a fuzzy match
+
+        self.db = sqlite3.connect(path, check_same_thread=False)  # Connection to the index
+        self.lock = threading.RLock()  # Lock protecting the index
+        self.log = get_logger('CHAS:LIBRARY')
+
+        self.thread = None  # Thread refreshing the index
+        self.stopping = threading.Event()  # Event set when the thread should stop
+
+        self._titles = None  # Cached titles and folders, used for fuzzy matching
+        self.scanned = 0  # Number of directories listed by the last refresh
+
+        self.db.executescript(SCHEMA)
+
+    def refresh(self):
+
+        """
+        Brings the index up to date with the song directory.
+
+        We stat every known directory, and only list the ones that have changed.
+        Directories that no longer exist are removed, with everything in them.
+
+        :return: Number of directories that changed
+        :rtype: int
+        """
+
+        with self.lock:
+
+            known = {}  # Modification time of each known directory
+            children = {}  # Known subdirectories of each directory
+
+            for path, parent, mtime in self.db.execute('SELECT path, parent, mtime FROM dirs'):
+
+                known[path] = mtime
+
+                children.setdefault(parent, []).append(path)
+
+            seen = set()
+            stack = [self.songs]
+            changed = 0
+
+            while stack:
+
+                path = stack.pop()
+
+                try:
+
+                    mtime = os.stat(path).st_mtime
+
+                except OSError:
+
+                    # Directory is gone, it is removed below:
+
+                    continue
+
+                seen.add(path)
+
+                if known.get(path) == mtime:
+
+                    # Nothing was added or removed, move on to the subdirectories:
+
+                    stack.extend(children.get(path, ()))
+
+                    continue
+
+                stack.extend(self._scan(path, mtime))
+
+                changed += 1
+
+            for path in set(known) - seen:
+
+                # Remove directories that are gone:
+
+                self.db.execute('DELETE FROM dirs WHERE path = ?', (path,))
+                self.db.execute('DELETE FROM songs WHERE dir = ?', (path,))
+                self.db.execute('DELETE FROM playlists WHERE dir = ?', (path,))
+
+                changed += 1
+
+            self.db.commit()
+
+            if changed:
+
+                # Titles have changed:
+
+                self._titles = None
+
+            self.scanned = changed
+
+            return changed
+
+    def find_song(self, title, folder=None):
+
+        """
+        Finds a song by title, and optionally by folder.
+
+        We look for an exact match of the normalized title first,
+        then refresh the index and look again, in case the song was just added.
+        If we still find nothing, then we find the closest title.
+        The folder is matched the same way.
+
+        :param title: Title of the song
+        :type title: str
+        :param folder: Folder to look in, usually the artist
+        :type folder: str
+        :return: Path to the song, or None if nothing matched
+        :rtype: str
+        """
+
+        title = normalize(title)
+        folder = normalize(folder) if folder is not None else None
+
+        path = self._find_song(title, folder)
+
+        if path is None and self.refresh():
+
+            # Index was out of date, try again:
+
+            path = self._find_song(title, folder)
+
+        if path is not None:
+
+            return path
+
+        # Try a fuzzy match:
+
+        titles, folders = self._get_titles()
+
+        if folder is not None and folder not in folders:
+
+            folder = self._closest(folder, folders)
+
+            if folder is None:
+
+                return None
+
+        title = self._closest(title, titles.get(folder) if folder is not None else titles[None])
+
+        if title is None:
+
+            return None
+
+        return self._find_song(title, folder)
+
+    def find_playlist(self, title):
+
+        """
+        Finds a playlist by name.
+
+        Like 'find_song()', we refresh and then try a fuzzy match if there is no exact match.
+
+        :param title: Name of the playlist
+        :type title: str
+        :return: Path to the playlist, or None if nothing matched
+        :rtype: str
+        """
+
+        title = normalize(title)
+
+        path = self._find_playlist(title)
+
+        if path is None and self.refresh():
+
+            path = self._find_playlist(title)
+
+        if path is not None:
+
+            return path
+
+        with self.lock:
+
+            names = [row[0] for row in self.db.execute('SELECT DISTINCT title FROM playlists')]
+
+        title = self._closest(title, names)
+
+        return None if title is None else self._find_playlist(title)
+
+    def start(self, interval=30.0):
+
+        """
+        Starts refreshing the index on a background thread.
+
+        The first refresh happens right away.
+
+        :param interval: Seconds between refreshes
+        :type interval: float
+        """
+
+        if self.thread is not None:
+
+            # Already running:
+
+            return
+
+        self.stopping.clear()
+
+        self.thread = threading.Thread(target=self._run, args=(interval,), daemon=True, name='CHAS:LIBRARY')
+        self.thread.start()
+
+    def stop(self):
+
+        """
+        Stops refreshing the index.
+        """
+
+        self.stopping.set()
+
+        if self.thread is not None:
+
+            self.thread.join()
+
+            self.thread = None
+
+    def close(self):
+
+        """
+        Stops refreshing and closes the index.
+        """
+
+        self.stop()
+
+        with self.lock:
+
+            self.db.close()
+
+    def stats(self):
+
+        """
+        Returns the size of the index.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        with self.lock:
+
+            return {'songs': self.db.execute('SELECT COUNT(*) FROM songs').fetchone()[0],
+                    'playlists': self.db.execute('SELECT COUNT(*) FROM playlists').fetchone()[0],
+                    'dirs': self.db.execute('SELECT COUNT(*) FROM dirs').fetchone()[0],
+                    'scanned': self.scanned}
+
+    def _run(self, interval):
+
+        # Refreshes the index until we are stopped
+
+        while not self.stopping.is_set():
+
+            try:
+
+                changed = self.refresh()
+
+                if changed:
+
+                    self.log.debug("Refreshed media index, {} directories changed".format(changed))
+
+            except Exception as e:
+
+                self.log.warning("Failed to refresh media index: {}".format(e))
+
+            # Sleep until the next refresh, waking up if we are stopped:
+
+            self.stopping.wait(interval)
+
+    def _scan(self, path, mtime):
+
+        """
+        Lists a directory, and replaces it's entries in the index.
+
+        :param path: Path to the directory
+        :type path: str
+        :param mtime: Modification time of the directory
+        :type mtime: float
+        :return: List of subdirectories
+        :rtype: list
+        """
+
+        subdirs = []
+        songs = []
+        playlists = []
+
+        rel = os.path.relpath(path, self.songs)
+        folder = normalize(rel.split(os.sep)[0]) if rel != os.curdir else ''
+        in_playlists = path == self.playlists or path.startswith(self.playlists + os.sep)
+
+        try:
+
+            entries = list(os.scandir(path))
+
+        except OSError:
+
+            entries = []
+
+        for entry in entries:
+
+            if entry.is_dir():
+
+                subdirs.append(entry.path)
+
+                continue
+
+            name, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+
+            if ext in SONG_TYPES:
+
+                songs.append((entry.path, path, normalize(name), folder, name))
+
+            elif in_playlists and ext == PLAYLIST_TYPE:
+
+                playlists.append((entry.path, path, normalize(name), name))
+
+        self.db.execute('DELETE FROM songs WHERE dir = ?', (path,))
+        self.db.execute('DELETE FROM playlists WHERE dir = ?', (path,))
+        self.db.executemany('INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?)', songs)
+        self.db.executemany('INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?)', playlists)
+        self.db.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)',
+                        (path, os.path.dirname(path) if path != self.songs else None, mtime))
+
+        return subdirs
+
+    def _find_song(self, title, folder):
+
+        # Looks up a song by normalized title and folder
+
+        with self.lock:
+
+            if folder is None:
+
+                row = self.db.execute('SELECT path FROM songs WHERE title = ? ORDER BY path LIMIT 1',
+                                      (title,)).fetchone()
+
+            else:
+
+                row = self.db.execute('SELECT path FROM songs WHERE title = ? AND folder = ? ORDER BY path LIMIT 1',
+                                      (title, folder)).fetchone()
+
+        return row[0] if row else None
+
+    def _find_playlist(self, title):
+
+        # Looks up a playlist by normalized name
+
+        with self.lock:
+
+            row = self.db.execute('SELECT path FROM playlists WHERE title = ? ORDER BY path LIMIT 1',
+                                  (title,)).fetchone()
+
+        return row[0] if row else None
+
+    def _get_titles(self):
+
+        """
+        Gets the titles of every song, for fuzzy matching.
+
+        Titles are grouped by folder, and all titles are kept under None.
+        They are cached until the index changes.
+
+        :return: Dictionary of title lists keyed by folder, and list of folders
+        :rtype: tuple
+        """
+
+        with self.lock:
+
+            if self._titles is None:
+
+                titles = {None: set()}
+
+                for title, folder in self.db.execute('SELECT title, folder FROM songs'):
+
+                    titles[None].add(title)
+                    titles.setdefault(folder, set()).add(title)
+
+                titles = {key: sorted(val) for key, val in titles.items()}
+
+                self._titles = titles, [key for key in titles if key is not None]
+
+            return self._titles
+
+    def _closest(self, name, names):
+
+        """
+        Finds the closest name to the given name.
+
+        Names that share a word with the given name are tried first,
+        as they are far fewer than all names.
+
+        :param name: Name to match
+        :type name: str
+        :param names: Names to choose from
+        :type names: list
+        :return: Closest name, or None if none are close enough
+        :rtype: str
+        """
+
+        if not names or not name:
+
+            return None
+
+        words = set(name.split())
+
+        likely = [other for other in names if words.intersection(other.split())]
+
+        for group in (likely, names):
+
+            found = difflib.get_close_matches(name, group, n=1, cutoff=self.cutoff)
+
+            if found:
+
+                return found[0]
+
+        return None
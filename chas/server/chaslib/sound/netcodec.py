@@ -0,0 +1,1240 @@
+"""
+Codec for streaming audio over the network.
+
+Instead of sending audio frames as JSON lists of floats,
+we pack a block of frames into PCM bytes in one step,
+and prefix it with a small header describing the block:
+
+    +---------+----------+---------------+----------------+
+    | codec   | channels | frames        | PCM data       |
+    | 1 byte  | 1 byte   | 4 bytes       | variable       |
+    +---------+----------+---------------+----------------+
+
+The header is big-endian, the PCM data is little-endian and interleaved.
+We support the following codecs:
+
+    - pcm16 - Signed 16 bit integers, 2 bytes per sample
+    - f32 - 32 bit floats, 4 bytes per sample
+    - adpcm - IMA-ADPCM, 4 bits per sample, needs no dependencies
+    - opus - Opus, needs 'opuslib' and a sample rate Opus supports *
+
+If the top bit of the codec is set, then the block is sequenced,
+and the header is followed by a sequence number and the position of the first frame:
+
+    +---------------+---------------+
+    | sequence      | position      |
+    | 4 bytes       | 4 bytes       |
+    +---------------+---------------+
+
+Sequence numbers let the receiver detect blocks that were lost or dropped,
+and the position lets it measure how late each block is.
+
+If the second bit of the codec is set, then the block is timed,
+and a presentation time follows(8 byte float, after the sequence header if there is one).
+This is the time on the server clock the first frame should be heard,
+so clients in different rooms can play it at the same moment(see 'clock.py').
+Only clients that negotiated a codec get sequenced blocks, older clients can't read them.
+
+ADPCM and Opus keep state between blocks, so they are encoded and decoded by codec objects(see 'make_codec()').
+ADPCM blocks start with the state of each channel, so they can still be decoded on their own.
+
+If NumPy is installed, then we use it to pack and unpack the samples.
+Otherwise, we fall back to the 'array' module, which is slower but has no dependencies.
+
+We also offer a simple counter for measuring the throughput of a stream,
+and a jitter buffer that puts received blocks back in order and smooths out their arrival times.
+"""
+
+import struct
+import sys
+import threading
+
+from array import array
+from itertools import chain
+
+from chaslib.sound.utils import get_time, make_block, zero_block
+
+try:
+
+    import numpy
+
+except ImportError:
+
+    # NumPy is not available, we will use the array module:
+
+    numpy = None
+
+try:
+
+    import opuslib
+
+except Exception:
+
+    # opuslib is not installed, or it could not find libopus:
+
+    opuslib = None
+
+
+BLOCK_HEADER = struct.Struct('>BBI')  # Codec, channels, number of frames
+SEQ_HEADER = struct.Struct('>II')  # Sequence number, position of the first frame
+TIME_HEADER = struct.Struct('>d')  # Presentation time of the first frame
+ADPCM_HEADER = struct.Struct('<hBx')  # Predictor and step index of each channel
+OPUS_HEADER = struct.Struct('>H')  # Length of each Opus packet
+
+CODEC_PCM16 = 1  # Signed 16 bit integers
+CODEC_F32 = 2  # 32 bit floats
+CODEC_ADPCM = 3  # IMA-ADPCM
+CODEC_OPUS = 4  # Opus
+
+FLAG_SEQUENCED = 0x80  # Codec bit set if a sequence header follows
+FLAG_TIMED = 0x40  # Codec bit set if a presentation time follows
+
+CODECS = {'pcm16': CODEC_PCM16, 'f32': CODEC_F32, 'adpcm': CODEC_ADPCM, 'opus': CODEC_OPUS}  # Codec names mapped to their IDs
+
+SEQ_MOD = 1 << 32  # Sequence numbers and positions wrap around at this value
+
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)  # Sample rates Opus supports
+OPUS_DURATIONS = (60, 40, 20, 10, 5, 2.5)  # Lengths of Opus frames in milliseconds, longest first
+
+ADPCM_STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60, 66, 73, 80, 88, 97,
+    107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796,
+    876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871,
+    5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623,
+    27086, 29794, 32767)  # IMA-ADPCM step sizes
+
+ADPCM_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8) * 2  # IMA-ADPCM step index changes for each nibble
+
+_SWAP = sys.byteorder != 'little'  # Value determining if the array module needs to swap bytes
+
+
+def to_frames(block, channels=2):
+
+    """
+    Splits an interleaved block into frames.
+
+    :param block: Interleaved block of samples
+    :param channels: Number of channels in the block
+    :type channels: int
+    :return: Tuple of frames, each frame is a tuple of floats
+    :rtype: tuple
+    """
+
+    samples = block.tolist()
+
+    return tuple(zip(*[samples[chan::channels] for chan in range(channels)]))
+
+
+def pack_samples(frames, codec=CODEC_PCM16, interleaved=False):
+
+    """
+    Packs the given frames into little-endian PCM bytes.
+
+    :param frames: Frames to pack, each frame is a tuple of floats, one for each channel
+    :type frames: tuple
+    :param codec: Codec to use
+    :type codec: int
+    :param interleaved: Value determining if the frames are already an interleaved block of floats
+    :type interleaved: bool
+    :return: Interleaved PCM bytes
+    :rtype: bytes
+    """
+
+    if interleaved and numpy is None:
+
+        # Wrap the block so it can be chained like frames:
+
+        frames = (frames,)
+
+    if numpy is not None:
+
+        # Pack all the frames in one go:
+
+        samples = numpy.asarray(frames, dtype=numpy.float32).ravel()
+
+        if codec == CODEC_PCM16:
+
+            return (numpy.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+        return samples.astype('<f4').tobytes()
+
+    # No NumPy, use the array module:
+
+    if codec == CODEC_PCM16:
+
+        samples = array('h', [int(min(max(val, -1.0), 1.0) * 32767) for val in chain.from_iterable(frames)])
+
+    else:
+
+        samples = array('f', chain.from_iterable(frames))
+
+    if _SWAP:
+
+        samples.byteswap()
+
+    return samples.tobytes()
+
+
+def unpack_samples(data, codec=CODEC_PCM16):
+
+    """
+    Unpacks the given little-endian PCM bytes into floats.
+
+    :param data: PCM bytes to unpack
+    :type data: bytes
+    :param codec: Codec the bytes were packed with
+    :type codec: int
+    :return: Interleaved samples as floats
+    :rtype: list
+    """
+
+    if numpy is not None:
+
+        if codec == CODEC_PCM16:
+
+            return (numpy.frombuffer(data, dtype='<i2') / 32767).tolist()
+
+        return numpy.frombuffer(data, dtype='<f4').tolist()
+
+    samples = array('h' if codec == CODEC_PCM16 else 'f')
+
+    samples.frombytes(data)
+
+    if _SWAP:
+
+        samples.byteswap()
+
+    if codec == CODEC_PCM16:
+
+        return [val / 32767 for val in samples]
+
+    return samples.tolist()
+
+
+def encode_block(frames, codec=CODEC_PCM16, channels=None, seq=None, position=0, pts=None):
+
+    """
+    Encodes the given frames into a block, ready to be sent.
+
+    The frames can be a tuple of frames,
+    or an interleaved audio block(see 'utils.py'), in which case the number of channels must be given.
+
+    The codec can be an ID, or a codec object(see 'make_codec()').
+    Codecs that keep state, like ADPCM and Opus, should be given as objects,
+    and the frames must be an interleaved block.
+
+    :param frames: Frames to encode, each frame is a tuple of floats, one for each channel
+    :type frames: tuple
+    :param codec: Codec to use
+    :type codec: int
+    :param channels: Number of channels, if the frames are an interleaved block
+    :type channels: int
+    :param seq: Sequence number of the block, None sends no sequence header
+    :type seq: int
+    :param position: Position of the first frame in the stream, only used if sequenced
+    :type position: int
+    :param pts: Time on the server clock the first frame should be heard, None sends no presentation time
+    :type pts: float
+    :return: Encoded block
+    :rtype: bytes
+    """
+
+    coder = None
+
+    if isinstance(codec, BaseCodec):
+
+        coder = codec
+        codec = coder.codec
+
+    if codec not in CODECS.values():
+
+        raise ValueError("Invalid codec: {}".format(codec))
+
+    if channels is None:
+
+        # Tuple of frames:
+
+        channels = len(frames[0]) if len(frames) else 0
+
+        if coder is None and codec in (CODEC_PCM16, CODEC_F32):
+
+            payload = pack_samples(frames, codec)
+
+        else:
+
+            payload = (coder or make_codec(codec, channels=channels)).encode(list(chain.from_iterable(frames)),
+                                                                             channels)
+
+        num = len(frames)
+
+    else:
+
+        # Interleaved block:
+
+        num = len(frames) // channels
+
+        payload = (coder or make_codec(codec, channels=channels)).encode(frames, channels)
+
+    headers = []
+
+    if seq is not None:
+
+        codec |= FLAG_SEQUENCED
+
+        headers.append(SEQ_HEADER.pack(seq % SEQ_MOD, position % SEQ_MOD))
+
+    if pts is not None:
+
+        codec |= FLAG_TIMED
+
+        headers.append(TIME_HEADER.pack(pts))
+
+    return BLOCK_HEADER.pack(codec, channels, num) + b''.join(headers) + payload
+
+
+def decode_block(block, codec=None):
+
+    """
+    Decodes the given block.
+
+    Sequence and time headers are skipped, use 'parse_block()' if you need them.
+    Opus blocks need the codec object of the stream, as Opus decoding is stateful.
+
+    :param block: Block to decode
+    :type block: bytes
+    :param codec: Codec object to decode the block with, None creates one
+    :type codec: BaseCodec
+    :return: Number of channels, and the interleaved samples as floats
+    :rtype: tuple
+    """
+
+    codec_id, channels, frames, _, _, _, payload = parse_block(block)
+
+    codec = codec or make_codec(codec_id, channels=channels)
+
+    samples = codec.decode(payload, channels, frames)
+
+    if len(samples) != channels * frames:
+
+        raise ValueError("Block is truncated! Expected {} samples, got {}".format(channels * frames, len(samples)))
+
+    return channels, samples
+
+
+def parse_block(block):
+
+    """
+    Parses the headers of the given block.
+
+    :param block: Block to parse
+    :type block: bytes
+    :return: Codec ID, channels, frames, sequence number(None if not sequenced), position,
+        presentation time(None if not timed) and payload
+    :rtype: tuple
+    """
+
+    codec, channels, frames = BLOCK_HEADER.unpack_from(block)
+
+    seq = position = pts = None
+    start = BLOCK_HEADER.size
+
+    if codec & FLAG_SEQUENCED:
+
+        # Sequence header follows:
+
+        seq, position = SEQ_HEADER.unpack_from(block, start)
+
+        start += SEQ_HEADER.size
+
+    if codec & FLAG_TIMED:
+
+        # Presentation time follows:
+
+        pts, = TIME_HEADER.unpack_from(block, start)
+
+        start += TIME_HEADER.size
+
+    codec &= ~(FLAG_SEQUENCED | FLAG_TIMED)
+
+    if codec not in CODECS.values():
+
+        raise ValueError("Invalid codec: {}".format(codec))
+
+    return codec, channels, frames, seq, position, pts, memoryview(block)[start:]
+
+
+def encode_adpcm(samples, channels, state):
+
+    """
+    Encodes interleaved float samples into IMA-ADPCM.
+
+    The state of each channel is written before the nibbles,
+    so the block can be decoded without knowing what came before it.
+    Two nibbles are packed into each byte, low nibble first.
+
+    :param samples: Interleaved samples to encode
+    :param channels: Number of channels
+    :type channels: int
+    :param state: List of [predictor, step index] for each channel, updated as we go
+    :type state: list
+    :return: Encoded bytes
+    :rtype: bytes
+    """
+
+    if numpy is not None:
+
+        ints = (numpy.clip(numpy.asarray(samples, dtype=numpy.float32), -1.0, 1.0) * 32767).astype(int).tolist()
+
+    else:
+
+        ints = [int(min(max(val, -1.0), 1.0) * 32767) for val in samples]
+
+    header = b''.join(ADPCM_HEADER.pack(pred, index) for pred, index in state)
+
+    nibbles = bytearray(len(ints))
+
+    steps = ADPCM_STEPS
+    changes = ADPCM_INDEX
+
+    for chan in range(channels):
+
+        pred, index = state[chan]
+
+        for num in range(chan, len(ints), channels):
+
+            step = steps[index]
+            diff = ints[num] - pred
+
+            nib = 0
+
+            if diff < 0:
+
+                nib = 8
+                diff = -diff
+
+            delta = step >> 3
+
+            if diff >= step:
+
+                nib |= 4
+                diff -= step
+                delta += step
+
+            step >>= 1
+
+            if diff >= step:
+
+                nib |= 2
+                diff -= step
+                delta += step
+
+            step >>= 1
+
+            if diff >= step:
+
+                nib |= 1
+                delta += step
+
+            pred = max(-32768, pred - delta) if nib & 8 else min(32767, pred + delta)
+            index = min(88, max(0, index + changes[nib]))
+
+            nibbles[num] = nib
+
+        state[chan] = [pred, index]
+
+    if len(nibbles) % 2:
+
+        nibbles.append(0)
+
+    return header + bytes(nibbles[i] | nibbles[i + 1] << 4 for i in range(0, len(nibbles), 2))
+
+
+def decode_adpcm(data, channels, frames):
+
+    """
+    Decodes IMA-ADPCM bytes into interleaved floats.
+
+    :param data: Encoded bytes, starting with the state of each channel
+    :type data: bytes
+    :param channels: Number of channels
+    :type channels: int
+    :param frames: Number of frames to decode
+    :type frames: int
+    :return: Interleaved samples as floats
+    :rtype: list
+    """
+
+    data = bytes(data)
+    start = ADPCM_HEADER.size * channels
+    total = frames * channels
+
+    if len(data) < start + (total + 1) // 2:
+
+        raise ValueError("ADPCM block is truncated!")
+
+    nibbles = []
+
+    for byte in data[start:start + (total + 1) // 2]:
+
+        nibbles.append(byte & 0x0F)
+        nibbles.append(byte >> 4)
+
+    samples = [0.0] * total
+
+    steps = ADPCM_STEPS
+    changes = ADPCM_INDEX
+
+    for chan in range(channels):
+
+        pred, index = ADPCM_HEADER.unpack_from(data, chan * ADPCM_HEADER.size)
+
+        for num in range(chan, total, channels):
+
+            nib = nibbles[num]
+            step = steps[index]
+
+            delta = step >> 3
+
+            if nib & 4:
+
+                delta += step
+
+            if nib & 2:
+
+                delta += step >> 1
+
+            if nib & 1:
+
+                delta += step >> 2
+
+            pred = max(-32768, pred - delta) if nib & 8 else min(32767, pred + delta)
+            index = min(88, max(0, index + changes[nib]))
+
+            samples[num] = pred / 32767
+
+    return samples
+
+
+class BaseCodec:
+
+    """
+    BaseCodec - Encodes and decodes the payload of audio blocks.
+
+    Each stream should use it's own codec object,
+    as some codecs keep state between blocks.
+    """
+
+    codec = 0  # ID of this codec
+
+    def encode(self, block, channels):
+
+        """
+        Encodes an interleaved block of samples.
+
+        :param block: Interleaved block of samples
+        :param channels: Number of channels
+        :type channels: int
+        :return: Encoded payload
+        :rtype: bytes
+        """
+
+        raise NotImplementedError("Must be overridden in child class!")
+
+    def decode(self, data, channels, frames):
+
+        """
+        Decodes a payload into interleaved floats.
+
+        :param data: Encoded payload
+        :type data: bytes
+        :param channels: Number of channels
+        :type channels: int
+        :param frames: Number of frames in the payload
+        :type frames: int
+        :return: Interleaved samples
+        """
+
+        raise NotImplementedError("Must be overridden in child class!")
+
+
+class PCMCodec(BaseCodec):
+
+    """
+    PCMCodec - Packs samples as pcm16 or f32, keeps no state.
+
+    :param codec: Codec ID, CODEC_PCM16 or CODEC_F32
+    :type codec: int
+    """
+
+    def __init__(self, codec=CODEC_PCM16):
+
+        self.codec = codec  # ID of this codec
+
+    def encode(self, block, channels):
+
+        return pack_samples(block, self.codec, interleaved=True)
+
+    def decode(self, data, channels, frames):
+
+        return unpack_samples(data, self.codec)
+
+
+class ADPCMCodec(BaseCodec):
+
+    """
+    ADPCMCodec - IMA-ADPCM, 4 bits per sample.
+
+    We carry the state of the encoder from one block to the next,
+    so the step size does not have to adapt again at the start of each block.
+    """
+
+    codec = CODEC_ADPCM
+
+    def __init__(self):
+
+        self.state = None  # Encoder state of each channel
+
+    def encode(self, block, channels):
+
+        if self.state is None or len(self.state) != channels:
+
+            self.state = [self._first_state(block, chan, channels) for chan in range(channels)]
+
+        return encode_adpcm(block, channels, self.state)
+
+    def decode(self, data, channels, frames):
+
+        return decode_adpcm(data, channels, frames)
+
+    @staticmethod
+    def _first_state(block, chan, channels):
+
+        """
+        Determines the starting state of a channel from the first block.
+
+        We start at the first sample, with a step size that fits the first change,
+        so the encoder does not have to catch up.
+
+        :param block: First interleaved block
+        :param chan: Channel to get the state of
+        :type chan: int
+        :param channels: Number of channels
+        :type channels: int
+        :return: Predictor and step index
+        :rtype: list
+        """
+
+        vals = [int(min(max(val, -1.0), 1.0) * 32767) for val in block[chan:chan + 2 * channels:channels]]
+
+        if not vals:
+
+            return [0, 0]
+
+        change = abs(vals[-1] - vals[0])
+        index = 0
+
+        while index < 88 and ADPCM_STEPS[index] < change:
+
+            index += 1
+
+        return [vals[0], index]
+
+
+class OpusCodec(BaseCodec):
+
+    """
+    OpusCodec - Opus, using 'opuslib'.
+
+    Opus only supports a few sample rates and frame lengths,
+    so each block is split into Opus frames of the longest length that divides it evenly.
+    Each Opus packet is prefixed with it's length.
+
+    :param rate: Sample rate of the stream
+    :type rate: int
+    :param channels: Number of channels
+    :type channels: int
+    :param frames: Number of frames in each block, None if we only decode
+    :type frames: int
+    :param bitrate: Bitrate of the encoder in bits per second, None lets Opus choose
+    :type bitrate: int
+    """
+
+    codec = CODEC_OPUS
+
+    def __init__(self, rate=48000, channels=2, frames=None, bitrate=None):
+
+        if opuslib is None:
+
+            raise ModuleNotFoundError("opuslib is not installed!")
+
+        if rate not in OPUS_RATES:
+
+            raise ValueError("Opus does not support a sample rate of {}".format(rate))
+
+        self.rate = rate  # Sample rate of the stream
+        self.channels = channels  # Number of channels
+        self.encoder = None  # Opus encoder, created when we first encode
+        self.decoder = opuslib.Decoder(rate, channels)  # Opus decoder
+        self.bitrate = bitrate  # Bitrate of the encoder
+        self.frame_size = None  # Number of frames in each Opus packet
+
+        if frames is not None:
+
+            self.frame_size = opus_frame_size(rate, frames)
+
+            if self.frame_size is None:
+
+                raise ValueError("Opus can't split blocks of {} frames at {} Hz".format(frames, rate))
+
+    def encode(self, block, channels):
+
+        if self.encoder is None:
+
+            self.encoder = opuslib.Encoder(self.rate, channels, opuslib.APPLICATION_AUDIO)
+
+            if self.bitrate is not None:
+
+                self.encoder.bitrate = self.bitrate
+
+        data = pack_samples(block, CODEC_F32, interleaved=True)
+        size = self.frame_size * channels * 4
+
+        packets = []
+
+        for start in range(0, len(data), size):
+
+            packet = self.encoder.encode_float(data[start:start + size], self.frame_size)
+
+            packets.append(OPUS_HEADER.pack(len(packet)) + packet)
+
+        return b''.join(packets)
+
+    def decode(self, data, channels, frames):
+
+        data = bytes(data)
+        pcm = []
+        pos = 0
+
+        while pos < len(data):
+
+            length, = OPUS_HEADER.unpack_from(data, pos)
+            pos += OPUS_HEADER.size
+
+            # Opus packets know how many frames they hold, 5760 is the most they can hold:
+
+            pcm.append(self.decoder.decode_float(data[pos:pos + length], 5760))
+            pos += length
+
+        return unpack_samples(b''.join(pcm), CODEC_F32)
+
+
+def opus_frame_size(rate, frames):
+
+    """
+    Finds the longest Opus frame that divides a block evenly.
+
+    :param rate: Sample rate
+    :type rate: int
+    :param frames: Number of frames in the block
+    :type frames: int
+    :return: Number of frames in each Opus frame, None if no Opus frame fits
+    :rtype: int
+    """
+
+    for duration in OPUS_DURATIONS:
+
+        size = int(rate * duration / 1000)
+
+        if frames % size == 0:
+
+            return size
+
+    return None
+
+
+def make_codec(codec, rate=None, channels=2, frames=None):
+
+    """
+    Creates a codec object.
+
+    :param codec: Name or ID of the codec
+    :param rate: Sample rate of the stream, only needed by Opus
+    :type rate: int
+    :param channels: Number of channels
+    :type channels: int
+    :param frames: Number of frames in each block we will encode, only needed by Opus
+    :type frames: int
+    :return: Codec object
+    :rtype: BaseCodec
+    """
+
+    codec = CODECS.get(codec, codec)
+
+    if codec in (CODEC_PCM16, CODEC_F32):
+
+        return PCMCodec(codec)
+
+    if codec == CODEC_ADPCM:
+
+        return ADPCMCodec()
+
+    if codec == CODEC_OPUS:
+
+        return OpusCodec(rate or 48000, channels, frames)
+
+    raise ValueError("Invalid codec: {}".format(codec))
+
+
+def available_codecs(codecs=None, rate=None, frames=None):
+
+    """
+    Filters the given codec names to the ones we can use.
+
+    Opus is only available if 'opuslib' is installed.
+    If a rate and block size are given, then Opus is also only available
+    if it supports the rate and the blocks hold a whole number of Opus frames,
+    see 'opus_usable()'.
+
+    :param codecs: Codec names, None for every codec
+    :type codecs: list
+    :param rate: Sample rate of the stream we will encode, None if unknown
+    :type rate: int
+    :param frames: Number of frames in each block we will encode, None if unknown
+    :type frames: int
+    :return: Codec names we can use, in the same order
+    :rtype: list
+    """
+
+    opus = opuslib is not None and (rate is None or frames is None or opus_usable(rate, frames))
+
+    return [name for name in (codecs or CODECS) if name in CODECS and (name != 'opus' or opus)]
+
+
+def opus_usable(rate, frames):
+
+    """
+    Determines if Opus can encode a stream with the given rate and block size.
+
+    :param rate: Sample rate of the stream
+    :type rate: int
+    :param frames: Number of frames in each block
+    :type frames: int
+    :return: True if Opus can encode the stream
+    :rtype: bool
+    """
+
+    return rate in OPUS_RATES and opus_frame_size(rate, frames) is not None
+
+
+def negotiate_codec(offered, supported, rate=None, frames=None):
+
+    """
+    Determines the audio codec to use, given the codecs offered by the remote end.
+
+    We pick the first offered codec that we support.
+    If nothing matches we fall back to pcm16, which everyone understands.
+    Older clients offer nothing, in which case we return None,
+    as they can't read sequenced blocks.
+
+    The rate and block size of the stream should be given if known,
+    so we never pick a codec we can't actually encode the stream with.
+
+    :param offered: Codec names offered by the remote end, in order of preference
+    :type offered: list
+    :param supported: Codec names we support
+    :type supported: list
+    :param rate: Sample rate of the stream we will encode
+    :type rate: int
+    :param frames: Number of frames in each block we will encode
+    :type frames: int
+    :return: Codec name to use
+    :rtype: str
+    """
+
+    if not offered:
+
+        return None
+
+    supported = available_codecs(supported, rate=rate, frames=frames)
+
+    for name in offered:
+
+        if name in supported:
+
+            # Found a codec we both understand:
+
+            return name
+
+    return 'pcm16'
+
+
+class StreamCounter:
+
+    """
+    Counts the frames and bytes passing through a stream.
+
+    We use this to report the throughput of network streams,
+    in frames per second and bytes per second.
+    The clock starts on the first block we count.
+    """
+
+    def __init__(self):
+
+        self.frames = 0  # Number of frames counted
+        self.bytes = 0  # Number of bytes counted
+        self.start = None  # Time we counted the first block
+
+    def add(self, frames, nbytes):
+
+        """
+        Counts a block.
+
+        :param frames: Number of frames in the block
+        :type frames: int
+        :param nbytes: Size of the block in bytes
+        :type nbytes: int
+        """
+
+        if self.start is None:
+
+            self.start = get_time()
+
+        self.frames += frames
+        self.bytes += nbytes
+
+    def stats(self):
+
+        """
+        Returns the counters and the throughput of the stream.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        elapsed = 0 if self.start is None else get_time() - self.start
+
+        return {'frames': self.frames,
+                'bytes': self.bytes,
+                'frames-per-second': self.frames / elapsed if elapsed else 0,
+                'bytes-per-second': self.bytes / elapsed if elapsed else 0}
+
+
+class JitterBuffer:
+
+    """
+    Puts received blocks back in order, and plays them out after a delay.
+
+    Blocks can arrive late, out of order, twice, or not at all,
+    as the server drops blocks for clients that fall behind.
+    We keep blocks keyed by their sequence number, and play them in order.
+    A block that is missing when it's turn comes, while later blocks have arrived, is lost,
+    and we play silence in it's place.
+    Blocks that arrive after their turn are thrown away.
+
+    The playout delay adapts to the network.
+    We estimate the jitter of arrival times like RTP does(RFC 3550),
+    and aim to keep a few jitters worth of audio buffered.
+    If we run dry we count an underrun, grow the delay, and buffer up again.
+    The extra delay added by underruns slowly decays while things go well.
+    If more than the maximum delay is buffered, then the oldest blocks are dropped.
+
+    Blocks without sequence numbers, from older servers, are played in the order they arrive.
+
+    :param rate: Sample rate of the stream
+    :type rate: int
+    :param channels: Number of channels
+    :type channels: int
+    :param min_delay: Smallest playout delay in seconds
+    :type min_delay: float
+    :param max_delay: Largest playout delay in seconds
+    :type max_delay: float
+    """
+
+    MAX_GAP = 16  # Largest number of lost blocks we fill with silence, larger gaps are skipped
+    DECAY = 0.98  # Factor the underrun delay is multiplied by for each block played
+
+    def __init__(self, rate=44100, channels=2, min_delay=0.02, max_delay=0.5):
+
+        self.rate = rate  # Sample rate of the stream
+        self.channels = channels  # Number of channels
+        self.min_delay = min_delay  # Smallest playout delay in seconds
+        self.max_delay = max_delay  # Largest playout delay in seconds
+
+        self.jitter = 0.0  # Estimated jitter of arrival times in seconds
+        self.delay = min_delay  # Playout delay we are aiming for in seconds
+
+        self.received = 0  # Number of blocks received
+        self.lost = 0  # Number of blocks that never arrived
+        self.late = 0  # Number of blocks that arrived after their turn
+        self.duplicates = 0  # Number of blocks received twice
+        self.dropped = 0  # Number of blocks dropped as we had too much buffered
+        self.underruns = 0  # Number of times we ran dry
+
+        self._blocks = {}  # Blocks waiting to be played, keyed by sequence number
+        self._buffered = 0  # Number of frames waiting to be played
+        self._next = None  # Sequence number of the next block to play
+        self._count = 0  # Sequence number given to blocks without one
+        self._transit = None  # Transit time of the last block
+        self._boost = 0.0  # Extra delay added by underruns in seconds
+        self._frames = 0  # Number of frames in the last block received
+        self._current = None  # Block we are playing
+        self._pos = 0  # Position in the block we are playing
+        self._playing = False  # Value determining if we are playing, or buffering
+        self._lock = threading.Lock()  # Lock protecting the buffer
+
+    def put(self, samples, seq=None, position=None, now=None):
+
+        """
+        Adds a received block.
+
+        :param samples: Interleaved samples of the block
+        :param seq: Sequence number of the block, None if not sequenced
+        :type seq: int
+        :param position: Position of the first frame in the stream, None if not known
+        :type position: int
+        :param now: Time the block arrived, None for now
+        :type now: float
+        """
+
+        if isinstance(samples, list):
+
+            samples = make_block(samples)
+
+        frames = len(samples) // self.channels
+
+        with self._lock:
+
+            if seq is None:
+
+                seq = self._count
+
+            self._count = (seq + 1) % SEQ_MOD
+            self.received += 1
+
+            if self._next is None:
+
+                # First block, start playing from here:
+
+                self._next = seq
+
+            if (seq - self._next) % SEQ_MOD >= SEQ_MOD // 2:
+
+                # We already played past this block:
+
+                self.late += 1
+
+                return
+
+            if seq in self._blocks:
+
+                self.duplicates += 1
+
+                return
+
+            self._blocks[seq] = samples
+            self._buffered += frames
+            self._frames = frames
+
+            if position is not None:
+
+                self._update_delay(position, get_time() if now is None else now)
+
+            while len(self._blocks) > 1 and self._buffered > self.max_delay * self.rate:
+
+                # Too much buffered, drop the oldest block:
+
+                self._drop()
+
+    def get(self, frames):
+
+        """
+        Gets a block of frames to play.
+
+        We always return a full block, anything we don't have is silence.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block of samples
+        """
+
+        final = zero_block(frames * self.channels)
+
+        with self._lock:
+
+            if not self._playing:
+
+                if not self._blocks or self._buffered < self.delay * self.rate:
+
+                    # Still buffering:
+
+                    return final
+
+                self._playing = True
+
+            if self._read(final) < len(final):
+
+                # We ran dry, buffer up again with a longer delay:
+
+                self.underruns += 1
+
+                self._playing = False
+                self._boost = min(self.max_delay, self._boost + self._frames / self.rate)
+                self._retarget()
+
+        return final
+
+    def buffered(self):
+
+        """
+        Returns the amount of audio waiting to be played.
+
+        :return: Buffered audio in seconds
+        :rtype: float
+        """
+
+        return self._buffered / self.rate
+
+    def stats(self):
+
+        """
+        Returns the counters of this buffer.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {'received': self.received,
+                'lost': self.lost,
+                'late': self.late,
+                'duplicates': self.duplicates,
+                'dropped': self.dropped,
+                'underruns': self.underruns,
+                'jitter': self.jitter,
+                'delay': self.delay,
+                'buffered': self.buffered()}
+
+    def _update_delay(self, position, now):
+
+        """
+        Updates our jitter estimate and playout delay, the lock must be held.
+
+        :param position: Position of the first frame of the block
+        :type position: int
+        :param now: Time the block arrived
+        :type now: float
+        """
+
+        transit = now - position / self.rate
+
+        if self._transit is not None:
+
+            self.jitter += (abs(transit - self._transit) - self.jitter) / 16
+
+        self._transit = transit
+
+        self._retarget()
+
+    def _retarget(self):
+
+        """
+        Determines the playout delay to aim for, the lock must be held.
+        """
+
+        delay = self._frames / self.rate + 3 * self.jitter + self._boost
+
+        self.delay = min(self.max_delay, max(self.min_delay, delay))
+
+    def _read(self, final, done=0):
+
+        """
+        Copies buffered samples into the given block, the lock must be held.
+
+        :param final: Block to copy into
+        :param done: Number of samples already in the block
+        :type done: int
+        :return: Number of samples in the block, less than it's length if we ran dry
+        :rtype: int
+        """
+
+        while done < len(final):
+
+            if self._current is None or self._pos >= len(self._current):
+
+                if not self._advance():
+
+                    break
+
+            take = min(len(final) - done, len(self._current) - self._pos)
+
+            final[done:done + take] = self._current[self._pos:self._pos + take]
+
+            self._pos += take
+            done += take
+
+        return done
+
+    def _advance(self):
+
+        """
+        Moves on to the next block, the lock must be held.
+
+        :return: True if there is a block to play
+        :rtype: bool
+        """
+
+        if not self._blocks:
+
+            return False
+
+        block = self._blocks.pop(self._next, None)
+
+        if block is None:
+
+            # Block was lost, see how many are missing:
+
+            gap = min((seq - self._next) % SEQ_MOD for seq in self._blocks)
+
+            if gap > self.MAX_GAP:
+
+                # Too many to fill, skip to the next block we have:
+
+                self.lost += gap
+                self._next = (self._next + gap) % SEQ_MOD
+
+                return self._advance()
+
+            # Play silence in place of the lost block:
+
+            self.lost += 1
+
+            block = zero_block(self._frames * self.channels)
+
+        else:
+
+            self._buffered -= len(block) // self.channels
+            self._boost *= self.DECAY
+
+        self._current = block
+        self._pos = 0
+        self._next = (self._next + 1) % SEQ_MOD
+
+        return True
+
+    def _drop(self):
+
+        """
+        Drops the oldest block, the lock must be held.
+        """
+
+        block = self._blocks.pop(self._next, None)
+
+        if block is None:
+
+            self.lost += 1
+
+        else:
+
+            self._buffered -= len(block) // self.channels
+            self.dropped += 1
+
+        self._next = (self._next + 1) % SEQ_MOD
@@ -22,14 +22,16 @@ Here are some audio modules I would like to see later:
     - Other - Wrappers for other output types(simpleaudio, alsa) *
 """
 
-import queue
 import wave
 import pathlib
 
 from base64 import b64encode
 
 from chaslib.sound.convert import BaseConvert, NullConvert, Float32, Int16
-from chaslib.sound.utils import amp_clamp
+from chaslib.sound.netcodec import CODECS, StreamCounter, encode_block, make_codec, to_frames
+from chaslib.sound.ring import RingBuffer
+from chaslib.sound.utils import amp_clamp, get_time, mix_down
+from chaslib.socket_lib import FRAMING_BINARY
 from chaslib.misctools import get_chas, get_logger
 
 
@@ -67,17 +69,45 @@ class BaseOutput(object):
 
     If you want to do the mixing and conversions yourself,
     then you can simply call 'get_sample(raw=True)'. 
+
+    A special module generates the audio itself when it asks for it.
+    If the OutputHandler is rendering with a scheduler,
+    then special modules read from the ring like everyone else.
     """
 
     def __init__(self):
 
-        self.queue = queue.Queue()  # Queue for getting audio information
+        self.ring = None  # Ring buffer we get audio information from
+        self.reader = None  # Our reader of the ring buffer
         self.convert = NullConvert()  # Converter instance
         self.running = False  # Value determining if we are running
         self.out = None  # Reference to master OutputHandler class
         self.special = False
         self.stereo = True  # Value determining if we should return samples in stereo.
 
+        # Use a ring of our own until we are added to an OutputHandler:
+
+        self.bind_ring(RingBuffer(frames=16384))
+
+    def bind_ring(self, ring):
+
+        """
+        Binds this output module to the given ring buffer.
+
+        We create a reader of the ring, and stop reading from any ring we were bound to before.
+        The OutputHandler binds us to it's ring when we are added to it.
+
+        :param ring: Ring buffer to read from
+        :type ring: RingBuffer
+        """
+
+        if self.ring is not None:
+
+            self.ring.remove_reader(self.reader)
+
+        self.ring = ring
+        self.reader = ring.add_reader(name=type(self).__name__)
+
     def mono(self):
 
         """
@@ -110,7 +140,7 @@ class BaseOutput(object):
     def get_sample(self, timeout=None, raw=False):
 
         """
-        Gets a value from the queue, mixes it, and sends it through the converter.
+        Gets a value from the ring buffer, mixes it, and sends it through the converter.
         This returns one sample of audio, the size of which can be determined by 
         We support the timeout feature, which is the amount of time to wait for values to become available.
 
@@ -121,7 +151,7 @@ class BaseOutput(object):
         the first representing the left channel, then right representing the right channel.
 
         When we are stopped by the Output class,
-        'None' is added to our queue.
+        our reader is closed and 'None' is returned.
         If you encounter 'None', then you should exit and finish up any work you may be doing.
         The 'stop()' method will be called shortly after,
         so you can put stop code in there.
@@ -133,17 +163,25 @@ class BaseOutput(object):
         :type raw: bool
         """
 
-        if self.special:
+        if self.special and not self.out.scheduled():
 
-            # Generate a new frame:
+            # Generate a new frame, and skip it in the ring as we already have it:
 
             inp = self.out.gen_value()
 
+            self.reader.skip()
+
         else:
 
-            # Get input from the queue:
+            # Get input from the ring:
+
+            inp = self.reader.read_frame(timeout=timeout)
+
+        if inp is None:
+
+            # We are stopping:
 
-            inp = self.queue.get(timeout=timeout)
+            return None
 
         # We are done processing!
         # Check if we should convert:
@@ -161,13 +199,13 @@ class BaseOutput(object):
     def get_samples(self, num, timeout=None, raw=False):
 
         """
-        Gets a number of inputs from the input queue,
+        Gets a number of inputs from the ring buffer,
         and returns them in a tuple.
 
         Under the hood we call 'get_input()' a number of times,
         and return all the inputs as a tuple.
 
-        Again, when we are stopped, 'None' is added to our audio queue.
+        Again, when we are stopped, our reader is closed.
         If we encounter 'None', then we will simply return 'None.
 
         :param num: Number of samples to retrieve
@@ -207,7 +245,7 @@ class BaseOutput(object):
     def get_added_samples(self, num, timeout=None, raw=False):
 
         """
-        Gets a number of inputs from the input queue,
+        Gets a number of inputs from the ring buffer,
         and adds them together into one value.
 
         Under the hood, we call 'get_sample()' a specified amount of times,
@@ -216,7 +254,7 @@ class BaseOutput(object):
         If your converter returns bytes,
         then this is a great way to get a combined bytes object!
 
-        Again, when we are stopped, 'None' is added to our audio queue.
+        Again, when we are stopped, our reader is closed.
         If we encounter 'None', then we will simply return None.
 
         :param num: Number of samples to retrieve
@@ -228,28 +266,135 @@ class BaseOutput(object):
         :return: Added values
         """
 
-        # Iterate a specified number of times:
+        # Get all the inputs, adding them one by one would copy everything each time:
 
-        final = self.get_sample(timeout=timeout, raw=raw)
+        final = self.get_samples(num, timeout=timeout, raw=raw)
 
-        for _ in range(0, num-1):
+        if final is None:
 
-            # Get input and add it to final:
+            # We are done, return None
 
-            inp = self.get_sample(timeout=timeout, raw=raw)
+            return None
 
-            # Add input to list:
+        if isinstance(final[0], (bytes, bytearray)):
+
+            # Join the bytes together:
+
+            return b''.join(final)
+
+        if isinstance(final[0], tuple):
+
+            # Chain the tuples together:
+
+            return tuple(val for inp in final for val in inp)
+
+        return sum(final[1:], final[0])
+
+    def get_block(self, frames, timeout=None, raw=False, out=None):
+
+        """
+        Gets a block of frames and sends it through the converter.
+
+        This is much faster than getting samples one by one,
+        as the OutputHandler can hand us whole blocks of audio.
+        We read contiguous blocks straight from the ring buffer,
+        without any per-sample locking.
+
+        You can provide a buffer to convert the block into,
+        so no new bytes are allocated for each block.
+        In this case, we return a memoryview of the part of the buffer we wrote.
+
+        Again, when we are stopped, our reader is closed.
+        If this happens, then we will simply return None.
+
+        :param frames: Number of frames to retrieve
+        :type frames: int
+        :param timeout: Timeout value in seconds. Ignored if None
+        :type timeout: int
+        :param raw: Determines if we should send the block through the converter
+        :type raw: bool
+        :param out: Buffer to convert the block into, ignored if raw
+        :type out: bytearray
+        :return: Interleaved stereo block if raw, converted block otherwise
+        """
+
+        if self.special and not self.out.scheduled():
+
+            # Generate a new block, and skip it in the ring as we already have it:
+
+            block = self.out.gen_block(frames)
+
+            self.reader.skip()
+
+        else:
+
+            block = self.reader.read(frames, timeout=timeout)
 
-            final = final + inp
+        if block is None:
 
-        # Convert the tuple and return:
+            # We are done, return None
 
-        return final
+            return None
+
+        if not raw:
+
+            # Process our block:
+
+            return self._process_block(block, out=out)
+
+        return block
+
+    def add_block(self, block):
+
+        """
+        Writes the given block to our ring buffer.
+
+        Like 'add_input()', this should probably only be called by 'Output'.
+        Keep in mind that everyone reading the ring gets the block.
+
+        :param block: Interleaved stereo block to add
+        """
+
+        self.ring.write(block)
+
+    def _process_block(self, block, out=None):
+
+        """
+        Processes the given interleaved stereo block.
+
+        We automatically mix down the audio if we are working in mono,
+        and send the whole block through the converter.
+
+        :param block: Interleaved stereo block
+        :param out: Buffer to convert the block into
+        :type out: bytearray
+        :return: Block in bytes, or the block itself if our converter does nothing
+        """
+
+        if not self.stereo:
+
+            # Mix down into mono:
+
+            block = mix_down(block)
+
+        if type(self.convert) == NullConvert:
+
+            # No conversion needed:
+
+            return block
+
+        if out is None:
+
+            return self.convert.convert_block(block)
+
+        # Convert into the buffer:
+
+        return memoryview(out)[:self.convert.convert_block(block, out=out)]
 
     def add_input(self, inp):
 
         """
-        Adds the given input to the audio queue.
+        Adds the given input to our ring buffer.
 
         This probably should only be called by 'Output',
         but if developers has a use for adding values,
@@ -257,15 +402,24 @@ class BaseOutput(object):
         then it should be okay to do so.
 
         Unless you have an explicit reason,
-        floats are the only types that should be added to the queue!
+        stereo frames of floats are the only types that should be added!
+        Adding None closes our reader, which stops this module.
 
-        :param inp: Input to add to the queue
-        :type inp: float
+        :param inp: Input to add to the ring buffer
+        :type inp: tuple
         """
 
-        # Add the value to the queue:
+        if inp is None:
+
+            # We are stopping, close our reader:
 
-        self.queue.put(inp)
+            self.reader.close()
+
+            return
+
+        # Add the value to the ring:
+
+        self.ring.write_frame(inp)
 
     def _process_input(self, inp):
 
@@ -353,9 +507,9 @@ class NullModule(BaseOutput):
 
         while self.running:
 
-            # Get an item, and do nothing!
+            # Get a block, and do nothing!
 
-            inp = self.get_sample()
+            inp = self.get_block(1024, raw=True)
 
 
 class PrintModule(BaseOutput):
@@ -415,6 +569,7 @@ class WaveModule(BaseOutput):
         self.frames_per_buffer = frames_per_buffer  # Number of frames per write
         self.path = str(pathlib.Path(path).resolve())  # Path to the wave file
         self.file = None  # Instance of wave file
+        self.buffer = None  # Buffer we convert frames into, created upon start
 
         # Add an int16 converter:
 
@@ -454,6 +609,10 @@ class WaveModule(BaseOutput):
 
         self.file.setframerate(self.out.rate)
 
+        # Create the buffer we convert frames into:
+
+        self.buffer = bytearray(self.frames_per_buffer * (2 if self.stereo else 1) * self.convert.width)
+
     def stop(self):
 
         """
@@ -480,7 +639,13 @@ class WaveModule(BaseOutput):
 
             # Get a certain number of frames:
 
-            frames = self.get_added_samples(self.frames_per_buffer)
+            frames = self.get_block(self.frames_per_buffer, out=self.buffer)
+
+            if frames is None:
+
+                # We are done, lets break
+
+                break
 
             # Output them to the wave file:
 
@@ -574,7 +739,13 @@ class PyAudioModule(BaseOutput):
 
             # Get a certain number of frames:
 
-            frames = self.get_added_samples(self.frames_per_buffer)
+            frames = self.get_block(self.frames_per_buffer)
+
+            if frames is None:
+
+                # We are done, lets break
+
+                break
 
             # Send them to PyAudio
 
@@ -598,11 +769,32 @@ class NetModule(BaseOutput):
     and we utilise the CHAS streaming protocol, 
     outlined in 'id4.py'.
 
-    All audio frames received are encoded in base64 and sent.
-    We encode the floats in int16 format to ensure that packet length does not get too high.
+    Audio frames are gathered into blocks, and each block is encoded
+    in one go(see 'netcodec.py').
+    Each client agrees on an audio codec when it authenticates,
+    and gets sequenced blocks encoded with it, so it can detect lost blocks.
+    Older clients did not agree on anything, and may not understand blocks at all,
+    so by default they get the frames as JSON lists of floats, like they always have.
+    If we are given a codec, then they get unsequenced blocks encoded with it instead.
+    Each block is encoded once per codec, and the encoded message is shared between all clients
+    using the same codec and framing mode.
+
+    Sequenced blocks are also stamped with the time on our clock they should be heard,
+    a little ahead of now, so clients in different rooms can play them together(see 'clock.py').
+    If we fall behind, then the stamps are moved forward again.
+    Clients using binary framing get the raw block,
+    clients using JSON framing get the block encoded in base64.
+
+    :param codec: Codec to pack the frames with for older clients, 'pcm16', 'f32',
+        or None to send them JSON lists of floats
+    :type codec: str
+    :param frames_per_buffer: Number of frames to send in each block
+    :type frames_per_buffer: int
+    :param lead: Seconds ahead of now blocks should be heard, must cover the network and jitter delay
+    :type lead: float
     """
 
-    def __init__(self):
+    def __init__(self, codec=None, frames_per_buffer=1024, lead=0.2):
 
         super().__init__()
 
@@ -617,7 +809,17 @@ class NetModule(BaseOutput):
 
             raise Exception("Must be server instance, not client!")
 
-        # Load an int16 converter:
+        self.codec = None if codec is None else CODECS[codec]  # ID of the codec to use for older clients
+        self.frames_per_buffer = frames_per_buffer  # Number of frames per block
+        self.counter = StreamCounter()  # Throughput counter of this stream
+
+        self.codecs = {}  # Codec objects keyed by codec name
+        self.seq = 0  # Sequence number of the next block
+        self.position = 0  # Position of the next frame in the stream
+        self.lead = lead  # Seconds ahead of now blocks should be heard
+        self.epoch = None  # Time on our clock the first frame of the stream should be heard
+
+        # Load a null converter, we pack the frames ourselves:
 
         self.add_converter(NullConvert())
 
@@ -627,28 +829,41 @@ class NetModule(BaseOutput):
         Generates a starter payload,
         which prepares the client to receive information.
 
+        We tell the client the rate of the stream, and the size of our blocks.
+
         :return: Dictionary contaning starting payload
         :rtype: dict
         """
 
-        return {'id': 0, 'data': None}
+        return {'id': 0, 'data': {'rate': self.out.rate, 'channels': 2, 'frames': self.frames_per_buffer}}
 
     def _gen_data_payload(self, data):
 
         """
         Generates a data payload based upon the given data.
 
-        We encode the data in base64 format to ensure it can be transported via socket.
+        This is the legacy format, where the frames are sent as lists of floats.
 
         :return: Data payload
         :rtype: dict
         """
 
-        #b64_bytes = b64encode(data)
+        return {'id': 1, 'data': data}
 
-        #b64_string = b64_bytes.decode('utf-8')
+    def _gen_block_payload(self, block):
 
-        return {'id': 1, 'data': data}
+        """
+        Generates a block payload for clients using JSON framing.
+
+        We encode the block in base64 format to ensure it can be transported via JSON.
+
+        :param block: Encoded block
+        :type block: bytes
+        :return: Block payload
+        :rtype: dict
+        """
+
+        return {'id': 3, 'data': b64encode(block).decode('utf-8')}
 
     def _gen_stop_payload(self):
 
@@ -662,17 +877,137 @@ class NetModule(BaseOutput):
 
         return {'id': 2, 'data': None}
 
-    def _write(self, data):
+    def _write(self, data, devices=None):
 
         """
         Sends the given data to all clients.
 
         Weather to listen or not is up to them.
+        The data is encoded once, not once per client.
         """
 
+        self.chas.net.broadcast({'id': 4, 'uuid': None, 'content': data}, devices)
+
+    def _get_codec(self, name):
+
+        """
+        Gets the codec object with the given name, creating it if necessary.
+
+        If the codec can't be used for this stream,
+        like Opus at a rate it does not support, then we use ADPCM instead.
+
+        :param name: Name of the codec
+        :type name: str
+        :return: Codec object
+        :rtype: BaseCodec
+        """
+
+        codec = self.codecs.get(name)
+
+        if codec is None:
+
+            try:
+
+                codec = make_codec(name, rate=self.out.rate, channels=2, frames=self.frames_per_buffer)
+
+            except (ValueError, ModuleNotFoundError) as e:
+
+                self.log.warning("Can't stream with {}, using adpcm: {}".format(name, e))
+
+                codec = self.codecs.get('adpcm') or make_codec('adpcm')
+
+            self.codecs[name] = codec
+
+        return codec
+
+    def _presentation_time(self):
+
+        """
+        Determines the time on our clock the next block should be heard.
+
+        If the block would be heard too soon for clients to get it in time,
+        then we move the whole stream forward.
+
+        :return: Presentation time in seconds
+        :rtype: float
+        """
+
+        now = get_time()
+
+        if self.epoch is None or self.epoch + self.position / self.out.rate < now + self.lead / 2:
+
+            # Starting, or we fell behind:
+
+            self.epoch = now + self.lead - self.position / self.out.rate
+
+        return self.epoch + self.position / self.out.rate
+
+    def _write_block(self, samp):
+
+        """
+        Encodes the given block of samples, and sends it to all clients.
+
+        Clients are grouped by their audio codec, and each group gets the block encoded once.
+        Clients using binary framing get the raw block,
+        everyone else gets a base64 block payload.
+        Older clients get a legacy data payload, unless we were given a codec for them.
+
+        :param samp: Interleaved block of stereo samples
+        :return: Number of bytes encoded
+        :rtype: int
+        """
+
+        groups = {}  # Devices keyed by audio codec and framing mode
+
         for dev in self.chas.devices:
 
-            dev.send(data, 4)
+            groups.setdefault((dev.audio_codec, dev.sock.framing == FRAMING_BINARY), []).append(dev)
+
+        encoded = {}  # Encoded blocks keyed by codec object, codecs with state must only encode once
+        pts = self._presentation_time()  # Time the block should be heard
+
+        for (name, binary), devices in groups.items():
+
+            if name is None and self.codec is None:
+
+                # Older client, send the frames as is:
+
+                self._write(self._gen_data_payload(to_frames(samp)), devices)
+
+                continue
+
+            codec = None if name is None else self._get_codec(name)
+
+            block = encoded.get(codec)
+
+            if block is None:
+
+                if codec is None:
+
+                    # Older client, send an unsequenced block:
+
+                    block = encode_block(samp, self.codec, channels=2)
+
+                else:
+
+                    block = encode_block(samp, codec, channels=2, seq=self.seq, position=self.position, pts=pts)
+
+                encoded[codec] = block
+
+            self._write(block if binary else self._gen_block_payload(block), devices)
+
+        return sum(len(block) for block in encoded.values())
+
+    def stats(self):
+
+        """
+        Returns the throughput of this stream.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return self.counter.stats()
 
     def start(self):
 
@@ -686,6 +1021,11 @@ class NetModule(BaseOutput):
 
         self.log.info("Sending starter packet...")
 
+        self.codecs = {}
+        self.seq = 0
+        self.position = 0
+        self.epoch = None
+
         self._write(self._gen_starter_payload())
 
     def stop(self):
@@ -702,6 +1042,9 @@ class NetModule(BaseOutput):
 
         self._write(self._gen_stop_payload())
 
+        self.log.info("Streamed {frames} frames at {frames-per-second:.0f} frames/sec, "
+                      "{bytes-per-second:.0f} bytes/sec".format(**self.stats()))
+
     def run(self):
 
         """
@@ -710,9 +1053,9 @@ class NetModule(BaseOutput):
 
         while self.running:
 
-            # Get and send a frame to the clients:
+            # Get a block of frames:
 
-            samp = self.get_samples(2024, raw=True)
+            samp = self.get_block(self.frames_per_buffer, raw=True)
 
             if samp is None:
 
@@ -720,4 +1063,11 @@ class NetModule(BaseOutput):
 
                 break
 
-            self._write(self._gen_data_payload(samp))
+            # Pack the frames and send them to the clients:
+
+            nbytes = self._write_block(samp)
+
+            self.counter.add(len(samp) // 2, nbytes)
+
+            self.seq += 1
+            self.position += len(samp) // 2
@@ -0,0 +1,911 @@
+"""
+Gapless playback of a sequence of sound files.
+
+Playing a playlist by binding a new chain for each track leaves a gap between tracks,
+as the next file is only opened once the last one is done,
+and the mixer has nothing to play until it is.
+
+The PlaylistReader is a single input module that plays tracks back to back.
+It asks a callback for the next track as soon as a track starts,
+and opens and pre-buffers it on a background thread while the current one plays.
+When the current track ends part way through a block, the rest of the block is filled from the next one,
+so tracks are joined without a single frame of silence.
+Optionally, the end of each track can be crossfaded into the start of the next.
+
+Every track is converted to interleaved stereo at the rate of the OutputHandler,
+so tracks with different rates and channels can follow each other.
+
+We keep track of how each transition went:
+how long the next track took to open, how far ahead of time it was ready,
+and how many frames of silence were played if it wasn't.
+
+The PlaylistFile keeps a parsed playlist in memory,
+and appends to it without rewriting or re-reading the file.
+"""
+
+import json
+import os
+import threading
+
+from collections import deque
+
+from chaslib.sound.cache import open_sound
+from chaslib.sound.resample import convert_chain
+from chaslib.sound.utils import BaseModule, concat_blocks, get_time, make_block, numpy, zero_block
+from chaslib.misctools import get_logger
+
+BLOCK = 1024  # Number of frames we read from a track at a time
+MAX_FAILED = 8  # Number of tracks in a row that can fail to open before we give up
+
+
+def crossfade(out, into):
+
+    """
+    Crossfades two interleaved stereo blocks of the same length.
+
+    The first block fades out as the second fades in, with linear gains.
+
+    :param out: Block fading out
+    :param into: Block fading in
+    :return: Crossfaded block
+    """
+
+    frames = len(out) // 2
+
+    if numpy is not None:
+
+        gain = numpy.repeat((numpy.arange(frames, dtype=numpy.float32) + 0.5) / frames, 2)
+
+        return numpy.asarray(out, dtype=numpy.float32) * (1 - gain) + numpy.asarray(into, dtype=numpy.float32) * gain
+
+    final = zero_block(frames * 2)
+
+    for index in range(frames * 2):
+
+        gain = (index // 2 + 0.5) / frames
+
+        final[index] = out[index] * (1 - gain) + into[index] * gain
+
+    return final
+
+
+class Track:
+
+    """
+    A track of the playlist, opened and buffered ahead of time.
+
+    We are opened on a background thread with 'open()',
+    which sets our ready event once the start of the track is buffered.
+    Afterwards, we are only used by the thread pulling audio.
+
+    :param key: Key of the track, given to the callback when the track starts
+    :param path: Path to the sound file
+    :type path: str
+    """
+
+    def __init__(self, key, path):
+
+        self.key = key  # Key of the track
+        self.path = path  # Path to the sound file
+        self.chain = None  # Started chain playing the track, converted to stereo
+        self.blocks = deque()  # Buffered blocks
+        self.offset = 0  # Number of samples already read from the first block
+        self.buffered = 0  # Number of samples buffered
+        self.eof = False  # Value determining if the chain has ended
+        self.error = None  # Exception raised while opening the track
+        self.ready = threading.Event()  # Event set once the track is opened
+        self.open_time = 0.0  # Seconds it took to open and buffer the track
+        self.ready_time = 0.0  # Time the track was ready
+        self.cancelled = False  # Value determining if the track is no longer wanted
+
+    def open(self, opener, rate, samples):
+
+        """
+        Opens the track and buffers the start of it.
+
+        :param opener: Function creating an input module for a path
+        :type opener: callable
+        :param rate: Rate of the OutputHandler
+        :type rate: int
+        :param samples: Number of samples to buffer
+        :type samples: int
+        """
+
+        start = get_time()
+
+        try:
+
+            synth = opener(self.path)
+
+            # Play at the rate of the OutputHandler, chains with another native rate are resampled:
+
+            synth._info.rate = rate
+
+            iter(synth)
+
+            self.chain = convert_chain(synth, rate, stereo=True)
+
+            self.fill(samples)
+
+        except Exception as e:
+
+            self.error = e
+            self.eof = True
+
+        self.ready_time = get_time()
+        self.open_time = self.ready_time - start
+
+        self.ready.set()
+
+        if self.cancelled:
+
+            # No longer wanted while we were opening:
+
+            self.close()
+
+    def fill(self, samples):
+
+        """
+        Reads from the chain until at least the given number of samples are buffered.
+
+        :param samples: Number of samples to buffer
+        :type samples: int
+        """
+
+        while self.buffered < samples and not self.eof:
+
+            block = self.chain.get_block(BLOCK)
+
+            if block is None or len(block) == 0:
+
+                # Track is done:
+
+                self.eof = True
+
+                break
+
+            self.blocks.append(block)
+            self.buffered += len(block)
+
+    def read(self, samples):
+
+        """
+        Reads up to the given number of samples from the buffer.
+
+        :param samples: Number of samples to read
+        :type samples: int
+        :return: Block, which is shorter if the buffer runs out
+        """
+
+        parts = []
+
+        while samples > 0 and self.blocks:
+
+            block = self.blocks[0]
+            num = min(samples, len(block) - self.offset)
+
+            parts.append(block[self.offset:self.offset + num])
+
+            self.offset += num
+            self.buffered -= num
+            samples -= num
+
+            if self.offset >= len(block):
+
+                # Done with this block:
+
+                self.blocks.popleft()
+
+                self.offset = 0
+
+        if len(parts) == 1:
+
+            return parts[0]
+
+        return concat_blocks(parts) if parts else make_block()
+
+    def unread(self, block):
+
+        """
+        Puts samples back in front of the buffer.
+
+        :param block: Block to put back
+        """
+
+        if self.offset:
+
+            self.blocks[0] = self.blocks[0][self.offset:]
+
+            self.offset = 0
+
+        self.blocks.appendleft(block)
+
+        self.buffered += len(block)
+
+    def done(self):
+
+        """
+        Determines if every sample of the track has been read.
+
+        :return: True if the track is done
+        :rtype: bool
+        """
+
+        return self.eof and not self.buffered
+
+    def close(self):
+
+        """
+        Stops the chain of the track, and drops the buffer.
+
+        If we are still opening, the opening thread closes us once it is done.
+        """
+
+        self.cancelled = True
+
+        if not self.ready.is_set():
+
+            return
+
+        if self.chain is not None:
+
+            try:
+
+                self.chain.stop_module()
+
+            except Exception:
+
+                pass
+
+            self.chain = None
+
+        self.blocks.clear()
+
+        self.buffered = 0
+        self.eof = True
+
+
+class PlaylistReader(BaseModule):
+
+    """
+    Plays tracks back to back, without gaps.
+
+    We get tracks from the 'source' callback, which returns the key and path of the next track,
+    or None when there are no more tracks.
+    It is called when we start, and again each time a track starts, so it should be quick.
+    The 'on_change' callback is called with the key of each track as it starts,
+    and with None once the last track is done.
+    The 'on_error' callback is called with the key of each track that fails to open,
+    so the source can move past it before it is asked for another track.
+    If too many tracks in a row fail, we stop asking and end.
+    All are called on the thread pulling audio, or the thread calling 'skip()' or 'requeue()'.
+
+    Bind us to the OutputHandler like any other chain.
+    We are always interleaved stereo at the rate of the OutputHandler.
+
+    :param source: Callback returning the key and path of the next track
+    :type source: callable
+    :param on_change: Callback given the key of each track as it starts
+    :type on_change: callable
+    :param on_error: Callback given the key of each track that fails to open
+    :type on_error: callable
+    :param opener: Function creating an input module for a path, defaults to 'open_sound()'
+    :type opener: callable
+    :param prefetch: Seconds of each track to buffer before it starts
+    :type prefetch: float
+    :param fade: Seconds to crossfade between tracks, 0 joins them gaplessly
+    :type fade: float
+    """
+
+    def __init__(self, source, on_change=None, on_error=None, opener=None, prefetch=1.0, fade=0.0):
+
+        super(PlaylistReader, self).__init__()
+
+        self.source = source  # Callback returning the next track
+        self.on_change = on_change  # Callback given the key of each track as it starts
+        self.on_error = on_error  # Callback given the key of each track that fails to open
+        self.opener = opener or open_sound  # Function creating an input module for a path
+        self.prefetch = prefetch  # Seconds of each track to buffer ahead of time
+        self.fade = fade  # Seconds to crossfade between tracks
+
+        self.current = None  # Track playing
+        self.next = None  # Track opening or opened, played after the current one
+        self.ended = False  # Value determining if the source has run out of tracks
+        self.finished = False  # Value determining if every track is done
+        self.started_tracks = 0  # Number of tracks started
+        self.waiting = False  # Value determining if we are playing silence, waiting for a track
+        self.failed_run = 0  # Number of tracks in a row that failed to open
+        self.lock = threading.RLock()  # Lock protecting the tracks
+
+        self.log = get_logger('CHAS:PLAYLIST')
+
+        self._info.channels = 2
+
+        self.reset()
+
+    def reset(self):
+
+        """
+        Resets our transition counters.
+        """
+
+        self.transitions = 0  # Number of times a track started after another
+        self.gaps = 0  # Number of transitions where the next track was not ready in time
+        self.gap_frames = 0  # Frames of silence played waiting for tracks
+        self.gap_max = 0  # Most frames of silence played in a single gap
+        self.failed = 0  # Number of tracks that could not be opened
+        self.opened = 0  # Number of tracks opened
+        self.open_total = 0.0  # Total seconds spent opening tracks
+        self.open_max = 0.0  # Longest time spent opening a track
+        self.ahead_min = None  # Least time a track was ready before it was needed
+
+        self._gap = 0  # Frames of silence played in the current gap
+
+    def start(self):
+
+        """
+        Opens the first track, and starts buffering the one after it.
+        """
+
+        with self.lock:
+
+            self.ended = False
+            self.finished = False
+            self.started_tracks = 0
+            self.waiting = False
+            self.failed_run = 0
+
+            self._queue()
+
+            track = self.next
+
+        if track is not None:
+
+            # Wait for the first track, there is nothing to play until it is ready:
+
+            track.ready.wait()
+
+            with self.lock:
+
+                self._advance()
+
+    def stop(self):
+
+        """
+        Closes every track.
+        """
+
+        with self.lock:
+
+            for track in (self.current, self.next):
+
+                if track is not None:
+
+                    track.close()
+
+            self.current = None
+            self.next = None
+
+    def skip(self):
+
+        """
+        Ends the current track now, and moves on to the next one.
+        """
+
+        with self.lock:
+
+            if self.current is not None:
+
+                self.current.close()
+
+    def requeue(self):
+
+        """
+        Drops the track after the current one, and asks the source for it again.
+
+        This should be called when the source would now give a different track,
+        like after the playlist is shuffled.
+        """
+
+        with self.lock:
+
+            if self.next is not None:
+
+                self.next.close()
+
+                self.next = None
+
+            self.ended = False
+
+            self._queue()
+
+    def get_next(self):
+
+        """
+        Gets a single sample, we are much better at blocks.
+
+        :return: Next sample, None if we are done
+        """
+
+        block = self.get_block(1)
+
+        if block is None:
+
+            return None
+
+        return block[0]
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of interleaved stereo frames.
+
+        If the current track ends part way through, we fill the rest of the block from the next one.
+        If crossfading, we mix the end of the current track into the start of the next one.
+        If the next track is not ready yet, we fill the rest with silence and count a gap.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Block of samples, None once every track is done
+        """
+
+        need = frames * 2
+        fade = int(self.fade * self.info.rate) * 2
+        parts = []
+
+        with self.lock:
+
+            # Replace the next track if it failed to open:
+
+            self._queue()
+
+            while need > 0:
+
+                track = self.current
+
+                if track is None:
+
+                    if not self._advance():
+
+                        break
+
+                    continue
+
+                # Buffer far enough ahead to see the end of the track coming:
+
+                track.fill(need + fade + BLOCK * 2)
+
+                if fade and track.eof and 0 < track.buffered <= fade and self._next_ready():
+
+                    # Crossfade the rest of this track into the next one:
+
+                    need -= self._crossfade(parts, need)
+
+                    continue
+
+                num = need
+
+                if fade and track.eof and track.buffered > fade:
+
+                    # Stop short of the samples we crossfade:
+
+                    num = min(need, track.buffered - fade)
+
+                block = track.read(num)
+
+                if len(block):
+
+                    parts.append(block)
+
+                    need -= len(block)
+
+                if track.done() and not self._advance():
+
+                    break
+
+            if need > 0:
+
+                if self.ended and self.current is None and self.next is None:
+
+                    # Every track is done:
+
+                    if not parts:
+
+                        self._finish()
+
+                        return None
+
+                else:
+
+                    # Next track is not ready, fill with silence:
+
+                    self._gap += need // 2
+                    self.gap_frames += need // 2
+                    self.gap_max = max(self.gap_max, self._gap)
+
+                    parts.append(zero_block(need))
+
+        return parts[0] if len(parts) == 1 else concat_blocks(parts)
+
+    def stats(self):
+
+        """
+        Returns our transition counters.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        with self.lock:
+
+            return {'transitions': self.transitions,
+                    'gapless': self.transitions - self.gaps,
+                    'gaps': self.gaps,
+                    'gap_frames': self.gap_frames,
+                    'gap_max': self.gap_max,
+                    'failed': self.failed,
+                    'open_mean': self.open_total / self.opened if self.opened else 0.0,
+                    'open_max': self.open_max,
+                    'ahead_min': self.ahead_min or 0.0}
+
+    def _crossfade(self, parts, need):
+
+        """
+        Crossfades the rest of the current track into the start of the next one.
+
+        Samples of the crossfade that don't fit are put back in front of the next track.
+
+        :param parts: List of blocks to add to
+        :type parts: list
+        :param need: Number of samples we still need
+        :type need: int
+        :return: Number of samples added
+        :rtype: int
+        """
+
+        num = self.current.buffered
+        tail = self.current.read(num)
+
+        self._advance()
+
+        head = self.current.read(num) if self.current is not None else make_block()
+
+        if len(head) < num:
+
+            # Next track is shorter than the crossfade:
+
+            head = concat_blocks([head, zero_block(num - len(head))])
+
+        block = crossfade(tail, head)
+
+        if num > need and self.current is not None:
+
+            self.current.unread(block[need:])
+
+            block = block[:need]
+
+        parts.append(block)
+
+        return len(block)
+
+    def _queue(self):
+
+        """
+        Asks the source for the next track, and starts opening it on a background thread.
+
+        If the next track failed to open, we drop it, tell the 'on_error' callback,
+        and ask for another, so a broken file costs no more time than any other transition.
+        If too many tracks in a row fail, we end instead of asking forever.
+        Must be called with our lock held.
+        """
+
+        if self.next is not None and self.next.ready.is_set() and self.next.error is not None:
+
+            # Could not open it, move on to the next one:
+
+            track = self.next
+
+            self.log.warning("Could not open track [{}]: {}".format(track.path, track.error))
+
+            self._record(track)
+
+            self.failed += 1
+            self.failed_run += 1
+            self.next = None
+
+            if self.on_error is not None:
+
+                self.on_error(track.key)
+
+            if self.failed_run >= MAX_FAILED:
+
+                # Source keeps giving us tracks we can't open:
+
+                self.log.error("{} tracks in a row failed to open, giving up".format(self.failed_run))
+
+                self.ended = True
+
+        if self.next is not None or self.ended:
+
+            # Already have one, or there are none left:
+
+            return
+
+        found = self.source()
+
+        if found is None:
+
+            self.ended = True
+
+            return
+
+        self.next = Track(*found)
+
+        thread = threading.Thread(target=self.next.open,
+                                  args=(self.opener, self.info.rate, int(self.prefetch * self.info.rate) * 2),
+                                  daemon=True, name='CHAS:PLAYLIST')
+        thread.start()
+
+    def _record(self, track):
+
+        # Records how long the track took to open
+
+        self.opened += 1
+        self.open_total += track.open_time
+        self.open_max = max(self.open_max, track.open_time)
+
+    def _next_ready(self):
+
+        # Determines if the next track is opened
+
+        self._queue()
+
+        return self.next is not None and self.next.ready.is_set() and self.next.error is None
+
+    def _advance(self):
+
+        """
+        Makes the next track the current one, if it is ready.
+
+        Must be called with our lock held.
+
+        :return: True if a track was started, False if none are ready
+        :rtype: bool
+        """
+
+        if self.current is not None:
+
+            self.current.close()
+
+            self.current = None
+
+        for _ in range(MAX_FAILED + 1):
+
+            self._queue()
+
+            track = self.next
+
+            if track is None:
+
+                # No more tracks:
+
+                return False
+
+            ready = track.ready.is_set()
+
+            if ready and track.error is not None:
+
+                # Failed to open, ask for another:
+
+                continue
+
+            if not ready:
+
+                # Still opening, we will play silence until it is ready:
+
+                if self.started_tracks and not self.waiting:
+
+                    self.gaps += 1
+
+                self.waiting = True
+
+                return False
+
+            break
+
+        else:
+
+            # Every track we were given failed to open:
+
+            return False
+
+        self.next = None
+
+        self._record(track)
+
+        if self.started_tracks:
+
+            # Record how the transition went:
+
+            self.transitions += 1
+
+            if not self.waiting:
+
+                ahead = get_time() - track.ready_time
+
+                self.ahead_min = ahead if self.ahead_min is None else min(self.ahead_min, ahead)
+
+        self.current = track
+        self.started_tracks += 1
+        self.waiting = False
+        self.failed_run = 0
+        self._gap = 0
+
+        if self.on_change is not None:
+
+            self.on_change(track.key)
+
+        # Start opening the track after it:
+
+        self._queue()
+
+        return True
+
+    def _finish(self):
+
+        # Tells the callback every track is done, once
+
+        if not self.finished:
+
+            self.finished = True
+
+            if self.on_change is not None:
+
+                self.on_change(None)
+
+
+class PlaylistFile:
+
+    """
+    A playlist file, parsed once and kept in memory.
+
+    Playlists are text files holding one JSON object per line,
+    each with the 'name' and 'path' of a song.
+    Blank lines and lines that fail to parse are skipped.
+
+    'load()' only parses the file again if it has changed on disk,
+    and 'append()' adds a song to the file and to the parsed playlist,
+    without reading the file again.
+
+    :param path: Path to the playlist file
+    :type path: str
+    """
+
+    def __init__(self, path):
+
+        self.path = path  # Path to the playlist file
+        self.entries = []  # Parsed songs
+        self.stamp = None  # Modification time and size of the file when it was parsed
+        self.lock = threading.RLock()  # Lock protecting the entries and the file
+
+    def load(self):
+
+        """
+        Gets the songs in the playlist, parsing the file if it has changed.
+
+        :return: List of songs, do not modify it
+        :rtype: list
+        """
+
+        with self.lock:
+
+            stamp = self._stamp()
+
+            if stamp != self.stamp:
+
+                self.entries = self._parse()
+                self.stamp = stamp
+
+            return self.entries
+
+    def append(self, entry):
+
+        """
+        Adds a song to the end of the playlist.
+
+        The song is written to the file with a single append,
+        so it can never be mixed in with other writes to the file.
+
+        :param entry: Song to add, with a 'name' and 'path'
+        :type entry: dict
+        """
+
+        with self.lock:
+
+            self.load()
+
+            data = json.dumps(entry) + '\n'
+
+            if self.stamp is not None and self.stamp[1] and not self._ends_line():
+
+                # Last song has no newline after it:
+
+                data = '\n' + data
+
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+            try:
+
+                os.write(fd, data.encode())
+
+            finally:
+
+                os.close(fd)
+
+            self.entries = self.entries + [entry]
+            self.stamp = self._stamp()
+
+    def _stamp(self):
+
+        # Gets the modification time and size of the file
+
+        try:
+
+            stat = os.stat(self.path)
+
+        except OSError:
+
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def _ends_line(self):
+
+        # Determines if the file ends with a newline
+
+        with open(self.path, 'rb') as file:
+
+            file.seek(-1, os.SEEK_END)
+
+            return file.read(1) == b'\n'
+
+    def _parse(self):
+
+        """
+        Parses the playlist file.
+
+        :return: List of songs
+        :rtype: list
+        """
+
+        entries = []
+
+        try:
+
+            with open(self.path, 'r') as file:
+
+                lines = file.read().splitlines()
+
+        except OSError:
+
+            return entries
+
+        for line in lines:
+
+            if not line.strip():
+
+                continue
+
+            try:
+
+                entry = json.loads(line)
+
+            except ValueError:
+
+                continue
+
+            if isinstance(entry, dict) and 'name' in entry and 'path' in entry:
+
+                entries.append(entry)
+
+        return entries
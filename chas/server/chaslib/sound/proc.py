@@ -0,0 +1,268 @@
+"""
+Rendering synth chains in worker processes.
+
+Synth chains are normally rendered by the mixer, on whatever thread is pulling audio.
+Heavy chains then compete for the interpreter with everything else CHAS is doing,
+like the Listener and the socket server.
+
+Here we offer a way to render a chain in a process of it's own.
+The worker renders blocks into slots of a shared memory buffer,
+and the mixer copies the blocks out as it needs them.
+Two semaphores keep track of the free and filled slots,
+so the worker can render a few blocks ahead and then sleep,
+and the mixer never has to wait on the worker.
+
+If the worker has not finished a block in time, then the mixer gets silence,
+and we count an underrun.
+If the worker crashes, then only the chain it was rendering is lost.
+The traceback of the crash is sent back to us through a pipe.
+
+The 'ProcessControl' in 'base.py' uses this to render a chain bound to the OutputHandler.
+"""
+
+import multiprocessing
+import traceback
+
+from multiprocessing import shared_memory
+
+from chaslib.sound.resample import convert_chain
+from chaslib.sound.utils import make_block, zero_block, numpy
+
+END = -1  # Slot length marking the end of the chain
+SAMPLE_WIDTH = 4  # Size of each float32 sample in bytes
+
+
+class SharedBlocks:
+
+    """
+    Slots of float32 blocks in shared memory, passed from one worker to one reader.
+
+    The worker writes blocks with 'write()', and the reader gets them in order with 'read()'.
+    We are created in the parent process, and handed to the worker when it is started.
+    When the parent is done, it should call 'close()' to free the shared memory.
+
+    :param frames: Number of frames in each block
+    :type frames: int
+    :param channels: Number of channels in each frame
+    :type channels: int
+    :param slots: Number of blocks the worker can render ahead
+    :type slots: int
+    :param ctx: Multiprocessing context to create our semaphores with
+    """
+
+    def __init__(self, frames=1024, channels=1, slots=4, ctx=None):
+
+        ctx = ctx or multiprocessing.get_context()
+
+        self.frames = frames  # Number of frames in each block
+        self.channels = channels  # Number of channels in each frame
+        self.slots = slots  # Number of slots
+        self.size = frames * channels  # Number of samples in each slot
+
+        self.shm = shared_memory.SharedMemory(create=True, size=self.size * slots * SAMPLE_WIDTH)  # Slot storage
+        self.lengths = ctx.Array('i', slots, lock=False)  # Number of samples in each slot
+        self.free = ctx.Semaphore(slots)  # Number of slots the worker can write
+        self.ready = ctx.Semaphore(0)  # Number of slots the reader can read
+        self.stopping = ctx.Event()  # Event set when the worker should stop
+
+        self.write_index = 0  # Number of blocks written, only used by the worker
+        self.read_index = 0  # Number of blocks read, only used by the reader
+        self.done = False  # Value determining if the reader has reached the end
+
+    def write(self, block, timeout=0.1):
+
+        """
+        Writes a block into the next free slot.
+
+        We wait for a slot to become free, so the worker never renders too far ahead.
+        If the block is None, then we mark the end of the chain.
+
+        :param block: Block to write, no longer than a slot
+        :param timeout: Time in seconds to wait for a free slot
+        :type timeout: float
+        :return: True if the block was written, False if there was no free slot
+        :rtype: bool
+        """
+
+        if not self.free.acquire(timeout=timeout):
+
+            # The reader is behind, nothing to do:
+
+            return False
+
+        slot = self.write_index % self.slots
+
+        if block is None:
+
+            self.lengths[slot] = END
+
+        else:
+
+            if numpy is not None:
+
+                block = numpy.asarray(block, dtype=numpy.float32)
+
+            elif getattr(block, 'typecode', None) != 'f':
+
+                block = make_block(block)
+
+            num = min(len(block), self.size)
+            start = slot * self.size * SAMPLE_WIDTH
+
+            self.shm.buf[start:start + num * SAMPLE_WIDTH] = memoryview(block).cast('B')[:num * SAMPLE_WIDTH]
+            self.lengths[slot] = num
+
+        # Publish the slot:
+
+        self.write_index += 1
+
+        self.ready.release()
+
+        return True
+
+    def read(self, timeout=0):
+
+        """
+        Reads the next filled slot.
+
+        :param timeout: Time in seconds to wait for a block, 0 does not wait
+        :type timeout: float
+        :return: Block, or None if no block is ready or we are at the end
+        """
+
+        if self.done:
+
+            return None
+
+        if timeout:
+
+            filled = self.ready.acquire(timeout=timeout)
+
+        else:
+
+            filled = self.ready.acquire(False)
+
+        if not filled:
+
+            # Worker is not done yet:
+
+            return None
+
+        slot = self.read_index % self.slots
+        num = self.lengths[slot]
+
+        if num == END:
+
+            # We reached the end of the chain:
+
+            self.done = True
+
+            return None
+
+        start = slot * self.size * SAMPLE_WIDTH
+
+        block = zero_block(num)
+
+        memoryview(block).cast('B')[:] = self.shm.buf[start:start + num * SAMPLE_WIDTH]
+
+        # Give the slot back to the worker:
+
+        self.read_index += 1
+
+        self.free.release()
+
+        return block
+
+    def stop(self):
+
+        """
+        Tells the worker to stop.
+        """
+
+        self.stopping.set()
+
+    def close(self, unlink=True):
+
+        """
+        Closes our shared memory.
+
+        Only the parent process should unlink the memory.
+
+        :param unlink: Value determining if we should free the shared memory
+        :type unlink: bool
+        """
+
+        self.shm.close()
+
+        if unlink:
+
+            try:
+
+                self.shm.unlink()
+
+            except FileNotFoundError:
+
+                # Already freed:
+
+                pass
+
+
+def render_worker(synth, rate, blocks, conn):
+
+    """
+    Renders the given synth chain into the shared blocks until we are stopped.
+
+    This is the target of the worker process.
+    The traceback of any exception is sent through the given connection,
+    so the parent can log it, and we exit with an error.
+
+    :param synth: Synth chain to render
+    :type synth: BaseModule
+    :param rate: Rate of the OutputHandler, the chain is converted to stereo at this rate
+    :type rate: int
+    :param blocks: Shared blocks to render into
+    :type blocks: SharedBlocks
+    :param conn: Connection to send tracebacks through
+    :type conn: multiprocessing.connection.Connection
+    """
+
+    try:
+
+        # Prepare the chain:
+
+        iter(synth)
+
+        synth = convert_chain(synth, rate, stereo=True)
+
+        block = synth.get_block(blocks.frames)
+
+        while not blocks.stopping.is_set():
+
+            if not blocks.write(block):
+
+                # No free slots, try again:
+
+                continue
+
+            if block is None:
+
+                # The chain is done:
+
+                break
+
+            block = synth.get_block(blocks.frames)
+
+        synth.stop_module()
+
+    except Exception:
+
+        conn.send(traceback.format_exc())
+
+        # Exit with an error, so the parent knows we crashed:
+
+        raise SystemExit(1)
+
+    finally:
+
+        conn.close()
+        blocks.close(unlink=False)
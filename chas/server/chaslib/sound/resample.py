@@ -0,0 +1,573 @@
+"""
+Sample rate conversion and channel mapping for synth chains.
+
+The mixer expects every chain to be mono or stereo, and to run at the rate of the OutputHandler.
+Audio files are often recorded at other rates, or have more channels.
+Instead of re-encoding them, we convert them as they are played.
+
+Channels are mapped first, so we resample as few channels as possible.
+Surround layouts are folded down into stereo with the usual weights,
+anything else is folded by sending even channels left and odd channels right.
+
+Rates are converted with a polyphase windowed-sinc filter.
+To go from rate 'src' to rate 'dst', we upsample by L, filter, and downsample by M,
+where L / M is 'dst / src' in lowest terms.
+The filter is split into L phases, and only the samples we keep are ever computed.
+Filter designs only depend on the rate pair, so they are cached.
+
+The ResampleModule does all of this a block at a time,
+and is inserted in front of chains that need it by the OutputControl(see 'base.py').
+"""
+
+import math
+
+from functools import lru_cache
+
+from chaslib.sound.utils import BaseModule, ModuleInfo, concat_blocks, make_block, zero_block, numpy
+
+TAPS = 16  # Filter taps per phase, more is sharper but slower
+ROLLOFF = 0.9  # Cutoff of the filter, as a fraction of the lower Nyquist frequency
+
+SQRT_HALF = math.sqrt(0.5)
+
+CHANNEL_MAPS = {3: ((1, 0), (0, 1), (SQRT_HALF, SQRT_HALF)),  # L R C
+                4: ((1, 0), (0, 1), (SQRT_HALF, 0), (0, SQRT_HALF)),  # L R Ls Rs
+                5: ((1, 0), (0, 1), (SQRT_HALF, SQRT_HALF), (SQRT_HALF, 0), (0, SQRT_HALF)),  # L R C Ls Rs
+                6: ((1, 0), (0, 1), (SQRT_HALF, SQRT_HALF), (0, 0), (SQRT_HALF, 0), (0, SQRT_HALF)),  # 5.1
+                8: ((1, 0), (0, 1), (SQRT_HALF, SQRT_HALF), (0, 0),
+                    (SQRT_HALF, 0), (0, SQRT_HALF), (SQRT_HALF, 0), (0, SQRT_HALF))}  # 7.1
+
+
+@lru_cache(maxsize=None)
+def channel_matrix(channels):
+
+    """
+    Gets the weights used to fold the given number of channels down into stereo.
+
+    Each weight pair is how much of a channel goes left and right.
+    The weights of each side add up to one, so folding never gets louder.
+
+    :param channels: Number of channels to fold
+    :type channels: int
+    :return: Tuple of left and right weights for each channel
+    :rtype: tuple
+    """
+
+    weights = CHANNEL_MAPS.get(channels)
+
+    if weights is None:
+
+        # Unknown layout, even channels go left and odd channels go right:
+
+        weights = tuple((1, 0) if chan % 2 == 0 else (0, 1) for chan in range(channels))
+
+    left = sum(weight[0] for weight in weights) or 1
+    right = sum(weight[1] for weight in weights) or 1
+
+    return tuple((weight[0] / left, weight[1] / right) for weight in weights)
+
+
+def map_channels(block, channels):
+
+    """
+    Folds an interleaved block with the given number of channels down into stereo.
+
+    :param block: Interleaved block
+    :param channels: Number of channels in the block
+    :type channels: int
+    :return: Interleaved stereo block
+    """
+
+    weights = channel_matrix(channels)
+    frames = len(block) // channels
+
+    if numpy is not None:
+
+        matrix = numpy.asarray(weights, dtype=numpy.float32)
+
+        return (numpy.asarray(block[:frames * channels]).reshape(frames, channels) @ matrix).ravel()
+
+    final = zero_block(frames * 2)
+
+    for frame in range(frames):
+
+        base = frame * channels
+
+        for chan in range(channels):
+
+            val = block[base + chan]
+
+            final[frame * 2] += val * weights[chan][0]
+            final[frame * 2 + 1] += val * weights[chan][1]
+
+    return final
+
+
+@lru_cache(maxsize=64)
+def design_filter(src, dst, taps=TAPS):
+
+    """
+    Designs the polyphase filter for converting between the given rates.
+
+    We create a windowed-sinc lowpass filter running at the upsampled rate,
+    and split it into one phase for each of the L upsampled positions.
+    Designs are cached, as they only depend on the rates.
+
+    :param src: Rate to convert from
+    :type src: int
+    :param dst: Rate to convert to
+    :type dst: int
+    :param taps: Number of taps in each phase
+    :type taps: int
+    :return: Upsample factor, downsample factor, and the phases
+    :rtype: tuple
+    """
+
+    div = math.gcd(int(src), int(dst))
+
+    up = int(dst) // div
+    down = int(src) // div
+
+    length = taps * up
+
+    # Cutoff in cycles per upsampled sample, below the Nyquist frequency of the lower rate:
+
+    cutoff = ROLLOFF * 0.5 / max(up, down)
+    middle = (length - 1) / 2
+
+    proto = []
+
+    for index in range(length):
+
+        pos = index - middle
+
+        sinc = 2 * cutoff if pos == 0 else math.sin(2 * math.pi * cutoff * pos) / (math.pi * pos)
+
+        # Blackman window:
+
+        window = 0.42 - 0.5 * math.cos(2 * math.pi * index / (length - 1)) + \
+            0.08 * math.cos(4 * math.pi * index / (length - 1))
+
+        # Scale by L, as upsampling spreads the energy over L samples:
+
+        proto.append(sinc * window * up)
+
+    # Phase p gets every L-th coefficient starting at p, reversed so it lines up with the input:
+
+    phases = tuple(tuple(reversed(proto[phase::up])) for phase in range(up))
+
+    if numpy is not None:
+
+        phases = numpy.asarray(phases, dtype=numpy.float32)
+
+    return up, down, phases
+
+
+class Resampler:
+
+    """
+    Converts interleaved blocks from one sample rate to another, keeping state between blocks.
+
+    We keep the last few input frames of each channel,
+    so the filter runs over block boundaries without any clicks.
+    The output is delayed by half the filter length.
+
+    :param src: Rate to convert from
+    :type src: int
+    :param dst: Rate to convert to
+    :type dst: int
+    :param channels: Number of channels in each block
+    :type channels: int
+    :param taps: Number of taps in each phase
+    :type taps: int
+    """
+
+    def __init__(self, src, dst, channels=2, taps=TAPS):
+
+        self.src = src  # Rate to convert from
+        self.dst = dst  # Rate to convert to
+        self.channels = channels  # Number of channels
+        self.taps = taps  # Number of taps in each phase
+
+        self.up, self.down, self.phases = design_filter(src, dst, taps)
+
+        self.reset()
+
+    def reset(self):
+
+        """
+        Forgets all previous input.
+        """
+
+        self.history = [zero_block(self.taps - 1) for _ in range(self.channels)]  # Last input frames of each channel
+        self.pos = (self.taps - 1) * self.up  # Position of the next output, in upsampled samples
+
+    def frames_needed(self, frames):
+
+        """
+        Returns about how many input frames are needed for the given number of output frames.
+
+        :param frames: Number of output frames
+        :type frames: int
+        :return: Number of input frames
+        :rtype: int
+        """
+
+        return max(1, math.ceil(frames * self.down / self.up))
+
+    def process(self, block):
+
+        """
+        Converts the given interleaved block.
+
+        :param block: Interleaved block at the source rate
+        :return: Interleaved block at the destination rate
+        """
+
+        frames = len(block) // self.channels
+
+        # Work out how many output frames this input gives us:
+
+        total = self.taps - 1 + frames
+        count = max(0, (total * self.up - 1 - self.pos) // self.down + 1)
+
+        final = zero_block(count * self.channels)
+
+        for chan in range(self.channels):
+
+            buf = concat_blocks([self.history[chan], make_block(block[chan::self.channels])])
+
+            final[chan::self.channels] = self._filter(buf, count)
+
+            self.history[chan] = buf[len(buf) - (self.taps - 1):]
+
+        # Move our position to the start of the new history:
+
+        self.pos += count * self.down - frames * self.up
+
+        return final
+
+    def _filter(self, buf, count):
+
+        """
+        Computes the given number of output samples of one channel.
+
+        :param buf: Input samples of the channel, starting with the history
+        :param count: Number of output samples
+        :type count: int
+        :return: Output samples
+        """
+
+        if numpy is not None:
+
+            pos = self.pos + self.down * numpy.arange(count)
+
+            bases = pos // self.up
+            phases = pos % self.up
+
+            windows = numpy.lib.stride_tricks.sliding_window_view(buf, self.taps)
+
+            return numpy.einsum('ij,ij->i', windows[bases - self.taps + 1], self.phases[phases])
+
+        final = []
+
+        for num in range(count):
+
+            pos = self.pos + self.down * num
+
+            base = pos // self.up - self.taps + 1
+
+            phase = self.phases[pos % self.up]
+
+            final.append(sum(buf[base + tap] * phase[tap] for tap in range(self.taps)))
+
+        return make_block(final)
+
+
+class ResampleModule(BaseModule):
+
+    """
+    Converts a synth chain to the rate of the OutputHandler, and to mono or stereo.
+
+    We are inserted in front of a started chain by 'convert_chain()',
+    when the chain reports a native rate(info.native_rate) that differs from the OutputHandler,
+    or has more than two channels.
+    Mono chains stay mono unless we are asked for stereo, as the mixer handles mono itself.
+
+    We have our own ModuleInfo, describing the audio we output,
+    while the chain keeps it's own.
+
+    :param rate: Rate to convert to
+    :type rate: int
+    :param stereo: Value determining if we always output stereo
+    :type stereo: bool
+    """
+
+    def __init__(self, rate, stereo=False):
+
+        super(ResampleModule, self).__init__()
+
+        self.rate = rate  # Rate to convert to
+        self.stereo = stereo  # Value determining if we always output stereo
+        self.resampler = None  # Resampler, None if the rate already matches
+        self.source = None  # Info of the chain we convert
+
+        self._block = None  # Converted samples we have not given out yet
+        self._pos = 0  # Position of the next sample in the converted samples
+        self._samples = None  # Block we give out one sample at a time
+        self._sample_pos = 0  # Position of the next sample we give out
+
+    def bind(self, module):
+
+        """
+        Binds the chain to convert, while keeping our own info.
+
+        :param module: Chain to convert
+        :type module: BaseModule
+        """
+
+        self.input.add_module(module)
+
+        module.output = self
+
+        self.source = module.info
+
+    def start(self):
+
+        """
+        Configures ourselves for the chain we convert.
+        """
+
+        source = self.source
+
+        channels = 2 if self.stereo or source.channels > 1 else 1
+
+        self._info = ModuleInfo(samp=self.rate)
+
+        self._info.channels = channels
+        self._info.name = source.name
+
+        native = source.native_rate or self.rate
+
+        self.resampler = Resampler(native, self.rate, channels=channels) if native != self.rate else None
+
+        self._block = None
+        self._pos = 0
+        self._samples = None
+        self._sample_pos = 0
+
+    def get_next(self):
+
+        """
+        Gets the next converted sample.
+
+        :return: Next sample, None if the chain is done
+        :rtype: float
+        """
+
+        if self._samples is None or self._sample_pos >= len(self._samples):
+
+            self._samples = self.get_block(256)
+            self._sample_pos = 0
+
+            if self._samples is None:
+
+                return None
+
+        val = self._samples[self._sample_pos]
+
+        self._sample_pos += 1
+
+        return float(val)
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of converted frames.
+
+        We pull blocks from the chain at it's own rate until we have enough.
+        The block is shorter if the chain stops part way through.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved block, None if the chain is done
+        """
+
+        size = frames * self.info.channels
+
+        parts = []
+        have = 0
+
+        if self._block is not None and self._pos < len(self._block):
+
+            # Use what we have left over:
+
+            parts.append(self._block[self._pos:self._pos + size])
+
+            have = len(parts[0])
+
+            self._pos += have
+
+        while have < size:
+
+            need = (size - have) // self.info.channels
+
+            if self.resampler is not None:
+
+                need = self.resampler.frames_needed(need)
+
+            block = self._convert(self.input.get_block(need))
+
+            if block is None:
+
+                # The chain is done:
+
+                self.info.running = False
+
+                break
+
+            take = min(size - have, len(block))
+
+            parts.append(block[:take])
+
+            have += take
+
+            # Keep the rest for next time:
+
+            self._block = block
+            self._pos = take
+
+        if not parts:
+
+            return None
+
+        return concat_blocks(parts)
+
+    def _convert(self, block):
+
+        """
+        Maps the channels and converts the rate of a block from the chain.
+
+        :param block: Block from the chain
+        :return: Converted block, None if the chain is done
+        """
+
+        if block is None:
+
+            return None
+
+        channels = self.source.channels
+
+        if channels > 2:
+
+            block = map_channels(block, channels)
+
+        elif channels == 1 and self.info.channels == 2:
+
+            # Copy mono into both channels:
+
+            stereo = zero_block(len(block) * 2)
+
+            stereo[0::2] = block
+            stereo[1::2] = block
+
+            block = stereo
+
+        if self.resampler is not None:
+
+            block = self.resampler.process(block)
+
+        return block
+
+
+def resample_block(block, channels, src, dst, taps=TAPS):
+
+    """
+    Converts a whole interleaved block from one sample rate to another.
+
+    This is for sounds that are decoded all at once, like those in the SoundCache(see 'cache.py').
+    We run the block through a Resampler, flush it with silence,
+    and drop the delay the filter adds, so the result lines up with the original.
+
+    :param block: Interleaved block to convert
+    :param channels: Number of channels in the block
+    :type channels: int
+    :param src: Rate of the block
+    :type src: int
+    :param dst: Rate to convert to
+    :type dst: int
+    :param taps: Number of taps in each phase
+    :type taps: int
+    :return: Converted block, or the block itself if the rates match
+    """
+
+    if src == dst or len(block) < channels:
+
+        return block
+
+    resampler = Resampler(src, dst, channels=channels, taps=taps)
+
+    frames = max(1, int(len(block) // channels * dst / src))
+    delay = int(round((taps * resampler.up - 1) / 2 / resampler.down))
+
+    # Flush the filter, so the end of the block comes out:
+
+    flush = zero_block((resampler.frames_needed(delay) + taps) * channels)
+
+    final = concat_blocks([resampler.process(block), resampler.process(flush)])
+
+    return final[delay * channels:(delay + frames) * channels]
+
+
+def needs_convert(info, rate, stereo=False):
+
+    """
+    Determines if a chain with the given info needs to be converted.
+
+    :param info: Info of the chain
+    :type info: ModuleInfo
+    :param rate: Rate of the OutputHandler
+    :type rate: int
+    :param stereo: Value determining if we require stereo
+    :type stereo: bool
+    :return: True if the chain must be converted
+    :rtype: bool
+    """
+
+    if info.native_rate is not None and info.native_rate != rate:
+
+        return True
+
+    return info.channels not in ((2,) if stereo else (1, 2))
+
+
+def convert_chain(synth, rate, stereo=False):
+
+    """
+    Puts a ResampleModule in front of the given started chain, if it needs one.
+
+    :param synth: Started synth chain
+    :type synth: BaseModule
+    :param rate: Rate of the OutputHandler
+    :type rate: int
+    :param stereo: Value determining if we require stereo
+    :type stereo: bool
+    :return: The converted chain, or the chain itself if it needs no conversion
+    :rtype: BaseModule
+    """
+
+    if not needs_convert(synth.info, rate, stereo=stereo):
+
+        return synth
+
+    stage = ResampleModule(rate, stereo=stereo)
+
+    stage.bind(synth)
+
+    # The chain is already started, we only configure ourselves:
+
+    stage.start()
+
+    stage.started = True
+
+    return stage
@@ -0,0 +1,439 @@
+"""
+Ring buffer for passing audio from the OutputHandler to output modules.
+
+One producer(the OutputHandler) writes blocks of interleaved frames into the ring,
+and any number of consumers(the output modules) read from it,
+each with their own cursor.
+
+The storage is preallocated when the ring is created,
+and is a NumPy array if NumPy is installed, or an 'array' otherwise.
+
+Positions are counted in samples since the ring was created, and only ever grow.
+The writer copies a block in, and then publishes it by advancing the write position.
+Readers only look at the write position, so reading and writing take no locks.
+A lock is only used to put readers to sleep when there is nothing to read,
+and to wake them up again.
+
+The writer never waits for readers, as audio must keep flowing.
+If a reader falls more than a ring behind, then the audio it missed is lost.
+We count this as an overrun, so slow readers can be detected.
+"""
+
+import threading
+
+from chaslib.sound.utils import zero_block
+
+
+class RingReader:
+
+    """
+    A reader of a ring buffer.
+
+    Each reader has it's own cursor, and reads contiguous blocks from the ring.
+    Readers are created by 'RingBuffer.add_reader()'.
+
+    :param ring: Ring buffer we read from
+    :type ring: RingBuffer
+    :param name: Meaningful name of this reader
+    :type name: str
+    """
+
+    def __init__(self, ring, name=''):
+
+        self.ring = ring  # Ring buffer we read from
+        self.name = name  # Meaningful name of this reader
+        self.cursor = ring.write_pos  # Position of the next sample we read
+        self.closed = False  # Value determining if we are closed
+
+        self.overruns = 0  # Number of times we fell a whole ring behind
+        self.lost = 0  # Number of frames lost to overruns
+
+    def available(self):
+
+        """
+        Returns the number of frames waiting to be read.
+
+        :return: Number of frames
+        :rtype: int
+        """
+
+        return min(self.ring.write_pos - self.cursor, self.ring.size) // self.ring.channels
+
+    def lag(self):
+
+        """
+        Returns how far behind the writer we are, as a fraction of the ring.
+
+        Anything close to 1 means we are about to lose audio.
+
+        :return: Lag between 0 and 1
+        :rtype: float
+        """
+
+        return self.available() * self.ring.channels / self.ring.size
+
+    def read(self, frames, timeout=None):
+
+        """
+        Reads a block of frames from the ring.
+
+        We wait until enough frames are available.
+        If we are closed while waiting, then we return what is left,
+        or None if there is nothing left.
+
+        :param frames: Number of frames to read
+        :type frames: int
+        :param timeout: Time in seconds to wait for frames, None waits forever
+        :type timeout: float
+        :return: Interleaved block of samples
+        :raises TimeoutError: If the frames did not arrive in time
+        """
+
+        ring = self.ring
+        needed = frames * ring.channels
+
+        if ring.write_pos - self.cursor < needed and not self.closed:
+
+            # Not enough frames, wait for the writer:
+
+            ring.wait(self, needed, timeout)
+
+        while True:
+
+            self._check_overrun()
+
+            start = self.cursor
+            num = min(needed, ring.write_pos - start)
+
+            if num <= 0:
+
+                # Closed, and nothing left:
+
+                return None
+
+            block = ring.copy(start, num)
+
+            if ring.write_pos - start <= ring.size:
+
+                # Nothing was overwritten while we were copying:
+
+                self.cursor = start + num
+
+                return block
+
+    def read_frame(self, timeout=None):
+
+        """
+        Reads a single frame from the ring.
+
+        Much cheaper than reading a block of one frame,
+        as we don't allocate a block.
+
+        :param timeout: Time in seconds to wait for the frame, None waits forever
+        :type timeout: float
+        :return: Tuple of floats, one for each channel, None if we are closed
+        :rtype: tuple
+        """
+
+        ring = self.ring
+
+        if ring.write_pos - self.cursor < ring.channels and not self.closed:
+
+            # No frame, wait for the writer:
+
+            ring.wait(self, ring.channels, timeout)
+
+        self._check_overrun()
+
+        if ring.write_pos - self.cursor < ring.channels:
+
+            # Closed, and nothing left:
+
+            return None
+
+        pos = self.cursor % ring.size
+
+        frame = tuple(ring.storage[pos:pos + ring.channels].tolist())
+
+        self.cursor += ring.channels
+
+        return frame
+
+    def skip(self):
+
+        """
+        Skips everything waiting to be read.
+        """
+
+        self.cursor = self.ring.write_pos
+
+    def close(self):
+
+        """
+        Closes this reader, waking it up if it is waiting.
+        """
+
+        self.closed = True
+
+        self.ring.wake()
+
+    def reset(self):
+
+        """
+        Opens this reader again, starting at the current write position.
+        """
+
+        self.closed = False
+        self.overruns = 0
+        self.lost = 0
+
+        self.skip()
+
+    def stats(self):
+
+        """
+        Returns the counters of this reader.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        return {'available': self.available(),
+                'lag': self.lag(),
+                'overruns': self.overruns,
+                'lost': self.lost}
+
+    def _check_overrun(self):
+
+        """
+        Checks if the writer has lapped us, and skips ahead if it has.
+        """
+
+        behind = self.ring.write_pos - self.cursor
+
+        if behind > self.ring.size:
+
+            # We lost everything the writer overwrote, skip to the oldest sample still there:
+
+            self.overruns += 1
+            self.lost += (behind - self.ring.size) // self.ring.channels
+
+            self.cursor = self.ring.write_pos - self.ring.size
+
+
+class RingBuffer:
+
+    """
+    Single producer, multi consumer ring buffer of audio frames.
+
+    :param frames: Number of frames the ring can hold
+    :type frames: int
+    :param channels: Number of channels in each frame
+    :type channels: int
+    """
+
+    def __init__(self, frames=65536, channels=2):
+
+        self.channels = channels  # Number of channels in each frame
+        self.size = frames * channels  # Number of samples the ring can hold
+        self.storage = zero_block(self.size)  # Preallocated storage
+        self.write_pos = 0  # Number of samples ever written
+        self.readers = []  # Readers of this ring
+
+        self._cond = threading.Condition()  # Condition readers sleep on
+        self._waiting = 0  # Number of readers sleeping
+
+    def add_reader(self, name=''):
+
+        """
+        Creates a new reader, starting at the current write position.
+
+        :param name: Meaningful name of the reader
+        :type name: str
+        :return: New reader
+        :rtype: RingReader
+        """
+
+        names = {reader.name for reader in self.readers}
+
+        if name in names:
+
+            # Make the name unique, so the counters can be told apart:
+
+            name = next(name + '-' + str(num) for num in range(2, len(names) + 2) if name + '-' + str(num) not in names)
+
+        reader = RingReader(self, name=name)
+
+        self.readers.append(reader)
+
+        return reader
+
+    def remove_reader(self, reader):
+
+        """
+        Removes and closes the given reader.
+
+        :param reader: Reader to remove
+        :type reader: RingReader
+        """
+
+        if reader in self.readers:
+
+            self.readers.remove(reader)
+
+        reader.close()
+
+    def write(self, block):
+
+        """
+        Writes a block of interleaved samples into the ring.
+
+        We never wait, if a reader is too slow then it loses audio.
+
+        :param block: Block to write, must be a multiple of the channel count
+        """
+
+        num = len(block)
+        start = self.write_pos
+
+        if num > self.size:
+
+            # Only the end of the block fits:
+
+            start += num - self.size
+            block = block[num - self.size:]
+
+        pos = start % self.size
+        first = min(len(block), self.size - pos)
+
+        self.storage[pos:pos + first] = block[:first]
+
+        if first < len(block):
+
+            # Wrap around to the start:
+
+            self.storage[:len(block) - first] = block[first:]
+
+        # Publish the samples:
+
+        self.write_pos += num
+
+        if self._waiting:
+
+            self.wake()
+
+    def write_frame(self, frame):
+
+        """
+        Writes a single frame into the ring.
+
+        Much cheaper than writing a block of one frame,
+        as we don't allocate a block.
+
+        :param frame: Tuple of floats, one for each channel
+        :type frame: tuple
+        """
+
+        pos = self.write_pos % self.size
+
+        for chan in range(self.channels):
+
+            self.storage[pos + chan] = frame[chan]
+
+        # Publish the frame:
+
+        self.write_pos += self.channels
+
+        if self._waiting:
+
+            self.wake()
+
+    def copy(self, start, num):
+
+        """
+        Copies samples out of the ring.
+
+        :param start: Position of the first sample
+        :type start: int
+        :param num: Number of samples to copy
+        :type num: int
+        :return: Block containing the samples
+        """
+
+        block = zero_block(num)
+
+        pos = start % self.size
+        first = min(num, self.size - pos)
+
+        block[:first] = self.storage[pos:pos + first]
+
+        if first < num:
+
+            block[first:] = self.storage[:num - first]
+
+        return block
+
+    def wait(self, reader, needed, timeout=None):
+
+        """
+        Waits until the given reader has enough samples, or is closed.
+
+        :param reader: Reader that is waiting
+        :type reader: RingReader
+        :param needed: Number of samples the reader needs
+        :type needed: int
+        :param timeout: Time in seconds to wait, None waits forever
+        :type timeout: float
+        :raises TimeoutError: If the samples did not arrive in time
+        """
+
+        with self._cond:
+
+            self._waiting += 1
+
+            try:
+
+                done = self._cond.wait_for(lambda: reader.closed or self.write_pos - reader.cursor >= needed,
+                                           timeout=timeout)
+
+            finally:
+
+                self._waiting -= 1
+
+        if not done:
+
+            raise TimeoutError("Timed out waiting for audio!")
+
+    def wake(self):
+
+        """
+        Wakes up all sleeping readers.
+        """
+
+        with self._cond:
+
+            self._cond.notify_all()
+
+    def stats(self):
+
+        """
+        Returns the counters of each reader.
+
+        :return: Dictionary of counters, keyed by reader name
+        :rtype: dict
+        """
+
+        return {reader.name: reader.stats() for reader in list(self.readers)}
+
+    def slow_readers(self, threshold=0.5):
+
+        """
+        Returns the readers that are falling behind.
+
+        :param threshold: Lag at which a reader is considered slow
+        :type threshold: float
+        :return: Readers that are lagging, or have lost audio
+        :rtype: list
+        """
+
+        return [reader for reader in list(self.readers) if reader.overruns or reader.lag() >= threshold]
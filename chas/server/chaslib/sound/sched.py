@@ -0,0 +1,424 @@
+"""
+Real time scheduler for the OutputHandler.
+
+Without a scheduler, the OutputHandler is reactive,
+and audio is only generated when a special output module asks for it.
+Nothing checks if the synths can keep up with playback.
+
+The AudioScheduler instead renders the mixer on a fixed cadence,
+one block every 'frames / rate' seconds, and writes each block into the ring buffer.
+Each block has a deadline, which is the time playback would reach the end of the block before it.
+If a block is finished after it's deadline, then we count an underrun,
+as the outputs would have run out of audio.
+If we fall more than a few blocks behind, then we skip ahead to the current time,
+and count the blocks we skipped as lost.
+
+We also time each synth chain as it is rendered.
+A chain that takes longer than a whole block on it's own is counted as an overrun,
+as no amount of scheduling can save it.
+Processing times are kept in histograms,
+with buckets that are fractions of the block period,
+so it is easy to see how much room is left for more chains.
+"""
+
+import threading
+import traceback
+
+from chaslib.misctools import get_logger
+from chaslib.sound.utils import get_time, zero_block
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0)  # Upper bounds of the histogram buckets, in block periods
+
+
+class Histogram:
+
+    """
+    Histogram of processing times.
+
+    Times are sorted into buckets relative to the block period,
+    with one extra bucket for everything slower than the last bound.
+
+    :param period: Length of a block in seconds
+    :type period: float
+    :param buckets: Upper bounds of each bucket, in block periods
+    :type buckets: tuple
+    """
+
+    def __init__(self, period, buckets=BUCKETS):
+
+        self.period = period  # Length of a block in seconds
+        self.buckets = buckets  # Upper bounds of each bucket
+        self.counts = [0] * (len(buckets) + 1)  # Number of times in each bucket
+
+        self.num = 0  # Number of times recorded
+        self.total = 0  # Sum of all times recorded
+        self.max = 0  # Slowest time recorded
+
+    def add(self, secs):
+
+        """
+        Records the given time.
+
+        :param secs: Time in seconds
+        :type secs: float
+        """
+
+        load = secs / self.period
+
+        for index, bound in enumerate(self.buckets):
+
+            if load <= bound:
+
+                break
+
+        else:
+
+            # Slower than every bound:
+
+            index = len(self.buckets)
+
+        self.counts[index] += 1
+
+        self.num += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+
+    def mean(self):
+
+        """
+        Returns the mean time recorded.
+
+        :return: Mean time in seconds
+        :rtype: float
+        """
+
+        return self.total / self.num if self.num else 0
+
+    def stats(self):
+
+        """
+        Returns the histogram and it's summary.
+
+        Bucket keys are the upper bound of the bucket in block periods,
+        the last bucket holds everything slower than the block period.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        keys = ['<={}'.format(bound) for bound in self.buckets] + ['>{}'.format(self.buckets[-1])]
+
+        return {'count': self.num,
+                'mean': self.mean(),
+                'max': self.max,
+                'load': self.mean() / self.period,
+                'histogram': dict(zip(keys, self.counts))}
+
+
+class ChainStats:
+
+    """
+    Counters for a single synth chain.
+
+    :param name: Meaningful name of the chain
+    :type name: str
+    :param period: Length of a block in seconds
+    :type period: float
+    """
+
+    def __init__(self, name, period):
+
+        self.name = name  # Meaningful name of the chain
+        self.period = period  # Length of a block in seconds
+        self.times = Histogram(period)  # Processing times of the chain
+        self.overruns = 0  # Number of blocks that took longer than a block period
+
+    def add(self, secs):
+
+        """
+        Records the time it took to render a block of this chain.
+
+        :param secs: Time in seconds
+        :type secs: float
+        """
+
+        self.times.add(secs)
+
+        if secs > self.period:
+
+            # This chain alone can't keep up:
+
+            self.overruns += 1
+
+    def stats(self):
+
+        """
+        Returns the counters of this chain.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        stats = self.times.stats()
+
+        stats['overruns'] = self.overruns
+
+        return stats
+
+
+class AudioScheduler:
+
+    """
+    Renders the OutputHandler's mixer on a fixed cadence.
+
+    We run in our own thread, rendering one block of 'frames' frames each period,
+    and writing it into the ring buffer of the OutputHandler.
+    When no synths are bound, we write silence, so the outputs keep flowing.
+
+    While we are running, special output modules read from the ring like everyone else,
+    as we are the only one generating audio.
+
+    :param handler: OutputHandler to render
+    :type handler: OutputHandler
+    :param frames: Number of frames in each block
+    :type frames: int
+    :param max_late: Number of blocks we can fall behind before we skip ahead
+    :type max_late: int
+    """
+
+    def __init__(self, handler, frames=1024, max_late=4):
+
+        self.handler = handler  # OutputHandler we render
+        self.frames = frames  # Number of frames in each block
+        self.max_late = max_late  # Number of blocks we can fall behind
+        self.thread = None  # Thread we render in
+        self.running = False  # Value determining if we are running
+        self._wake = threading.Event()  # Event set to wake us up early
+
+        self.log = get_logger("AUDIO_SCHED")
+
+        self.reset()
+
+    @property
+    def period(self):
+
+        """
+        Length of a block in seconds.
+
+        :return: Block period
+        :rtype: float
+        """
+
+        return self.frames / self.handler.rate
+
+    def reset(self):
+
+        """
+        Resets all counters.
+        """
+
+        self.blocks = 0  # Number of blocks rendered
+        self.underruns = 0  # Number of blocks finished after their deadline
+        self.lost = 0  # Number of blocks skipped to catch up
+        self.late = 0  # Slowest a block was finished after it's deadline, in seconds
+        self.times = Histogram(self.period)  # Processing times of whole blocks
+        self.chains = {}  # Counters of each synth chain, keyed by the serial of it's OutputControl
+
+    def start(self):
+
+        """
+        Starts rendering in a new thread.
+        """
+
+        if self.running:
+
+            return
+
+        self.running = True
+        self._wake.clear()
+
+        self.handler._input.timer = self._time_chain
+
+        self.thread = threading.Thread(target=self.run, name='AudioScheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        """
+        Stops rendering, and waits for our thread to exit.
+        """
+
+        self.running = False
+        self._wake.set()
+
+        self.handler._input.timer = None
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+
+            self.thread.join()
+
+        self.thread = None
+
+    def run(self):
+
+        """
+        Main render loop.
+
+        Block n is due once playback reaches it,
+        which is 'n' periods after we started.
+        We render the block, and then sleep until the next one is due.
+        """
+
+        start = get_time()
+        num = 0
+
+        while self.running and self.handler.run:
+
+            if not self.handler._pause.is_set():
+
+                # We are paused, start counting again once we resume:
+
+                self.handler._pause.wait(self.period)
+
+                start = get_time()
+                num = 0
+
+                continue
+
+            begin = get_time()
+
+            self._render()
+
+            now = get_time()
+
+            self.times.add(now - begin)
+            self.blocks += 1
+
+            num += 1
+
+            # Block 'num' must be ready before playback reaches the end of the previous one:
+
+            deadline = start + num * self.period
+
+            if now > deadline:
+
+                # We finished too late, the outputs ran dry:
+
+                self.underruns += 1
+                self.late = max(self.late, now - deadline)
+
+                behind = int((now - deadline) / self.period)
+
+                if behind >= self.max_late:
+
+                    # Too far behind to catch up, skip ahead:
+
+                    self.lost += behind
+                    num += behind
+
+                    self.log.warning("Audio fell {} blocks behind, skipping ahead".format(behind))
+
+                continue
+
+            # Wait until the next block is due:
+
+            self._sleep(deadline - now)
+
+    def _render(self):
+
+        """
+        Renders a block from the mixer and writes it to the ring.
+        """
+
+        try:
+
+            block = self.handler._input.get_block(self.frames)
+
+        except Exception as e:
+
+            self.log.warning("Getting next block failed: {}".format(e))
+            self.log.debug("Traceback: \n{}".format(traceback.format_exc()))
+
+            block = None
+
+        if block is None:
+
+            # Nothing to play, keep the outputs going with silence:
+
+            block = zero_block(self.frames * 2)
+
+        self.handler.ring.write(block)
+
+    def _sleep(self, secs):
+
+        """
+        Sleeps for the given time, waking up early if we are stopped.
+
+        :param secs: Time to sleep in seconds
+        :type secs: float
+        """
+
+        self._wake.wait(secs)
+
+    def _time_chain(self, chain, secs):
+
+        """
+        Records the time the mixer took to render the given chain.
+
+        :param chain: Synth chain that was rendered
+        :type chain: BaseModule
+        :param secs: Time in seconds
+        :type secs: float
+        """
+
+        key = getattr(chain, 'serial', id(chain))
+        stats = self.chains.get(key)
+
+        if stats is None:
+
+            if chain not in self.handler._input._objs:
+
+                # Chain was removed while we rendered it, don't bring it's stats back:
+
+                return
+
+            # Name the chain after the synth bound to it, if it has no name:
+
+            name = chain.info.name or type(chain.input._objs[0] if chain.input._objs else chain).__name__
+
+            stats = self.chains[key] = ChainStats('{}-{}'.format(name, key), self.period)
+
+        stats.add(secs)
+
+    def retire(self, chain):
+
+        """
+        Drops the counters of a synth chain that was removed from the mixer.
+
+        :param chain: Synth chain that was removed
+        :type chain: BaseModule
+        """
+
+        self.chains.pop(getattr(chain, 'serial', id(chain)), None)
+
+    def stats(self):
+
+        """
+        Returns the counters of the scheduler, and of each synth chain.
+
+        :return: Dictionary of counters
+        :rtype: dict
+        """
+
+        stats = self.times.stats()
+
+        stats.update({'rate': self.handler.rate,
+                      'frames': self.frames,
+                      'period': self.period,
+                      'blocks': self.blocks,
+                      'underruns': self.underruns,
+                      'lost': self.lost,
+                      'late': self.late,
+                      'chains': {chain.name: chain.stats() for chain in list(self.chains.values())}})
+
+        return stats
@@ -1,13 +1,32 @@
 """
 General utilities for sound processing
+
+We also contain the helpers for working with audio blocks.
+A block is a buffer of float samples, interleaved if there is more than one channel.
+If NumPy is installed, then blocks are float32 NumPy arrays.
+Otherwise, we fall back to float arrays from the 'array' module.
+The helpers below work with either, so modules don't have to care which one is in use.
 """
 
 
 from chaslib.misctools import get_logger
 import time
 
+from array import array
 from collections import deque
 
+try:
+
+    import numpy
+
+except ImportError:
+
+    # NumPy is not available, we will use the array module:
+
+    numpy = None
+
+BLOCK_TYPES = (array,) if numpy is None else (array, numpy.ndarray)  # Types that are blocks
+
 
 def get_time():
 
@@ -53,6 +72,124 @@ def amp_clamp(val):
     return val
 
 
+def make_block(values=()):
+
+    """
+    Creates a block from the given values.
+
+    :param values: Float values to put into the block
+    :type values: iterable
+    :return: New block
+    """
+
+    if numpy is not None:
+
+        return numpy.asarray(values, dtype=numpy.float32)
+
+    return array('f', values)
+
+
+def zero_block(size):
+
+    """
+    Creates a block of silence.
+
+    :param size: Number of samples in the block
+    :type size: int
+    :return: New block filled with zeros
+    """
+
+    if numpy is not None:
+
+        return numpy.zeros(size, dtype=numpy.float32)
+
+    return array('f', bytes(size * 4))
+
+
+def is_block(obj):
+
+    """
+    Determines if the given object is a block.
+
+    :param obj: Object to check
+    :return: True if the object is a block
+    :rtype: bool
+    """
+
+    return isinstance(obj, BLOCK_TYPES)
+
+
+def concat_blocks(blocks):
+
+    """
+    Joins the given blocks into one block.
+
+    :param blocks: Blocks to join
+    :type blocks: list
+    :return: Joined block
+    """
+
+    if numpy is not None:
+
+        return numpy.concatenate(blocks) if blocks else make_block()
+
+    final = array('f')
+
+    for block in blocks:
+
+        final.extend(block)
+
+    return final
+
+
+def mix_into(dest, src, scale=1.0, offset=0, step=1):
+
+    """
+    Adds the given block to the destination block, scaled by the given value.
+
+    The source is added to every 'step' sample of the destination, starting at 'offset'.
+    This allows us to mix a mono block into one channel of an interleaved block.
+    If the source is shorter than the destination, then the rest is left alone.
+
+    :param dest: Block to add to, modified in place
+    :param src: Block to add
+    :param scale: Value to scale the source by
+    :type scale: float
+    :param offset: Sample of the destination to start at
+    :type offset: int
+    :param step: Number of destination samples between each source sample
+    :type step: int
+    """
+
+    num = min(len(src), (len(dest) - offset + step - 1) // step)
+
+    if numpy is not None:
+
+        dest[offset:offset + num * step:step] += numpy.asarray(src[:num], dtype=numpy.float32) * scale
+
+        return
+
+    for index in range(num):
+
+        dest[offset + index * step] += src[index] * scale
+
+
+def mix_down(block):
+
+    """
+    Mixes an interleaved stereo block down into mono, by adding the channels together.
+
+    :param block: Stereo block to mix down
+    :return: Mono block
+    """
+
+    if numpy is not None:
+
+        return block[0::2] + block[1::2]
+
+    return array('f', [block[index] + block[index + 1] for index in range(0, len(block) - 1, 2)])
+
+
 class BaseModule(object):
 
     """
@@ -166,6 +303,29 @@ class BaseModule(object):
 
         return item
 
+    def get_input_block(self, frames):
+
+        """
+        Gets a block of frames from the AudioCollection attached to us.
+
+        Like 'get_input()', if we receive None then we stop,
+        as this synth is stopping.
+
+        :param frames: Number of frames to retrieve
+        :type frames: int
+        :return: Block from the AudioCollection
+        """
+
+        block = self.input.get_block(frames)
+
+        if block is None:
+
+            # We are None! Stop this object somehow...
+
+            self.stop()
+
+        return block
+
     def get_inputs(self, num):
 
         """
@@ -406,6 +566,45 @@ class BaseModule(object):
 
         return val
 
+    def get_block(self, frames):
+
+        """
+        Gets a block of frames from this module.
+
+        The block contains 'frames' samples for each channel, interleaved.
+        It can be shorter if this module stops part way through,
+        and None is returned if we have nothing left to give.
+
+        By default, we sample this module one value at a time,
+        so every module supports blocks without any extra work.
+        Modules that can compute a whole block at once,
+        should override this method for much better performance.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Block of samples
+        """
+
+        final = []
+
+        for _ in range(frames * self.info.channels):
+
+            val = next(self)
+
+            if val is None:
+
+                # We are done, return what we have:
+
+                break
+
+            final.append(val)
+
+        if not final:
+
+            return None
+
+        return make_block(final)
+
 
 class ModuleInfo:
 
@@ -428,6 +627,7 @@ class ModuleInfo:
 
         #self.freq = AudioValue(freq, 0, samp)  # AudioValue representing the frequency
         self.rate = samp   # Sampling rate of this synth
+        self.native_rate = None  # Rate the audio was recorded at, None if it is generated at our rate
         self.channels= 1  # Number of channels the synth chain has
         self.running = True  # Value determining if we are running
         self.name = ''  # Meaningful name for this chain
@@ -584,6 +784,53 @@ class AudioCollection:
 
         return final
 
+    def get_block(self, frames):
+
+        """
+        Gets a block of frames from each node and adds them together.
+
+        Just like '__next__()', if any node is done, then we return None.
+        If a node returns a shorter block, then we only return that many samples.
+
+        :param frames: Number of frames to get from each node
+        :type frames: int
+        :return: Synthesized block
+        """
+
+        objs = tuple(self._objs)
+
+        if not objs:
+
+            # Return None
+
+            return None
+
+        blocks = []
+
+        for obj in objs:
+
+            # Get the next block:
+
+            block = obj.get_block(frames)
+
+            if block is None:
+
+                # We are done, return None
+
+                return None
+
+            blocks.append(block)
+
+        # Add the blocks together:
+
+        final = zero_block(min(len(block) for block in blocks))
+
+        for block in blocks:
+
+            mix_into(final, block, 1 / len(objs))
+
+        return final
+
 
 class AudioMixer(AudioCollection):
 
@@ -599,8 +846,17 @@ class AudioMixer(AudioCollection):
 
     If an input module identifies itself as stereo,
     then we will sample it twice to get the values we need.
+
+    A timer can be set, which is called with each node and the time it took to render a block of it.
+    The AudioScheduler uses this to keep track of each synth chain.
     """
 
+    def __init__(self):
+
+        super(AudioMixer, self).__init__()
+
+        self.timer = None  # Callable given each node and it's render time in seconds
+
     def __next__(self):
 
         """
@@ -638,7 +894,7 @@ class AudioMixer(AudioCollection):
                     continue
 
                 final[0] = final[0] + temp * 1 / len(self._objs)
-                final[1] = final[0] + temp * 1 / len(self._objs)
+                final[1] = final[1] + temp * 1 / len(self._objs)
 
                 continue
 
@@ -667,3 +923,75 @@ class AudioMixer(AudioCollection):
         # Done, return the final result:
 
         return final
+
+    def get_block(self, frames):
+
+        """
+        Gets a block of frames from each node and mixes them.
+
+        We always return an interleaved stereo block of 'frames' frames.
+        Mono nodes are mixed into both channels,
+        and nodes that are done, or return short blocks, only contribute what they have.
+
+        :param frames: Number of frames to get
+        :type frames: int
+        :return: Interleaved stereo block
+        """
+
+        objs = tuple(self._objs)
+
+        if not objs:
+
+            # Return None
+
+            return None
+
+        final = zero_block(frames * 2)
+        timer = self.timer
+
+        for obj in objs:
+
+            # Determine the number of channels:
+
+            if obj.info.channels not in (1, 2):
+
+                # Incompatible, continue
+
+                continue
+
+            if timer is None:
+
+                block = obj.get_block(frames)
+
+            else:
+
+                # Time how long this node takes:
+
+                start = get_time()
+
+                block = obj.get_block(frames)
+
+                timer(obj, get_time() - start)
+
+            if block is None:
+
+                # We are done with this node, lets continue:
+
+                continue
+
+            if obj.info.channels == 1:
+
+                # One channel, lets mix it into both:
+
+                mix_into(final, block, 1 / len(objs), offset=0, step=2)
+                mix_into(final, block, 1 / len(objs), offset=1, step=2)
+
+                continue
+
+            # Two channels, already interleaved:
+
+            mix_into(final, block, 1 / len(objs))
+
+        # Done, return the final result:
+
+        return final
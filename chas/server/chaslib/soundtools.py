@@ -12,6 +12,7 @@ import wave
 from math import ceil
 
 from chaslib.sound.input import WaveReader
+from chaslib.sound.cache import open_sound
 from chaslib.misctools import get_logger
 
 class Listener:
@@ -35,6 +36,7 @@ class Listener:
         self.wake = Event()  # Event determining if we have a wake word event
         self.pause = Event()  # Event determining if we are paused(True means we are not paused
         self.sphinx = True  # Boolean determining if we recognize with the offline engine
+        self.sound_path = os.path.join(self.chas.settings.media_dir, 'sounds/listen.wav')  # Notification sound
 
         self.log = get_logger("SPEECH")
 
@@ -70,9 +72,9 @@ class Listener:
 
             self.rec.adjust_for_ambient_noise(mic)
 
-            # PLaying notification sound
+            # PLaying notification sound, it is decoded once and then played from the sound cache:
 
-            WavePlayer(self.chas, path=os.path.join(self.chas.settings.media_dir, 'sounds/listen.wav')).start()
+            self.chas.sound.bind_synth(open_sound(self.sound_path, rate=self.chas.sound.rate)).start()
 
             # Listening for voice
 
@@ -15,6 +15,8 @@ class DateTime(BaseExtension):
                      {'number date': 'Displays the numerical date'},
                      {'time': "Displays the time"}]
 
+        self.add_keywords('date', 'day', 'time')
+
     def match(self, mesg, talk, win):
 
         if keyword_find(mesg, ['date', 'day']):
@@ -3,11 +3,11 @@
 from chaslib.extension import BaseExtension
 from chaslib.resptools import keyword_find, key_sta_find
 from random import shuffle, randint
-from chaslib.sound.input import WaveReader
+from chaslib.sound.cache import open_sound
+from chaslib.sound.library import MediaLibrary
+from chaslib.sound.playlist import PlaylistFile, PlaylistReader
 
 import os
-import json
-import threading
 
 # Potential inputs:
 # 1. 'play Spanish Flea'
@@ -34,10 +34,58 @@ class MusicPlayer(BaseExtension):
         self.playlist_path = None  # Path to playlist file
         self.playlist = []  # Dictionary of playlist
         self.playlist_num = 0  # Current song index in playlist
+        self.playlist_next = None  # Index of the song to play next, if not the one after the current song
+        self.playlist_files = {}  # Parsed playlist files, keyed by path
         self.repeat = False  # Function determining if playlist repeats
         self.song = None  # Name of current song
         self.song_path = None  # Path to current song
-        self.thread = None  # Threading object
+        self.engine = None  # PlaylistReader playing the playlist
+        self.library = None  # Index of songs and playlists
+
+        self.add_keywords('stop', 'play', 'next song', 'song up one', 'previous song', 'song down one',
+                          'shuffle', 'restart', 'random', 'replay', 'repeat', 'add')
+
+    def enable(self):
+
+        # Open the index of songs and playlists, and keep it up to date in the background:
+
+        settings = self.chas.settings
+
+        self.library = MediaLibrary(os.path.join(self.media, 'songs/'), path=settings.media_index,
+                                    cutoff=settings.media_fuzzy_cutoff)
+        self.library.start(settings.media_scan_interval)
+
+    def disable(self):
+
+        self.stop()
+
+    def unload(self):
+
+        self.stop()
+
+    def check(self, mesg, talk):
+
+        # Checks if we would handle the input, without searching for songs
+
+        if key_sta_find(mesg, ['stop song', 'stop playlist', 'stop']) or keyword_find(mesg, 'play'):
+
+            return True
+
+        if self.playlist:
+
+            # Playlist methods
+
+            return key_sta_find(mesg, ['next song', 'song up one', 'previous song', 'song down one']) or \
+                keyword_find(mesg, ['shuffle', 'restart', 'random'])
+
+        if self.playing:
+
+            # Song commands
+
+            return key_sta_find(mesg, ['previous song', 'song down one', 'replay', 'repeat']) or \
+                keyword_find(mesg, 'add')
+
+        return False
 
     def match(self, mesg, talk, win):
 
@@ -177,8 +225,6 @@ class MusicPlayer(BaseExtension):
 
                 self.playlist_incriment(1)
 
-                self.out.stop()
-
                 win.add("Playing next song")
 
                 return True
@@ -256,164 +302,204 @@ class MusicPlayer(BaseExtension):
 
         # This function will search for songs:
 
-        temp_title = title.lower().replace(' ', '_') + '.wav'
-
-        media_dir = os.path.join(self.media, 'songs/')
+        path = self.library.find_song(title, folder=foulder)
 
-        if foulder is not None:
+        if path is None:
 
-            foulder = foulder.lower().replace(' ', '_')
-            media_dir = os.path.join(media_dir, foulder + '/')
+            # Did not find song. Returning nothing
 
-        for root, dirs, files in os.walk(media_dir):
-
-            if temp_title in files:
-
-                # Found our song and returning path:
+            return False
 
-                self.song = title
-                self.song_path = root + '/' + temp_title
-                return True
+        # Found our song:
 
-        # Did not find song. Returning nothing
+        self.song = title
+        self.song_path = path
 
-        return False
+        return True
  
     def search_playlist(self, title, return_vals=False):
 
         # Function for searching for playlist:
 
-        temp_dir = os.path.join(self.media, 'songs/playlists/')
+        path = self.library.find_playlist(title)
 
-        temp_title = title.lower().replace(' ', '_') + '.txt'
+        if return_vals:
 
-        for root, dirs, files in os.walk(temp_dir):
+            # Returning vals instead of setting instance vars:
 
-            if temp_title in files:
+            return path, path is not None
 
-                # Found playlist, returning path:
+        if path is None:
 
-                path = root + '/' + temp_title
+            # Did not find playlist.
 
-                if return_vals:
+            return False
 
-                    # Returning vals instead of setting instance vars:
+        self.playlist_path = path
 
-                    return path, True
+        return True
 
-                self.playlist_path = path
+    def playlist_parse(self, song=None):
 
-                return True
+        # User wants to use a playlist
+        # Playlists are only parsed again if the file has changed:
 
-        # Did not find playlist.
+        self.playlist = list(self.playlist_file(self.playlist_path).load())
+        self.playlist_num = 0
 
-        if return_vals:
+        if not self.playlist:
 
-            return None, False
+            # Nothing to play:
 
-        return False
+            self.playlist_path = None
+            return False
 
-    def playlist_parse(self, song=None):
+        if song is None:
 
-        # User wants to use a playlist
-        # Parsing playlist:
+            return True
 
-        file = open(self.playlist_path, 'r')
+        for num, line in enumerate(self.playlist):
 
-        lines = file.read().splitlines()
+            if line['name'].lower() == song.lower():
 
-        for i in range(len(lines)):
+                # We found our song!
 
-            line = json.loads(lines[i])
+                self.song = line['name']
+                self.song_path = self.entry_path(line)
+                self.playlist_num = num
 
-            if song is not None and line['name'].lower() == song.lower():
+                return True
 
-                # We found our song!
+        # Song not found:
 
-                self.song = line['name']
-                self.song_path = os.path.join(self.media, line['path'])
-                self.playlist_num = i
+        self.playlist = []
+        self.playlist_path = None
+        return False
 
-            self.playlist.append(line)
+    def playlist_file(self, path):
 
-        if song is not None and self.playlist_num is None:
+        # Gets the parsed playlist at the given path:
 
-            # Song not found:
+        if path not in self.playlist_files:
 
-            self.playlist = []
-            self.playlist_path = None
-            return False
+            self.playlist_files[path] = PlaylistFile(path)
 
-        return True
+        return self.playlist_files[path]
+
+    def entry_path(self, line):
+
+        # Gets the path to a song in a playlist, which is relative to the media directory:
+
+        return os.path.join(self.media, line['path'].lstrip('/\\'))
 
     def play(self):
 
         # Function for Playing audio
         # Must be executed in thread
 
-        # Add the WaveReader node:
+        # Add the song node, short songs are played from the sound cache, the rest are memory mapped:
 
-        self.out = self.chas.sound.bind_synth(WaveReader(self.song_path))
+        self.out = self.chas.sound.bind_synth(open_sound(self.song_path))
         self.out.start()
 
         self.playing = True
 
         return
 
-    def player(self):
+    def next_track(self):
 
-        # Function for iterating over playlist
+        # Called by the PlaylistReader for the song after the current one, returns it's key and path
 
-        self.playing = True
+        if self.playlist_next is not None:
 
-        if self.song is None:
+            # User picked the next song:
 
-            # No song queued up, selecting first song:
+            num = self.playlist_next
+            self.playlist_next = None
 
-            self.playlist_num = 0
+        else:
 
-        while self.playlist_num <= len(self.playlist) - 1:
+            num = self.playlist_num + 1
 
-            temp_num = self.playlist_num
-            self.song = self.playlist[self.playlist_num]['name']
-            self.song_path = os.path.join(self.media, self.playlist[self.playlist_num]['path'])
+        if num > len(self.playlist) - 1 and self.repeat:
 
-            self.play()
+            num = 0
 
-            self.wav.block()
+        if num < 0 or num > len(self.playlist) - 1:
 
-            if not self.playing:
+            # End of the playlist:
 
-                # Stop playing song:
+            return None
 
-                break
+        line = self.playlist[num]
 
-            if temp_num != self.playlist_num:
+        return (num, line), self.entry_path(line)
 
-                # User changed playlist index
+    def track_started(self, key):
 
-                continue
+        # Called by the PlaylistReader when a song starts, and with None when the playlist is done
 
-            self.playlist_num = self.playlist_num + 1
+        if key is None:
 
-            if self.playlist_num > len(self.playlist) - 1 and self.repeat:
+            self.playlist = []
+            self.playlist_num = 0
+            self.playing = False
+            self.engine = None
 
-                self.playlist_num = 0
+            return
 
-        self.playlist = []
-        self.playlist_num = 0
-        self.playing = False
+        self.playlist_num, line = key
 
-        return
+        self.song = line['name']
+        self.song_path = self.entry_path(line)
+
+    def track_failed(self, key):
+
+        # Called by the PlaylistReader when a song can't be opened, moves past it
+
+        num, line = key
+
+        if self.playlist_next is None:
+
+            self.playlist_next = num + 1
 
     def start_player(self):
 
-        # Function for starting player thread
+        # Function for playing the playlist
+        # The next song is buffered while the current one plays, so songs are joined without a gap
+
+        if self.playing:
+
+            # Stop what we are playing now:
+
+            self.out.stop()
+
+        settings = self.chas.settings
+
+        self.playlist_next = self.playlist_num
+        self.engine = PlaylistReader(self.next_track, self.track_started, on_error=self.track_failed,
+                                     prefetch=settings.music_prefetch, fade=settings.music_crossfade)
+
+        self.out = self.chas.sound.bind_synth(self.engine)
+        self.playing = True
+
+        self.out.start()
 
-        self.thread = threading.Thread(target=self.player, daemon=True)
-        self.thread.start()
         return
 
+    def playlist_jump(self, num):
+
+        # Plays the song at the given index now:
+
+        self.playlist_next = num
+
+        if self.engine is not None:
+
+            # Drop the buffered song, and skip to the one we picked:
+
+            self.engine.requeue()
+            self.engine.skip()
+
     def playlist_incriment(self, num):
 
         val = self.playlist_num + num
@@ -424,9 +510,15 @@ class MusicPlayer(BaseExtension):
 
             return
 
-        self.playlist_num = self.playlist_num + num
+        if num == 1 and self.engine is not None:
 
-        self.out.stop()
+            # Next song is already buffered:
+
+            self.engine.skip()
+
+            return
+
+        self.playlist_jump(val)
 
         return
 
@@ -436,6 +528,12 @@ class MusicPlayer(BaseExtension):
 
         shuffle(self.playlist)
 
+        if self.engine is not None:
+
+            # Buffer the new next song:
+
+            self.engine.requeue()
+
         return
 
     def playlist_restart(self):
@@ -445,9 +543,9 @@ class MusicPlayer(BaseExtension):
         self.playlist_parse()
         self.playlist_num = 0
 
-        if self.playing:
+        if self.playing and self.engine is not None:
 
-            self.out.stop()
+            self.playlist_jump(0)
 
         else:
 
@@ -459,9 +557,7 @@ class MusicPlayer(BaseExtension):
 
         # Chooses random song from playlist:
 
-        self.playlist_num = randint(0, len(self.playlist) - 1)
-
-        self.out.stop()
+        self.playlist_jump(randint(0, len(self.playlist) - 1))
 
         return
 
@@ -469,9 +565,6 @@ class MusicPlayer(BaseExtension):
 
         # Function for adding song to playlist:
 
-        temp_title = self.song
-        temp_path = self.song_path.replace(self.media, '')
-
         playlist_path, val = self.search_playlist(playlist, return_vals=True)
 
         if not val:
@@ -480,12 +573,21 @@ class MusicPlayer(BaseExtension):
             print("Playlist not found")
             return False
 
-        file = open(playlist_path, 'a')
+        data = {"name": self.song, "path": os.path.relpath(self.song_path, self.media)}
+
+        self.playlist_file(playlist_path).append(data)
+
+        if playlist_path == self.playlist_path and self.playlist:
+
+            # Adding to the playlist we are playing:
 
-        data = {"name": temp_title, "path": temp_path}
+            self.playlist.append(data)
 
-        file.write('\n' + str(json.dumps(data)))
-        file.close()
+            if self.engine is not None and self.engine.ended:
+
+                # We were on the last song, play the new one after it:
+
+                self.engine.requeue()
 
         return
 
@@ -499,11 +601,21 @@ class MusicPlayer(BaseExtension):
 
         self.song = None
         self.playlist_num = 0
+        self.playlist_next = None
         self.playing = False
         self.playlist = []
+        self.engine = None
 
         self.out.stop()
 
     def stop(self):
 
-        self.out.stop()
+        # Stop playing, and close the index of songs and playlists:
+
+        self.stop_song()
+
+        if self.library is not None:
+
+            self.library.close()
+
+            self.library = None
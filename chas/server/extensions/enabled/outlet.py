@@ -58,6 +58,35 @@ class OutletExtension(BaseExtension):
 
         self.rf_path = '/var/www/rfoutlet/codesend'  # Path to codesend binary
 
+        # We also declare the phrases we respond to.
+        # CHAS indexes these when extensions are loaded,
+        # and only calls 'match()' when the input contains one of them.
+        # Extensions that declare nothing will see every input.
+
+        self.add_keywords('light on', 'light off')
+
+    def check(self, mesg, talk):
+
+        """
+        Extension check function - This tells CHAS if we would handle the input, without handling it.
+
+        Running 'codesend' can take a while, and CHAS would have to wait on us to find out we did not want the input.
+        If we provide this function, then CHAS can run it alongside the checks of other extensions,
+        and only call 'match()' if we return True.
+
+        This function must not do anything other than look at the input,
+        so we don't run 'codesend' here.
+
+        :param mesg: String contaning input from the user
+        :type mesg: str
+        :param talk: Boolean determining if we are talking
+        :type talk: bool
+        :return: True if we would handle the input, False if not
+        :rtype: bool
+        """
+
+        return key_sta_find(mesg, ['light on', 'light off'])
+
     def match(self, mesg, talk, out):
 
         """
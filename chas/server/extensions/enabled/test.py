@@ -12,6 +12,8 @@ class TestExtension(BaseExtension):
         self.test = 'Everything is working!'
         self.blank = None
 
+        self.add_keywords('test', 'blank', 'chasval')
+
     def match(self, text, talk, win):
 
         # Function for matching text to operation
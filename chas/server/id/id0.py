@@ -1,16 +1,101 @@
-# Dummy handler to get code working
+# ID Handler for connection maintenance and clock sync
+
+import threading
 
 from id.idhandle import IDHandle
+from chaslib.sound.clock import ClockSync
+from chaslib.sound.utils import get_time
+
+
+class MaintainHandel(IDHandle):
+
+    """
+    Handler for connection maintenance.
+
+    Clients ping the server every so often, and the server replies with the time on it's clock.
+    Clients use the replies to estimate the offset and drift of the server clock,
+    so audio streamed to many rooms can be played at the same moment(see 'clock.py').
 
+    Pings are sent a few times a second until we are synced,
+    and then once every 'net_clock_interval' seconds.
+    """
 
-class DummyHandel(IDHandle):
+    FAST_INTERVAL = 0.1  # Seconds between pings until we are synced
 
     def __init__(self):
 
-        super(DummyHandel, self).__init__('Dummy Handler',
-                                          'Dummy handler to get code working',
-                                          0)
+        super(MaintainHandel, self).__init__('Maintenance Handler',
+                                             'Handler for connection maintenance and clock sync',
+                                             0)
+
+        self.clock = ClockSync()  # Estimate of the server clock
+        self.running = False  # Value determining if we are pinging the server
+        self.thread = None  # Thread sending pings
+        self._wake = threading.Event()  # Event set when we should stop pinging
+
+    def start(self):
+
+        """
+        Starts pinging the server.
+
+        This is called by the authentication handler once we are connected to a server.
+        """
+
+        if self.running:
+
+            return
+
+        self.running = True
+
+        self._wake.clear()
+
+        self.thread = threading.Thread(target=self._ping_loop, name='ClockSync', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        """
+        Stops pinging the server.
+        """
+
+        self.running = False
+
+        self._wake.set()
+
+    def handel_server(self, dev, data):
+
+        # Client sent us a ping, reply with our time:
+
+        received = get_time()
+
+        if isinstance(data, dict) and 'ping' in data:
+
+            dev.send({'ping': data['ping'], 'recv': received, 'send': get_time()}, 0)
+
+    def handle_client(self, server, data):
+
+        # Server replied to our ping:
+
+        if isinstance(data, dict) and 'recv' in data:
+
+            self.clock.add_sample(data['ping'], data['recv'], data['send'])
+
+    def _ping_loop(self):
+
+        # Sends pings to the server until we are stopped
+
+        while self.running:
+
+            server = self.chas.server
+
+            if server is not None:
+
+                try:
+
+                    server.send(self.clock.make_ping(), 0)
+
+                except Exception as e:
+
+                    self.log.warning("Failed to ping server: {}".format(e))
 
-    def handel(self, dev, data):
-        
-        pass
+            self._wake.wait(self.chas.settings.net_clock_interval if self.clock.synced() else self.FAST_INTERVAL)
@@ -1,6 +1,8 @@
 
 from id.idhandle import IDHandle
 from chaslib.device import Device, Server
+from chaslib.socket_lib import negotiate_framing, FRAMING_JSON
+from chaslib.sound.netcodec import negotiate_codec
 
 # ID Handel for authentication actions
 
@@ -35,11 +37,28 @@ class AuthHandel(IDHandle):
 
         self.chas.devices.register(dev)
 
+        # Agreeing on a framing mode, older clients send no content and get JSON framing
+
+        offered = data.get('framing') if isinstance(data, dict) else None
+
+        framing = negotiate_framing(offered, self.chas.settings.net_framing)
+
+        # Agreeing on an audio codec we can stream with, older clients offer none and get unsequenced blocks
+
+        offered = data.get('audio_codecs') if isinstance(data, dict) else None
+
+        dev.audio_codec = negotiate_codec(offered, self.chas.settings.net_audio_codecs,
+                                          rate=self.chas.sound.rate, frames=self.chas.settings.net_audio_frames)
+
         # Sending back confirmation and UUID
 
         self.log.debug("Sending authentication information ...")
 
-        dev.send({'auth': True, 'uuid': str(dev.uuid)}, 1)
+        dev.send({'auth': True, 'uuid': str(dev.uuid), 'framing': framing, 'audio_codec': dev.audio_codec}, 1)
+
+        # We can read both framing modes, so it does not matter if the reply is sent with the new one
+
+        sock.set_framing(framing)
 
         return
 
@@ -59,10 +78,18 @@ class AuthHandel(IDHandle):
 
             sev = Server(self.chas, addr[0], addr[1], sock, data['uuid'])
 
+            # Switching to the framing mode the server agreed on:
+
+            sock.set_framing(data.get('framing', FRAMING_JSON))
+
             # Setting server object in CHAS lib
 
             self.chas.server = sev
 
+            # Start syncing our clock with the server:
+
+            self.chas.net.handlers[0].start()
+
             return
 
         else:
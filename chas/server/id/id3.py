@@ -2,6 +2,9 @@
 from id.idhandle import IDHandle
 from chaslib.device import Device
 
+import asyncio
+import inspect
+
 # Handel for special requests
 
 
@@ -63,7 +66,13 @@ class SpecialHandel(IDHandle):
 
             dd = self._gen_dummy_device(device)
 
-            handel.handel_server(dd, content)
+            val = handel.handel_server(dd, content)
+
+            if inspect.iscoroutine(val):
+
+                # Coroutine handler, lets run it to completion before we send what it queued:
+
+                asyncio.run(val)
 
             response = self._gen_request(dd, content_uuid, content_id, content_type)
 
@@ -1,5 +1,7 @@
 # ID Handler for network audio streaming
 
+from base64 import b64decode
+
 from id.idhandle import IDHandle
 from chaslib.sound.out import NetModule
 from chaslib.sound.input import NetReader
@@ -20,15 +22,25 @@ class AudioStream(IDHandle):
 
     def handle_client(self, dev, data):
 
-        id_num = data['id']
-        contents = data['data']
-
         if not self.allow_stream:
 
             # We are not allowing streaming, lets drop the packet
 
             return
 
+        if isinstance(data, (bytes, bytearray)):
+
+            # Server sent us an encoded block using binary framing:
+
+            if self.stream is not None:
+
+                self.stream.put_block(data)
+
+            return
+
+        id_num = data['id']
+        contents = data['data']
+
         if id_num == 0:
 
             # Server wants to start an audio stream:
@@ -43,6 +55,14 @@ class AudioStream(IDHandle):
 
             self._read_stream(contents)
 
+        if id_num == 3:
+
+            # Server sent us a base64 encoded block:
+
+            if self.stream is not None:
+
+                self.stream.put_block(b64decode(contents))
+
         if id_num == 2:
 
             # Server wants to stop audio stream
@@ -108,7 +128,16 @@ class AudioStream(IDHandle):
 
         self.log.debug("Starting audio stream...")
 
-        self.stream = NetReader()
+        # Newer servers tell us the rate of the stream:
+
+        rate = data.get('rate') if isinstance(data, dict) else None
+
+        min_delay, max_delay = self.chas.settings.net_audio_delay
+
+        # Timed blocks are played in sync with the other rooms, using our estimate of the server clock:
+
+        self.stream = NetReader(rate=rate, min_delay=min_delay, max_delay=max_delay,
+                                clock=self.chas.net.handlers[0].clock, latency=self.chas.settings.net_audio_latency)
 
         self.control = self.chas.sound.bind_synth(self.stream)
 
@@ -41,6 +41,12 @@ class IDHandle(object):
 
         The functionality defined within should only be relevant for server operations!
 
+        This method may also be defined as a coroutine('async def').
+        The asyncio engine will await it on the event loop,
+        and the selector engine will run it to completion on a handler thread.
+        Regular methods are always ran on a handler thread,
+        so they should not assume they are on the event loop.
+
         :param dev: Device instance to handle
         :type dev: Device
         :param data: Data received from the client
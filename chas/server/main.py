@@ -18,14 +18,16 @@ import curses
 import threading
 
 from chaslib.socket_server import SocketServer, SocketClient
+from chaslib.socket_async import AsyncSocketServer
 from chaslib.device import Devices
 from chaslib.extension import Extensions
 from settings import Settings
 from chaslib.soundtools import Listener, Speaker
 from chaslib.sound.base import OutputHandler
 from chaslib.sound.out import PyAudioModule
+from chaslib.sound.cache import get_cache
 from chaslib.chascurses import ChatWindow
-from chaslib.resptools import Personalities
+from chaslib.resptools import Personalities, ParsedUtterance
 from chaslib.misctools import set_chas, get_logger
 
 
@@ -100,8 +102,26 @@ class CHASBase:
 
         self.sound.add_output(pyaud)
 
+        if self.settings.audio_schedule:
+
+            # Render audio on a fixed cadence:
+
+            self.sound.schedule(frames=self.settings.audio_block)
+
         self.sound.start()
 
+        # Decode the notification sound now, so the first wake word plays it instantly:
+
+        get_cache().budget = self.settings.audio_cache_size
+
+        try:
+
+            get_cache().get(self.listener.sound_path, rate=self.sound.rate)
+
+        except Exception as e:
+
+            self.log.warning("Unable to load notification sound: {}".format(e))
+
         # Parsing and loading extensions
 
         self.log.info("Starting Extension Service...")
@@ -197,7 +217,7 @@ class CHASBase:
 
             # Get words from CHAS
 
-            word = self.listener.listen()
+            word = ParsedUtterance(self.listener.listen())
 
             # Handling output
 
@@ -207,7 +227,7 @@ class CHASBase:
 
                 # Extensions unable to handle input, send input to personality
 
-                self.person.handel(val, False, self.chat)
+                self.person.handel(word, False, self.chat)
 
     def main(self):
 
@@ -258,6 +278,10 @@ class CHASBase:
 
                 return
 
+            # Parse the input once, so extensions and personalities can share it:
+
+            inp = ParsedUtterance(inp)
+
             # Check CHAS extensions:
 
             if self.extensions.handel(inp, False, self.chat):
@@ -304,9 +328,15 @@ class CHASServer(CHASBase):
 
         self.devices = Devices(self)
 
-        # Define our networking:
+        # Define our networking, using the engine selected in the settings:
+
+        if self.settings.net_engine == 'asyncio':
+
+            self.net = AsyncSocketServer(self, self.settings.host, self.settings.port)
+
+        else:
 
-        self.net = SocketServer(self, self.settings.host, self.settings.port)
+            self.net = SocketServer(self, self.settings.host, self.settings.port)
 
 
 class CHASClient(CHASBase):
@@ -17,6 +17,11 @@ class Settings:
         self.extension_dir = os.path.join(self.client_dir, "extensions/")
 
         self.media_dir = os.path.join(self.client_dir, 'media/')
+        self.media_index = os.path.join(self.media_dir, 'library.db')  # Path to the index of songs and playlists
+        self.media_scan_interval = 30.0  # Seconds between checks for new songs and playlists
+        self.media_fuzzy_cutoff = 0.75  # Smallest similarity, from 0 to 1, of a fuzzy song or playlist match
+        self.music_prefetch = 1.0  # Seconds of the next song to buffer before it plays
+        self.music_crossfade = 0.0  # Seconds to crossfade between songs in a playlist, 0 joins them gaplessly
 
         self.id_dir = os.path.join(self.client_dir, 'id/')
 
@@ -29,8 +34,42 @@ class Settings:
         self.host = '127.0.0.1'
         self.port = 65432
 
+        self.net_framing = ['binary', 'json']  # Framing modes we support, in order of preference
+
+        # Audio codecs we support, in order of preference.
+        # Opus is only picked if the output rate is an Opus rate(8000, 12000, 16000, 24000 or 48000),
+        # and 'net_audio_frames' is a whole number of Opus frames, such as 960 at 48000.
+        # Otherwise the next codec in the list is used.
+
+        self.net_audio_codecs = ['opus', 'adpcm', 'pcm16', 'f32']
+        self.net_audio_frames = 1024  # Number of frames in each streamed audio block
+        self.net_audio_delay = (0.02, 0.5)  # Smallest and largest playout delay of streamed audio in seconds
+        self.net_audio_lead = 0.2  # Seconds ahead streamed audio is scheduled to be heard, must be below the largest delay
+        self.net_audio_latency = 0.0  # Seconds between audio leaving our mixer and being heard, to line up rooms
+        self.net_clock_interval = 1.0  # Seconds between clock sync pings once synced
+
+        self.net_engine = 'selector'  # Socket server engine to use, 'selector' or 'asyncio'
+        self.net_out_buffer = 256000  # Maximum number of queued outbound bytes per device
+
+        # What to do with queued messages of each ID when a device falls behind,
+        # 'keep' never drops, 'drop' drops the oldest messages, 'coalesce' only keeps the newest message.
+        # IDs not listed use 'keep'.
+
+        self.net_write_policy = {0: 'coalesce', 1: 'keep', 2: 'keep', 3: 'keep', 4: 'drop'}
+
+        self.net_backlog = 512  # Maximum number of pending connections(asyncio engine)
+
         self.socket_server = None
 
+        self.extension_parallel = True  # Run extension checks concurrently, see 'BaseExtension.check()'
+        self.extension_budget = 0.25  # Seconds each extension has to check input before it's an overrun
+        self.extension_strikes = 3  # Overruns in a row before an extension is tried after all others
+        self.extension_workers = 4  # Number of threads running extension checks
+
+        self.audio_schedule = True  # Render audio on a fixed cadence, and keep track of underruns
+        self.audio_block = 1024  # Number of frames the audio scheduler renders at a time
+        self.audio_cache_size = 64 * 1024 * 1024  # Bytes of decoded sounds to keep in memory
+
         self.wake = 'computer'
 
         # Pocket Sphinx Decoder options: